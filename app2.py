@@ -1,12 +1,24 @@
 # backend/app2.py
 import os
 import logging  # 用于 Flask app logger 完全配置前的早期日志记录
+import click  # 判断 create_app 是否由 flask CLI 命令调用
 from flask import Flask
 from flask_cors import CORS
 
 # 从我们创建的模块中导入
 from config import config as app_configs  # 重命名导入的 config 字典以避免名称冲突
 from models import db  # 从 models.py 导入 SQLAlchemy 实例
+from batch_worker import batch_executor  # 进程内批量ZIP任务执行器
+from pdf_store import pdf_store  # 内容寻址PDF存储
+from pdf_proxy_cache import pdf_proxy_cache  # /api/proxy-pdf 的磁盘缓存
+from single_flight import pdf_fetch_flights  # 同一URL的并发PDF下载合并
+from batch_progress import batch_progress  # 批量任务进度事件中心 (SSE)
+from zip_retention import zip_retention  # ZIPPED_FILES_DIR 保留策略
+from resolution_cache import resolution_cache  # PDF链接解析缓存
+from mirror_health import mirror_health  # Sci-Hub 镜像健康跟踪与熔断
+from source_ranking import source_ranking  # 按 DOI 前缀自适应排列PDF来源
+from http_client import http_client  # 出站HTTP客户端 (连接池/重试/限速)
+from library_resolver import library_resolver  # 文献库后台自动查找PDF链接
 # utils.py 中的函数通常在蓝图或需要它们的地方按需导入，而不是在 app.py 全局导入所有
 # 但如果 app2.py 自身（例如 CLI 命令或特定钩子）需要，则可以导入
 
@@ -20,7 +32,39 @@ from main_views import main_bp  # 使用直接导入，而非相对导入
 
 
 # --- 不应再在此处定义全局 app 实例或全局常量如 ARTICLE_DATA_ROOT_DIR 等 ---
-# --- BACKEND_COLUMN_MAPPING, REQUEST_SESSION, 路径常量等已移至 config.py 或 utils.py ---
+# --- BACKEND_COLUMN_MAPPING, 路径常量等已移至 config.py 或 utils.py；出站请求使用 http_client.py ---
+
+def _is_serving_process(app):
+    """
+    是否为实际处理请求的进程。以下进程不应启动后台线程：
+      - flask CLI 命令 (init-db 会删除并重建数据表，migrate-batch-records 正在写入的任务不应被工作线程领取)；
+        flask run 除外
+      - debug 模式下 Werkzeug 重载器的父进程 (只负责监视文件并重启子进程，其代码可能已过期)
+    """
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        cli_context = click.get_current_context(silent=True)
+        if cli_context is None or cli_context.command.name != 'run':
+            return False
+    if app.debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return False
+    return True
+
+
+def start_background_workers(app):
+    # 批量ZIP后台工作线程 (会自动恢复 SUBMITTED / 中断的 PROCESSING 任务)
+    if app.config.get('BATCH_WORKER_ENABLED', True):
+        batch_executor.start()
+    else:
+        app.logger.info("BATCH_WORKER_ENABLED 已关闭，本进程不执行批量ZIP任务。")
+
+    # ZIP保留策略后台清理线程
+    if app.config.get('ZIP_RETENTION_ENABLED', True):
+        zip_retention.start()
+
+    # 文献库自动查找工作线程 (会自动恢复 QUEUED / 心跳超时的 RUNNING 任务)
+    if app.config.get('LIBRARY_RESOLVE_ENABLED', True):
+        library_resolver.start()
+
 
 def create_app(config_name=None):
     """
@@ -64,7 +108,17 @@ def create_app(config_name=None):
 
     # 3. 初始化Flask扩展
     db.init_app(app)  # 将 SQLAlchemy 实例与 app 关联
-
+    batch_executor.init_app(app)  # 批量任务执行器，工作线程在目录创建完成后启动
+    pdf_store.init_app(app)  # 创建 PDF_STORE_DIR 下的 blobs/keys/incoming 子目录
+    pdf_proxy_cache.init_app(app)  # 依赖 pdf_store 已初始化
+    pdf_fetch_flights.init_app(app)
+    batch_progress.init_app(app)
+    zip_retention.init_app(app)
+    resolution_cache.init_app(app)
+    mirror_health.init_app(app)
+    source_ranking.init_app(app)
+    http_client.init_app(app)
+    library_resolver.init_app(app)
 
 
     # 4. 注册蓝图
@@ -98,6 +152,12 @@ def create_app(config_name=None):
     # --- 移除 app2.py 中全局的 DIRECTORY SETUP 循环 ---
     # --- 因为该逻辑已移入 create_app() 并使用 app.config ---
 
+    # 5.1 启动后台线程 (批量ZIP任务、ZIP清理、文献库自动查找)，只在实际处理请求的进程中启动
+    if _is_serving_process(app):
+        start_background_workers(app)
+    else:
+        app.logger.info("当前进程不处理请求 (flask CLI 命令或调试重载器的父进程)，不启动后台工作线程。")
+
     # 6. (可选) 定义Flask CLI命令，例如用于初始化数据库
     @app.cli.command("init-db")
     def init_db_command():
@@ -135,6 +195,31 @@ def create_app(config_name=None):
         else:
             app.logger.warning("init-db 命令仅应在开发模式下使用，且当前未执行。")
 
+    @app.cli.command("migrate-batch-records")
+    def migrate_batch_records_command():
+        """
+        一次性把旧的 download_records.json 批量任务记录导入 batch_tasks 表。
+        可重复执行（已导入的任务会被跳过）；导入后原文件被重命名为 .migrated。
+        """
+        from models import BatchTask
+        from utils import migrate_download_records_to_db
+        with app.app_context():
+            BatchTask.__table__.create(db.engine, checkfirst=True)  # 未运行 Alembic 迁移时也能直接使用
+            imported_count, skipped_count = migrate_download_records_to_db()
+        app.logger.info(f"批量任务记录迁移完成：导入 {imported_count} 条，跳过 {skipped_count} 条。")
+
+    @app.cli.command("create-literature-indexes")
+    def create_literature_indexes_command():
+        """
+        为已存在的 literature_articles 表补建文献列表分页/过滤使用的复合索引 (db.create_all 不会修改已有的表)。
+        可重复执行（已存在的索引会被跳过）。
+        """
+        from models import LiteratureArticle
+        with app.app_context():
+            for index in sorted(LiteratureArticle.__table__.indexes, key=lambda item: item.name):
+                index.create(db.engine, checkfirst=True)
+                app.logger.info(f"索引 '{index.name}' 已就绪。")
+
     app.logger.info(f"Flask 应用 '{app.name}' (模式: {config_name}) 创建并配置完成。")
     return app
 
@@ -164,7 +249,8 @@ if __name__ == '__main__':
     app.logger.info(f"截图存储根目录: {app.config.get('ARTICLE_DATA_ROOT_DIR')}")
     app.logger.info(f"批量ZIP临时存储: {app.config.get('BATCH_TEMP_ROOT_DIR')}")
     app.logger.info(f"批量ZIP最终存储: {app.config.get('ZIPPED_FILES_DIR')}")
-    app.logger.info(f"下载记录文件: {app.config.get('DOWNLOAD_RECORDS_FILE')}")
+    app.logger.info(f"PDF内容存储: {app.config.get('PDF_STORE_DIR')}")
+    app.logger.info(f"旧版下载记录文件 (仅供 flask migrate-batch-records 导入): {app.config.get('DOWNLOAD_RECORDS_FILE')}")
     app.logger.info(f"--- 配置详情结束 ---")
 
     # 运行Flask应用 (debug 参数由加载的配置对象中的 app.debug 控制)
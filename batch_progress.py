@@ -0,0 +1,106 @@
+# backend/batch_progress.py
+import threading
+import time
+from collections import deque
+
+
+# === 批量任务进度事件中心 (进程内发布/订阅) ===
+# 工作线程在下载过程中发布逐篇文章的事件，SSE 接口 (batch_views.batch_progress_events_bp) 订阅并推送给前端。
+# 每个任务保留最近的事件历史，事件带递增ID，断线重连时按 Last-Event-ID 补发错过的事件。
+# 任务结束 (发布 summary 事件) 后，历史再保留 BATCH_PROGRESS_RETENTION_SECONDS 供迟到的订阅者读取。
+
+TERMINAL_EVENT = "summary"
+
+
+class _TaskChannel:
+    def __init__(self, history_limit):
+        self.events = deque(maxlen=history_limit)  # (event_id, event_type, data)
+        self.next_event_id = 1
+        self.finished_at = None
+
+
+class BatchProgressHub:
+    """
+    进程内的任务进度发布/订阅中心。用法与其他扩展一致：模块级实例化，在 create_app 中调用 init_app(app)。
+    publish 可在任意线程调用；订阅者通过 wait_for_events 阻塞等待新事件。
+    """
+
+    def __init__(self, app=None):
+        self.history_limit = 1000
+        self.retention_seconds = 600
+        self._channels = {}
+        self._condition = threading.Condition()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.history_limit = int(app.config.get('BATCH_PROGRESS_HISTORY_LIMIT', self.history_limit))
+        self.retention_seconds = int(app.config.get('BATCH_PROGRESS_RETENTION_SECONDS', self.retention_seconds))
+        app.extensions['batch_progress'] = self
+
+    def publish(self, task_id, event_type, data):
+        with self._condition:
+            self._purge_expired_locked()
+            channel = self._channels.get(task_id)
+            if channel is None or (channel.finished_at is not None and event_type != TERMINAL_EVENT):
+                # 任务重新开始执行 (重试/重新提交)：丢弃上一轮的历史
+                channel = self._channels[task_id] = _TaskChannel(self.history_limit)
+            event_id = channel.next_event_id
+            channel.next_event_id += 1
+            channel.events.append((event_id, event_type, data))
+            if event_type == TERMINAL_EVENT:
+                channel.finished_at = time.monotonic()
+            self._condition.notify_all()
+            return event_id
+
+    def wait_for_events(self, task_id, after_event_id, timeout):
+        """
+        返回 (events, finished)：events 为ID大于 after_event_id 的事件列表。
+        没有新事件时最多阻塞 timeout 秒。finished 表示任务已发布 summary 事件。
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                channel = self._channels.get(task_id)
+                if channel is not None:
+                    # 客户端的事件ID超出了当前历史的范围（任务重试后ID重新从1开始），从头补发
+                    if channel.events and after_event_id >= channel.next_event_id:
+                        after_event_id = 0
+                    events = [event for event in channel.events if event[0] > after_event_id]
+                    if events:
+                        return events, channel.finished_at is not None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return [], channel is not None and channel.finished_at is not None
+                self._condition.wait(remaining)
+
+    def _purge_expired_locked(self):
+        now = time.monotonic()
+        expired = [task_id for task_id, channel in self._channels.items()
+                   if channel.finished_at is not None and now - channel.finished_at > self.retention_seconds]
+        for task_id in expired:
+            del self._channels[task_id]
+
+
+class DownloadProgressReporter:
+    """
+    把 download_pdf_* 的字节进度回调节流为 downloading 事件：
+    每篇文章最多每 min_interval_seconds 秒发布一次（最后一块总是发布），避免大文件产生海量事件。
+    """
+
+    def __init__(self, emit, min_interval_seconds=0.5):
+        self._emit = emit
+        self._min_interval_seconds = min_interval_seconds
+        self._last_emit_at = 0.0
+
+    def __call__(self, bytes_done, bytes_total):
+        now = time.monotonic()
+        is_last_chunk = bytes_total is not None and bytes_done >= bytes_total
+        if not is_last_chunk and now - self._last_emit_at < self._min_interval_seconds:
+            return
+        self._last_emit_at = now
+        self._emit(bytes_done, bytes_total)
+
+
+# 模块级实例，在 create_app 中 batch_progress.init_app(app)
+batch_progress = BatchProgressHub()
@@ -8,110 +8,122 @@ import os
 import shutil
 import zipfile
 import time
-import uuid # batch_process_and_zip_route_bp 中模拟job_id时使用
+import uuid # batch_process_and_zip_route_bp 中生成 job_id 时使用
+import json # SSE 事件数据
 import io   # proxy_pdf_bp 和 download_article_screenshots_zip_route (后者在screenshot_views.py)
-from filelock import FileLock, Timeout
+import tempfile  # 并发下载时每篇PDF的 SpooledTemporaryFile 缓冲
+import zlib      # _choose_zip_compression 取样试压缩
+import queue     # 流式ZIP响应的生产者/消费者队列
+import threading
+from urllib.parse import quote  # Content-Disposition 中的 UTF-8 文件名
+from collections import OrderedDict, defaultdict, deque  # _download_articles_concurrently 的按主机调度
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 
 # 从同级目录的 utils.py 导入需要的辅助函数
 from utils import (
     generate_task_id,
-    load_download_records,
-    save_download_records,
     sanitize_filename,
     get_current_user_from_token,  # proxy_pdf_bp 需要
-    REQUEST_SESSION,  # proxy_pdf_bp 和 perform_batch_processing_logic 中的 download_pdf_to_server 会用
-    download_pdf_to_server, log_user_activity  # perform_batch_processing_logic 需要
+    download_pdf_to_fileobj, download_pdf_resumable, log_user_activity  # perform_batch_processing_logic 需要
 )
-# 注意：download_pdf_to_server 内部也使用 REQUEST_SESSION，这没问题，因为它们都在 utils.py 中定义或被正确导入
+from http_client import http_client  # 出站HTTP客户端 (proxy_pdf_bp 使用 pdf 服务的连接池与限速)
+from models import db, BatchTask, BatchTaskArtifact, BatchTaskSubmitter  # 批量任务记录 (batch_tasks 表) 及其ZIP条目、提交者
+from batch_worker import batch_executor, TaskLeaseLost  # 提交后的任务由进程内后台执行器执行
+from batch_progress import batch_progress, DownloadProgressReporter, TERMINAL_EVENT  # 逐篇文章的进度事件 (SSE)
+from pdf_store import pdf_store, article_store_keys, key_digest  # 跨任务共享的内容寻址PDF存储
+from pdf_proxy_cache import pdf_proxy_cache  # /api/proxy-pdf 的磁盘缓存 (内容存放在 pdf_store 中)
+from single_flight import pdf_fetch_flights, FlightFailed  # 同一URL的并发下载合并
 
 batch_bp = Blueprint('batch_bp', __name__, url_prefix='/api')
 
 # === 核心批量处理逻辑 (原 perform_batch_processing_logic) ===
 # 此函数现在是 batch_views.py 的一部分，因为它与 batch_process_and_zip_route_bp 紧密相关
-def _perform_batch_processing_for_blueprint(articles_to_process, content_based_task_id):
+# 由 batch_worker.BatchJobExecutor 的工作线程在应用上下文中调用，任务状态已被置为 PROCESSING。
+# lease 为工作线程持有的 batch_worker.TaskLease：租约被接管后停止写入ZIP，所有结果只在仍持有租约时写入任务表
+def _perform_batch_processing_for_blueprint(articles_to_process, content_based_task_id, lease=None):
     log_prefix = f"[BatchWorkerBP:{content_based_task_id}]"
+    worker_id = lease.worker_id if lease is not None else None
     current_app.logger.info(f"{log_prefix} 开始执行批量处理任务，共 {len(articles_to_process)} 篇文章。")
 
-    batch_temp_root_dir = current_app.config.get('BATCH_TEMP_ROOT_DIR')
     zipped_files_dir = current_app.config.get('ZIPPED_FILES_DIR')
 
-    if not batch_temp_root_dir or not zipped_files_dir:
-        current_app.logger.error(f"{log_prefix} 关键路径配置 BATCH_TEMP_ROOT_DIR 或 ZIPPED_FILES_DIR 未找到！")
-        _temp_update_final_record_for_blueprint(content_based_task_id, "FAILED", error_message="服务器路径配置错误")
+    if not zipped_files_dir:
+        current_app.logger.error(f"{log_prefix} 关键路径配置 ZIPPED_FILES_DIR 未找到！")
+        _temp_update_final_record_for_blueprint(content_based_task_id, "FAILED", error_message="服务器路径配置错误", worker_id=worker_id)
         return {"status": "FAILED", "message": "服务器路径配置错误"}
 
-    current_task_temp_dir = os.path.join(batch_temp_root_dir, content_based_task_id)
-    if os.path.exists(current_task_temp_dir):
-        current_app.logger.info(f"{log_prefix} 检测到旧的临时目录，正在移除: {current_task_temp_dir}")
-        shutil.rmtree(current_task_temp_dir)
-    try:
-        os.makedirs(current_task_temp_dir)
-        current_app.logger.info(f"{log_prefix} 已创建临时目录: {current_task_temp_dir}")
-    except OSError as e:
-        current_app.logger.error(f"{log_prefix} 创建临时目录 '{current_task_temp_dir}' 失败: {e}", exc_info=True)
-        _temp_update_final_record_for_blueprint(content_based_task_id, "FAILED", error_message=f"创建临时目录失败: {e}", num_requested=len(articles_to_process))
-        return {"status": "FAILED", "message": f"创建临时目录失败: {e}"}
-
-    downloaded_files_paths = []
-    failed_articles_info = []
-    download_success_count = 0
-
-    for index, article_data in enumerate(articles_to_process):
-        pdf_url = article_data.get('pdfLink')
-        title = article_data.get('title')
-        doi = article_data.get('doi', 'N/A')
-
-        if not pdf_url or not title:
-            current_app.logger.warning(f"{log_prefix} 第 {index+1} 篇文章 (标题: {title or '未知'}, DOI: {doi}) 缺少PDF链接或标题。跳过。")
-            failed_articles_info.append({"title": title or "未知", "doi": doi, "reason": "缺少PDF链接或标题"})
-            continue
-
-        current_app.logger.info(f"{log_prefix} 正在下载第 {index+1}/{len(articles_to_process)} 篇文章: '{title}' (URL: '{pdf_url}')")
-        saved_path = download_pdf_to_server(pdf_url, title, current_task_temp_dir) # 从 utils.py 导入
+    final_zip_filename = _zip_filename_for_task(content_based_task_id)
+    final_zip_file_path = os.path.join(zipped_files_dir, final_zip_filename)
+    # 构建过程中写入 .part 文件；只有完整写入并 fsync 后才原子重命名为最终文件名，
+    # 因此 download_zip_package_route_bp 永远不会发送半成品ZIP。
+    # 每次执行使用各自的 .part 文件：租约被接管时旧执行尚未察觉，两次执行不会写入同一文件
+    partial_zip_file_path = f"{final_zip_file_path}.{uuid.uuid4().hex[:8]}{ZIP_PARTIAL_SUFFIX}"
 
-        if saved_path:
-            current_app.logger.info(f"{log_prefix} 成功下载: {saved_path}")
-            downloaded_files_paths.append(saved_path)
-            download_success_count += 1
-        else:
-            current_app.logger.warning(f"{log_prefix} 下载失败: 文章 '{title}' (URL: '{pdf_url}')")
-            failed_articles_info.append({"title": title, "doi": doi, "pdfLink_attempted": pdf_url, "reason": "下载或保存失败"})
+    download_success_count = 0
+    failed_articles_info = []
+    written_entries = []  # (index, arcname, size)，任务完成后登记为可复用的条目
+    batch_progress.publish(content_based_task_id, "started", {"task_id": content_based_task_id,
+                                                             "num_requested": len(articles_to_process)})
+    try:
+        current_app.logger.info(f"{log_prefix} 正在流式构建ZIP文件: {partial_zip_file_path}")
+        with open(partial_zip_file_path, 'wb') as raw_zip_file:
+            with zipfile.ZipFile(raw_zip_file, 'w', allowZip64=True) as zipf:
+                def _write_entry(index, arcname, pdf_fileobj, size):
+                    if lease is not None:
+                        lease.ensure_held()  # 租约已被接管：放弃本次执行
+                    compress_type = _choose_zip_compression(pdf_fileobj, size)
+                    _write_zip_entry_from_fileobj(zipf, arcname, pdf_fileobj, size, compress_type)
+                    written_entries.append((index, arcname, size))
+                    current_app.logger.debug(
+                        f"{log_prefix} 已写入ZIP条目 '{arcname}' ({size} 字节, "
+                        f"{'DEFLATED' if compress_type == zipfile.ZIP_DEFLATED else 'STORED'})")
+
+                download_success_count, failed_articles_info = _download_articles_concurrently(
+                    articles_to_process, log_prefix, _write_entry,
+                    on_progress=lambda event_type, data: batch_progress.publish(content_based_task_id, event_type, data))
+            raw_zip_file.flush()
+            os.fsync(raw_zip_file.fileno())
+    except TaskLeaseLost as e_lease:
+        current_app.logger.warning(f"{log_prefix} {e_lease} 停止构建ZIP。")
+        _remove_file_quietly(partial_zip_file_path, log_prefix)
+        return {"status": "ABANDONED", "message": str(e_lease)}
+    except Exception as e_zip:
+        current_app.logger.error(f"{log_prefix} 创建ZIP包 '{partial_zip_file_path}' 失败: {e_zip}", exc_info=True)
+        _remove_file_quietly(partial_zip_file_path, log_prefix)
+        _temp_update_final_record_for_blueprint(content_based_task_id, "FAILED_ZIP_CREATION", error_message=str(e_zip), num_requested=len(articles_to_process), num_success=download_success_count, failed_items=failed_articles_info, worker_id=worker_id)
+        return {"status": "FAILED", "message": f"创建ZIP包失败: {e_zip}"}
 
-    if not downloaded_files_paths:
+    if download_success_count == 0:
         current_app.logger.warning(f"{log_prefix} 此批量任务中没有PDF文件被成功下载。")
-        if os.path.exists(current_task_temp_dir):
-            shutil.rmtree(current_task_temp_dir)
-            current_app.logger.info(f"{log_prefix} 已移除空的临时目录: {current_task_temp_dir}")
-        _temp_update_final_record_for_blueprint(content_based_task_id, "FAILED_NO_DOWNLOADS", message="没有PDF被成功下载。", num_requested=len(articles_to_process), failed_items=failed_articles_info)
+        _remove_file_quietly(partial_zip_file_path, log_prefix)
+        _temp_update_final_record_for_blueprint(content_based_task_id, "FAILED_NO_DOWNLOADS", message="没有PDF被成功下载。", num_requested=len(articles_to_process), failed_items=failed_articles_info, worker_id=worker_id)
         return {"status": "FAILED", "message": "没有PDF被成功下载。", "failed_items": failed_articles_info}
 
-    zip_filename_base = sanitize_filename(f"文献包_{content_based_task_id[:8]}", extension="")
-    final_zip_filename = f"{zip_filename_base}.zip"
-    final_zip_file_path = os.path.join(zipped_files_dir, final_zip_filename)
+    if lease is not None and not lease.refresh():
+        current_app.logger.warning(f"{log_prefix} 任务的租约已被其他工作线程接管，不发布本次构建的ZIP。")
+        _remove_file_quietly(partial_zip_file_path, log_prefix)
+        return {"status": "ABANDONED", "message": "任务的租约已被其他工作线程接管。"}
 
     try:
-        current_app.logger.info(f"{log_prefix} 正在创建ZIP文件: {final_zip_file_path}，包含 {len(downloaded_files_paths)} 个文件。")
-        with zipfile.ZipFile(final_zip_file_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file_to_zip in downloaded_files_paths:
-                zipf.write(file_to_zip, os.path.basename(file_to_zip))
+        os.replace(partial_zip_file_path, final_zip_file_path)  # 原子发布
+        _fsync_directory(zipped_files_dir)
         current_app.logger.info(f"{log_prefix} ZIP文件创建成功: {final_zip_filename}")
-    except Exception as e_zip:
-        current_app.logger.error(f"{log_prefix} 创建ZIP包 '{final_zip_file_path}' 失败: {e_zip}", exc_info=True)
-        if os.path.exists(final_zip_file_path):
-            try: os.remove(final_zip_file_path)
-            except OSError as e_rm_zip: current_app.logger.error(f"{log_prefix} 删除部分创建的ZIP包 '{final_zip_file_path}' 失败: {e_rm_zip}")
-        _temp_update_final_record_for_blueprint(content_based_task_id, "FAILED_ZIP_CREATION", error_message=str(e_zip), num_requested=len(articles_to_process), num_success=download_success_count, failed_items=failed_articles_info)
-        return {"status": "FAILED", "message": f"创建ZIP包失败: {e_zip}"}
-    finally:
-        if os.path.exists(current_task_temp_dir):
-            shutil.rmtree(current_task_temp_dir)
-            current_app.logger.info(f"{log_prefix} 已清理临时下载目录: {current_task_temp_dir}")
+    except OSError as e_publish:
+        current_app.logger.error(f"{log_prefix} 发布ZIP包 '{final_zip_file_path}' 失败: {e_publish}", exc_info=True)
+        _remove_file_quietly(partial_zip_file_path, log_prefix)
+        _temp_update_final_record_for_blueprint(content_based_task_id, "FAILED_ZIP_CREATION", error_message=str(e_publish), num_requested=len(articles_to_process), num_success=download_success_count, failed_items=failed_articles_info, worker_id=worker_id)
+        return {"status": "FAILED", "message": f"创建ZIP包失败: {e_publish}"}
 
-    _temp_update_final_record_for_blueprint(content_based_task_id, "COMPLETED",
+    if not _temp_update_final_record_for_blueprint(content_based_task_id, "COMPLETED",
                               zip_filename=final_zip_filename,
                               num_requested=len(articles_to_process),
                               num_success=download_success_count,
-                              failed_items=failed_articles_info)
+                              failed_items=failed_articles_info,
+                              worker_id=worker_id):
+        return {"status": "ABANDONED", "message": "任务记录未更新。"}
+    _record_task_artifacts(content_based_task_id, articles_to_process, written_entries, log_prefix)
 
     current_app.logger.info(f"{log_prefix} 批量处理任务成功完成。ZIP包: {final_zip_filename}, 处理统计: {download_success_count}/{len(articles_to_process)}")
     return {
@@ -120,52 +132,584 @@ def _perform_batch_processing_for_blueprint(articles_to_process, content_based_t
         "successfully_processed": download_success_count, "failed_items": failed_articles_info
     }
 
-# === 临时辅助函数 (原 _temp_update_final_record) ===
-# 此函数现在是 batch_views.py 的一部分
-def _temp_update_final_record_for_blueprint(task_id, status, zip_filename=None, message=None, error_message=None, num_requested=0, num_success=0, failed_items=None):
-    log_prefix = f"[BatchWorkerBP:{task_id}]" # 使用与任务处理函数一致的前缀
-    download_records_file_path = current_app.config.get('DOWNLOAD_RECORDS_FILE')
-    if not download_records_file_path:
-        current_app.logger.error(f"{log_prefix} DOWNLOAD_RECORDS_FILE 未在应用配置中定义！无法更新最终记录。")
+
+# === 流式ZIP构建辅助函数 ===
+ZIP_PARTIAL_SUFFIX = ".part"
+ZIP_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _choose_zip_compression(fileobj, size):
+    """
+    PDF 内部通常已是压缩流，再次 DEFLATE 只会浪费CPU。
+    从文件中部取样试压缩，只有压缩收益足够大时才使用 ZIP_DEFLATED，否则 ZIP_STORED。
+    """
+    sample_size = current_app.config.get('BATCH_ZIP_COMPRESSION_SAMPLE_BYTES', 64 * 1024)
+    ratio_threshold = current_app.config.get('BATCH_ZIP_DEFLATE_RATIO_THRESHOLD', 0.9)
+    if not sample_size or size <= 0:
+        return zipfile.ZIP_STORED
+    fileobj.seek(max(0, size // 2 - sample_size // 2))
+    sample = fileobj.read(sample_size)
+    fileobj.seek(0)
+    if not sample:
+        return zipfile.ZIP_STORED
+    compressed_ratio = len(zlib.compress(sample, 1)) / len(sample)
+    return zipfile.ZIP_DEFLATED if compressed_ratio < ratio_threshold else zipfile.ZIP_STORED
+
+
+def _write_zip_entry_from_fileobj(zipf, arcname, fileobj, size, compress_type):
+    zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+    zinfo.compress_type = compress_type
+    zinfo.file_size = size  # 让 zipfile 预先判断是否需要 Zip64 头
+    fileobj.seek(0)
+    with zipf.open(zinfo, 'w', force_zip64=size > zipfile.ZIP64_LIMIT) as zip_entry:
+        shutil.copyfileobj(fileobj, zip_entry, ZIP_COPY_CHUNK_SIZE)
+
+
+def _fsync_directory(directory_path):
+    """fsync 目录本身，使 os.replace 产生的目录项变更落盘 (Windows 不支持，静默跳过)。"""
+    if os.name != 'posix':
         return
+    dir_fd = os.open(directory_path, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
 
-    lock_path = download_records_file_path + ".lock" # 为记录文件定义一个锁文件路径
+def _remove_file_quietly(file_path, log_prefix):
+    if file_path and os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+            current_app.logger.info(f"{log_prefix} 已删除未完成的文件: {file_path}")
+        except OSError as e_rm:
+            current_app.logger.error(f"{log_prefix} 删除未完成的文件 '{file_path}' 失败: {e_rm}")
 
+
+# === 即时流式ZIP响应 (不在 ZIPPED_FILES_DIR 中落盘完整归档) ===
+ZIP_STREAM_QUEUE_MAX_CHUNKS = 64  # 生产者/消费者之间最多缓冲的数据块数，提供背压
+
+
+class _ZipStreamCancelled(Exception):
+    """客户端断开连接后，由 _ZipStreamSink.write 抛出以终止生产者线程。"""
+
+
+class _ZipStreamSink:
+    """
+    不可 seek 的写入端：zipfile 检测到不可 seek 时会自动改用数据描述符 (data descriptor) 写条目，
+    因此无需预先知道文件大小即可边写边发。写入的数据块经有界队列交给响应生成器。
+    """
+
+    def __init__(self, cancel_event):
+        self._queue = queue.Queue(maxsize=ZIP_STREAM_QUEUE_MAX_CHUNKS)
+        self._cancel_event = cancel_event
+
+    def write(self, data):
+        if not data:
+            return 0
+        chunk = bytes(data)
+        while True:
+            if self._cancel_event.is_set():
+                raise _ZipStreamCancelled()
+            try:
+                self._queue.put(chunk, timeout=1)
+                return len(chunk)
+            except queue.Full:
+                continue
+
+    def flush(self):
+        pass
+
+    def close_stream(self, error=None):
+        # 结束标记：None 表示正常结束，Exception 表示生产者失败
+        while not self._cancel_event.is_set():
+            try:
+                self._queue.put(error, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, timeout):
+        return self._queue.get(timeout=timeout)
+
+
+class _LazyZipEntryWriter:
+    """首次写入数据时才创建ZIP条目：下载在校验阶段（响应头/魔术字节）失败时，归档中不会留下空条目。"""
+
+    def __init__(self, zipf, arcname, size=None):
+        self._zipf = zipf
+        self._arcname = arcname
+        self._size = size
+        self._entry = None
+
+    @property
+    def started(self):
+        return self._entry is not None
+
+    def write(self, data):
+        if self._entry is None:
+            zinfo = zipfile.ZipInfo(self._arcname, date_time=time.localtime()[:6])
+            zinfo.compress_type = zipfile.ZIP_STORED  # 流式模式无法事先取样，PDF 直接存储
+            # 大小未知（上游直连）时强制 Zip64 头，避免超过 4GB 时在传输中途失败
+            force_zip64 = self._size is None or self._size > zipfile.ZIP64_LIMIT
+            if self._size is not None:
+                zinfo.file_size = self._size
+            self._entry = self._zipf.open(zinfo, 'w', force_zip64=force_zip64)
+        return self._entry.write(data)
+
+    def close(self):
+        if self._entry is not None:
+            self._entry.close()
+
+
+class _TeeWriter:
+    def __init__(self, *targets):
+        self._targets = targets
+
+    def write(self, data):
+        for target in self._targets:
+            target.write(data)
+        return len(data)
+
+
+def _copy_from_single_flight(pdf_url, store_keys, writer, log_prefix):
+    """加入该URL的合并下载并把数据写入 writer，返回写入的字节数；失败返回 None。"""
+    flight, _ = pdf_fetch_flights.join(pdf_url, store_keys)
+    chunks = pdf_fetch_flights.read_chunks(flight)
+    size = 0
     try:
-        # 获取文件锁，超时时间设为例如10秒 (根据实际情况调整)
-        with FileLock(lock_path, timeout=10):
-            current_app.logger.debug(f"{log_prefix} 获取到下载记录文件锁: {lock_path}")
-            records = load_download_records() # utils.py 中的函数
-
-            record_data = records.get(task_id, {}) # 获取现有记录或创建新记录
-            record_data.update({ # 更新或添加字段
-                "timestamp_processed": time.strftime("%Y-%m-%d %H:%M:%S"),
-                "status": status,
-                "zip_filename": zip_filename,
-                "message": message,
-                "error_message": error_message,
-                # 如果是初始记录，这些可能还不存在，所以要安全地更新
-                "num_requested": num_requested if num_requested > 0 else record_data.get("num_requested", 0),
-                "num_success": num_success if num_success > 0 else record_data.get("num_success", 0),
-                "failed_items": failed_items if failed_items is not None else record_data.get("failed_items", [])
-            })
-            # 确保初始提交信息（如果存在）不会被覆盖
-            if "timestamp_submitted" not in record_data:
-                 record_data["timestamp_submitted"] = record_data.get("timestamp_processed") # 如果是新失败记录，提交时间就是处理时间
-            if "job_id" not in record_data:
-                 record_data["job_id"] = record_data.get("job_id") # 保留可能存在的 job_id
-
-            records[task_id] = record_data
-
-            if save_download_records(records): # utils.py 中的函数
-                current_app.logger.info(f"{log_prefix} 已更新并保存下载记录。状态: {status}, ZIP: {zip_filename}")
+        for chunk in chunks:
+            writer.write(chunk)
+            size += len(chunk)
+    except FlightFailed as e_flight:
+        current_app.logger.warning(f"{log_prefix} 合并下载 '{pdf_url}' 失败: {e_flight}")
+        return None
+    finally:
+        chunks.close()  # 写入ZIP流失败 (客户端断开) 时立即释放读者登记
+    return size
+
+
+def _write_streamed_zip(articles_to_process, sink, log_prefix):
+    """生产者：依次把每篇文章写入流式ZIP。失败条目汇总到归档末尾的清单文件中。"""
+    filenames = _unique_pdf_filenames(articles_to_process)
+    failed_lines = []
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as zipf:
+        for index, article_data in enumerate(articles_to_process):
+            pdf_url = article_data.get('pdfLink')
+            title = article_data.get('title')
+            if not pdf_url or not title:
+                failed_lines.append(f"{title or '未知'}\t{article_data.get('doi', 'N/A')}\t缺少PDF链接或标题")
+                continue
+            cached = pdf_store.lookup_article(article_data)
+            previous_entry = None if cached else _find_previous_zip_entry(article_store_keys(article_data))
+            if previous_entry:
+                # 复用旧任务ZIP中的条目：大小已知，从本地ZIP解压复制
+                zip_path, entry_name, previous_size = previous_entry
+                entry_writer = _LazyZipEntryWriter(zipf, filenames[index], size=previous_size)
+                try:
+                    size = _copy_previous_zip_entry(zip_path, entry_name, entry_writer, log_prefix)
+                finally:
+                    entry_writer.close()
+            elif cached:
+                # 命中PDF存储：大小已知，直接从本地磁盘读取
+                blob_path, _, cached_size = cached
+                entry_writer = _LazyZipEntryWriter(zipf, filenames[index], size=cached_size)
+                try:
+                    with open(blob_path, 'rb') as blob_file:
+                        shutil.copyfileobj(blob_file, entry_writer, ZIP_COPY_CHUNK_SIZE)
+                    size = cached_size
+                except OSError as e_read:
+                    current_app.logger.warning(f"{log_prefix} 读取PDF存储文件 '{blob_path}' 失败: {e_read}")
+                    size = None
+                finally:
+                    entry_writer.close()
             else:
-                current_app.logger.error(f"{log_prefix} 保存更新后的下载记录失败！")
-        current_app.logger.debug(f"{log_prefix} 已释放下载记录文件锁: {lock_path}")
-    except Timeout: # FileLock 超时异常
-        current_app.logger.error(f"{log_prefix} 获取下载记录文件锁超时 ({lock_path})。记录可能未更新。")
-    except Exception as e_lock:
-         current_app.logger.error(f"{log_prefix} 处理下载记录时发生文件锁相关错误: {e_lock}", exc_info=True)
+                entry_writer = _LazyZipEntryWriter(zipf, filenames[index])
+                try:
+                    if pdf_store.enabled and pdf_fetch_flights.enabled:
+                        # 合并下载写入PDF存储，这里从正在增长的文件中读取并写入ZIP流
+                        size = _copy_from_single_flight(pdf_url, article_store_keys(article_data), entry_writer, log_prefix)
+                    elif pdf_store.enabled:
+                        # 上游数据同时写入ZIP流和PDF存储，供后续批量复用
+                        stored = pdf_store.store_from_download(
+                            article_store_keys(article_data),
+                            lambda writer: download_pdf_to_fileobj(pdf_url, _TeeWriter(entry_writer, writer)))
+                        size = stored[2] if stored else None
+                    else:
+                        size = download_pdf_to_fileobj(pdf_url, entry_writer)
+                finally:
+                    entry_writer.close()
+            if not size:
+                reason = "传输中断，条目可能不完整" if entry_writer.started else "下载失败"
+                failed_lines.append(f"{title}\t{article_data.get('doi', 'N/A')}\t{reason}\t{pdf_url}")
+                current_app.logger.warning(f"{log_prefix} 流式ZIP中文章 '{title}' 处理失败: {reason}")
+        if failed_lines:
+            zipf.writestr("_下载失败清单.txt", "\n".join(["标题\tDOI\t原因\tPDF链接"] + failed_lines))
+    current_app.logger.info(
+        f"{log_prefix} 流式ZIP生成完毕: {len(articles_to_process) - len(failed_lines)}/{len(articles_to_process)} 篇成功。")
+
+
+def _stream_zip_response(articles_to_process, download_name, log_prefix):
+    app = current_app._get_current_object()
+    cancel_event = threading.Event()
+    sink = _ZipStreamSink(cancel_event)
+
+    def _producer():
+        with app.app_context():
+            try:
+                _write_streamed_zip(articles_to_process, sink, log_prefix)
+                sink.close_stream()
+            except _ZipStreamCancelled:
+                current_app.logger.info(f"{log_prefix} 客户端已断开，流式ZIP生成已中止。")
+            except Exception as e_stream:
+                current_app.logger.error(f"{log_prefix} 生成流式ZIP时发生错误: {e_stream}", exc_info=True)
+                sink.close_stream(e_stream)
+
+    producer_thread = threading.Thread(target=_producer, name="zip-stream-producer", daemon=True)
+
+    def generate_zip_chunks():
+        yield b''  # 立即发送响应头，浏览器马上开始"下载"
+        producer_thread.start()
+        try:
+            while True:
+                try:
+                    item = sink.get(timeout=1)
+                except queue.Empty:
+                    if not producer_thread.is_alive():
+                        break
+                    continue
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    break  # 响应头已发出，只能截断；客户端会得到一个不完整的ZIP
+                yield item
+        finally:
+            cancel_event.set()  # 客户端断开或结束时通知生产者退出
+
+    headers = {
+        'Content-Type': 'application/zip',
+        'Content-Disposition': f"attachment; filename*=UTF-8''{quote(download_name)}",
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no'  # 关闭 Nginx 等反向代理的响应缓冲
+    }
+    return Response(generate_zip_chunks(), headers=headers)
+
+
+def _zip_filename_for_task(task_id):
+    return f"{sanitize_filename(f'文献包_{task_id[:8]}', extension='')}.zip"
+
+
+def _find_task_by_zip_filename(zip_filename):
+    """按ZIP文件名查找任务记录 (zip_filename 列有索引)，找不到时返回 None。"""
+    return BatchTask.query.filter_by(zip_filename=zip_filename).order_by(BatchTask.updated_at.desc()).first()
+
+
+def _add_submitter_after_conflict(task_id, user_id, log_prefix):
+    """并发提交冲突回滚后，重新读取已存在的任务并登记提交者，保证该用户之后能查询到共享的任务。"""
+    if user_id is None:
+        return
+    try:
+        task = BatchTask.query.filter_by(task_id=task_id).first()
+        if task is None:
+            return
+        task.add_submitter(user_id)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        # 同一用户的另一请求已登记，无需处理
+        db.session.rollback()
+        current_app.logger.info(f"{log_prefix} 登记任务 '{task_id}' 的提交者时冲突: {e}")
+
+
+def _record_task_artifacts(task_id, articles_to_process, written_entries, log_prefix):
+    """登记已完成任务ZIP中的每篇文章条目（按文章的每个存储 key 各一行），供后续有重叠的批量复用。"""
+    try:
+        task = BatchTask.query.filter_by(task_id=task_id).first()
+        if task is None:
+            return
+        task.artifacts.delete(synchronize_session=False)  # 同一任务重新构建时替换旧条目
+        for index, arcname, size in written_entries:
+            for store_key in article_store_keys(articles_to_process[index]):
+                db.session.add(BatchTaskArtifact(batch_task_id=task.id, article_key_hash=key_digest(store_key),
+                                                 zip_entry_name=arcname, size_bytes=size))
+        db.session.commit()
+    except SQLAlchemyError as e_db:
+        db.session.rollback()
+        current_app.logger.warning(f"{log_prefix} 登记任务ZIP条目失败（不影响本任务，仅后续批量无法复用）: {e_db}")
+
+
+def _find_previous_zip_entry(store_keys):
+    """
+    在已完成任务的ZIP中查找同一文章的条目，返回 (zip_path, entry_name, size)，找不到时返回 None。
+    多个任务都包含该文章时优先使用最近完成的；ZIP已被清理的任务状态不是 COMPLETED，不会被选中。
+    """
+    if not store_keys:
+        return None
+    zipped_files_dir = current_app.config.get('ZIPPED_FILES_DIR')
+    candidates = BatchTaskArtifact.query.join(BatchTask).with_entities(
+        BatchTask.zip_filename, BatchTaskArtifact.zip_entry_name, BatchTaskArtifact.size_bytes
+    ).filter(
+        BatchTaskArtifact.article_key_hash.in_([key_digest(store_key) for store_key in store_keys]),
+        BatchTask.status == "COMPLETED"
+    ).order_by(BatchTask.processed_at.desc()).limit(3).all()
+    for candidate in candidates:
+        zip_path = os.path.join(zipped_files_dir, candidate.zip_filename)
+        if os.path.isfile(zip_path):
+            return zip_path, candidate.zip_entry_name, candidate.size_bytes
+    return None
+
+
+def _copy_previous_zip_entry(zip_path, entry_name, writer, log_prefix):
+    """把旧ZIP中的条目解压复制到 writer（读取结束时 zipfile 会校验CRC），返回复制的字节数，失败返回 None。"""
+    try:
+        copied_size = 0
+        with zipfile.ZipFile(zip_path) as previous_zip, previous_zip.open(entry_name) as entry_file:
+            for chunk in iter(lambda: entry_file.read(ZIP_COPY_CHUNK_SIZE), b''):
+                writer.write(chunk)
+                copied_size += len(chunk)
+        return copied_size or None
+    except (OSError, KeyError, zipfile.BadZipFile) as e_copy:
+        current_app.logger.warning(f"{log_prefix} 从旧ZIP '{zip_path}' 复制条目 '{entry_name}' 失败: {e_copy}")
+        return None
+
+
+def _unique_pdf_filenames(articles_to_process):
+    """为每篇文章预先分配不重复的文件名（ZIP条目名），避免同名标题互相覆盖。"""
+    used_names = set()
+    filenames = []
+    for article_data in articles_to_process:
+        base_name = sanitize_filename(article_data.get('title'), extension="")
+        candidate = f"{base_name}.pdf"
+        suffix = 2
+        while candidate.lower() in used_names:
+            candidate = f"{base_name}_{suffix}.pdf"
+            suffix += 1
+        used_names.add(candidate.lower())
+        filenames.append(candidate)
+    return filenames
+
+
+def _download_articles_concurrently(articles_to_process, log_prefix, on_article_downloaded, on_progress=None):
+    """
+    并发下载一批文章的PDF。
+    - 全局并发上限: BATCH_DOWNLOAD_MAX_CONCURRENCY
+    - 单个主机并发上限: BATCH_DOWNLOAD_PER_HOST_CONCURRENCY (避免集中请求同一出版商)
+    调度器按主机轮询派发任务，某主机达到上限时不会占用全局槽位等待，其他主机的文章可以继续下载。
+    每篇文章优先取自内容寻址PDF存储 (pdf_store)；未命中时下载进存储供后续批量复用。
+    存储未配置时下载到 SpooledTemporaryFile（小文件留在内存，大文件溢出到 BATCH_TEMP_ROOT_DIR 的匿名临时文件）。
+    完成后由调度线程调用 on_article_downloaded(index, arcname, fileobj, size)，因此回调无需加锁。
+    on_progress(event_type, data) 可选，用于发布逐篇文章的进度事件 (resolved / downloading / stored / failed)。
+    返回 (download_success_count, failed_articles_info)，失败列表按输入顺序排列，与完成顺序无关。
+    """
+    app = current_app._get_current_object()  # 工作线程中需要显式推入应用上下文
+    max_concurrency = max(1, int(app.config.get('BATCH_DOWNLOAD_MAX_CONCURRENCY', 8)))
+    per_host_limit = max(1, int(app.config.get('BATCH_DOWNLOAD_PER_HOST_CONCURRENCY', 2)))
+    spool_max_bytes = int(app.config.get('BATCH_DOWNLOAD_SPOOL_MAX_BYTES', 32 * 1024 * 1024))
+    spool_dir = app.config.get('BATCH_TEMP_ROOT_DIR')
+    total = len(articles_to_process)
+    filenames = _unique_pdf_filenames(articles_to_process)
+
+    download_success_count = 0
+    failure_by_index = {}
+    pending_by_host = OrderedDict()  # host -> deque[index]，保持首次出现顺序以便轮询
+    progress_interval = float(app.config.get('BATCH_PROGRESS_MIN_INTERVAL_SECONDS', 0.5))
+
+    def _emit(event_type, index, **fields):
+        if on_progress is None:
+            return
+        article_data = articles_to_process[index]
+        data = {"index": index, "total": total, "title": article_data.get('title'), "doi": article_data.get('doi')}
+        data.update(fields)
+        try:
+            on_progress(event_type, data)
+        except Exception as e_progress:  # 进度推送失败不应影响下载本身
+            app.logger.warning(f"{log_prefix} 发布进度事件 '{event_type}' 失败: {e_progress}")
+
+    for index, article_data in enumerate(articles_to_process):
+        pdf_url = article_data.get('pdfLink')
+        title = article_data.get('title')
+        doi = article_data.get('doi', 'N/A')
+        if not pdf_url or not title:
+            current_app.logger.warning(f"{log_prefix} 第 {index+1} 篇文章 (标题: {title or '未知'}, DOI: {doi}) 缺少PDF链接或标题。跳过。")
+            failure_by_index[index] = {"title": title or "未知", "doi": doi, "reason": "缺少PDF链接或标题"}
+            _emit("failed", index, reason="缺少PDF链接或标题")
+            continue
+        host = (urlparse(pdf_url).hostname or '').lower()
+        pending_by_host.setdefault(host, deque()).append(index)
+        _emit("resolved", index, pdfLink=pdf_url, host=host)
+
+    def _download_one(index):
+        article_data = articles_to_process[index]
+        with app.app_context():
+            # 优先从内容寻址PDF存储读取；未命中时下载进存储，再从存储读出写入ZIP
+            store_keys = article_store_keys(article_data)
+            cached = pdf_store.lookup(store_keys)
+            if cached:
+                blob_path, _, size = cached
+                current_app.logger.info(f"{log_prefix} 第 {index+1}/{total} 篇文章命中PDF存储: '{article_data.get('title')}'")
+                return open(blob_path, 'rb'), size
+            # 其次从之前已完成任务的ZIP条目中复制（与本批有重叠的旧批量）
+            previous_entry = _find_previous_zip_entry(store_keys)
+            if previous_entry:
+                zip_path, entry_name, _ = previous_entry
+                current_app.logger.info(f"{log_prefix} 第 {index+1}/{total} 篇文章复用旧ZIP条目: '{os.path.basename(zip_path)}/{entry_name}'")
+                if pdf_store.enabled:
+                    stored = pdf_store.store_from_download(
+                        store_keys, lambda writer: _copy_previous_zip_entry(zip_path, entry_name, writer, log_prefix))
+                    if stored:
+                        return open(stored[0], 'rb'), stored[2]
+                else:
+                    spool = tempfile.SpooledTemporaryFile(max_size=spool_max_bytes, dir=spool_dir)
+                    size = _copy_previous_zip_entry(zip_path, entry_name, spool, log_prefix)
+                    if size:
+                        return spool, size
+                    spool.close()
+            current_app.logger.info(f"{log_prefix} 正在下载第 {index+1}/{total} 篇文章: '{article_data.get('title')}' (URL: '{article_data.get('pdfLink')}')")
+            _emit("downloading", index, bytes=0, bytes_total=None)
+            report_progress = DownloadProgressReporter(
+                lambda bytes_done, bytes_total: _emit("downloading", index, bytes=bytes_done, bytes_total=bytes_total),
+                progress_interval)
+            if pdf_store.enabled:
+                # 按URL固定的 .part 文件支持断点续传：本次失败的大文件在任务重试时从断点继续
+                pdf_url = article_data.get('pdfLink')
+                if pdf_fetch_flights.enabled:
+                    # 与其他批量任务或代理请求中对同一URL的下载合并，只向源站下载一次
+                    flight, _ = pdf_fetch_flights.join(pdf_url, store_keys)
+                    stored = pdf_fetch_flights.wait(flight, report_progress)
+                else:
+                    stored = pdf_store.store_from_resumable_download(
+                        store_keys, pdf_url, lambda part_path: download_pdf_resumable(pdf_url, part_path, report_progress))
+                if not stored:
+                    return None, 0
+                blob_path, _, size = stored
+                return open(blob_path, 'rb'), size
+            spool = tempfile.SpooledTemporaryFile(max_size=spool_max_bytes, dir=spool_dir)
+            size = download_pdf_to_fileobj(article_data.get('pdfLink'), spool, report_progress)
+            if not size:
+                spool.close()
+                return None, 0
+            return spool, size
+
+    in_flight = {}  # future -> (index, host)
+    in_flight_per_host = defaultdict(int)
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="batch-download") as pool:
+        try:
+            while pending_by_host or in_flight:
+                # 轮询各主机派发任务，直到全局槽位用尽或所有主机都达到各自上限
+                dispatched = True
+                while dispatched and len(in_flight) < max_concurrency:
+                    dispatched = False
+                    for host in list(pending_by_host.keys()):
+                        if len(in_flight) >= max_concurrency:
+                            break
+                        if in_flight_per_host[host] >= per_host_limit:
+                            continue
+                        index = pending_by_host[host].popleft()
+                        if not pending_by_host[host]:
+                            del pending_by_host[host]
+                        in_flight[pool.submit(_download_one, index)] = (index, host)
+                        in_flight_per_host[host] += 1
+                        dispatched = True
+
+                if not in_flight:
+                    break
+                done_futures, _ = wait(list(in_flight.keys()), return_when=FIRST_COMPLETED)
+                for future in done_futures:
+                    index, host = in_flight.pop(future)
+                    in_flight_per_host[host] -= 1
+                    article_data = articles_to_process[index]
+                    try:
+                        spool, size = future.result()
+                    except Exception as e_download:
+                        current_app.logger.error(f"{log_prefix} 下载第 {index+1} 篇文章时发生未处理错误: {e_download}", exc_info=True)
+                        spool, size = None, 0
+                    if spool is None:
+                        current_app.logger.warning(f"{log_prefix} 下载失败: 文章 '{article_data.get('title')}' (URL: '{article_data.get('pdfLink')}')")
+                        failure_by_index[index] = {"title": article_data.get('title'), "doi": article_data.get('doi', 'N/A'),
+                                                   "pdfLink_attempted": article_data.get('pdfLink'), "reason": "下载或保存失败"}
+                        _emit("failed", index, reason="下载或保存失败")
+                        continue
+                    with spool:
+                        on_article_downloaded(index, filenames[index], spool, size)
+                    download_success_count += 1
+                    _emit("stored", index, filename=filenames[index], bytes=size)
+                    current_app.logger.info(f"{log_prefix} 成功下载并写入: '{filenames[index]}'")
+        except BaseException:
+            # 回调失败（例如ZIP写入错误）时放弃剩余任务，并关闭已完成但尚未消费的临时文件
+            pending_by_host.clear()
+            for future in in_flight:
+                future.cancel()
+            for future in in_flight:
+                if not future.cancelled():
+                    try:
+                        spool, _ = future.result()
+                        if spool is not None:
+                            spool.close()
+                    except Exception:
+                        pass
+            raise
+
+    failed_articles_info = [failure_by_index[index] for index in sorted(failure_by_index)]
+    return download_success_count, failed_articles_info
+
+# === 临时辅助函数 (原 _temp_update_final_record) ===
+# 此函数现在是 batch_views.py 的一部分；只更新 batch_tasks 表中的单行记录
+def _temp_update_final_record_for_blueprint(task_id, status, zip_filename=None, message=None, error_message=None, num_requested=0, num_success=0, failed_items=None, worker_id=None):
+    """
+    写入任务终态并推送最终汇总。worker_id 为执行任务的工作线程时，只有该线程仍持有租约 (worker_id 未变且仍为 PROCESSING)
+    才写入，租约已被接管的旧执行返回 False，不会覆盖新执行的结果。
+    """
+    log_prefix = f"[BatchWorkerBP:{task_id}]" # 使用与任务处理函数一致的前缀
+    now = datetime.now(timezone.utc)
+    values = {"processed_at": now, "status": status, "zip_filename": zip_filename,
+              "message": message, "error_message": error_message}
+    # 如果是初始记录，这些可能还不存在，所以要安全地更新
+    if num_requested > 0:
+        values["num_requested"] = num_requested
+    if num_success > 0:
+        values["num_success"] = num_success
+    if failed_items is not None:
+        values["failed_items_json"] = json.dumps(failed_items, ensure_ascii=False) if failed_items else None
+    if status == "COMPLETED" and zip_filename:
+        # 生成时间作为首次"访问"，供 zip_retention 的LRU淘汰使用
+        values["last_downloaded_at"] = now
+        try:
+            values["zip_size_bytes"] = os.path.getsize(os.path.join(current_app.config.get('ZIPPED_FILES_DIR'), zip_filename))
+        except (OSError, TypeError):
+            values["zip_size_bytes"] = 0
+    try:
+        if worker_id is not None:
+            # 以租约为条件的 UPDATE：判断与写入在同一语句中完成
+            values["updated_at"] = now
+            updated_rows = BatchTask.query.filter(
+                BatchTask.task_id == task_id, BatchTask.worker_id == worker_id, BatchTask.status == "PROCESSING"
+            ).update(values, synchronize_session=False)
+            db.session.commit()
+            if updated_rows != 1:
+                current_app.logger.warning(f"{log_prefix} 工作线程 {worker_id} 的租约已被接管，不写入结果 (状态: {status})。")
+                return False
+        else:
+            task = BatchTask.query.filter_by(task_id=task_id).first()
+            if task is None:  # 获取现有记录或创建新记录 (新失败记录的提交时间就是处理时间)
+                task = BatchTask(task_id=task_id)
+                db.session.add(task)
+            for name, value in values.items():
+                setattr(task, name, value)
+            db.session.commit()
+        current_app.logger.info(f"{log_prefix} 已更新任务记录。状态: {status}, ZIP: {zip_filename}")
+    except SQLAlchemyError as e_db:
+        db.session.rollback()
+        current_app.logger.error(f"{log_prefix} 更新任务记录失败！记录可能未更新: {e_db}", exc_info=True)
+    # 所有终态都经由此函数写入，在这里向进度订阅者推送最终汇总
+    _publish_task_summary(task_id, status, zip_filename, message, error_message, num_requested, num_success, failed_items)
+    return True
+
+
+def _publish_task_summary(task_id, status, zip_filename=None, message=None, error_message=None, num_requested=0, num_success=0, failed_items=None):
+    batch_progress.publish(task_id, TERMINAL_EVENT, {
+        "task_id": task_id, "status": status, "zip_download_filename": zip_filename,
+        "message": message, "error_message": error_message,
+        "total_requested": num_requested, "successfully_processed": num_success,
+        "failed_items": failed_items or []
+    })
 
 
 # === 路由定义 ===
@@ -186,86 +730,130 @@ def batch_process_and_zip_route_bp():
         current_app.logger.error(f"{log_prefix} 无法为批量任务生成基于内容的标识符。")
         return jsonify({"success": False, "message": "无法生成任务标识符。"}), 500
 
-    # --- 文件锁应用于读取和写入 download_records.json ---
-    download_records_file_path = current_app.config.get('DOWNLOAD_RECORDS_FILE')
-    if not download_records_file_path:
-        current_app.logger.error(f"{log_prefix} DOWNLOAD_RECORDS_FILE 未在应用配置中定义！")
-        return jsonify({"success": False, "message": "服务器配置错误。"}), 500
-    lock_path = download_records_file_path + ".lock"
+    # delivery: "zip" (默认，后台构建ZIP) 或 "stream" (下载时即时生成ZIP流，适合一次性批量)
+    delivery_mode = str(data.get('delivery') or 'zip').lower()
+    if delivery_mode not in ('zip', 'stream'):
+        return jsonify({"success": False, "message": "'delivery' 只能是 'zip' 或 'stream'。"}), 400
+
+    # 该接口暂不强制认证；若携带了有效Token，则将其登记为任务的提交者（同一批文章的多个提交者均可查询进度）
+    current_user_info = get_current_user_from_token()
+    submitting_user_id = current_user_info['user_id'] if current_user_info else None
 
     try:
-        with FileLock(lock_path, timeout=10): # 获取文件锁
-            current_app.logger.debug(f"{log_prefix} 获取到下载记录文件锁 (for task submission): {lock_path}")
-            download_records = load_download_records()
-
-            if content_based_task_id in download_records:
-                record = download_records[content_based_task_id]
-                current_status = record.get('status')
-                # ... (处理 previously_processed_completed 和 already_processing_or_submitted 的逻辑不变) ...
-                if current_status == "COMPLETED":
-                    # ... (省略，与之前相同，确保此部分代码也在此 with FileLock块内，虽然它只读)
-                    zipped_files_dir_config = current_app.config.get('ZIPPED_FILES_DIR')
-                    if not zipped_files_dir_config:
-                        current_app.logger.error(f"{log_prefix} ZIPPED_FILES_DIR 未在应用配置中设置！")
-                        # 释放锁
-                        current_app.logger.debug(f"{log_prefix} 释放下载记录文件锁 (因配置错误): {lock_path}")
-                        return jsonify({"success": False, "message": "服务器配置错误：存储路径未定义。"}), 500
-
-                    zip_filename_from_record = record.get('zip_filename')
-                    if zip_filename_from_record:
-                        zip_path_to_check = os.path.join(zipped_files_dir_config, zip_filename_from_record)
-                        if os.path.exists(zip_path_to_check):
-                            current_app.logger.info(f"{log_prefix} 内容ID '{content_based_task_id}' 的任务之前已成功处理。返回缓存结果。")
-                            current_app.logger.debug(f"{log_prefix} 释放下载记录文件锁 (previously_processed): {lock_path}")
-                            return jsonify({
-                                "success": True, "status": "previously_processed_completed",
-                                # ... (其他字段)
-                            }), 200
-                elif current_status in ["PROCESSING", "SUBMITTED", "PENDING"]:
-                    current_app.logger.info(f"{log_prefix} 内容ID '{content_based_task_id}' 的任务当前状态为 '{current_status}'。")
-                    current_app.logger.debug(f"{log_prefix} 释放下载记录文件锁 (already_processing): {lock_path}")
-                    return jsonify({
-                        "success": True, "status": "already_processing_or_submitted",
-                        # ... (其他字段)
-                    }), 202
-
-            # 如果记录不存在，或状态允许重新提交，则创建/更新初始记录
-            current_app.logger.info(f"{log_prefix} 准备提交/重新提交新的异步批量处理任务。内容ID: '{content_based_task_id}', 文章数: {len(articles_to_process)}")
-            simulated_celery_job_id = str(uuid.uuid4())
-
-            initial_task_record = {
-                "timestamp_submitted": time.strftime("%Y-%m-%d %H:%M:%S"),
-                "job_id": simulated_celery_job_id, "status": "SUBMITTED",
-                "num_requested": len(articles_to_process), "zip_filename": None,
-                "message": "任务已提交，等待后台处理。", "failed_items": []
-            }
-            download_records[content_based_task_id] = initial_task_record # 在锁内修改
-
-            if not save_download_records(download_records): # 在锁内保存
-                current_app.logger.error(f"{log_prefix} 保存初始任务记录失败！")
-                current_app.logger.debug(f"{log_prefix} 释放下载记录文件锁 (因保存失败): {lock_path}")
-                return jsonify({"success": False, "message": "保存任务初始记录时发生错误。"}), 500
-
-            current_app.logger.info(f"{log_prefix} 已为任务 '{content_based_task_id}' 创建/更新初始状态记录 (SUBMITTED)，模拟Job ID: {simulated_celery_job_id}.")
-            # === Celery 任务提交逻辑（异步）应在释放锁之后，或者确保任务提交本身不依赖此锁 ===
-            # _perform_batch_processing_for_blueprint.delay(...)
-
-        current_app.logger.debug(f"{log_prefix} 释放下载记录文件锁 (task submission): {lock_path}")
-        # 异步任务的提交（如果适用）应该在锁之外，或者提交一个不直接操作此JSON文件的任务
-        # 如果 _perform_batch_processing_for_blueprint 是同步调用（仅用于测试），它内部的 _temp_update_final_record_for_blueprint 也需要处理锁
-        # 我们当前的 _perform_batch_processing_for_blueprint 调用是被注释掉的，所以这里没问题
+        task = BatchTask.query.filter_by(task_id=content_based_task_id).first()
+
+        if task is not None:
+            current_status = task.status
+            if current_status == "COMPLETED":
+                zipped_files_dir_config = current_app.config.get('ZIPPED_FILES_DIR')
+                if not zipped_files_dir_config:
+                    current_app.logger.error(f"{log_prefix} ZIPPED_FILES_DIR 未在应用配置中设置！")
+                    return jsonify({"success": False, "message": "服务器配置错误：存储路径未定义。"}), 500
+
+                if task.zip_filename:
+                    zip_path_to_check = os.path.join(zipped_files_dir_config, task.zip_filename)
+                    if not os.path.exists(zip_path_to_check):
+                        # ZIP已被清理或丢失（记录尚未被保留策略同步）：按新任务重新构建
+                        current_app.logger.info(f"{log_prefix} 内容ID '{content_based_task_id}' 的ZIP已不存在，将重新构建。")
+                    else:
+                        current_app.logger.info(f"{log_prefix} 内容ID '{content_based_task_id}' 的任务之前已成功处理。返回缓存结果。")
+                        task.add_submitter(submitting_user_id)
+                        db.session.commit()
+                        return jsonify({
+                            "success": True, "status": "previously_processed_completed",
+                            "message": "此文献集合之前已打包完成。",
+                            "task_id": content_based_task_id,
+                            "zip_download_filename": task.zip_filename,
+                            "original_record_timestamp": (task.processed_at or task.submitted_at).strftime("%Y-%m-%d %H:%M:%S"),
+                            "total_requested": task.num_requested,
+                            "successfully_processed": task.num_success,
+                            "failed_items": task.failed_items
+                        }), 200
+            elif current_status == "EVICTED":
+                current_app.logger.info(f"{log_prefix} 内容ID '{content_based_task_id}' 的ZIP已按保留策略清理，将重新构建。")
+            elif current_status in ["PROCESSING", "SUBMITTED", "PENDING"]:
+                current_app.logger.info(f"{log_prefix} 内容ID '{content_based_task_id}' 的任务当前状态为 '{current_status}'。")
+                task.add_submitter(submitting_user_id)
+                db.session.commit()
+                return jsonify({
+                    "success": True, "status": "already_processing_or_submitted",
+                    "message": "此文献集合的打包任务已在处理中。",
+                    "task_id": content_based_task_id, "job_id": task.job_id,
+                    "current_status": current_status
+                }), 202
+        else:
+            task = BatchTask(task_id=content_based_task_id)
+            db.session.add(task)
+
+        # 如果记录不存在，或状态允许重新提交，则创建/重置该行记录；首个提交者 (user_id) 保持不变
+        task.add_submitter(submitting_user_id)
+        task.submitted_at = datetime.now(timezone.utc)
+        task.num_requested = len(articles_to_process)
+        task.num_success = 0
+        task.failed_items = []
+        task.articles = articles_to_process
+        task.error_message = None
+        task.processed_at = None
+        task.zip_size_bytes = 0
+        task.last_downloaded_at = None
+
+        # 一次性批量的"流式交付"模式：不排队构建ZIP，而是登记文章列表，
+        # 由 download_zip_package_route_bp 在下载时即时生成ZIP流
+        if delivery_mode == 'stream':
+            stream_zip_filename = _zip_filename_for_task(content_based_task_id)
+            task.status = "STREAMABLE"
+            task.zip_filename = stream_zip_filename
+            task.message = "流式ZIP已就绪，下载时即时生成。"
+            db.session.commit()
+            current_app.logger.info(f"{log_prefix} 任务 '{content_based_task_id}' 已登记为流式交付: {stream_zip_filename}")
+            return jsonify({
+                "success": True, "status": "stream_ready",
+                "message": "ZIP将在下载时即时生成。",
+                "task_id": content_based_task_id,
+                "zip_download_filename": stream_zip_filename,
+                "stream_url": f"/api/download_zip_package/{quote(stream_zip_filename)}?mode=stream"
+            }), 200
+
+        current_app.logger.info(f"{log_prefix} 准备提交/重新提交新的异步批量处理任务。内容ID: '{content_based_task_id}', 文章数: {len(articles_to_process)}")
+        job_id = str(uuid.uuid4())
+        # 记录中保存完整的 articles 列表：batch_tasks 表即持久化队列，
+        # 进程重启后 batch_executor 的扫描线程据此恢复并执行任务
+        task.job_id = job_id
+        task.status = "SUBMITTED"
+        task.zip_filename = None
+        task.message = "任务已提交，等待后台处理。"
+        task.attempts = 0
+        task.worker_id = None
+        task.processing_started_at = None
+        db.session.commit()
+        current_app.logger.info(f"{log_prefix} 已为任务 '{content_based_task_id}' 创建/更新初始状态记录 (SUBMITTED)，Job ID: {job_id}.")
+
+        # 提交后再交给后台执行器；即使本进程未启动工作线程，其他进程的扫描线程也会拾取该 SUBMITTED 记录
+        batch_executor.submit(content_based_task_id)
 
         return jsonify({
             "success": True, "status": "processing_submitted",
             "message": "批量处理任务已成功提交到后台队列。",
-            "task_id": content_based_task_id, "job_id": simulated_celery_job_id
+            "task_id": content_based_task_id, "job_id": job_id
         }), 202
 
-    except Timeout: # FileLock 超时异常
-        current_app.logger.error(f"{log_prefix} 获取下载记录文件锁超时 ({lock_path})。任务提交可能失败。")
-        return jsonify({"success": False, "message": "服务器繁忙，请稍后再试。"}), 503 # Service Unavailable
+    except IntegrityError:
+        # 同一批文章被并发提交，另一请求已先插入了该 task_id 的记录（或同一用户并发登记为提交者）
+        db.session.rollback()
+        current_app.logger.info(f"{log_prefix} 内容ID '{content_based_task_id}' 的任务已被并发提交。")
+        _add_submitter_after_conflict(content_based_task_id, submitting_user_id, log_prefix)
+        return jsonify({
+            "success": True, "status": "already_processing_or_submitted",
+            "message": "此文献集合的打包任务已在处理中。",
+            "task_id": content_based_task_id
+        }), 202
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"{log_prefix} 准备或提交批量任务时数据库操作失败 (内容ID: '{content_based_task_id}'): {e}", exc_info=True)
+        return jsonify({"success": False, "message": "保存任务初始记录时发生错误。"}), 500
     except Exception as e:
-        current_app.logger.error(f"{log_prefix} 准备或提交批量任务时（锁内操作）发生错误 (内容ID: '{content_based_task_id}'): {e}", exc_info=True)
+        db.session.rollback()
+        current_app.logger.error(f"{log_prefix} 准备或提交批量任务时发生错误 (内容ID: '{content_based_task_id}'): {e}", exc_info=True)
         return jsonify({"success": False, "message": "准备或提交批量处理任务失败。"}), 500
 
 
@@ -285,66 +873,177 @@ def delete_batch_record_route_bp():
 
     current_app.logger.info(f"{log_prefix}[User:{user_id}] 尝试删除批量记录，Task ID: {task_id_to_delete}")
 
-    download_records_file_path = current_app.config.get('DOWNLOAD_RECORDS_FILE')
-    if not download_records_file_path:
-        current_app.logger.error(f"{log_prefix}[User:{user_id}] DOWNLOAD_RECORDS_FILE 未在应用配置中定义！无法删除记录。")
-        return jsonify({"success": False, "message": "服务器配置错误。"}), 500
-    lock_path = download_records_file_path + ".lock"
-
     try:
-        with FileLock(lock_path, timeout=10):  # 获取文件锁
-            current_app.logger.debug(
-                f"{log_prefix}[User:{user_id}] 获取到下载记录文件锁 (for deleting record {task_id_to_delete}): {lock_path}")
-            records = load_download_records()  # 从 utils.py 导入
-
-            if task_id_to_delete in records:
-                record_to_delete = records.pop(task_id_to_delete)
-
-                if not save_download_records(records):  # 保存更新后的记录字典 (在锁内)
-                    current_app.logger.error(
-                        f"{log_prefix}[User:{user_id}] 保存删除 '{task_id_to_delete}' 后的记录失败！记录可能未完全删除。")
-                    # 即使保存失败，也应该尝试继续删除ZIP文件（如果存在），但要告知用户可能的不一致
-                    # 或者，更安全的做法是如果保存失败，则不进行ZIP删除，并返回错误
-                    # 此处我们选择如果保存失败，则返回错误，不删除ZIP
-                    current_app.logger.debug(
-                        f"{log_prefix}[User:{user_id}] 释放下载记录文件锁 (因保存失败): {lock_path}")
-                    return jsonify({"success": False, "message": "删除任务记录时保存更新失败。"}), 500
-
-                # 如果记录保存成功，则继续尝试删除关联的ZIP文件
-                msg = f"任务ID '{task_id_to_delete}' 的记录已从JSON中删除。"
-                zip_to_delete_path = os.path.join(current_app.config.get('ZIPPED_FILES_DIR', 'zipped_downloads'),
-                                                  record_to_delete.get('zip_filename', ''))
-                if record_to_delete.get('zip_filename') and os.path.exists(zip_to_delete_path):
-                    try:
-                        os.remove(zip_to_delete_path)
-                        msg += f" 关联的ZIP文件 '{record_to_delete.get('zip_filename')}' 已删除。"
-                        current_app.logger.info(
-                            f"{log_prefix}[User:{user_id}] 关联的ZIP文件 '{zip_to_delete_path}' 已删除。")
-                    except OSError as e_rm_zip:
-                        msg += f" 但删除关联的ZIP文件失败: {e_rm_zip}."  # 即使ZIP删除失败，记录也已删除
-                        current_app.logger.error(
-                            f"{log_prefix}[User:{user_id}] 删除ZIP文件 '{zip_to_delete_path}' 失败: {e_rm_zip}",
-                            exc_info=True)
-
-                log_user_activity(user_id, "delete_batch_zip_record",
-                                  f"删除了批量下载任务记录 (Task ID: {task_id_to_delete}). ZIP文件状态: {'已删除' if record_to_delete.get('zip_filename') and not os.path.exists(zip_to_delete_path) else ('无关联ZIP' if not record_to_delete.get('zip_filename') else '删除失败或未找到')}.")
-                current_app.logger.debug(
-                    f"{log_prefix}[User:{user_id}] 释放下载记录文件锁 (record deleted): {lock_path}")
-                return jsonify({"success": True, "message": msg}), 200
-            else:
-                current_app.logger.warning(
-                    f"{log_prefix}[User:{user_id}] 未找到要删除的批量记录，Task ID: {task_id_to_delete}")
-                current_app.logger.debug(
-                    f"{log_prefix}[User:{user_id}] 释放下载记录文件锁 (record not found): {lock_path}")
-                return jsonify({"success": False, "message": f"任务ID '{task_id_to_delete}' 未找到。"}), 404
-    except Timeout:
-        current_app.logger.error(f"{log_prefix}[User:{user_id}] 获取下载记录文件锁超时 ({lock_path})。删除操作未执行。")
-        return jsonify({"success": False, "message": "服务器繁忙，请稍后再试。"}), 503
-    except Exception as e_lock_del:
+        task_to_delete = BatchTask.query.filter_by(task_id=task_id_to_delete).first()
+        # 无权访问的任务与不存在的任务一样返回 404，不泄露任务是否存在
+        if task_to_delete is None or not task_to_delete.is_accessible_by(user_id):
+            current_app.logger.warning(
+                f"{log_prefix}[User:{user_id}] 未找到要删除的批量记录，Task ID: {task_id_to_delete}")
+            return jsonify({"success": False, "message": f"任务ID '{task_id_to_delete}' 未找到。"}), 404
+
+        # 同一批文章被多个用户提交时共享任务：还有其他提交者时只移除当前用户的提交记录，任务与ZIP保留
+        other_user_ids = {submitter.user_id for submitter in task_to_delete.submitters} | {task_to_delete.user_id}
+        other_user_ids.discard(None)
+        other_user_ids.discard(user_id)
+        if other_user_ids:
+            task_to_delete.submitters.filter(BatchTaskSubmitter.user_id == user_id).delete(synchronize_session=False)
+            if task_to_delete.user_id == user_id:
+                next_owner = task_to_delete.submitters.filter(BatchTaskSubmitter.user_id != user_id).order_by(
+                    BatchTaskSubmitter.submitted_at, BatchTaskSubmitter.id).first()
+                task_to_delete.user_id = next_owner.user_id if next_owner else min(other_user_ids)
+            db.session.commit()
+            current_app.logger.info(
+                f"{log_prefix}[User:{user_id}] 任务 '{task_id_to_delete}' 仍有 {len(other_user_ids)} 个其他提交者，仅移除当前用户的提交记录。")
+            log_user_activity(user_id, "delete_batch_zip_record",
+                              f"从共享的批量下载任务中移除了自己的记录 (Task ID: {task_id_to_delete})。")
+            return jsonify({"success": True, "message": f"已移除你对任务ID '{task_id_to_delete}' 的记录，其他提交者的任务与ZIP保留。"}), 200
+
+        if task_to_delete.status in BATCH_IN_PROGRESS_STATUSES:
+            current_app.logger.warning(
+                f"{log_prefix}[User:{user_id}] 任务 '{task_id_to_delete}' 状态为 {task_to_delete.status}，拒绝删除。")
+            return jsonify({"success": False, "status": task_to_delete.status,
+                            "message": "任务正在处理或生成中，暂时无法删除，请稍后再试。"}), 409
+
+        zip_filename_to_delete = task_to_delete.zip_filename
+        db.session.delete(task_to_delete)
+        db.session.commit()
+    except SQLAlchemyError as e_db_del:
+        # 记录删除失败时不删除ZIP，避免记录与文件不一致
+        db.session.rollback()
         current_app.logger.error(
-            f"{log_prefix}[User:{user_id}] 处理删除记录时发生文件锁相关或其他错误 (Task ID: {task_id_to_delete}): {e_lock_del}",
+            f"{log_prefix}[User:{user_id}] 删除任务记录时数据库操作失败 (Task ID: {task_id_to_delete}): {e_db_del}",
             exc_info=True)
-        return jsonify({"success": False, "message": "删除记录时发生内部错误。"}), 500
+        return jsonify({"success": False, "message": "删除任务记录时保存更新失败。"}), 500
+
+    # 记录删除成功后，继续尝试删除关联的ZIP文件
+    msg = f"任务ID '{task_id_to_delete}' 的记录已删除。"
+    zip_to_delete_path = os.path.join(current_app.config.get('ZIPPED_FILES_DIR', 'zipped_downloads'),
+                                      zip_filename_to_delete or '')
+    if zip_filename_to_delete and os.path.exists(zip_to_delete_path):
+        try:
+            os.remove(zip_to_delete_path)
+            msg += f" 关联的ZIP文件 '{zip_filename_to_delete}' 已删除。"
+            current_app.logger.info(
+                f"{log_prefix}[User:{user_id}] 关联的ZIP文件 '{zip_to_delete_path}' 已删除。")
+        except OSError as e_rm_zip:
+            msg += f" 但删除关联的ZIP文件失败: {e_rm_zip}."  # 即使ZIP删除失败，记录也已删除
+            current_app.logger.error(
+                f"{log_prefix}[User:{user_id}] 删除ZIP文件 '{zip_to_delete_path}' 失败: {e_rm_zip}",
+                exc_info=True)
+
+    log_user_activity(user_id, "delete_batch_zip_record",
+                      f"删除了批量下载任务记录 (Task ID: {task_id_to_delete}). ZIP文件状态: {'已删除' if zip_filename_to_delete and not os.path.exists(zip_to_delete_path) else ('无关联ZIP' if not zip_filename_to_delete else '删除失败或未找到')}.")
+    return jsonify({"success": True, "message": msg}), 200
+
+
+# 工作线程正在构建ZIP (PROCESSING)，或下载时即时生成ZIP流 (STREAMABLE) 的任务不可删除
+BATCH_IN_PROGRESS_STATUSES = ("PROCESSING", "STREAMABLE")
+# 终态：任务不会再产生新的进度事件
+BATCH_TERMINAL_STATUSES = ("COMPLETED", "FAILED", "FAILED_ZIP_CREATION", "FAILED_NO_DOWNLOADS", "STREAMABLE")
+
+
+def _task_summary(task):
+    return {
+        "task_id": task.task_id, "status": task.status, "zip_download_filename": task.zip_filename,
+        "message": task.message, "error_message": task.error_message,
+        "total_requested": task.num_requested, "successfully_processed": task.num_success,
+        "failed_items": task.failed_items
+    }
+
+
+def _format_sse(event_type, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+@batch_bp.route('/batch_progress/<task_id>/events', methods=['GET'])
+def batch_progress_events_bp(task_id):
+    """
+    以 Server-Sent Events 推送批量任务的逐篇文章进度：
+      status      连接建立时的任务状态快照
+      started     工作线程开始执行
+      resolved    文章已确定下载地址 (pdfLink, host)
+      downloading 下载中 (bytes / bytes_total)，已节流
+      stored      已写入ZIP (filename, bytes)
+      failed      该文章失败 (reason)
+      summary     任务结束时的最终汇总，随后服务器关闭连接
+    进度事件在执行任务的进程内发布；任务由其他进程执行时，本接口定期读取该任务行，任务结束后同样推送 summary。
+    支持 Last-Event-ID 请求头 (或 last_event_id 参数) 断线续传。
+    """
+    current_user_info = get_current_user_from_token()
+    if not current_user_info:
+        return jsonify({"success": False, "message": "认证失败或Token无效。"}), 401
+    user_id = current_user_info['user_id']
+    log_prefix = f"[BatchProgressBP][User:{user_id}]"
+
+    try:
+        task = BatchTask.query.filter_by(task_id=task_id).first()
+        # 同一批文章的所有提交者共享该任务，均可订阅进度
+        task_accessible = task is not None and task.is_accessible_by(user_id)
+    except SQLAlchemyError as e_db:
+        current_app.logger.error(f"{log_prefix} 查询任务 '{task_id}' 失败: {e_db}", exc_info=True)
+        return jsonify({"success": False, "message": "服务器繁忙，请稍后再试。"}), 503
+    if not task_accessible:
+        return jsonify({"success": False, "message": f"任务ID '{task_id}' 未找到。"}), 404
+
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+    except ValueError:
+        last_event_id = 0
+
+    app = current_app._get_current_object()
+    heartbeat_seconds = max(1, int(app.config.get('BATCH_PROGRESS_HEARTBEAT_SECONDS', 15)))
+    max_stream_seconds = int(app.config.get('BATCH_PROGRESS_STREAM_MAX_SECONDS', 3600))
+    initial_status = task.status
+    initial_summary = _task_summary(task)
+    db.session.remove()  # 释放连接，推送期间仅在心跳时短暂查询
+    current_app.logger.info(f"{log_prefix} 订阅任务 '{task_id}' 的进度事件 (当前状态: {initial_status})")
+
+    def generate_events():
+        yield _format_sse("status", {"task_id": task_id, "status": initial_status,
+                                     "total_requested": initial_summary["total_requested"]})
+        if initial_status in BATCH_TERMINAL_STATUSES:
+            yield _format_sse(TERMINAL_EVENT, initial_summary)
+            return
+
+        after_event_id = last_event_id
+        started_at = time.monotonic()
+        while time.monotonic() - started_at < max_stream_seconds:
+            events, finished = batch_progress.wait_for_events(task_id, after_event_id, heartbeat_seconds)
+            for event_id, event_type, data in events:
+                after_event_id = event_id
+                yield _format_sse(event_type, data, event_id)
+            if finished:
+                return
+            if events:
+                continue
+            # 一个心跳周期内没有事件：检查任务行，覆盖任务在其他进程执行或被判定为重试超限的情况
+            try:
+                latest_task = BatchTask.query.filter_by(task_id=task_id).first()
+                latest_summary = _task_summary(latest_task) if latest_task is not None else None
+            except SQLAlchemyError as e_db_poll:
+                app.logger.warning(f"{log_prefix} 检查任务 '{task_id}' 状态失败: {e_db_poll}")
+                latest_summary = {"status": None}
+            finally:
+                db.session.remove()  # 不在长连接期间占用数据库连接
+            if latest_summary is None:
+                yield _format_sse(TERMINAL_EVENT, {"task_id": task_id, "status": "DELETED"})
+                return
+            if latest_summary["status"] in BATCH_TERMINAL_STATUSES:
+                yield _format_sse(TERMINAL_EVENT, latest_summary)
+                return
+            yield ": keep-alive\n\n"
+
+    headers = {
+        "Content-Type": "text/event-stream; charset=utf-8",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # 禁止反向代理缓冲事件
+    }
+    return Response(stream_with_context(generate_events()), headers=headers)
 
 
 @batch_bp.route('/download_zip_package/<path:filename>', methods=['GET'])  # 使用 <path:filename> 以允许文件名中包含点号等
@@ -365,7 +1064,8 @@ def download_zip_package_route_bp(filename):  # 重命名函数以示区分
     safe_filename = os.path.basename(filename)
 
     # 再次检查净化后的文件名是否仍包含不应有的路径分隔符 (双重保险)
-    if ".." in safe_filename or "/" in safe_filename or "\\" in safe_filename:
+    if ".." in safe_filename or "/" in safe_filename or "\\" in safe_filename or \
+            safe_filename.endswith(ZIP_PARTIAL_SUFFIX):  # 构建中的 .part 文件不可下载
         current_app.logger.error(
             f"{log_prefix} 下载ZIP包请求包含无效或恶意的文件名: '{filename}' (净化后: '{safe_filename}')")
         return jsonify({"success": False, "message": "无效的文件名。"}), 400
@@ -379,8 +1079,42 @@ def download_zip_package_route_bp(filename):  # 重命名函数以示区分
     # 确保目录是绝对路径（config.py中应该已经处理了）
     absolute_zipped_files_dir = os.path.abspath(zipped_files_dir_from_config)
 
+    # 2.1 流式模式：显式 ?mode=stream，或登记为 STREAMABLE 的任务（磁盘上没有预构建的ZIP）
+    zip_exists_on_disk = os.path.isfile(os.path.join(absolute_zipped_files_dir, safe_filename))
+    if request.args.get('mode') == 'stream' or not zip_exists_on_disk:
+        try:
+            task = _find_task_by_zip_filename(safe_filename)
+        except SQLAlchemyError as e_db:
+            current_app.logger.error(f"{log_prefix} 查找流式ZIP任务记录失败: {e_db}", exc_info=True)
+            return jsonify({"success": False, "message": "服务器繁忙，请稍后再试。"}), 503
+        wants_stream = request.args.get('mode') == 'stream' or (task is not None and task.status == "STREAMABLE")
+        if wants_stream:
+            articles = task.articles if task is not None else []
+            if not articles:
+                current_app.logger.warning(f"{log_prefix} 流式下载请求的ZIP '{safe_filename}' 没有对应的任务记录。")
+                return jsonify({"success": False, "message": "请求的ZIP文件未找到。"}), 404
+            current_app.logger.info(f"{log_prefix} 以流式模式发送ZIP '{safe_filename}' (任务: {task.task_id})")
+            return _stream_zip_response(articles, safe_filename, f"[BatchStreamBP:{task.task_id}]")
+        if not zip_exists_on_disk:
+            if task is not None and task.status == "EVICTED":
+                current_app.logger.info(f"{log_prefix} 请求的ZIP '{safe_filename}' 已按保留策略清理。")
+                return jsonify({"success": False, "status": "evicted",
+                                "message": "该ZIP包已过期被清理，请重新提交批量下载以重新生成。"}), 410
+            current_app.logger.warning(
+                f"{log_prefix} 请求下载的ZIP文件未找到: '{safe_filename}' 在目录 '{absolute_zipped_files_dir}'")
+            return jsonify({"success": False, "message": "请求的ZIP文件未找到。"}), 404
+
     current_app.logger.info(f"{log_prefix} 尝试从目录 '{absolute_zipped_files_dir}' 发送ZIP文件: '{safe_filename}'")
 
+    # 记录最近下载时间，zip_retention 按此做LRU淘汰（单行UPDATE，失败不影响下载）
+    try:
+        BatchTask.query.filter_by(zip_filename=safe_filename, status="COMPLETED").update(
+            {"last_downloaded_at": datetime.now(timezone.utc)}, synchronize_session=False)
+        db.session.commit()
+    except SQLAlchemyError as e_touch:
+        db.session.rollback()
+        current_app.logger.warning(f"{log_prefix} 更新ZIP '{safe_filename}' 的最近下载时间失败: {e_touch}")
+
     # 3. 使用 send_from_directory 安全地发送文件
     try:
         # send_from_directory 会自动处理文件的存在性检查，如果文件不存在会抛出 NotFound (404) 异常。
@@ -406,12 +1140,168 @@ def download_zip_package_route_bp(filename):  # 重命名函数以示区分
 
 # backend/batch_views.py
 # ... (确保顶部的导入包含了 Blueprint, request, jsonify, current_app, Response, stream_with_context from flask;
-#      os, urlparse from urllib.parse; get_current_user_from_token, REQUEST_SESSION, sanitize_filename from utils) ...
+#      os, urlparse from urllib.parse; get_current_user_from_token, sanitize_filename from utils; http_client) ...
 from flask import Response, stream_with_context  # 确保导入
 from urllib.parse import urlparse  # 确保导入
 import os  # 确保导入
 
 
+def _proxy_pdf_download_name(pdf_url):
+    original_filename_from_url = os.path.basename(urlparse(pdf_url).path)
+    if not original_filename_from_url or not original_filename_from_url.lower().endswith('.pdf'):
+        original_filename_from_url = "proxied_document.pdf"
+    return f"{sanitize_filename(original_filename_from_url, extension='')}.pdf"
+
+
+def _satisfiable_byte_ranges(requested_range, size):
+    """把请求的 Range 换算为 [(start, stop)] (stop 不含)，按起点排序并合并重叠/相邻的区间；均不可满足时返回空列表。"""
+    ranges = []
+    for begin, end in requested_range.ranges:
+        if begin < 0:  # 后缀区间 bytes=-N
+            start, stop = max(0, size + begin), size
+        else:
+            start, stop = begin, size if end is None else min(end, size)
+        if start < stop:
+            ranges.append((start, stop))
+    merged = []
+    for start, stop in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def _read_blob_range(blob_file, start, stop):
+    """按 64KB 分块读取 [start, stop) 区间。"""
+    blob_file.seek(start)
+    remaining = stop - start
+    while remaining > 0:
+        chunk = blob_file.read(min(64 * 1024, remaining))
+        if not chunk:
+            return
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _send_cached_byte_range(cache_entry, byte_range, download_name):
+    """
+    单个区间：返回 206 和 Content-Range。多个区间合并为一个时 (如 bytes=0-99,100-199) 请求头仍是多区间，
+    send_file 不处理多区间请求头而会返回整个文件 (200)，因此区间请求都由这里发送。
+    """
+    start, stop = byte_range
+
+    def generate_range():
+        with open(cache_entry.blob_path, 'rb') as blob_file:
+            yield from _read_blob_range(blob_file, start, stop)
+
+    response = Response(generate_range(), status=206, mimetype=cache_entry.content_type)
+    response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{cache_entry.size}"
+    response.headers['Content-Length'] = str(stop - start)
+    response.headers['Content-Disposition'] = f'inline; filename="{download_name}"'
+    response.set_etag(cache_entry.sha256)
+    response.last_modified = pdf_proxy_cache.last_modified_datetime(cache_entry)
+    return response
+
+
+def _send_cached_byteranges(cache_entry, byte_ranges, download_name):
+    """多区间请求：以 multipart/byteranges 返回 206 (werkzeug 的 send_file 只处理单个区间)。"""
+    boundary = uuid.uuid4().hex
+    part_headers = [
+        (f"\r\n--{boundary}\r\nContent-Type: {cache_entry.content_type}\r\n"
+         f"Content-Range: bytes {start}-{stop - 1}/{cache_entry.size}\r\n\r\n").encode('latin-1')
+        for start, stop in byte_ranges]
+    closing = f"\r\n--{boundary}--\r\n".encode('latin-1')
+    content_length = sum(len(header) + stop - start for header, (start, stop) in zip(part_headers, byte_ranges)) + len(closing)
+
+    def generate_parts():
+        with open(cache_entry.blob_path, 'rb') as blob_file:
+            for header, (start, stop) in zip(part_headers, byte_ranges):
+                yield header
+                yield from _read_blob_range(blob_file, start, stop)
+        yield closing
+
+    response = Response(generate_parts(), status=206, mimetype=f"multipart/byteranges; boundary={boundary}")
+    response.headers['Content-Length'] = str(content_length)
+    response.headers['Content-Disposition'] = f'inline; filename="{download_name}"'
+    response.set_etag(cache_entry.sha256)
+    return response
+
+
+def _send_cached_proxy_pdf(cache_entry, download_name, cache_status):
+    """
+    从本地缓存发送PDF。ETag 为内容的 SHA-256，浏览器带 If-None-Match 再次请求时得到 304。
+    支持 Range (含 If-Range)：合并后为单个区间时返回 206 + Content-Range，多个区间返回 multipart/byteranges；
+    无 Range (或 If-Range 不匹配) 时由 send_file 发送完整内容并处理 If-None-Match。
+    """
+    requested_range = request.range if request.range is not None and request.range.units == 'bytes' else None
+    byte_ranges = _satisfiable_byte_ranges(requested_range, cache_entry.size) if requested_range is not None else None
+    # If-Range 不匹配 (或为日期形式) 时按完整内容处理；If-None-Match 命中时交给 send_file 返回 304
+    if_range = request.if_range
+    range_applies = requested_range is not None and not request.if_none_match.contains(cache_entry.sha256) and \
+        not if_range.date and (not if_range.etag or if_range.etag == cache_entry.sha256)
+    if range_applies and not byte_ranges:
+        response = Response(status=416)
+        response.headers['Content-Range'] = f"bytes */{cache_entry.size}"
+    elif range_applies and len(byte_ranges) > 1:
+        response = _send_cached_byteranges(cache_entry, byte_ranges, download_name)
+    elif range_applies:
+        response = _send_cached_byte_range(cache_entry, byte_ranges[0], download_name)
+    else:
+        response = send_file(cache_entry.blob_path, mimetype=cache_entry.content_type, download_name=download_name,
+                             conditional=True, etag=cache_entry.sha256,
+                             last_modified=pdf_proxy_cache.last_modified_datetime(cache_entry))
+    response.cache_control.private = True
+    response.cache_control.no_cache = True  # 允许浏览器缓存，但每次使用前用 ETag 向本服务确认
+    response.headers['X-Proxy-Cache'] = cache_status
+    response.headers['Accept-Ranges'] = 'bytes'
+    pdf_proxy_cache.record({"HIT": "hits", "REVALIDATED": "revalidated_hits", "STALE": "stale_hits"}[cache_status])
+    if response.status_code == 304:
+        pdf_proxy_cache.record("browser_not_modified")
+    else:
+        pdf_proxy_cache.record("bytes_from_cache", response.content_length or 0)
+    return response
+
+
+def _proxy_pdf_via_single_flight(pdf_url, download_name, log_prefix):
+    """
+    未缓存的完整请求：加入 (或发起) 该URL的合并下载，从正在增长的文件中流式发送。
+    合并下载在产生数据前就失败时返回 None，由调用方直接请求源站 (以便原样返回源站的错误状态)。
+    """
+    flight, created = pdf_fetch_flights.join(
+        pdf_url, pdf_proxy_cache.store_keys(pdf_url),
+        on_commit=lambda stored, upstream_headers: pdf_proxy_cache.remember(pdf_url, stored, upstream_headers))
+    try:
+        total_size, upstream_headers = pdf_fetch_flights.wait_until_started(flight)
+    except FlightFailed as e_flight:
+        pdf_fetch_flights.leave(flight)
+        current_app.logger.warning(f"{log_prefix} 合并下载未能开始，改为直接请求源站: {e_flight}")
+        return None
+
+    pdf_proxy_cache.record("misses" if created else "coalesced_hits")
+    bytes_metric = "bytes_from_upstream" if created else "bytes_coalesced"
+
+    def generate_pdf_chunks():
+        try:
+            for chunk in pdf_fetch_flights.read_chunks(flight):
+                pdf_proxy_cache.record(bytes_metric, len(chunk))
+                yield chunk
+        except FlightFailed as e_flight:
+            current_app.logger.error(f"{log_prefix} 合并下载中途失败 (URL: {pdf_url}): {e_flight}")
+
+    headers = {
+        'Content-Type': upstream_headers.get('Content-Type') or 'application/pdf',
+        'Content-Disposition': f'inline; filename="{download_name}"',
+        'Cache-Control': 'private, no-cache',
+        'X-Proxy-Cache': 'MISS' if created else 'COALESCED',
+    }
+    if total_size:
+        headers['Content-Length'] = str(total_size)
+    if 'bytes' in (upstream_headers.get('Accept-Ranges') or '').lower():
+        headers['Accept-Ranges'] = 'bytes'
+    return Response(stream_with_context(generate_pdf_chunks()), headers=headers)
+
+
 @batch_bp.route('/proxy-pdf', methods=['GET'])
 def proxy_pdf_bp():
     # 1. 用户认证 (防止滥用代理功能)
@@ -428,47 +1318,85 @@ def proxy_pdf_bp():
         current_app.logger.warning(f"{log_prefix} PDF代理请求缺少 'url' 参数。")
         return jsonify({"success": False, "message": "缺少 'url' 参数。"}), 400
 
-    current_app.logger.info(f"{log_prefix} 正在尝试通过流式代理获取PDF: {pdf_url_to_proxy}")
+    download_name = _proxy_pdf_download_name(pdf_url_to_proxy)
+    pdf_proxy_cache.record("requests")
 
-    try:
-        # 3. 使用 REQUEST_SESSION (从 utils.py 导入) 发送GET请求，并启用流模式
-        proxied_response = REQUEST_SESSION.get(pdf_url_to_proxy, stream=True, timeout=60)
-        proxied_response.raise_for_status()  # 检查HTTP错误
+    # 3. 本地缓存命中且在有效期内：直接从磁盘发送，不访问源站
+    cache_entry = pdf_proxy_cache.lookup(pdf_url_to_proxy)
+    if cache_entry is not None and pdf_proxy_cache.is_fresh(cache_entry):
+        current_app.logger.info(f"{log_prefix} PDF代理缓存命中: {pdf_url_to_proxy}")
+        return _send_cached_proxy_pdf(cache_entry, download_name, "HIT")
+
+    current_app.logger.info(f"{log_prefix} 正在尝试通过流式代理获取PDF: {pdf_url_to_proxy}"
+                            f"{' (缓存已过期，条件请求)' if cache_entry is not None else ''}")
+
+    # 未缓存的完整请求经合并下载发送：同一URL的并发请求只向源站下载一次
+    client_range = request.headers.get('Range')
+    if cache_entry is None and not client_range and pdf_fetch_flights.enabled:
+        coalesced_response = _proxy_pdf_via_single_flight(pdf_url_to_proxy, download_name, log_prefix)
+        if coalesced_response is not None:
+            return coalesced_response
 
-        # 4. 获取原始响应的 Content-Type，默认为 application/pdf
+    try:
+        # 4. 使用 http_client 的 pdf 服务发送GET请求，并启用流模式；有缓存副本时带上源站的校验值
+        # 没有缓存副本时把客户端的 Range 原样转发给源站 (区间响应不写入缓存)
+        request_headers = pdf_proxy_cache.revalidation_headers(cache_entry) if cache_entry is not None else {}
+        if cache_entry is None and client_range:
+            request_headers['Range'] = client_range
+        try:
+            proxied_response = http_client.get("pdf", pdf_url_to_proxy, stream=True, timeout=60, headers=request_headers)
+            if cache_entry is not None and proxied_response.status_code == 304:
+                proxied_response.close()
+                cache_entry = pdf_proxy_cache.mark_revalidated(pdf_url_to_proxy, cache_entry, proxied_response)
+                return _send_cached_proxy_pdf(cache_entry, download_name, "REVALIDATED")
+            proxied_response.raise_for_status()  # 检查HTTP错误
+        except requests.exceptions.RequestException as e_upstream:
+            if cache_entry is None:
+                raise
+            # 源站不可用时发送本地的旧副本
+            current_app.logger.warning(f"{log_prefix} 源站重新验证失败，发送缓存中的旧副本: {pdf_url_to_proxy} - {e_upstream}")
+            return _send_cached_proxy_pdf(cache_entry, download_name, "STALE")
+
+        # 5. 获取原始响应的 Content-Type，默认为 application/pdf
         response_content_type = proxied_response.headers.get('Content-Type', 'application/pdf')
         if 'application/pdf' not in response_content_type.lower():
             current_app.logger.warning(
                 f"{log_prefix} 代理的URL '{pdf_url_to_proxy}' 返回的Content-Type不是PDF: '{response_content_type}'。仍将尝试以流式发送。"
             )
+        pdf_proxy_cache.record("misses")
+        is_partial = proxied_response.status_code == 206
 
-        # 5. 定义一个生成器函数，用于逐块读取和产生数据
+        # 6. 定义一个生成器函数，用于逐块读取和产生数据 (完整响应同时写入缓存，完整接收后下次请求即可命中)
         def generate_pdf_chunks():
             try:
-                for chunk in proxied_response.iter_content(chunk_size=8192):  # 8KB的块大小
-                    if chunk:
+                upstream_chunks = proxied_response.iter_content(chunk_size=64 * 1024)
+                if is_partial:
+                    for chunk in upstream_chunks:
+                        pdf_proxy_cache.record("bytes_from_upstream", len(chunk))
                         yield chunk
+                else:
+                    yield from pdf_proxy_cache.stream_and_store(pdf_url_to_proxy, proxied_response, upstream_chunks)
             except Exception as e_chunk:
                 current_app.logger.error(
                     f"{log_prefix} 在流式传输PDF数据块时发生错误 (URL: {pdf_url_to_proxy}): {e_chunk}", exc_info=True)
             finally:
                 proxied_response.close()  # 确保在流结束后关闭原始响应连接
 
-        # 6. 构造响应头
-        original_filename_from_url = os.path.basename(urlparse(pdf_url_to_proxy).path)
-        if not original_filename_from_url or not original_filename_from_url.lower().endswith('.pdf'):
-            original_filename_from_url = "proxied_document.pdf"
-
+        # 7. 构造响应头 (内容尚未缓存完成，此时没有可用的强校验值，浏览器下次请求时再由缓存给出 ETag)
         headers = {
             'Content-Type': response_content_type,
-            'Content-Disposition': f'inline; filename="{sanitize_filename(original_filename_from_url, extension="")}.pdf"',
-            'Cache-Control': 'no-cache, no-store, must-revalidate',
-            'Pragma': 'no-cache',
-            'Expires': '0'
+            'Content-Disposition': f'inline; filename="{download_name}"',
+            'Cache-Control': 'private, no-cache',
+            'X-Proxy-Cache': 'MISS',
         }
+        # 源站的区间相关响应头原样转发；内容经过编码 (gzip 等) 时 iter_content 返回解码后的数据，不转发长度
+        if not proxied_response.headers.get('Content-Encoding'):
+            for header_name in ('Content-Length', 'Content-Range', 'Accept-Ranges'):
+                if proxied_response.headers.get(header_name):
+                    headers[header_name] = proxied_response.headers[header_name]
 
-        # 7. 返回流式响应
-        return Response(stream_with_context(generate_pdf_chunks()), headers=headers)
+        # 8. 返回流式响应 (源站返回 206 时同样返回 206)
+        return Response(stream_with_context(generate_pdf_chunks()), status=proxied_response.status_code, headers=headers)
 
     except requests.exceptions.Timeout:
         current_app.logger.error(f"{log_prefix} 代理请求超时: {pdf_url_to_proxy}", exc_info=False)
@@ -489,4 +1417,13 @@ def proxy_pdf_bp():
         current_app.logger.error(f"{log_prefix} 后端代理PDF时发生未知错误: {e_unknown}", exc_info=True)
         return jsonify({"success": False, "message": "后端代理PDF时发生内部错误。"}), 500
 
+
+# --- PDF代理缓存统计 (GET /api/proxy-pdf/cache-stats) ---
+@batch_bp.route('/proxy-pdf/cache-stats', methods=['GET'])
+def proxy_pdf_cache_stats_bp():
+    current_user_info = get_current_user_from_token()
+    if not current_user_info:
+        return jsonify({"success": False, "message": "认证失败或Token无效。"}), 401
+    return jsonify({"success": True, "stats": pdf_proxy_cache.stats(), "single_flight": pdf_fetch_flights.stats()}), 200
+
 # ... (batch_views.py 中的其他路由) ...
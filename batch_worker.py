@@ -0,0 +1,322 @@
+# backend/batch_worker.py
+import os
+import queue
+import socket
+import threading
+import uuid
+from datetime import datetime, timezone, timedelta
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, BatchTask
+
+
+# === 进程内批量任务执行器 ===
+# batch_tasks 表本身就是持久化队列：状态为 SUBMITTED 的记录（含 articles 列表）即待执行任务。
+# 内存中的 queue.Queue 只负责"唤醒"工作线程；进程重启后由扫描线程 (_scanner_loop) 重新扫描任务表恢复任务，
+# 因此即使工作线程或整个进程崩溃，任务也不会丢失。
+# 执行期间由 TaskLease 定期刷新 processing_started_at (续租)，运行超过 BATCH_JOB_LEASE_SECONDS 的任务不会被误判为已过期；
+# 任务结果只有仍持有租约的工作线程才能写入 (见 batch_views._temp_update_final_record_for_blueprint)。
+# 工作线程标识为 "主机名:进程ID:启动标识:线程序号"。容器重启后进程ID常被复用，启动标识 (每个进程随机生成)
+# 用来区分 "本进程领取的任务" 与 "上一次启动时同一进程ID遗留的任务"。
+_boot_id = None
+_boot_pid = None
+_boot_id_lock = threading.Lock()
+
+
+def process_boot_id():
+    """本进程的启动标识；fork 出的子进程 (进程ID不同) 会生成自己的标识。"""
+    global _boot_id, _boot_pid
+    with _boot_id_lock:
+        if _boot_pid != os.getpid():
+            _boot_id = uuid.uuid4().hex[:12]
+            _boot_pid = os.getpid()
+        return _boot_id
+
+
+def process_worker_id_prefix():
+    return f"{socket.gethostname()}:{os.getpid()}:{process_boot_id()}"
+
+
+class BatchJobExecutor:
+    """
+    有界线程池 + 持久化队列的批量ZIP任务执行器。
+    用法与 SQLAlchemy 扩展一致：模块级实例化，在 create_app 中调用 init_app(app)。
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.worker_count = 0
+        self._queue = queue.Queue()
+        self._queued_task_ids = set()  # 避免同一任务被重复放入内存队列
+        self._queued_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.worker_count = max(1, int(app.config.get('BATCH_WORKER_COUNT', 2)))
+        app.extensions['batch_executor'] = self
+
+    # --- 生命周期 ---
+    def start(self):
+        if self.app is None:
+            raise RuntimeError("BatchJobExecutor 尚未通过 init_app 关联到 Flask 应用。")
+        if self._threads:
+            return  # 已启动
+        self._stop_event.clear()
+        for index in range(self.worker_count):
+            worker_thread = threading.Thread(target=self._worker_loop, args=(index,),
+                                             name=f"batch-worker-{index}", daemon=True)
+            worker_thread.start()
+            self._threads.append(worker_thread)
+        # 单独的扫描线程：启动时恢复遗留任务，之后定期拾取其他进程提交的或租约已过期的任务
+        scanner_thread = threading.Thread(target=self._scanner_loop, name="batch-worker-scanner", daemon=True)
+        scanner_thread.start()
+        self._threads.append(scanner_thread)
+        self.app.logger.info(f"[BatchExecutor] 已启动 {self.worker_count} 个批量任务工作线程。")
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        for worker_thread in self._threads:
+            worker_thread.join(timeout=timeout)
+        self._threads = []
+
+    # --- 任务提交 ---
+    def submit(self, task_id):
+        """将已持久化为 SUBMITTED 的任务放入内存队列。任务记录必须先提交到 batch_tasks 表。"""
+        with self._queued_lock:
+            if task_id in self._queued_task_ids:
+                return False
+            self._queued_task_ids.add(task_id)
+        self._queue.put(task_id)
+        return True
+
+    # --- 工作线程 ---
+    def _worker_loop(self, index):
+        worker_id = f"{process_worker_id_prefix()}:{index}"  # 在工作线程所在进程中生成 (可能是 fork 后的子进程)
+        while not self._stop_event.is_set():
+            try:
+                task_id = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            with self._queued_lock:
+                self._queued_task_ids.discard(task_id)
+            try:
+                with self.app.app_context():
+                    self._run_task(task_id, worker_id)
+            except Exception as e:
+                # 防御性兜底：任何未处理异常都不能让工作线程退出
+                self.app.logger.error(f"[BatchExecutor:{worker_id}] 执行任务 '{task_id}' 时发生未处理错误: {e}",
+                                      exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def _run_task(self, task_id, worker_id):
+        # 延迟导入以避免 batch_views <-> batch_worker 循环依赖
+        from batch_views import _perform_batch_processing_for_blueprint, _temp_update_final_record_for_blueprint
+
+        log_prefix = f"[BatchExecutor:{worker_id}]"
+        articles = claim_task_for_processing(task_id, worker_id)
+        if articles is None:
+            current_app.logger.debug(f"{log_prefix} 任务 '{task_id}' 未能被领取（已被其他工作线程处理或状态已变化）。")
+            return
+
+        current_app.logger.info(f"{log_prefix} 已领取任务 '{task_id}'，共 {len(articles)} 篇文章。")
+        with TaskLease(self.app, task_id, worker_id) as lease:
+            try:
+                _perform_batch_processing_for_blueprint(articles, task_id, lease)
+            except Exception as e:
+                current_app.logger.error(f"{log_prefix} 任务 '{task_id}' 执行失败: {e}", exc_info=True)
+                _temp_update_final_record_for_blueprint(task_id, "FAILED", error_message=f"后台处理异常: {e}",
+                                                        num_requested=len(articles), worker_id=worker_id)
+
+    # --- 扫描线程 ---
+    def _scanner_loop(self):
+        poll_interval = max(1, int(self.app.config.get('BATCH_JOB_POLL_INTERVAL_SECONDS', 30)))
+        while not self._stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    for task_id in find_runnable_task_ids():
+                        self.submit(task_id)
+            except Exception as e:
+                self.app.logger.error(f"[BatchExecutor] 扫描待处理任务时发生错误: {e}", exc_info=True)
+            self._stop_event.wait(poll_interval)
+
+
+class TaskLeaseLost(Exception):
+    """任务的租约已被其他工作线程接管，本次执行应停止且不再写入结果。"""
+
+
+class TaskLease:
+    """
+    工作线程对一个 PROCESSING 任务的租约。作为上下文管理器使用：执行期间由后台线程每 BATCH_JOB_LEASE_SECONDS / 3 秒
+    刷新一次 processing_started_at；发现任务已被接管 (worker_id 已变化或状态不再是 PROCESSING) 时 held 变为 False。
+    """
+
+    def __init__(self, app, task_id, worker_id):
+        self.app = app
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.refresh_interval = max(1.0, app.config.get('BATCH_JOB_LEASE_SECONDS', 3600) / 3)
+        self.held = True
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._refresh_loop, name=f"batch-lease-{self.task_id[:8]}", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop_event.set()
+        self._thread.join(timeout=5)
+        return False
+
+    def _refresh_loop(self):
+        while self.held and not self._stop_event.wait(self.refresh_interval):
+            with self.app.app_context():
+                self.refresh()
+
+    def refresh(self):
+        """立即续租，返回是否仍持有租约。"""
+        if self.held and not touch_task_lease(self.task_id, self.worker_id):
+            self.held = False
+            self.app.logger.warning(f"[BatchExecutor:{self.worker_id}] 任务 '{self.task_id}' 的租约已被其他工作线程接管。")
+        return self.held
+
+    def ensure_held(self):
+        if not self.held:
+            raise TaskLeaseLost(f"任务 '{self.task_id}' 的租约已被其他工作线程接管。")
+
+
+def touch_task_lease(task_id, worker_id):
+    """刷新租约，返回任务是否仍由该工作线程执行。数据库暂时不可用时按仍在执行处理，由最终写入结果时确认。"""
+    now = datetime.now(timezone.utc)
+    try:
+        still_owned = BatchTask.query.filter(
+            BatchTask.task_id == task_id, BatchTask.status == "PROCESSING", BatchTask.worker_id == worker_id
+        ).update({"processing_started_at": now}, synchronize_session=False)
+        db.session.commit()
+        return still_owned == 1
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.warning(f"[BatchExecutor:{worker_id}] 刷新任务 '{task_id}' 的租约失败: {e}")
+        return True
+
+
+def _as_utc(dt):
+    # SQLite 读回的 DateTime 不带时区信息，统一视为 UTC
+    if dt is None:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _lease_expired(task, now, lease_seconds):
+    """
+    PROCESSING 任务的租约是否已失效：超过租约时长未续租，或领取它的本机进程已经不存在。
+    进程ID与本进程相同但启动标识不同 (或是不带启动标识的旧格式) 时，说明是重启前遗留的任务。
+    """
+    started_at = _as_utc(task.processing_started_at)
+    if started_at is None or now - started_at > timedelta(seconds=lease_seconds):
+        return True
+    owner = str(task.worker_id or '')
+    parts = owner.split(':')
+    if len(parts) >= 2 and parts[0] == socket.gethostname():
+        try:
+            owner_pid = int(parts[1])
+        except ValueError:
+            return False
+        if owner_pid == os.getpid():
+            return len(parts) < 4 or parts[2] != process_boot_id()
+        try:
+            os.kill(owner_pid, 0)  # 信号0仅探测进程是否存在
+        except ProcessLookupError:
+            return True
+        except (PermissionError, OSError):
+            return False
+    return False
+
+
+def find_runnable_task_ids():
+    """
+    返回可执行的任务ID：所有 SUBMITTED 任务，以及租约已失效的 PROCESSING 任务
+    （说明之前领取它的工作线程/进程已经退出）。
+    """
+    lease_seconds = current_app.config.get('BATCH_JOB_LEASE_SECONDS', 3600)
+    now = datetime.now(timezone.utc)
+    runnable = []
+    try:
+        candidates = BatchTask.query.with_entities(
+            BatchTask.task_id, BatchTask.status, BatchTask.worker_id, BatchTask.processing_started_at
+        ).filter(
+            BatchTask.status.in_(["SUBMITTED", "PROCESSING"]),
+            BatchTask.articles_json.isnot(None)
+        ).order_by(BatchTask.submitted_at).all()
+        for task in candidates:
+            if task.status == "SUBMITTED" or _lease_expired(task, now, lease_seconds):
+                runnable.append(task.task_id)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"[BatchExecutor] 扫描任务时查询数据库失败: {e}", exc_info=True)
+    return runnable
+
+
+def claim_task_for_processing(task_id, worker_id):
+    """
+    把任务从 SUBMITTED（或租约过期的 PROCESSING）切换为 PROCESSING。
+    以读取时的 status/attempts 作为 UPDATE 的条件（比较并交换），多个工作线程/进程同时领取时只有一个会成功。
+    成功时返回任务的文章列表，否则返回 None。
+    超过 BATCH_JOB_MAX_ATTEMPTS 次仍未完成的任务会被标记为 FAILED，避免"毒任务"无限重试。
+    """
+    log_prefix = f"[BatchExecutor:{worker_id}]"
+    lease_seconds = current_app.config.get('BATCH_JOB_LEASE_SECONDS', 3600)
+    max_attempts = current_app.config.get('BATCH_JOB_MAX_ATTEMPTS', 3)
+    now = datetime.now(timezone.utc)
+    try:
+        task = BatchTask.query.filter_by(task_id=task_id).first()
+        if not task or not task.articles_json:
+            return None
+
+        status = task.status
+        lease_expired = status == "PROCESSING" and _lease_expired(task, now, lease_seconds)
+        if status != "SUBMITTED" and not lease_expired:
+            return None
+
+        previous_attempts = task.attempts or 0
+        attempts = previous_attempts + 1
+        claim_query = BatchTask.query.filter(BatchTask.task_id == task_id, BatchTask.status == status,
+                                             BatchTask.attempts == previous_attempts)
+        if attempts > max_attempts:
+            error_message = f"任务已重试 {max_attempts} 次仍未完成，已放弃。"
+            failed_rows = claim_query.update({
+                "status": "FAILED", "processed_at": now, "updated_at": now, "error_message": error_message
+            }, synchronize_session=False)
+            db.session.commit()
+            if failed_rows == 1:
+                current_app.logger.error(f"{log_prefix} 任务 '{task_id}' 超过最大重试次数，已标记为 FAILED。")
+                # 与正常的失败路径一样向进度订阅者推送终态，SSE 连接随即结束
+                from batch_views import _publish_task_summary
+                _publish_task_summary(task_id, "FAILED", error_message=error_message,
+                                      num_requested=len(task.articles))
+            return None
+
+        claimed_rows = claim_query.update({
+            "status": "PROCESSING", "worker_id": worker_id, "attempts": attempts,
+            "processing_started_at": now, "updated_at": now,
+            "message": "任务正在后台处理。"
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed_rows != 1:
+            return None  # 被其他工作线程抢先领取
+        return task.articles
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"{log_prefix} 领取任务 '{task_id}' 时数据库操作失败: {e}", exc_info=True)
+        return None
+
+
+# 模块级实例，与 models.db 的用法一致：在 create_app 中 batch_executor.init_app(app)
+batch_executor = BatchJobExecutor()
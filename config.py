@@ -40,10 +40,102 @@ class Config:
     ARTICLE_DATA_ROOT_DIR = os.path.join(_BACKEND_DIR, "literature_screenshots_data")
     BATCH_TEMP_ROOT_DIR = os.path.join(_BACKEND_DIR, "batch_processing_temp")
     ZIPPED_FILES_DIR = os.path.join(_BACKEND_DIR, "zipped_downloads")
+    # 旧版批量任务记录文件；任务记录现保存在 batch_tasks 表，此文件仅供 `flask migrate-batch-records` 一次性导入
     DOWNLOAD_RECORDS_FILE = os.path.join(_BACKEND_DIR, "download_records.json")
+    # 内容寻址PDF存储 (按 SHA-256 去重，跨批量任务和用户共享)，超过容量上限时按LRU淘汰
+    PDF_STORE_DIR = os.path.join(_BACKEND_DIR, "pdf_store")
+    PDF_STORE_MAX_BYTES = int(os.environ.get('APP_PDF_STORE_MAX_BYTES') or 20 * 1024 * 1024 * 1024)  # 默认20GB
+    PDF_STORE_INCOMING_MAX_AGE_SECONDS = 7 * 24 * 3600  # 超过此时长未续传的未完成下载 (.part) 在启动时清理
+    # /api/proxy-pdf 的磁盘缓存 (见 pdf_proxy_cache.py，内容存放在 PDF_STORE_DIR 中，受 PDF_STORE_MAX_BYTES 限制)
+    PDF_PROXY_CACHE_ENABLED = True
+    PDF_PROXY_CACHE_FRESH_SECONDS = 24 * 3600  # 超过此时长后向源站条件请求 (ETag / Last-Modified) 重新验证
+    # 同一URL的并发PDF下载合并 (见 single_flight.py，用于 /api/proxy-pdf 与批量下载)
+    SINGLE_FLIGHT_ENABLED = True
+    SINGLE_FLIGHT_STALL_TIMEOUT_SECONDS = 120  # 读者超过此时长没有等到新数据即放弃
+    # 单次下载内连接中断后的续传尝试次数（服务器支持 Range 时从断点继续，否则从头重下）
+    PDF_DOWNLOAD_RESUME_ATTEMPTS = 3
 
     # --- 新增结束 ---
 
+    # --- 批量ZIP后台任务执行器 ---
+    # 是否在 create_app 中启动进程内工作线程（运行 CLI 命令或单独部署 worker 时可设为 0 关闭）
+    BATCH_WORKER_ENABLED = os.environ.get('APP_BATCH_WORKER_ENABLED', '1').strip().lower() not in ('0', 'false', 'no')
+    BATCH_WORKER_COUNT = int(os.environ.get('APP_BATCH_WORKER_COUNT') or min(4, os.cpu_count() or 1))
+    BATCH_JOB_POLL_INTERVAL_SECONDS = 30  # 扫描持久化队列（batch_tasks 表）的间隔
+    BATCH_JOB_LEASE_SECONDS = 60 * 60     # PROCESSING 任务的租约时长，超时后视为工作进程已退出并重新执行
+    BATCH_JOB_MAX_ATTEMPTS = 3            # 单个任务的最大执行次数
+    # 单个批量任务内的并发下载：全局并发上限与单主机并发上限
+    BATCH_DOWNLOAD_MAX_CONCURRENCY = int(os.environ.get('APP_BATCH_DOWNLOAD_MAX_CONCURRENCY') or 8)
+    BATCH_DOWNLOAD_PER_HOST_CONCURRENCY = int(os.environ.get('APP_BATCH_DOWNLOAD_PER_HOST_CONCURRENCY') or 2)
+    # 每篇PDF下载时的内存缓冲上限，超出后溢出到 BATCH_TEMP_ROOT_DIR 下的匿名临时文件
+    BATCH_DOWNLOAD_SPOOL_MAX_BYTES = 32 * 1024 * 1024
+    # ZIP条目压缩方式自适应：取样试压缩，压缩后/原始 < 阈值才使用 DEFLATED，否则 STORED (PDF通常已压缩)
+    BATCH_ZIP_COMPRESSION_SAMPLE_BYTES = 64 * 1024
+    BATCH_ZIP_DEFLATE_RATIO_THRESHOLD = 0.9
+    # ZIPPED_FILES_DIR 保留策略 (zip_retention.py)：按最近下载时间做LRU淘汰，被淘汰的任务重新提交时自动重建
+    ZIP_RETENTION_ENABLED = os.environ.get('APP_ZIP_RETENTION_ENABLED', '1').strip().lower() not in ('0', 'false', 'no')
+    ZIP_RETENTION_MAX_BYTES = int(os.environ.get('APP_ZIP_RETENTION_MAX_BYTES') or 50 * 1024 * 1024 * 1024)  # 默认50GB
+    ZIP_RETENTION_PER_USER_MAX_BYTES = int(os.environ.get('APP_ZIP_RETENTION_PER_USER_MAX_BYTES') or 5 * 1024 * 1024 * 1024)  # 默认5GB
+    ZIP_RETENTION_MAX_AGE_SECONDS = int(os.environ.get('APP_ZIP_RETENTION_MAX_AGE_SECONDS') or 30 * 24 * 3600)  # 默认30天未下载
+    ZIP_RETENTION_SWEEP_INTERVAL_SECONDS = 600
+    # PDF链接并行解析：所有策略同时发起，按优先级取结果 (默认 Sci-Hub 镜像 -> Unpaywall -> arXiv，见 source_ranking.py)
+    PDF_RESOLVE_DEADLINE_SECONDS = int(os.environ.get('APP_PDF_RESOLVE_DEADLINE_SECONDS') or 30)  # 单次解析的总时间预算 (见 deadline.py)，/api/find-pdf?sla_ms= 可进一步缩短
+    PDF_RESOLVE_MAX_WORKERS = 16  # 进程内共享的解析线程池大小 (交互式查询 /api/find-pdf)
+    PDF_RESOLVE_BACKGROUND_MAX_WORKERS = 8  # 批量/后台解析 (/api/find-pdf/bulk、整库解析) 独立使用的线程池大小
+    # 批量查找PDF链接 (POST /api/find-pdf/bulk)
+    PDF_BULK_RESOLVE_MAX_ITEMS = 2000  # 单次请求的最大条目数
+    PDF_BULK_RESOLVE_CONCURRENCY = 8  # 同时解析的条目数
+    PDF_BULK_RESOLVE_COMMIT_BATCH = 50  # write_back 时每批提交的条目数
+    # 出站HTTP客户端 (见 http_client.py)：每个上游服务独立的连接池、重试退避和按主机的令牌桶限速
+    HTTP_CLIENT_SERVICES = {
+        # pool_maxsize 应不小于同时访问同一主机的线程数 (PDF_RESOLVE_MAX_WORKERS + PDF_RESOLVE_BACKGROUND_MAX_WORKERS / BATCH_DOWNLOAD_PER_HOST_CONCURRENCY)
+        "unpaywall": {"pool_maxsize": 24, "retries": 2, "backoff_factor": 0.5, "rate_per_second": 10, "burst": 10},
+        "arxiv": {"pool_maxsize": 4, "retries": 2, "backoff_factor": 3, "rate_per_second": 1 / 3, "burst": 1},  # arXiv 要求每3秒最多1次请求
+        "scihub": {"pool_maxsize": 24, "retries": 0, "rate_per_second": 5, "burst": 10},  # 镜像故障交给熔断器处理，不重试
+        "pdf": {"pool_connections": 64, "pool_maxsize": 16, "retries": 2, "backoff_factor": 1, "rate_per_second": 4, "burst": 8},
+    }
+    HTTP_CLIENT_RATE_LIMIT_MAX_WAIT_SECONDS = 30  # 本地限速排队的最长等待时间
+    HTTP_CLIENT_MAX_RETRY_AFTER_SECONDS = 30  # 服从上游 Retry-After 的最长等待时间
+    # arXiv 批量标题查询 (多个标题合并为一个 OR 查询)
+    ARXIV_BATCH_TITLES_PER_QUERY = 10
+    ARXIV_BATCH_PAGE_SIZE = 50  # 每页结果数
+    ARXIV_BATCH_MAX_PAGES = 3  # 每个查询最多读取的页数
+    ARXIV_TITLE_MATCH_THRESHOLD = 0.9  # 规范化标题相似度阈值 (difflib ratio)
+    SCIHUB_PAGE_MAX_BYTES = 256 * 1024  # Sci-Hub 页面最多读取的字节数 (PDF嵌入元素位于页面前部)
+    # 文献库后台自动查找PDF链接 (见 library_resolver.py)
+    LIBRARY_RESOLVE_ENABLED = True
+    LIBRARY_RESOLVE_WORKER_COUNT = 1  # 同时执行的任务数 (每个任务一个工作线程)
+    LIBRARY_RESOLVE_CONCURRENCY = 8  # 所有任务共享的解析并发数
+    LIBRARY_RESOLVE_BATCH_SIZE = 100  # 每批处理的文献数，每批结束时写回结果并推进游标
+    LIBRARY_RESOLVE_LEASE_SECONDS = 900  # RUNNING 任务心跳超时后可被其他进程接管
+    LIBRARY_RESOLVE_POLL_INTERVAL_SECONDS = 30
+    # GET /api/user/literature_list 分页 (传入 limit 或 cursor 时启用)
+    LITERATURE_LIST_DEFAULT_PAGE_SIZE = 100
+    LITERATURE_LIST_MAX_PAGE_SIZE = 500
+    LITERATURE_LIST_STREAM_YIELD_PER = 500  # stream=true 时每次从数据库读取的行数
+    LITERATURE_LIST_STREAM_CHUNK_BYTES = 64 * 1024  # stream=true 时每次写出的数据块大小
+    # Sci-Hub 镜像健康跟踪与熔断 (见 mirror_health.py)
+    MIRROR_HEALTH_WINDOW = 50  # 每个镜像保留的最近请求样本数
+    MIRROR_CIRCUIT_FAILURE_THRESHOLD = 3  # 连续失败多少次后熔断
+    MIRROR_CIRCUIT_OPEN_SECONDS = 300  # 熔断持续时间，之后放行一个探测请求
+    # 按 DOI 注册者前缀自适应排列PDF来源 (见 source_ranking.py)
+    SOURCE_RANKING_ENABLED = True
+    SOURCE_RANKING_WINDOW = 100  # 每个 (前缀, 来源) 保留的最近结果数
+    SOURCE_RANKING_MIN_SAMPLES = 5  # 样本不足时保持默认顺序
+    SOURCE_RANKING_EXPLORATION_RATE = 0.1  # 随机把一个非首位来源提前的概率，保持统计更新
+    SOURCE_RANKING_MAX_PREFIXES = 5000
+    # PDF链接解析缓存 (内存LRU + pdf_resolutions 表)，找到与未找到分别设置TTL
+    PDF_RESOLUTION_CACHE_ENABLED = True
+    PDF_RESOLUTION_CACHE_HIT_TTL_SECONDS = 30 * 24 * 3600
+    PDF_RESOLUTION_CACHE_MISS_TTL_SECONDS = 6 * 3600
+    PDF_RESOLUTION_CACHE_MEMORY_ENTRIES = 10000
+    # 批量任务进度事件 (SSE: /api/batch_progress/<task_id>/events)
+    BATCH_PROGRESS_MIN_INTERVAL_SECONDS = 0.5   # 每篇文章 downloading 事件的最小间隔
+    BATCH_PROGRESS_HEARTBEAT_SECONDS = 15       # 无事件时的心跳间隔，同时是检查任务行状态的间隔
+    BATCH_PROGRESS_STREAM_MAX_SECONDS = 60 * 60 # 单个SSE连接的最长时间，超时后客户端按 Last-Event-ID 重连
+    BATCH_PROGRESS_HISTORY_LIMIT = 1000         # 每个任务在内存中保留的事件条数
+    BATCH_PROGRESS_RETENTION_SECONDS = 600      # 任务结束后事件历史的保留时间
+
     @staticmethod
     def init_app(app):
         pass
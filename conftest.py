@@ -0,0 +1,25 @@
+# backend/conftest.py
+import pytest
+from flask import Flask
+
+from config import Config
+from models import db
+from resolution_cache import resolution_cache
+
+
+@pytest.fixture
+def app():
+    """最小化的应用：内存 SQLite + 测试需要的扩展，不启动任何后台线程。"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(TESTING=True, SQLALCHEMY_DATABASE_URI="sqlite://",
+                      SCI_HUB_DOMAINS=["https://sci-hub.one", "https://sci-hub.two"],
+                      MY_EMAIL_FOR_APIS="tester@university.edu")
+    db.init_app(app)
+    resolution_cache.init_app(app)
+    resolution_cache._memory.clear()  # 模块级实例的内存层在测试之间共享
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
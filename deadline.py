@@ -0,0 +1,40 @@
+# backend/deadline.py
+import time
+
+import requests
+
+
+# === 截止时间 (时间预算) ===
+# find_pdf_link 在入口创建一个 Deadline 并一路传给各来源的查询函数和 http_client。每个出站请求的超时取
+# "该请求原本的超时上限" 与 "剩余预算" 中的较小值，调用方 (如 /api/find-pdf?sla_ms=3000) 因而可以限定整次查找的耗时。
+# 预算耗尽后再发请求会抛出 DeadlineExceeded (requests Timeout 的子类)，调用方现有的超时/请求异常分支即可处理。
+# Deadline 只保存一个单调时钟上的到期时间，创建后不可变，可以在线程之间共享。
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """时间预算已用完，未发出请求。"""
+
+
+class Deadline:
+    def __init__(self, seconds):
+        self.budget_seconds = max(0.0, float(seconds))
+        self.expires_at = time.monotonic() + self.budget_seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def elapsed(self):
+        return self.budget_seconds - self.remaining()
+
+    def timeout(self, cap_seconds=None):
+        """单个请求可用的超时：min(cap_seconds, 剩余预算)。预算已用完时抛出 DeadlineExceeded。"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"时间预算 {self.budget_seconds:.1f} 秒已用完。")
+        return remaining if cap_seconds is None else min(float(cap_seconds), remaining)
+
+    def __repr__(self):
+        return f"Deadline(remaining={self.remaining():.3f}s of {self.budget_seconds:.3f}s)"
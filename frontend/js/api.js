@@ -27,6 +27,9 @@ async function fetchLiteratureList(params = null) {
     let getListApiUrl = `${backendApiUrl}/api/user/literature_list`;
     if (params) {
         getListApiUrl += `?${params.toString()}`;
+    } else {
+        // 加载全部文献时使用流式输出 (格式与普通列表相同)，避免后端一次性构造整个列表
+        getListApiUrl += '?stream=true';
     }
 
     try {
@@ -207,6 +210,61 @@ async function findPdfLinkApi(doi, title) {
     }
 }
 
+/**
+ * 批量查找PDF链接：一次请求提交所有条目，后端并发解析并逐行 (NDJSON) 返回结果。
+ * @param {Array<{id: string, doi: string|null, title: string|null}>} items 要查找的条目。
+ * @param {function(object): void} onResult 每解析完一条调用一次，参数为 {index, id, success, pdfLink, ...}。
+ * @returns {Promise<object|null>} 最后的汇总行 {total, found, not_found, ...}，失败时返回null。
+ */
+async function bulkFindPdfLinksApi(items, onResult) {
+    const backendApiUrl = window.backendBaseUrl;
+    if (!backendApiUrl) {
+        console.error('API/bulkFindPdfLinksApi: Backend API URL is not configured.');
+        if (typeof showStatus === "function") showStatus('错误：后端API链接未配置。', 'text-red-500', 5000);
+        return null;
+    }
+    try {
+        const response = await fetch(`${backendApiUrl}/api/find-pdf/bulk`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${localStorage.getItem('authToken')}`
+            },
+            body: JSON.stringify({ items })
+        });
+        if (!response.ok) {
+            const errorData = await response.json().catch(() => ({}));
+            throw new Error(errorData.message || `后端错误: ${response.status}`);
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder('utf-8');
+        let buffer = '';
+        let summary = null;
+        const handleLine = (line) => {
+            if (!line.trim()) return;
+            const data = JSON.parse(line);
+            if (data.type === 'summary') summary = data;
+            else if (typeof onResult === "function") onResult(data);
+        };
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let newlineIndex;
+            while ((newlineIndex = buffer.indexOf('\n')) !== -1) {
+                handleLine(buffer.slice(0, newlineIndex));
+                buffer = buffer.slice(newlineIndex + 1);
+            }
+        }
+        handleLine(buffer);
+        return summary;
+    } catch (error) {
+        console.error('API/bulkFindPdfLinksApi: Error during bulk PDF link lookup:', error);
+        if (typeof showStatus === "function") showStatus(`批量查找PDF链接失败: ${error.message}`, 'text-red-500', 4000);
+        return null;
+    }
+}
+
 /**
  * 请求后端批量处理文献并打包为ZIP。
  * @param {Array} articlesToProcess 要处理的文章对象数组。
@@ -698,7 +756,7 @@ async function proxyPdfDownloadApi(pdfUrl) {
         return null;
     }
 
-    const proxyApiUrl = `<span class="math-inline">\{backendApiUrl\}/api/proxy\-pdf?url\=</span>{encodeURIComponent(pdfUrl)}`;
+    const proxyApiUrl = `${backendApiUrl}/api/proxy-pdf?url=${encodeURIComponent(pdfUrl)}`;
     try {
         const response = await fetch(proxyApiUrl, {
             method: 'GET',
@@ -728,6 +786,29 @@ async function proxyPdfDownloadApi(pdfUrl) {
     }
 }
 
+/**
+ * 构造供 PDF.js 直接加载的代理数据源。后端代理支持 Range 请求，PDF.js 只按需获取用到的区间，
+ * 不必等整个文件下载完成即可渲染第一页。
+ * @param {string} pdfUrl 原始 PDF 的 URL。
+ * @returns {object|null} pdfjsLib.getDocument 的参数，或在缺少登录信息/配置时返回 null。
+ */
+function buildProxyPdfSource(pdfUrl) {
+    const currentAuthToken = localStorage.getItem('authToken');
+    const backendApiUrl = window.backendBaseUrl;
+
+    if (!currentAuthToken || !backendApiUrl || !pdfUrl) {
+        console.error('API/buildProxyPdfSource: Invalid parameters or missing auth/config.');
+        return null;
+    }
+
+    return {
+        url: `${backendApiUrl}/api/proxy-pdf?url=${encodeURIComponent(pdfUrl)}`,
+        httpHeaders: { 'Authorization': `Bearer ${currentAuthToken}` },
+        rangeChunkSize: 256 * 1024, // 每个区间请求的大小
+        disableAutoFetch: true      // 只获取渲染当前页需要的数据，不在后台预取整个文件
+    };
+}
+
 /**
  * 从服务器删除指定的截图记录及其物理文件。
  * @param {string|number} screenshotId - 要删除的截图在数据库中的ID。
@@ -785,6 +866,64 @@ async function deleteScreenshotFromServerApi(screenshotId) {
 // =====================================================================
 
 
+/**
+ * 订阅批量任务的逐篇文章进度 (Server-Sent Events)，直到服务器推送最终 summary 事件。
+ * 使用 fetch 读取事件流（EventSource 无法携带 Authorization 头），断线时按 Last-Event-ID 自动重连。
+ * @param {string} taskId 批量任务ID。
+ * @param {function(string, object): void} [onEvent] 每个事件的回调 (事件类型, 数据)。
+ * @returns {Promise<object|null>} summary 事件的数据；无法订阅时返回 null。
+ */
+async function subscribeBatchProgressApi(taskId, onEvent) {
+    const backendApiUrl = window.backendBaseUrl;
+    if (!backendApiUrl || !taskId) {
+        console.error('API/subscribeBatchProgressApi: Backend URL or Task ID missing.');
+        return null;
+    }
+    const eventsUrl = `${backendApiUrl}/api/batch_progress/${encodeURIComponent(taskId)}/events`;
+    let lastEventId = null;
+    const maxReconnects = 5;
+    for (let attempt = 0; attempt <= maxReconnects; attempt++) {
+        try {
+            const headers = { 'Authorization': `Bearer ${localStorage.getItem('authToken')}` };
+            if (lastEventId !== null) headers['Last-Event-ID'] = String(lastEventId);
+            const response = await fetch(eventsUrl, { headers });
+            if (!response.ok) {
+                console.error(`API/subscribeBatchProgressApi: Server responded ${response.status} for task ${taskId}`);
+                return null;
+            }
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder('utf-8');
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                let separatorIndex;
+                while ((separatorIndex = buffer.indexOf('\n\n')) !== -1) {
+                    const rawEvent = buffer.slice(0, separatorIndex);
+                    buffer = buffer.slice(separatorIndex + 2);
+                    let eventType = 'message', dataText = '', eventId = null;
+                    rawEvent.split('\n').forEach(line => {
+                        if (line.startsWith('event: ')) eventType = line.slice(7);
+                        else if (line.startsWith('data: ')) dataText += line.slice(6);
+                        else if (line.startsWith('id: ')) eventId = Number(line.slice(4));
+                    });
+                    if (!dataText) continue; // 心跳注释行
+                    if (eventId !== null) lastEventId = eventId;
+                    const data = JSON.parse(dataText);
+                    if (typeof onEvent === "function") onEvent(eventType, data);
+                    if (eventType === 'summary') return data;
+                }
+            }
+        } catch (err) {
+            console.warn(`API/subscribeBatchProgressApi: Progress stream for task ${taskId} interrupted, reconnecting...`, err);
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000 * (attempt + 1)));
+    }
+    return null;
+}
+
+
 // js/api.js
 // ... (所有函数定义，包括 async function batchProcessAndZipApi(...) { ... } ) ...
 
@@ -794,8 +933,10 @@ export {
     saveFullLiteratureList,
     updateSingleLiteratureArticle,
     findPdfLinkApi,
+    bulkFindPdfLinksApi,
     batchProcessAndZipApi, // <--- 现在这个函数被导出了
     deleteBatchRecordApi,
+    subscribeBatchProgressApi,
     saveScreenshotApi,
     updateScreenshotMetadataApi,
     fetchAllMyScreenshotsApi,
@@ -806,6 +947,7 @@ export {
     deleteLiteratureArticleApi,
     batchDeleteLiteratureArticlesApi,
     proxyPdfDownloadApi,
+    buildProxyPdfSource,
     deleteScreenshotFromServerApi
 };
 
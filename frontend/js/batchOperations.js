@@ -3,7 +3,7 @@
 // 步骤 1: 从其他模块导入依赖
 import { COLUMN_MAPPING } from './config.js';
 import { showStatus, findHeader } from './utils.js';
-import { findPdfLinkApi, batchProcessAndZipApi, deleteBatchRecordApi } from './api.js';
+import { findPdfLinkApi, bulkFindPdfLinksApi, batchProcessAndZipApi, deleteBatchRecordApi, subscribeBatchProgressApi } from './api.js';
 import { updateTableDataEntry } from './dataManager.js';
 
 
@@ -162,23 +162,39 @@ async function autoFindAllPdfs() { // <--- 添加 export
     showStatus(`开始批量自动查找 ${itemsToSearchCount} 个文献的PDF链接...`, 'text-blue-500');
     updateBatchProgress(0, itemsToSearchCount);
 
-    let completedCount = 0;
-    for (const row of itemsToProcess) {
-        // 确保 findHeader 和 COLUMN_MAPPING 可用
+    // 一次请求提交全部条目，后端并发解析，每完成一条立即更新对应行
+    const bulkItems = itemsToProcess.map(row => {
         const doiHeaderKey = findHeader(Object.keys(row), COLUMN_MAPPING.doi || ['doi']);
-        let doiForApi = null;
-        if (doiHeaderKey && row[doiHeaderKey] != null) doiForApi = String(row[doiHeaderKey]).trim();
-
         const titleHeaderKey = findHeader(Object.keys(row), COLUMN_MAPPING.title || ['title']);
-        let titleForApi = null;
-        if (titleHeaderKey && row[titleHeaderKey] != null) titleForApi = String(row[titleHeaderKey]).trim();
-
-        await handleAutoFindPdfLink(doiForApi, titleForApi, row._id)
-            .finally(() => {
-                completedCount++;
-                updateBatchProgress(completedCount, itemsToSearchCount);
-            });
-        await new Promise(resolve => setTimeout(resolve, 200));
+        const doiForApi = doiHeaderKey && row[doiHeaderKey] != null ? String(row[doiHeaderKey]).trim() : null;
+        const titleForApi = titleHeaderKey && row[titleHeaderKey] != null ? String(row[titleHeaderKey]).trim() : null;
+        updateTableDataEntry(row._id, 'status', '自动查找中...');
+        return { id: row._id, doi: doiForApi || null, title: titleForApi || null };
+    });
+
+    let completedCount = 0;
+    const resolvedRowIds = new Set();
+    const summary = await bulkFindPdfLinksApi(bulkItems, (result) => {
+        const rowId = result.id != null ? result.id : bulkItems[result.index]?.id;
+        if (rowId != null) {
+            resolvedRowIds.add(rowId);
+            if (result.success && result.pdfLink) {
+                updateTableDataEntry(rowId, 'pdfLink', result.pdfLink);
+                updateTableDataEntry(rowId, 'status', '链接已找到 (自动)');
+            } else {
+                updateTableDataEntry(rowId, 'status', '自动查找失败');
+            }
+        }
+        completedCount++;
+        updateBatchProgress(completedCount, itemsToSearchCount);
+    });
+    // 连接中断时，未返回结果的条目标记为失败，避免一直停留在"自动查找中..."
+    bulkItems.forEach(item => {
+        if (!resolvedRowIds.has(item.id)) updateTableDataEntry(item.id, 'status', '自动查找失败');
+    });
+    if (!summary) {
+        showStatus(`批量自动查找中断，已完成 ${completedCount}/${itemsToSearchCount} 项。`, 'text-red-500', 5000);
+        return;
     }
     showStatus(`批量自动查找完成 ${itemsToSearchCount} 项尝试。请检查列表状态。`, 'text-green-500', 5000);
 }
@@ -245,10 +261,26 @@ async function downloadAllAvailablePdfs() { // <--- 添加 export
         showStatus("错误: API服务(batchProcessAndZipApi)未就绪。", "text-red-500", 3000);
     }
 
+    // 任务已进入后台队列：订阅进度事件流，直到收到最终汇总 (取代轮询)
+    if (responseData && (responseData.status === "processing_submitted" || responseData.status === "already_processing_or_submitted")) {
+        let finishedCount = 0;
+        const summary = await subscribeBatchProgressApi(responseData.task_id, (eventType, data) => {
+            if (eventType === 'stored' || eventType === 'failed') {
+                finishedCount++;
+                updateBatchProgress(finishedCount, data.total);
+            } else if (eventType === 'downloading' && data.bytes_total) {
+                showStatus(`正在下载 "${data.title}"：${Math.round(data.bytes / data.bytes_total * 100)}%`, 'text-blue-500');
+            }
+        });
+        responseData = summary
+            ? { ...summary, success: summary.status === "COMPLETED" }
+            : { success: false, message: "无法获取批量任务进度，请稍后重试。" };
+    }
+
     if (batchZipProcessingLoaderElem) batchZipProcessingLoaderElem.classList.add('hidden');
 
     if (responseData) {
-        if (responseData.status === "previously_processed") {
+        if (responseData.status === "previously_processed" || responseData.status === "previously_processed_completed") {
             const userChoice = confirm(`此文献集合之前已被处理并打包为 "${responseData.zip_download_filename}" (时间: ${responseData.original_record_timestamp || '未知'}).\n\n[确定] 重新下载这个旧的ZIP包。\n[取消] 删除旧记录并为此集合重新生成新的ZIP包?`);
             if (userChoice) {
                 showStatus(`准备重新下载之前生成的ZIP包: ${responseData.zip_download_filename}`, 'text-blue-500', 3000);
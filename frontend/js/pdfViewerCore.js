@@ -9,6 +9,7 @@
 import { showStatus, truncateText } from './utils.js'; // Assuming utils.js provides these
 import { DEFAULT_PDF_SCALE, MIN_PDF_SCALE, MAX_PDF_SCALE, PDF_SCALE_INCREMENT } from './config.js';
 import { displayScreenshotsForCurrentArticle } from './screenshotManager.js'; // If called from here
+import { buildProxyPdfSource } from './api.js';
 
 
 // ==========================================================================
@@ -462,7 +463,7 @@ export async function loadPdfFileObjectIntoViewer(fileObject, instanceSuffix = "
 export async function loadPdfFromUrl(pdfUrl, instanceSuffix = "") {
     // ... (Implementation from previous response, ensure all state and DOM uses suffix)
     // ... Ensure cleanupPdfViewerState, renderPdfPage, displayScreenshotsForCurrentArticle are called with suffix.
-    // ... Uses proxyPdfDownloadApi for external URLs.
+    // ... Uses the backend proxy (with HTTP Range requests) for external URLs.
     const suffixLog = `[PdfCore/${instanceSuffix || 'default'}]`;
     if (!pdfUrl || typeof pdfUrl !== 'string' || pdfUrl.trim() === '') {
         if(typeof showStatus === "function") showStatus("无效的PDF链接提供。", "text-red-500", 3000);
@@ -494,12 +495,11 @@ export async function loadPdfFromUrl(pdfUrl, instanceSuffix = "") {
 
         if (isExternalHttpUrl) {
             if(typeof showStatus === "function") showStatus(`通过后端代理加载PDF: ${truncateText(pdfUrl,30)}${suffixLog}...`, 'text-blue-500', 0);
-            const pdfBlob = await proxyPdfDownloadApi(pdfUrl); // From api.js
-            if (!pdfBlob) {
-                throw new Error("未能通过代理获取PDF文件数据。检查网络和服务器日志。");
+            // 由 PDF.js 直接请求代理并按需发送 Range 请求，首页渲染无需等待整个文件
+            pdfDataSource = buildProxyPdfSource(pdfUrl); // From api.js
+            if (!pdfDataSource) {
+                throw new Error("未能构造代理请求，请确认已登录。");
             }
-            const arrayBuffer = await pdfBlob.arrayBuffer();
-            pdfDataSource = new Uint8Array(arrayBuffer);
         } else {
             // For non-http(s) URLs (e.g., blob:, data:), pass URL directly if pdf.js supports it.
             // Or handle specific schemes if needed. Assume pdf.js handles common ones.
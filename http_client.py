@@ -0,0 +1,314 @@
+# backend/http_client.py
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import InvalidHeader
+from urllib3.util.retry import Retry
+
+
+# === 出站HTTP客户端 (取代 utils.REQUEST_SESSION) ===
+# 按上游服务划分：unpaywall / arxiv / scihub / pdf (任意PDF主机)，每个服务有独立的 requests.Session，
+# 因而有各自大小的连接池 (HTTPAdapter pool_connections/pool_maxsize) 和重试策略 (urllib3 Retry，指数退避)。
+# 每个 (服务, 主机) 还有一个令牌桶限速，超过速率的请求在本地排队等待，而不是把 429 留给上游返回；
+# 等待超过 HTTP_CLIENT_RATE_LIMIT_MAX_WAIT_SECONDS 时抛出 RateLimitExceeded (RequestException 的子类，
+# 调用方现有的 except requests.exceptions.RequestException 分支即可处理)。
+# 各服务的参数见 config.HTTP_CLIENT_SERVICES，未配置的字段使用 DEFAULT_SERVICE_SETTINGS。
+# 传入 deadline (deadline.Deadline) 时，限速等待与请求超时都不会超过剩余的时间预算；urllib3 Retry 的重试、退避与
+# Retry-After 等待不感知预算，因此这类请求经同一个适配器以 NO_RETRY 发送，由 request() 逐次尝试，每次尝试前检查剩余预算。
+
+DEFAULT_USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                      "Chrome/100.0.0.0 Safari/537.36 LitFinderBot/1.1")
+
+DEFAULT_SERVICE_SETTINGS = {
+    "pool_connections": 10,  # 缓存的主机连接池个数
+    "pool_maxsize": 10,  # 每个主机连接池的最大连接数，应不小于同时访问该主机的线程数
+    "retries": 2,  # 连接错误、读超时以及 429/502/503/504 的重试次数 (仅 GET/HEAD)
+    "backoff_factor": 0.5,  # 第 n 次重试前等待 backoff_factor * 2^(n-1) 秒
+    "rate_per_second": 0,  # 每个主机的令牌补充速率，0 表示不限速
+    "burst": 1,  # 令牌桶容量 (允许的突发请求数)
+}
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+DEFAULT_MAX_RETRY_AFTER_SECONDS = 30
+NO_RETRY = Retry(0, read=False)  # 与 requests 默认 (max_retries=0) 相同：不重试，读取错误原样抛出
+
+
+class RateLimitExceeded(requests.exceptions.RequestException):
+    """本地令牌桶在最长等待时间内没有可用令牌。"""
+
+
+class _CappedRetry(Retry):
+    # 上游 Retry-After 过长时 (如 429 要求等待一小时) 不整段等待，超过上限即放弃重试
+
+    def __init__(self, *args, max_retry_after_seconds=DEFAULT_MAX_RETRY_AFTER_SECONDS, **kwargs):
+        self.max_retry_after_seconds = max_retry_after_seconds
+        super().__init__(*args, **kwargs)
+
+    def new(self, **kwargs):
+        # urllib3 每次重试都通过 new() 生成新的 Retry 对象，上限需随之传递
+        retry = super().new(**kwargs)
+        retry.max_retry_after_seconds = self.max_retry_after_seconds
+        return retry
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is not None and retry_after > self.max_retry_after_seconds:
+            return self.max_retry_after_seconds
+        return retry_after
+
+
+def _retry_after_seconds(response, max_seconds=DEFAULT_MAX_RETRY_AFTER_SECONDS):
+    """响应的 Retry-After 秒数 (不超过 max_seconds)；没有或无法解析时返回 None。"""
+    header_value = response.headers.get("Retry-After")
+    if not header_value:
+        return None
+    try:
+        retry_after = Retry().parse_retry_after(header_value)
+    except InvalidHeader:
+        return None
+    return min(max(0.0, retry_after), max_seconds)
+
+
+class _ServiceAdapter(HTTPAdapter):
+    """
+    可为单个请求临时替换重试策略的 HTTPAdapter：带时间预算的请求在 retries_overridden(NO_RETRY) 中发送，
+    与普通请求共用同一个连接池。替换值保存在线程局部变量中，不影响其他线程的并发请求。
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._retry_override = threading.local()
+        super().__init__(*args, **kwargs)
+
+    @property
+    def max_retries(self):
+        override = getattr(getattr(self, "_retry_override", None), "retries", None)
+        return override if override is not None else self._max_retries
+
+    @max_retries.setter
+    def max_retries(self, value):
+        self._max_retries = value
+
+    @contextmanager
+    def retries_overridden(self, retries):
+        self._retry_override.retries = retries
+        try:
+            yield
+        finally:
+            self._retry_override.retries = None
+
+
+class _TokenBucket:
+    def __init__(self, rate_per_second, burst):
+        self.rate_per_second = rate_per_second
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """取一个令牌，返回需要等待的秒数（令牌预先扣除，等待期间其他线程会排在后面）。"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+            self.updated_at = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate_per_second
+
+    def refund(self):
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class _ServiceClient:
+    def __init__(self, name, settings, user_agent, max_retry_after_seconds=DEFAULT_MAX_RETRY_AFTER_SECONDS):
+        self.name = name
+        self.settings = settings
+        self.max_retry_after_seconds = max_retry_after_seconds
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": user_agent})
+        retry = _CappedRetry(
+            total=settings["retries"], connect=settings["retries"], read=settings["retries"],
+            status=settings["retries"], backoff_factor=settings["backoff_factor"],
+            status_forcelist=RETRY_STATUS_CODES, allowed_methods=frozenset({"GET", "HEAD"}),
+            respect_retry_after_header=True, raise_on_status=False,
+            max_retry_after_seconds=max_retry_after_seconds)
+        self.adapter = _ServiceAdapter(pool_connections=settings["pool_connections"],
+                                       pool_maxsize=settings["pool_maxsize"], max_retries=retry)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self.buckets = OrderedDict()  # host -> _TokenBucket，最多保留 MAX_TRACKED_HOSTS 个
+        self.lock = threading.Lock()
+        self.metrics = {"requests": 0, "errors": 0, "retried_requests": 0, "status_429": 0,
+                        "rate_limited_waits": 0, "rate_limit_wait_seconds": 0.0, "rate_limit_rejections": 0,
+                        "in_flight": 0, "peak_in_flight": 0}
+
+    def bucket_for(self, host, max_tracked_hosts):
+        if not self.settings["rate_per_second"]:
+            return None
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = _TokenBucket(self.settings["rate_per_second"], self.settings["burst"])
+                while len(self.buckets) > max_tracked_hosts:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(host)
+            return bucket
+
+    def add_metric(self, name, delta=1):
+        with self.lock:
+            self.metrics[name] += delta
+            if name == "in_flight" and self.metrics["in_flight"] > self.metrics["peak_in_flight"]:
+                self.metrics["peak_in_flight"] = self.metrics["in_flight"]
+
+    def pool_snapshot(self):
+        pools = list(self.adapter.poolmanager.pools.values()) if self.adapter.poolmanager else []
+        return {
+            "host_pools": len(pools),
+            "connections_created": sum(getattr(pool, "num_connections", 0) for pool in pools),
+            "idle_connections": sum(pool.pool.qsize() for pool in pools if getattr(pool, "pool", None) is not None),
+            "pool_maxsize": self.settings["pool_maxsize"],
+        }
+
+
+class OutboundHttpClient:
+    """
+    出站HTTP客户端。用法与其他扩展一致：模块级实例化，在 create_app 中调用 init_app(app)。
+    http_client.get("unpaywall", url, timeout=25) 等价于 requests 的 session.get，但使用该服务的连接池、重试与限速。
+    """
+
+    MAX_TRACKED_HOSTS = 1024
+
+    def __init__(self, app=None):
+        self.max_wait_seconds = 30
+        self.max_retry_after_seconds = DEFAULT_MAX_RETRY_AFTER_SECONDS
+        self.user_agent = DEFAULT_USER_AGENT
+        self._service_settings = {}
+        self._services = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_wait_seconds = float(app.config.get('HTTP_CLIENT_RATE_LIMIT_MAX_WAIT_SECONDS', self.max_wait_seconds))
+        self.user_agent = app.config.get('HTTP_CLIENT_USER_AGENT') or DEFAULT_USER_AGENT
+        self.max_retry_after_seconds = float(
+            app.config.get('HTTP_CLIENT_MAX_RETRY_AFTER_SECONDS', self.max_retry_after_seconds))
+        with self._lock:
+            self._service_settings = dict(app.config.get('HTTP_CLIENT_SERVICES') or {})
+            self._services = {}  # 配置变化后按新参数重新创建
+        app.extensions['http_client'] = self
+
+    def _service(self, name):
+        with self._lock:
+            service = self._services.get(name)
+            if service is None:
+                settings = dict(DEFAULT_SERVICE_SETTINGS)
+                settings.update(self._service_settings.get(name) or {})
+                service = self._services[name] = _ServiceClient(name, settings, self.user_agent,
+                                                                self.max_retry_after_seconds)
+            return service
+
+    def _acquire(self, service, url, deadline=None):
+        bucket = service.bucket_for(urlparse(url).netloc.lower(), self.MAX_TRACKED_HOSTS)
+        if bucket is None:
+            return
+        wait_seconds = bucket.reserve()
+        if wait_seconds <= 0:
+            return
+        max_wait_seconds = self.max_wait_seconds if deadline is None else min(self.max_wait_seconds, deadline.remaining())
+        if wait_seconds > max_wait_seconds:
+            bucket.refund()
+            service.add_metric("rate_limit_rejections")
+            raise RateLimitExceeded(
+                f"{service.name} 服务对 '{urlparse(url).netloc}' 的请求超过限速，需等待 {wait_seconds:.1f} 秒。")
+        service.add_metric("rate_limited_waits")
+        service.add_metric("rate_limit_wait_seconds", wait_seconds)
+        time.sleep(wait_seconds)
+
+    def request(self, service_name, method, url, deadline=None, **kwargs):
+        service = self._service(service_name)
+        if deadline is not None:
+            return self._request_within_deadline(service, method, url, deadline, kwargs)
+        self._acquire(service, url)
+        response = self._send(service, service.session, method, url, kwargs)
+        retries = getattr(getattr(response.raw, "retries", None), "history", None)
+        if retries:
+            service.add_metric("retried_requests")
+        return response
+
+    def _request_within_deadline(self, service, method, url, deadline, kwargs):
+        """
+        与 urllib3 Retry 相同的重试条件 (连接错误、超时、RETRY_STATUS_CODES，仅 GET/HEAD)，但每次尝试的超时、
+        退避和 Retry-After 等待都受剩余预算限制：等待会超出剩余预算时不再重试，直接抛出最后的异常或返回最后的响应。
+        """
+        timeout_cap = kwargs.get("timeout")
+        settings = service.settings
+        retries_left = settings["retries"] if method.upper() in ("GET", "HEAD") else 0
+        attempt = 0
+        while True:
+            deadline.timeout()  # 预算已用完时不再排队等待令牌
+            self._acquire(service, url, deadline)
+            kwargs["timeout"] = deadline.timeout(timeout_cap)
+            try:
+                with service.adapter.retries_overridden(NO_RETRY):
+                    response = self._send(service, service.session, method, url, kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                wait_seconds = settings["backoff_factor"] * (2 ** attempt)
+                if retries_left <= 0 or wait_seconds >= deadline.remaining():
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or retries_left <= 0:
+                    return response
+                retry_after = _retry_after_seconds(response, service.max_retry_after_seconds)
+                wait_seconds = retry_after if retry_after is not None else settings["backoff_factor"] * (2 ** attempt)
+                if wait_seconds >= deadline.remaining():
+                    return response
+                response.close()
+            if attempt == 0:
+                service.add_metric("retried_requests")
+            retries_left -= 1
+            attempt += 1
+            time.sleep(wait_seconds)
+
+    @staticmethod
+    def _send(service, session, method, url, kwargs):
+        service.add_metric("requests")
+        service.add_metric("in_flight")
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            service.add_metric("errors")
+            raise
+        finally:
+            service.add_metric("in_flight", -1)  # 流式响应在收到响应头后即不再计入
+        if response.status_code == 429:
+            service.add_metric("status_429")
+        return response
+
+    def get(self, service_name, url, **kwargs):
+        return self.request(service_name, "GET", url, **kwargs)
+
+    def head(self, service_name, url, **kwargs):
+        return self.request(service_name, "HEAD", url, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            services = dict(self._services)
+        result = {}
+        for name, service in services.items():
+            with service.lock:
+                metrics = dict(service.metrics)
+                metrics["tracked_hosts"] = len(service.buckets)
+            metrics["rate_limit_wait_seconds"] = round(metrics["rate_limit_wait_seconds"], 3)
+            metrics.update(service.pool_snapshot())
+            result[name] = metrics
+        return result
+
+
+# 模块级实例，在 create_app 中 http_client.init_app(app)
+http_client = OutboundHttpClient()
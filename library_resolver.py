@@ -0,0 +1,353 @@
+# backend/library_resolver.py
+import os
+import queue
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone, timedelta
+from flask import current_app
+from sqlalchemy import bindparam, or_
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, LiteratureArticle, LibraryResolveJob
+from resolution_cache import resolution_query_key
+from utils import find_pdf_link_outcome
+
+
+# === 用户文献库后台自动查找PDF链接 ===
+# 与 BatchJobExecutor 相同的结构：library_resolve_jobs 表是持久化队列，内存队列只负责唤醒工作线程，
+# 扫描线程定期拾取 QUEUED 任务以及心跳超时的 RUNNING 任务（执行它的进程已退出）。
+# 每个任务按 literature_articles.id 升序，每批取 LIBRARY_RESOLVE_BATCH_SIZE 篇 pdf_link 为空的文献，
+# 以 LIBRARY_RESOLVE_CONCURRENCY 的并发调用 find_pdf_link_outcome，结果用批量 UPDATE 写回，
+# 并在同一事务中推进游标 (cursor_article_id)。暂停/取消只需修改任务状态，工作线程在下一批开始前停止。
+# 确定未找到的文献标记为 FAILED_STATUS；查询出错 (超时、来源不可用) 的文献不做标记，首轮结束后再重试一轮，
+# 仍出错的留给之后的任务。等待一批结果期间每 LIBRARY_RESOLVE_LEASE_SECONDS / 3 秒刷新一次心跳。
+
+FOUND_STATUS = '链接已找到 (自动)'  # 与前端 batchOperations.js 中自动查找使用的状态一致
+FAILED_STATUS = '自动查找失败'
+PENDING_STATUSES = ('待处理', '自动查找中...')  # 只有这些状态（或空状态）的文献在未找到时会被标记为失败
+
+ACTIVE_JOB_STATUSES = ("QUEUED", "RUNNING")
+
+
+class LibraryAutoResolver:
+    """
+    用户文献库自动查找任务执行器。用法与 BatchJobExecutor 一致：模块级实例化，在 create_app 中调用 init_app(app)，再 start()。
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.worker_count = 1
+        self._queue = queue.Queue()
+        self._queued_job_ids = set()
+        self._queued_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._resolve_pool = None
+        self._worker_id_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.worker_count = max(1, int(app.config.get('LIBRARY_RESOLVE_WORKER_COUNT', self.worker_count)))
+        app.extensions['library_resolver'] = self
+
+    # --- 生命周期 ---
+    def start(self):
+        if self.app is None:
+            raise RuntimeError("LibraryAutoResolver 尚未通过 init_app 关联到 Flask 应用。")
+        if self._threads:
+            return
+        self._stop_event.clear()
+        concurrency = max(1, int(self.app.config.get('LIBRARY_RESOLVE_CONCURRENCY', 8)))
+        # 所有任务共享的解析线程池，总并发不超过 LIBRARY_RESOLVE_CONCURRENCY
+        self._resolve_pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="library-resolve")
+        for index in range(self.worker_count):
+            worker_thread = threading.Thread(target=self._worker_loop, args=(index,),
+                                             name=f"library-resolver-{index}", daemon=True)
+            worker_thread.start()
+            self._threads.append(worker_thread)
+        scanner_thread = threading.Thread(target=self._scanner_loop, name="library-resolver-scanner", daemon=True)
+        scanner_thread.start()
+        self._threads.append(scanner_thread)
+        self.app.logger.info(f"[LibraryResolver] 已启动 {self.worker_count} 个文献库自动查找工作线程。")
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        for worker_thread in self._threads:
+            worker_thread.join(timeout=timeout)
+        self._threads = []
+        if self._resolve_pool is not None:
+            self._resolve_pool.shutdown(wait=False, cancel_futures=True)
+            self._resolve_pool = None
+
+    def submit(self, job_id):
+        """将已持久化为 QUEUED 的任务放入内存队列。"""
+        with self._queued_lock:
+            if job_id in self._queued_job_ids:
+                return False
+            self._queued_job_ids.add(job_id)
+        self._queue.put(job_id)
+        return True
+
+    # --- 工作线程 ---
+    def _worker_loop(self, index):
+        worker_id = f"{self._worker_id_prefix}:library-{index}"
+        while not self._stop_event.is_set():
+            try:
+                job_id = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            with self._queued_lock:
+                self._queued_job_ids.discard(job_id)
+            try:
+                with self.app.app_context():
+                    if claim_library_job(job_id, worker_id):
+                        self._run_job(job_id, worker_id)
+            except Exception as e:
+                self.app.logger.error(f"[LibraryResolver:{worker_id}] 执行任务 {job_id} 时发生未处理错误: {e}",
+                                      exc_info=True)
+                with self.app.app_context():
+                    _finish_job(job_id, worker_id, "FAILED", error_message=f"后台处理异常: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _run_job(self, job_id, worker_id):
+        log_prefix = f"[LibraryResolver:{worker_id}]"
+        batch_size = max(1, int(current_app.config.get('LIBRARY_RESOLVE_BATCH_SIZE', 100)))
+        retry_cursor = None  # 重试轮的游标；None 表示仍在首轮
+
+        while not self._stop_event.is_set():
+            job = db.session.get(LibraryResolveJob, job_id)
+            if job is None or job.status != "RUNNING" or job.worker_id != worker_id:
+                current_app.logger.info(f"{log_prefix} 任务 {job_id} 已暂停、取消或被接管，停止处理。")
+                return
+            user_id, cursor = job.user_id, job.cursor_article_id
+            query = LiteratureArticle.query.with_entities(
+                LiteratureArticle.id, LiteratureArticle.doi, LiteratureArticle.title
+            ).filter(
+                LiteratureArticle.user_id == user_id,
+                or_(LiteratureArticle.pdf_link.is_(None), LiteratureArticle.pdf_link == '')
+            )
+            if retry_cursor is None:
+                query = query.filter(LiteratureArticle.id > cursor)
+            else:
+                # 重试轮：游标之前因查询出错而未做标记的文献 (未找到的已标记为 FAILED_STATUS)
+                query = query.filter(
+                    LiteratureArticle.id > retry_cursor, LiteratureArticle.id <= cursor,
+                    or_(LiteratureArticle.status.is_(None), LiteratureArticle.status.in_(PENDING_STATUSES)))
+            articles = query.order_by(LiteratureArticle.id).limit(batch_size).all()
+            db.session.remove()  # 解析期间不占用数据库连接
+
+            if not articles:
+                if retry_cursor is None:
+                    retry_cursor = 0
+                    continue
+                _finish_job(job_id, worker_id, "COMPLETED")
+                current_app.logger.info(f"{log_prefix} 用户 {user_id} 的文献库自动查找任务 {job_id} 已完成。")
+                return
+
+            found, missed_ids, errored_ids = self._resolve_articles(job_id, worker_id, articles, log_prefix)
+            if found is None:
+                current_app.logger.info(f"{log_prefix} 任务 {job_id} 在解析期间被暂停、取消或接管，停止处理。")
+                return
+            # 查询出错的文献不标记、不计入已处理，留给重试轮 (以及之后的任务) 再次查找
+            new_cursor = articles[-1].id if retry_cursor is None else cursor
+            if not _apply_batch_results(job_id, worker_id, found, missed_ids, new_cursor, len(found) + len(missed_ids)):
+                current_app.logger.info(f"{log_prefix} 任务 {job_id} 已暂停、取消、被接管或写回失败，停止处理。")
+                return
+            if retry_cursor is not None:
+                retry_cursor = articles[-1].id
+            current_app.logger.debug(
+                f"{log_prefix} 任务 {job_id}{' (重试轮)' if retry_cursor is not None else ''}: 本批 {len(articles)} 篇，"
+                f"找到 {len(found)} 篇，未找到 {len(missed_ids)} 篇，查询出错 {len(errored_ids)} 篇，游标位于 {new_cursor}。")
+
+    def _resolve_articles(self, job_id, worker_id, articles, log_prefix):
+        """
+        并发解析一批文献，返回 (found, missed_ids, errored_ids)。等待期间定期刷新任务心跳；
+        任务已不再由本工作线程执行时取消尚未开始的解析并返回 (None, None, None)。
+        """
+        app = current_app._get_current_object()
+        lease_seconds = int(current_app.config.get('LIBRARY_RESOLVE_LEASE_SECONDS', 900))
+        heartbeat_interval = max(1, lease_seconds // 3)
+
+        def _resolve(doi, title):
+            with app.app_context():
+                return find_pdf_link_outcome(doi=doi, title=title, background=True)
+
+        # 同一批中 DOI/标题相同的文献只解析一次
+        futures = {}
+        article_keys = {}
+        for article in articles:
+            doi = (article.doi or '').strip() or None
+            title = (article.title or '').strip() or None
+            key = resolution_query_key(doi, title)
+            article_keys[article.id] = key
+            if key is not None and key not in futures:
+                futures[key] = self._resolve_pool.submit(_resolve, doi, title)
+
+        pending = set(futures.values())
+        while pending:
+            _, pending = wait(pending, timeout=heartbeat_interval)
+            if pending and not _touch_heartbeat(job_id, worker_id):
+                for future in pending:
+                    future.cancel()
+                return None, None, None
+
+        found, missed_ids, errored_ids = [], [], []
+        for article in articles:
+            future = futures.get(article_keys[article.id])
+            if future is None:  # 没有有效的 DOI 或标题，无法查找
+                missed_ids.append(article.id)
+                continue
+            try:
+                pdf_link, conclusive = future.result()
+            except Exception as e:
+                current_app.logger.warning(f"{log_prefix} 文献 {article.id} 查找失败: {e}")
+                pdf_link, conclusive = None, False
+            if pdf_link:
+                found.append({"b_id": article.id, "b_pdf_link": pdf_link})
+            elif conclusive:
+                missed_ids.append(article.id)
+            else:
+                errored_ids.append(article.id)
+        return found, missed_ids, errored_ids
+
+    # --- 扫描线程 ---
+    def _scanner_loop(self):
+        poll_interval = max(1, int(self.app.config.get('LIBRARY_RESOLVE_POLL_INTERVAL_SECONDS', 30)))
+        while not self._stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    for job_id in find_runnable_library_job_ids():
+                        self.submit(job_id)
+            except Exception as e:
+                self.app.logger.error(f"[LibraryResolver] 扫描待处理任务时发生错误: {e}", exc_info=True)
+            self._stop_event.wait(poll_interval)
+
+
+def _as_utc(dt):
+    # SQLite 读回的 DateTime 不带时区信息，统一视为 UTC
+    if dt is None:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _heartbeat_expired(job, now):
+    lease_seconds = int(current_app.config.get('LIBRARY_RESOLVE_LEASE_SECONDS', 900))
+    heartbeat_at = _as_utc(job.heartbeat_at)
+    return heartbeat_at is None or now - heartbeat_at > timedelta(seconds=lease_seconds)
+
+
+def find_runnable_library_job_ids():
+    """QUEUED 任务，以及心跳超时的 RUNNING 任务。"""
+    now = datetime.now(timezone.utc)
+    try:
+        jobs = LibraryResolveJob.query.with_entities(
+            LibraryResolveJob.id, LibraryResolveJob.status, LibraryResolveJob.heartbeat_at
+        ).filter(LibraryResolveJob.status.in_(ACTIVE_JOB_STATUSES)).order_by(LibraryResolveJob.created_at).all()
+        return [job.id for job in jobs if job.status == "QUEUED" or _heartbeat_expired(job, now)]
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"[LibraryResolver] 扫描任务时查询数据库失败: {e}", exc_info=True)
+        return []
+
+
+def claim_library_job(job_id, worker_id):
+    """以读取时的 status/worker_id 为条件切换为 RUNNING（比较并交换），多个工作线程同时领取时只有一个成功。"""
+    now = datetime.now(timezone.utc)
+    try:
+        job = db.session.get(LibraryResolveJob, job_id)
+        if job is None:
+            return False
+        if job.status != "QUEUED" and not (job.status == "RUNNING" and _heartbeat_expired(job, now)):
+            return False
+        claimed_rows = LibraryResolveJob.query.filter(
+            LibraryResolveJob.id == job_id, LibraryResolveJob.status == job.status,
+            LibraryResolveJob.worker_id == job.worker_id if job.worker_id else LibraryResolveJob.worker_id.is_(None)
+        ).update({"status": "RUNNING", "worker_id": worker_id, "heartbeat_at": now, "updated_at": now},
+                 synchronize_session=False)
+        db.session.commit()
+        return claimed_rows == 1
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"[LibraryResolver:{worker_id}] 领取任务 {job_id} 失败: {e}", exc_info=True)
+        return False
+
+
+def _touch_heartbeat(job_id, worker_id):
+    """刷新心跳，返回任务是否仍由本工作线程执行。数据库暂时不可用时按仍在执行处理，由下一次写回确认。"""
+    now = datetime.now(timezone.utc)
+    try:
+        still_owned = LibraryResolveJob.query.filter(
+            LibraryResolveJob.id == job_id, LibraryResolveJob.status == "RUNNING", LibraryResolveJob.worker_id == worker_id
+        ).update({"heartbeat_at": now}, synchronize_session=False)
+        db.session.commit()
+        return still_owned == 1
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.warning(f"[LibraryResolver:{worker_id}] 刷新任务 {job_id} 的心跳失败: {e}")
+        return True
+    finally:
+        db.session.remove()
+
+
+def _apply_batch_results(job_id, worker_id, found, failed_ids, last_article_id, batch_count):
+    """
+    批量写回一批结果并推进游标（同一事务）。只写回仍没有 pdf_link 的文献，避免覆盖用户期间手动填写的链接。
+    返回任务是否仍由本工作线程执行（否则调用方应停止）。
+    """
+    now = datetime.now(timezone.utc)
+    table = LiteratureArticle.__table__
+    no_link = or_(table.c.pdf_link.is_(None), table.c.pdf_link == '')
+    try:
+        if found:
+            db.session.execute(
+                table.update().where(table.c.id == bindparam('b_id')).where(no_link)
+                .values(pdf_link=bindparam('b_pdf_link'), status=FOUND_STATUS, updated_at=now),
+                found)
+        if failed_ids:
+            db.session.execute(
+                table.update().where(table.c.id.in_(failed_ids)).where(no_link)
+                .where(or_(table.c.status.is_(None), table.c.status.in_(PENDING_STATUSES)))
+                .values(status=FAILED_STATUS, updated_at=now))
+        still_owned = LibraryResolveJob.query.filter(
+            LibraryResolveJob.id == job_id, LibraryResolveJob.status == "RUNNING", LibraryResolveJob.worker_id == worker_id
+        ).update({
+            "cursor_article_id": last_article_id,
+            "num_processed": LibraryResolveJob.num_processed + batch_count,
+            "num_found": LibraryResolveJob.num_found + len(found),
+            "heartbeat_at": now, "updated_at": now
+        }, synchronize_session=False)
+        db.session.commit()
+        return still_owned == 1
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"[LibraryResolver:{worker_id}] 写回任务 {job_id} 的批量结果失败: {e}", exc_info=True)
+        return False
+
+
+def _finish_job(job_id, worker_id, status, error_message=None):
+    now = datetime.now(timezone.utc)
+    try:
+        LibraryResolveJob.query.filter(
+            LibraryResolveJob.id == job_id, LibraryResolveJob.status == "RUNNING", LibraryResolveJob.worker_id == worker_id
+        ).update({"status": status, "error_message": error_message, "finished_at": now, "updated_at": now},
+                 synchronize_session=False)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"[LibraryResolver:{worker_id}] 更新任务 {job_id} 为 {status} 失败: {e}", exc_info=True)
+
+
+def count_unresolved_articles(user_id, after_article_id=0):
+    return LiteratureArticle.query.filter(
+        LiteratureArticle.user_id == user_id,
+        LiteratureArticle.id > after_article_id,
+        or_(LiteratureArticle.pdf_link.is_(None), LiteratureArticle.pdf_link == '')
+    ).count()
+
+
+# 模块级实例，在 create_app 中 library_resolver.init_app(app)
+library_resolver = LibraryAutoResolver()
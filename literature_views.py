@@ -1,12 +1,17 @@
 # backend/literature_views.py
-from flask import Blueprint, request, jsonify, current_app
-from sqlalchemy import func, or_ as sqlalchemy_or  # Explicitly import or_
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from sqlalchemy import func, and_, or_ as sqlalchemy_or  # Explicitly import or_
 
 # 从同级目录的 models.py 导入 db 和相关模型
-from models import db, \
+from models import db, LibraryResolveJob, \
     LiteratureArticle  # Assuming User model is not directly used in these routes beyond user_id from token
 # 从同级目录的 utils.py 导入需要的辅助函数
-from utils import get_current_user_from_token, log_user_activity, find_key_for_model,find_pdf_link
+from utils import get_current_user_from_token, log_user_activity, find_key_for_model,find_pdf_link, find_pdf_links_by_titles
+from resolution_cache import resolution_cache, resolution_query_key
+from mirror_health import mirror_health
+from source_ranking import source_ranking, doi_registrant_prefix
+from deadline import Deadline
+from library_resolver import library_resolver, count_unresolved_articles, FOUND_STATUS, FAILED_STATUS, ACTIVE_JOB_STATUSES
 
 
 # 导入在 app2.py 中定义的 find_pdf_link 函数 (这是一个临时措施)
@@ -28,15 +33,199 @@ except ImportError:
             print("[LiteratureBP-Placeholder] find_pdf_link called without app context.")
         return None
 
+import base64  # 文献列表分页游标
 import json  # get_user_literature_list_bp 和 add_literature_entries_to_list_bp 中用到了
+try:
+    import orjson  # 可选：流式导出文献列表时更快的 JSON 编码器，未安装时使用标准库 json
+except ImportError:
+    orjson = None
 import re  # get_pdf_link_api_route_bp 中用到了
 from datetime import datetime, timezone  # update_literature_article_route_bp 中用到了
+from concurrent.futures import ThreadPoolExecutor, as_completed  # bulk_find_pdf_links_bp 中用到了
+from sqlalchemy.exc import SQLAlchemyError
 
 # 创建一个蓝图实例
 literature_bp = Blueprint('literature_bp', __name__, url_prefix='/api')
 
 
 # --- 文献列表获取 (GET /api/user/literature_list) ---
+# 不带参数时按 created_at 倒序返回完整列表 (旧前端的行为)。可选参数均在 SQL 中执行：
+#   排序: sort=created_at|updated_at|year|title, order=desc|asc (year/title 为空的行总排在最后)
+#   过滤: status (可重复或逗号分隔), year_min, year_max, has_pdf=true|false, doi_prefix
+#   分页: 传入 limit 或 cursor 时返回 {"items": [...], "next_cursor": ...}；按 (排序列, id) 键集翻页，
+#         next_cursor 原样传回即可取下一页，为 null 表示没有更多数据。
+#   流式: stream=true 时以与不带参数时相同的 JSON 数组格式返回全部匹配行，但逐行读取 (yield_per)、逐行编码、
+#         按块写出，导出数万条文献时内存占用不随行数增长。不能与 limit/cursor 同时使用。
+_LITERATURE_LIST_SORT_COLUMNS = {
+    'created_at': LiteratureArticle.created_at,
+    'updated_at': LiteratureArticle.updated_at,
+    'year': LiteratureArticle.year,
+    'title': LiteratureArticle.title,
+}
+_LITERATURE_LIST_NULLABLE_SORT_KEYS = {'year', 'title'}
+_LITERATURE_LIST_DATETIME_SORT_KEYS = {'created_at', 'updated_at'}
+
+
+def _serialize_literature_article(article_db, log_prefix):
+    unique_frontend_id = article_db.frontend_row_id if article_db.frontend_row_id else str(article_db.id)
+    article_dict = {
+        "id": article_db.id,  # 数据库主键
+        "db_id": article_db.id,  # 兼容旧前端可能使用的 db_id
+        "_id": unique_frontend_id,  # 前端表格可能使用的唯一行标识
+        "title": article_db.title,
+        "authors": article_db.authors,
+        "year": article_db.year,
+        "source": article_db.source_publication,  # 在模型中是 source_publication
+        "doi": article_db.doi,
+        "pdfLink": article_db.pdf_link,
+        "status": article_db.status,
+        "screenshots": []  # 截图通常是按需或单独加载，此处留空
+    }
+    if article_db.additional_data_json:
+        try:
+            additional_data = json.loads(article_db.additional_data_json)
+            if isinstance(additional_data, dict):
+                # 核心模型字段（已在上面明确映射的）不应被 additional_data 覆盖，这里仅添加不在 article_dict 中的键
+                for key, value in additional_data.items():
+                    if key not in article_dict:
+                        article_dict[key] = value
+        except json.JSONDecodeError:
+            current_app.logger.error(
+                f"{log_prefix} 解析文献 (DB ID: {article_db.id}) 的 additional_data_json 失败。")
+    return article_dict
+
+
+_STREAM_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))  # 复用实例，避免每行重新构造编码器
+
+
+def _encode_json_row(value):
+    """把一行编码为 UTF-8 JSON 字节串。优先使用 orjson；其无法编码的值 (如超过64位的整数) 回退到标准库。"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value)
+        except TypeError:  # orjson.JSONEncodeError 是 TypeError 的子类
+            pass
+    return _STREAM_JSON_ENCODER.encode(value).encode('utf-8')
+
+
+def _stream_literature_list(query, log_prefix):
+    """生成器：以 JSON 数组的形式逐行输出查询结果，攒满约 LITERATURE_LIST_STREAM_CHUNK_BYTES 后写出一块。"""
+    app = current_app._get_current_object()
+    yield_per = app.config.get('LITERATURE_LIST_STREAM_YIELD_PER', 500)
+    chunk_bytes = app.config.get('LITERATURE_LIST_STREAM_CHUNK_BYTES', 64 * 1024)
+    buffer, buffered_size, row_count = [b'['], 1, 0
+    try:
+        for article_db in query.yield_per(yield_per):
+            encoded_row = _encode_json_row(_serialize_literature_article(article_db, log_prefix))
+            if row_count:
+                buffer.append(b',')
+                buffered_size += 1
+            buffer.append(encoded_row)
+            buffered_size += len(encoded_row)
+            row_count += 1
+            if buffered_size >= chunk_bytes:
+                yield b''.join(buffer)
+                buffer, buffered_size = [], 0
+    except SQLAlchemyError as e_db:
+        # 响应头已发出，无法再返回错误状态码：记录日志后结束输出，客户端会收到不完整的 JSON
+        app.logger.error(f"{log_prefix} 流式输出文献列表时数据库出错 (已输出 {row_count} 条): {e_db}", exc_info=True)
+        db.session.rollback()
+        return
+    buffer.append(b']')
+    yield b''.join(buffer)
+    app.logger.info(f"{log_prefix} 流式输出了 {row_count} 条文献记录。")
+
+
+def _int_query_arg(name):
+    raw_value = request.args.get(name, '').strip()
+    if not raw_value:
+        return None
+    try:
+        return int(raw_value)
+    except ValueError:
+        raise ValueError(f"参数 {name} 必须是整数。")
+
+
+def _encode_literature_list_cursor(sort_key, order, value, article_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps({"s": sort_key, "o": order, "v": value, "i": article_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_literature_list_cursor(cursor, sort_key, order):
+    """返回 (排序列的值, id)；游标无效或与当前排序方式不一致时抛出 ValueError。"""
+    try:
+        padded_cursor = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded_cursor.encode('ascii')).decode('utf-8'))
+        cursor_sort_key, cursor_order = payload["s"], payload["o"]
+        value, article_id = payload["v"], int(payload["i"])
+        if value is not None and sort_key in _LITERATURE_LIST_DATETIME_SORT_KEYS:
+            value = datetime.fromisoformat(value)
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("cursor 无效。")
+    if cursor_sort_key != sort_key or cursor_order != order:
+        raise ValueError("cursor 与当前的 sort/order 参数不一致。")
+    return value, article_id
+
+
+def _literature_list_keyset_condition(sort_key, descending, value, article_id):
+    """(排序列, id) 位于游标之后的行。可为空的排序列中 NULL 排在最后。"""
+    column = _LITERATURE_LIST_SORT_COLUMNS[sort_key]
+    after_id = LiteratureArticle.id < article_id if descending else LiteratureArticle.id > article_id
+    if value is None:  # 游标已进入末尾的 NULL 段
+        return and_(column.is_(None), after_id)
+    after_value = column < value if descending else column > value
+    condition = sqlalchemy_or(after_value, and_(column == value, after_id))
+    if sort_key in _LITERATURE_LIST_NULLABLE_SORT_KEYS:
+        condition = sqlalchemy_or(condition, column.is_(None))
+    return condition
+
+
+def _build_literature_list_query(user_id):
+    """根据请求参数构造查询，返回 (query, sort_key, order)；参数无效时抛出 ValueError。"""
+    sort_key = (request.args.get('sort') or 'created_at').strip()
+    if sort_key not in _LITERATURE_LIST_SORT_COLUMNS:
+        raise ValueError(f"不支持的排序字段 '{sort_key}'，可选: {', '.join(_LITERATURE_LIST_SORT_COLUMNS)}。")
+    order = (request.args.get('order') or 'desc').strip().lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError("参数 order 只能是 asc 或 desc。")
+    descending = order == 'desc'
+
+    query = LiteratureArticle.query.filter(LiteratureArticle.user_id == user_id)
+
+    statuses = [status.strip() for raw in request.args.getlist('status') for status in raw.split(',') if status.strip()]
+    if statuses:
+        query = query.filter(LiteratureArticle.status.in_(statuses))
+    year_min, year_max = _int_query_arg('year_min'), _int_query_arg('year_max')
+    if year_min is not None:
+        query = query.filter(LiteratureArticle.year >= year_min)
+    if year_max is not None:
+        query = query.filter(LiteratureArticle.year <= year_max)
+    has_pdf = (request.args.get('has_pdf') or '').strip().lower()
+    if has_pdf in ('1', 'true', 'yes'):
+        query = query.filter(LiteratureArticle.pdf_link.isnot(None), LiteratureArticle.pdf_link != '')
+    elif has_pdf in ('0', 'false', 'no'):
+        query = query.filter(sqlalchemy_or(LiteratureArticle.pdf_link.is_(None), LiteratureArticle.pdf_link == ''))
+    elif has_pdf:
+        raise ValueError("参数 has_pdf 只能是 true 或 false。")
+    doi_prefix = (request.args.get('doi_prefix') or '').strip()
+    if doi_prefix:
+        escaped_prefix = doi_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.filter(LiteratureArticle.doi.like(f"{escaped_prefix}%", escape='\\'))
+
+    cursor = (request.args.get('cursor') or '').strip()
+    if cursor:
+        cursor_value, cursor_id = _decode_literature_list_cursor(cursor, sort_key, order)
+        query = query.filter(_literature_list_keyset_condition(sort_key, descending, cursor_value, cursor_id))
+
+    column = _LITERATURE_LIST_SORT_COLUMNS[sort_key]
+    order_by = [column.desc(), LiteratureArticle.id.desc()] if descending else [column.asc(), LiteratureArticle.id.asc()]
+    if sort_key in _LITERATURE_LIST_NULLABLE_SORT_KEYS:
+        order_by.insert(0, column.is_(None))  # 与数据库的 NULL 默认排序位置无关，统一排在最后
+    return query.order_by(*order_by), sort_key, order
+
+
 @literature_bp.route('/user/literature_list', methods=['GET'])
 def get_user_literature_list_bp():
     current_user_info = get_current_user_from_token()
@@ -45,44 +234,47 @@ def get_user_literature_list_bp():
     user_id = current_user_info['user_id']
     log_prefix = f"[LiteratureBP][User:{user_id}]"  # 为日志添加前缀
 
+    paginated = 'limit' in request.args or 'cursor' in request.args
+    streamed = (request.args.get('stream') or '').strip().lower() in ('1', 'true', 'yes')
+    if streamed and paginated:
+        return jsonify({"success": False, "message": "stream 不能与 limit/cursor 同时使用。"}), 400
     try:
-        user_articles_db = LiteratureArticle.query.filter_by(user_id=user_id).order_by(
-            LiteratureArticle.created_at.desc()).all()
-        frontend_table_data = []
-        for article_db in user_articles_db:
-            unique_frontend_id = article_db.frontend_row_id if article_db.frontend_row_id else str(article_db.id)
-            article_dict = {
-                "id": article_db.id,  # 数据库主键
-                "db_id": article_db.id,  # 兼容旧前端可能使用的 db_id
-                "_id": unique_frontend_id,  # 前端表格可能使用的唯一行标识
-                "title": article_db.title,
-                "authors": article_db.authors,
-                "year": article_db.year,
-                "source": article_db.source_publication,  # 在模型中是 source_publication
-                "doi": article_db.doi,
-                "pdfLink": article_db.pdf_link,
-                "status": article_db.status,
-                "screenshots": []  # 截图通常是按需或单独加载，此处留空
-            }
-            if article_db.additional_data_json:
-                try:
-                    additional_data = json.loads(article_db.additional_data_json)
-                    if isinstance(additional_data, dict):
-                        column_mapping_config = current_app.config.get('APP_BACKEND_COLUMN_MAPPING', {})
-                        # 构建排除列表时应更严谨，避免误排除
-                        # 核心模型字段（已在上面明确映射的）通常不应被 additional_data 覆盖
-                        # 这里简化为仅添加不在 article_dict 中的键
-                        for key, value in additional_data.items():
-                            if key not in article_dict:  # 简单检查，避免覆盖核心字段
-                                article_dict[key] = value
-                except json.JSONDecodeError:
-                    current_app.logger.error(  # 使用 current_app.logger
-                        f"{log_prefix} 解析文献 (DB ID: {article_db.id}) 的 additional_data_json 失败。")
-            frontend_table_data.append(article_dict)
+        query, sort_key, order = _build_literature_list_query(user_id)
+        limit = None
+        if paginated:
+            limit = _int_query_arg('limit') or current_app.config.get('LITERATURE_LIST_DEFAULT_PAGE_SIZE', 100)
+            if limit < 1:
+                raise ValueError("参数 limit 必须大于 0。")
+            limit = min(limit, current_app.config.get('LITERATURE_LIST_MAX_PAGE_SIZE', 500))
+    except ValueError as e_param:
+        return jsonify({"success": False, "message": str(e_param)}), 400
+
+    if streamed:
+        headers = {
+            "Content-Type": "application/json; charset=utf-8",
+            "Cache-Control": "no-cache",
+        }
+        return Response(stream_with_context(_stream_literature_list(query, log_prefix)), headers=headers)
 
+    try:
+        if not paginated:
+            frontend_table_data = [_serialize_literature_article(article_db, log_prefix) for article_db in query.all()]
+            current_app.logger.info(
+                f"{log_prefix} 成功获取了 {len(frontend_table_data)} 条文献记录。")  # 使用 current_app.logger
+            return jsonify(frontend_table_data), 200
+
+        page_articles = query.limit(limit + 1).all()  # 多取一条用于判断是否还有下一页
+        next_cursor = None
+        if len(page_articles) > limit:
+            page_articles = page_articles[:limit]
+            last_article = page_articles[-1]
+            next_cursor = _encode_literature_list_cursor(
+                sort_key, order, getattr(last_article, _LITERATURE_LIST_SORT_COLUMNS[sort_key].key), last_article.id)
+        items = [_serialize_literature_article(article_db, log_prefix) for article_db in page_articles]
         current_app.logger.info(
-            f"{log_prefix} 成功获取了 {len(frontend_table_data)} 条文献记录。")  # 使用 current_app.logger
-        return jsonify(frontend_table_data), 200
+            f"{log_prefix} 分页获取了 {len(items)} 条文献记录 (sort={sort_key} {order}, 还有下一页: {next_cursor is not None})。")
+        return jsonify({"success": True, "items": items, "next_cursor": next_cursor, "limit": limit,
+                        "sort": sort_key, "order": order}), 200
     except Exception as e:
         current_app.logger.error(f"{log_prefix} 获取文献列表时发生严重错误: {e}",
                                  exc_info=True)  # 使用 current_app.logger
@@ -413,9 +605,24 @@ def get_pdf_link_api_route_bp():
         current_app.logger.warning(f"{log_prefix} /find-pdf 请求中的DOI格式无效: {doi}")  # 使用 current_app.logger
         return jsonify({"success": False, "message": "提供的DOI格式无效。"}), 400  # 返回 success: False
 
+    # 可选的 sla_ms：最多等待的毫秒数，到时返回已完成来源中最好的结果 (不超过 PDF_RESOLVE_DEADLINE_SECONDS)
+    max_budget_seconds = float(current_app.config.get('PDF_RESOLVE_DEADLINE_SECONDS', 30))
+    sla_ms = request.args.get('sla_ms')
+    if sla_ms:
+        try:
+            budget_seconds = int(sla_ms) / 1000.0
+        except ValueError:
+            return jsonify({"success": False, "message": "sla_ms 必须是整数 (毫秒)。"}), 400
+        if budget_seconds <= 0:
+            return jsonify({"success": False, "message": "sla_ms 必须大于 0。"}), 400
+        budget_seconds = min(budget_seconds, max_budget_seconds)
+    else:
+        budget_seconds = max_budget_seconds
+    deadline = Deadline(budget_seconds)
+
     # 调用 find_pdf_link 函数 (假设已正确导入或定义)
     # find_pdf_link 函数内部应使用 current_app.logger 和 current_app.config
-    pdf_link_found = find_pdf_link(doi=doi, title=title)
+    pdf_link_found = find_pdf_link(doi=doi, title=title, deadline=deadline)
 
     if pdf_link_found:
         current_app.logger.info(
@@ -424,7 +631,269 @@ def get_pdf_link_api_route_bp():
     else:
         current_app.logger.info(
             f"{log_prefix} /find-pdf 未能找到链接 (查询DOI: '{doi}', 标题: '{title}')")  # 使用 current_app.logger
+        if deadline.expired():
+            return jsonify({"success": False, "pdfLink": None, "timedOut": True,
+                            "message": f"未能在 {deadline.budget_seconds:.1f} 秒内找到PDF链接。"}), 404
         return jsonify({"success": False, "pdfLink": None, "message": "未能找到PDF链接。"}), 404
 
 
 
+# --- 批量查找PDF链接 (POST /api/find-pdf/bulk) ---
+@literature_bp.route('/find-pdf/bulk', methods=['POST'])
+def bulk_find_pdf_links_bp():
+    """
+    请求体: {"items": [{"doi": ..., "title": ..., "id": 前端行ID(可选), "article_id": 文献DB ID(可选)}, ...],
+             "write_back": false}
+    以有限并发 (PDF_BULK_RESOLVE_CONCURRENCY) 解析，每完成一条即输出一行 JSON (application/x-ndjson)：
+      {"type": "result", "index": 请求中的下标, "id": ..., "doi": ..., "title": ..., "success": bool, "pdfLink": ...}
+    最后一行为 {"type": "summary", "total": ..., "found": ..., "not_found": ..., "invalid": ..., "updated": ...}。
+    DOI/标题相同的条目只解析一次；只有标题的条目 (唯一来源是 arXiv) 每 ARXIV_BATCH_TITLES_PER_QUERY 个合并为一次批量查询。
+    write_back 为 true 时（需登录），把结果按批提交回当前用户对应 article_id 的
+    literature_articles 行 (pdf_link / status)。
+    """
+    log_prefix = "[LiteratureBP][BulkFindPdf]"
+    payload = request.get_json(silent=True) or {}
+    items = payload.get('items') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "message": "请求体应包含非空的 items 列表。"}), 400
+    max_items = int(current_app.config.get('PDF_BULK_RESOLVE_MAX_ITEMS', 2000))
+    if len(items) > max_items:
+        return jsonify({"success": False, "message": f"单次最多批量查找 {max_items} 条，当前 {len(items)} 条。"}), 413
+
+    write_back = bool(payload.get('write_back'))
+    user_id = None
+    if write_back:
+        current_user_info = get_current_user_from_token()
+        if not current_user_info:
+            return jsonify({"success": False, "message": "write_back 需要登录：认证失败或Token无效。"}), 401
+        user_id = current_user_info['user_id']
+        log_prefix = f"[LiteratureBP][BulkFindPdf][User:{user_id}]"
+
+    # 按解析 key 分组，相同 DOI/标题只解析一次
+    groups = {}  # query_key -> (doi, title, [下标, ...])
+    invalid_indexes = []
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        doi = (str(item.get('doi')).strip() or None) if item.get('doi') else None
+        if doi and not re.match(r"10\.\d{4,9}/[-._;()/:A-Z0-9]+$", doi, re.IGNORECASE):
+            doi = None
+        title = (str(item.get('title')).strip() or None) if item.get('title') else None
+        query_key = resolution_query_key(doi, title)
+        if query_key is None:
+            invalid_indexes.append(index)
+        else:
+            groups.setdefault(query_key, (doi, title, []))[2].append(index)
+
+    app = current_app._get_current_object()
+    concurrency = max(1, int(app.config.get('PDF_BULK_RESOLVE_CONCURRENCY', 8)))
+    commit_batch_size = max(1, int(app.config.get('PDF_BULK_RESOLVE_COMMIT_BATCH', 50)))
+    current_app.logger.info(
+        f"{log_prefix} 收到 {len(items)} 条批量查找请求 (去重后 {len(groups)} 条，无效 {len(invalid_indexes)} 条)，并发 {concurrency}。")
+
+    def _resolve(doi, title):
+        with app.app_context():
+            return find_pdf_link(doi=doi, title=title, background=True)  # 不占用交互式查询的线程池
+
+    def _resolve_titles(titles):
+        with app.app_context():
+            return find_pdf_links_by_titles(titles)
+
+    # 有DOI的条目逐条解析；只有标题的条目按块批量解析，每块的结果为 {标题: pdf_link}
+    single_groups = [group for group in groups.values() if group[0]]
+    title_only_groups = [group for group in groups.values() if not group[0]]
+    titles_per_chunk = max(1, int(app.config.get('ARXIV_BATCH_TITLES_PER_QUERY', 10)))
+
+    def _result_line(index, pdf_link):
+        item = items[index] if isinstance(items[index], dict) else {}
+        return json.dumps({"type": "result", "index": index, "id": item.get('id'), "doi": item.get('doi'),
+                           "title": item.get('title'), "success": bool(pdf_link), "pdfLink": pdf_link},
+                          ensure_ascii=False) + "\n"
+
+    def generate_lines():
+        counts = {"found": 0, "not_found": 0, "updated": 0}
+        pending_updates = []  # (article_id, pdf_link)
+
+        def _flush_updates():
+            if not pending_updates:
+                return
+            article_ids = [article_id for article_id, _ in pending_updates]
+            try:
+                articles_by_id = {article.id: article for article in LiteratureArticle.query.filter(
+                    LiteratureArticle.user_id == user_id, LiteratureArticle.id.in_(article_ids)).all()}
+                for article_id, pdf_link in pending_updates:
+                    article = articles_by_id.get(article_id)
+                    if article is None:
+                        continue
+                    if pdf_link:
+                        article.pdf_link = pdf_link
+                        article.status = FOUND_STATUS
+                    elif not article.pdf_link:
+                        article.status = FAILED_STATUS
+                    counts["updated"] += 1
+                db.session.commit()
+            except SQLAlchemyError as e_db:
+                db.session.rollback()
+                app.logger.error(f"{log_prefix} 批量写回 {len(pending_updates)} 条文献失败: {e_db}", exc_info=True)
+            pending_updates.clear()
+
+        for index in invalid_indexes:
+            yield json.dumps({"type": "result", "index": index, "success": False, "pdfLink": None,
+                              "message": "缺少有效的DOI或标题。"}, ensure_ascii=False) + "\n"
+
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bulk-find-pdf")
+        try:
+            futures = {executor.submit(_resolve, doi, title): {title: indexes} for doi, title, indexes in single_groups}
+            for chunk_start in range(0, len(title_only_groups), titles_per_chunk):
+                chunk = title_only_groups[chunk_start:chunk_start + titles_per_chunk]
+                futures[executor.submit(_resolve_titles, [title for _, title, _ in chunk])] = \
+                    {title: indexes for _, title, indexes in chunk}
+            for future in as_completed(futures):
+                indexes_by_title = futures[future]
+                try:
+                    result = future.result()
+                    links_by_title = result if isinstance(result, dict) else {title: result for title in indexes_by_title}
+                except Exception as e:
+                    app.logger.error(f"{log_prefix} 解析条目失败: {e}", exc_info=True)
+                    links_by_title = {}
+                for title, indexes in indexes_by_title.items():
+                    pdf_link = links_by_title.get(title)
+                    for index in indexes:
+                        counts["found" if pdf_link else "not_found"] += 1
+                        article_id = items[index].get('article_id') if isinstance(items[index], dict) else None
+                        if write_back and isinstance(article_id, int):
+                            pending_updates.append((article_id, pdf_link))
+                        yield _result_line(index, pdf_link)
+                if len(pending_updates) >= commit_batch_size:
+                    _flush_updates()
+            if write_back:
+                _flush_updates()
+        finally:
+            # 客户端提前断开时生成器被关闭，取消尚未开始的解析
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        app.logger.info(f"{log_prefix} 批量查找完成: 找到 {counts['found']}，未找到 {counts['not_found']}，写回 {counts['updated']}。")
+        yield json.dumps({"type": "summary", "total": len(items), "found": counts["found"],
+                          "not_found": counts["not_found"], "invalid": len(invalid_indexes),
+                          "updated": counts["updated"]}, ensure_ascii=False) + "\n"
+
+    headers = {
+        "Content-Type": "application/x-ndjson; charset=utf-8",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # 禁止反向代理缓冲，逐行推送给前端
+    }
+    return Response(stream_with_context(generate_lines()), headers=headers)
+
+
+# --- 文献库后台自动查找PDF链接 (/api/user/literature_list/auto_resolve) ---
+def _latest_library_resolve_job(user_id):
+    return LibraryResolveJob.query.filter_by(user_id=user_id).order_by(LibraryResolveJob.id.desc()).first()
+
+
+@literature_bp.route('/user/literature_list/auto_resolve', methods=['GET'])
+def get_library_auto_resolve_status_bp():
+    current_user_info = get_current_user_from_token()
+    if not current_user_info:
+        return jsonify({"success": False, "message": "认证失败或Token无效。"}), 401
+    user_id = current_user_info['user_id']
+    try:
+        job = _latest_library_resolve_job(user_id)
+        return jsonify({"success": True, "job": job.to_dict() if job else None,
+                        "unresolved_count": count_unresolved_articles(user_id)}), 200
+    except SQLAlchemyError as e_db:
+        current_app.logger.error(f"[LiteratureBP][User:{user_id}] 查询自动查找任务失败: {e_db}", exc_info=True)
+        return jsonify({"success": False, "message": "服务器繁忙，请稍后再试。"}), 503
+
+
+@literature_bp.route('/user/literature_list/auto_resolve', methods=['POST'])
+def start_library_auto_resolve_bp():
+    """启动文献库自动查找；已暂停的任务从游标处继续，已有进行中的任务时直接返回该任务。"""
+    current_user_info = get_current_user_from_token()
+    if not current_user_info:
+        return jsonify({"success": False, "message": "认证失败或Token无效。"}), 401
+    user_id = current_user_info['user_id']
+    log_prefix = f"[LiteratureBP][User:{user_id}]"
+    now = datetime.now(timezone.utc)
+    try:
+        job = _latest_library_resolve_job(user_id)
+        if job is not None and job.status in ACTIVE_JOB_STATUSES:
+            return jsonify({"success": True, "message": "自动查找任务已在进行中。", "job": job.to_dict()}), 200
+        if job is not None and job.status == "PAUSED":
+            job.status = "QUEUED"
+            job.updated_at = now
+            message = "自动查找任务已恢复，将从上次的位置继续。"
+        else:
+            unresolved_count = count_unresolved_articles(user_id)
+            if unresolved_count == 0:
+                return jsonify({"success": True, "message": "没有需要查找PDF链接的文献。", "job": None}), 200
+            job = LibraryResolveJob(user_id=user_id, status="QUEUED", total_candidates=unresolved_count)
+            db.session.add(job)
+            message = f"已开始在后台为 {unresolved_count} 篇文献查找PDF链接。"
+        db.session.commit()
+    except SQLAlchemyError as e_db:
+        db.session.rollback()
+        current_app.logger.error(f"{log_prefix} 启动自动查找任务失败: {e_db}", exc_info=True)
+        return jsonify({"success": False, "message": "服务器繁忙，请稍后再试。"}), 503
+
+    library_resolver.submit(job.id)
+    current_app.logger.info(f"{log_prefix} 文献库自动查找任务 {job.id} 已排队 (游标: {job.cursor_article_id})。")
+    log_user_activity(user_id, "library_auto_resolve_started", message)
+    return jsonify({"success": True, "message": message, "job": job.to_dict()}), 202
+
+
+@literature_bp.route('/user/literature_list/auto_resolve/<action>', methods=['POST'])
+def control_library_auto_resolve_bp(action):
+    """action 为 pause (保留游标，可再次 POST auto_resolve 继续) 或 cancel。工作线程在当前批次结束后停止。"""
+    current_user_info = get_current_user_from_token()
+    if not current_user_info:
+        return jsonify({"success": False, "message": "认证失败或Token无效。"}), 401
+    user_id = current_user_info['user_id']
+    if action not in ("pause", "cancel"):
+        return jsonify({"success": False, "message": f"不支持的操作 '{action}'。"}), 404
+    now = datetime.now(timezone.utc)
+    allowed_from = ACTIVE_JOB_STATUSES if action == "pause" else ACTIVE_JOB_STATUSES + ("PAUSED",)
+    new_status = "PAUSED" if action == "pause" else "CANCELLED"
+    try:
+        job = _latest_library_resolve_job(user_id)
+        if job is None or job.status not in allowed_from:
+            return jsonify({"success": False, "message": "没有可以暂停或取消的自动查找任务。"}), 409
+        # 条件更新：与工作线程的状态变更并发时以数据库为准
+        updated_rows = LibraryResolveJob.query.filter(
+            LibraryResolveJob.id == job.id, LibraryResolveJob.status.in_(allowed_from)
+        ).update({"status": new_status, "updated_at": now,
+                  "finished_at": now if new_status == "CANCELLED" else None}, synchronize_session=False)
+        db.session.commit()
+        if updated_rows != 1:
+            return jsonify({"success": False, "message": "任务状态已变化，请刷新后重试。"}), 409
+        db.session.refresh(job)
+    except SQLAlchemyError as e_db:
+        db.session.rollback()
+        current_app.logger.error(f"[LiteratureBP][User:{user_id}] {action} 自动查找任务失败: {e_db}", exc_info=True)
+        return jsonify({"success": False, "message": "服务器繁忙，请稍后再试。"}), 503
+    message = "自动查找任务已暂停。" if action == "pause" else "自动查找任务已取消。"
+    return jsonify({"success": True, "message": message, "job": job.to_dict()}), 200
+
+# --- PDF链接解析缓存统计 (GET /api/find-pdf/cache-stats) ---
+@literature_bp.route('/find-pdf/cache-stats', methods=['GET'])
+def get_pdf_resolution_cache_stats_bp():
+    # 计数器为本进程自启动以来的累计值
+    return jsonify({"success": True, "stats": resolution_cache.stats()}), 200
+
+
+# --- Sci-Hub 镜像健康状况 (GET /api/find-pdf/mirror-health) ---
+@literature_bp.route('/find-pdf/mirror-health', methods=['GET'])
+def get_mirror_health_bp():
+    domains = current_app.config.get('SCI_HUB_DOMAINS', [])
+    return jsonify({"success": True, "order": mirror_health.ordered_domains(domains),
+                    "mirrors": mirror_health.snapshot()}), 200
+
+
+# --- 按 DOI 前缀的来源排序统计 (GET /api/find-pdf/source-ranking[?doi=...]) ---
+@literature_bp.route('/find-pdf/source-ranking', methods=['GET'])
+def get_source_ranking_bp():
+    doi = request.args.get('doi', '').strip()
+    if not doi:
+        return jsonify({"success": True, "prefixes": source_ranking.snapshot()}), 200
+    prefix = doi_registrant_prefix(doi)
+    order, _ = source_ranking.ordered_sources(doi, ["Sci-Hub", "Unpaywall", "arXiv"], explore=False)
+    return jsonify({"success": True, "prefix": prefix, "order": order,
+                    "sources": source_ranking.snapshot(prefix).get(prefix, {})}), 200
@@ -1,5 +1,7 @@
 # backend/main_views.py
 from flask import Blueprint, jsonify # jsonify 可能不需要，取决于 health_check 的返回
+from http_client import http_client
+from utils import get_current_user_from_token
 
 # 创建一个蓝图实例
 # 'main_bp' 是蓝图的名称。
@@ -14,4 +16,13 @@ def health_check_bp(): # 重命名函数以示区分
     return jsonify({
         "status": "running",
         "message": "Backend is running! LitFinder vNext (with User Auth Setup and Blueprints)"
-    }), 200
\ No newline at end of file
+    }), 200
+
+
+@main_bp.route('/api/outbound_http_stats')
+def outbound_http_stats_bp():
+    # 出站HTTP客户端各服务的连接池与限速指标 (本进程自启动以来的累计值)
+    current_user_info = get_current_user_from_token()
+    if not current_user_info:
+        return jsonify({"success": False, "message": "认证失败或Token无效。"}), 401
+    return jsonify({"success": True, "services": http_client.stats()}), 200
@@ -0,0 +1,143 @@
+# backend/mirror_health.py
+import threading
+import time
+from collections import deque
+
+
+# === Sci-Hub 镜像健康跟踪与熔断 ===
+# 每个镜像 (SCI_HUB_DOMAINS 中的一项) 记录最近 MIRROR_HEALTH_WINDOW 次请求的耗时与成败：
+#   CLOSED    正常放行；连续失败达到 MIRROR_CIRCUIT_FAILURE_THRESHOLD 次后熔断 (OPEN)
+#   OPEN      直接跳过，不发出请求；熔断 MIRROR_CIRCUIT_OPEN_SECONDS 秒后进入 HALF_OPEN
+#   HALF_OPEN 只放行一个探测请求：成功则恢复 CLOSED，失败则重新 OPEN；探测未得出结果时 release_probe 释放名额
+# 镜像的尝试顺序按最近请求耗时的中位数 (p50) 排列，尚无数据的镜像排在最前以便尽快获得测量值。
+# 连接失败、超时和 5xx 计为失败；4xx (如 DOI 不存在) 说明镜像可用，计为成功。
+
+CIRCUIT_CLOSED = "CLOSED"
+CIRCUIT_OPEN = "OPEN"
+CIRCUIT_HALF_OPEN = "HALF_OPEN"
+
+
+class _MirrorState:
+    def __init__(self, window_size):
+        self.latencies = deque(maxlen=window_size)  # 成功请求的耗时 (秒)
+        self.outcomes = deque(maxlen=window_size)  # True 表示成功
+        self.consecutive_failures = 0
+        self.circuit = CIRCUIT_CLOSED
+        self.opened_at = None
+        self.probe_in_flight = False
+
+    def p50_latency(self):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[len(ordered) // 2]
+
+    def error_rate(self):
+        if not self.outcomes:
+            return None
+        return sum(1 for outcome in self.outcomes if not outcome) / len(self.outcomes)
+
+
+class MirrorHealthTracker:
+    """
+    镜像健康跟踪器。用法与其他扩展一致：模块级实例化，在 create_app 中调用 init_app(app)。
+    所有方法线程安全，可在解析线程池中直接调用。
+    """
+
+    def __init__(self, app=None):
+        self.window_size = 50
+        self.failure_threshold = 3
+        self.open_seconds = 300
+        self._states = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.window_size = int(app.config.get('MIRROR_HEALTH_WINDOW', self.window_size))
+        self.failure_threshold = max(1, int(app.config.get('MIRROR_CIRCUIT_FAILURE_THRESHOLD', self.failure_threshold)))
+        self.open_seconds = int(app.config.get('MIRROR_CIRCUIT_OPEN_SECONDS', self.open_seconds))
+        app.extensions['mirror_health'] = self
+
+    def _state_locked(self, domain):
+        state = self._states.get(domain)
+        if state is None:
+            state = self._states[domain] = _MirrorState(self.window_size)
+        return state
+
+    def allow_request(self, domain):
+        """是否可以向该镜像发请求。熔断冷却结束时放行一个半开探测请求（调用方之后必须 record_result 或 release_probe）。"""
+        with self._lock:
+            state = self._state_locked(domain)
+            if state.circuit == CIRCUIT_CLOSED:
+                return True
+            if state.circuit == CIRCUIT_OPEN and time.monotonic() - state.opened_at >= self.open_seconds:
+                state.circuit = CIRCUIT_HALF_OPEN
+                state.probe_in_flight = False
+            if state.circuit == CIRCUIT_HALF_OPEN and not state.probe_in_flight:
+                state.probe_in_flight = True
+                return True
+            return False
+
+    def release_probe(self, domain):
+        """
+        allow_request 放行后请求未得出结果 (本地限速、时间预算用完等不说明镜像好坏的情况) 时调用：
+        释放半开探测名额，否则该镜像会一直停在 HALF_OPEN 且不再放行任何请求。CLOSED 状态下不做任何事。
+        """
+        with self._lock:
+            state = self._states.get(domain)
+            if state is not None and state.circuit == CIRCUIT_HALF_OPEN:
+                state.probe_in_flight = False
+
+    def record_result(self, domain, latency_seconds, success):
+        """返回熔断状态是否发生了变化 (便于调用方记录日志)。"""
+        with self._lock:
+            state = self._state_locked(domain)
+            previous_circuit = state.circuit
+            state.outcomes.append(success)
+            if success:
+                state.latencies.append(latency_seconds)
+                state.consecutive_failures = 0
+                state.circuit = CIRCUIT_CLOSED
+                state.opened_at = None
+            else:
+                state.consecutive_failures += 1
+                if state.circuit == CIRCUIT_HALF_OPEN or state.consecutive_failures >= self.failure_threshold:
+                    state.circuit = CIRCUIT_OPEN
+                    state.opened_at = time.monotonic()
+            state.probe_in_flight = False
+            return state.circuit != previous_circuit
+
+    def ordered_domains(self, domains):
+        """按 p50 耗时升序排列镜像（无数据的在前，相同时保持配置顺序）；处于熔断中的镜像排在最后。"""
+        with self._lock:
+            def _sort_key(indexed_domain):
+                index, domain = indexed_domain
+                state = self._states.get(domain)
+                if state is None:
+                    return (0, 0.0, index)
+                p50 = state.p50_latency()
+                return (1 if state.circuit == CIRCUIT_OPEN else 0, p50 if p50 is not None else 0.0, index)
+            return [domain for _, domain in sorted(enumerate(domains), key=_sort_key)]
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            result = {}
+            for domain, state in self._states.items():
+                p50 = state.p50_latency()
+                error_rate = state.error_rate()
+                result[domain] = {
+                    "circuit": state.circuit,
+                    "p50_latency_ms": round(p50 * 1000) if p50 is not None else None,
+                    "error_rate": round(error_rate, 4) if error_rate is not None else None,
+                    "samples": len(state.outcomes),
+                    "consecutive_failures": state.consecutive_failures,
+                    "open_remaining_seconds": max(0, round(self.open_seconds - (now - state.opened_at)))
+                    if state.circuit == CIRCUIT_OPEN else None,
+                }
+            return result
+
+
+# 模块级实例，在 create_app 中 mirror_health.init_app(app)
+mirror_health = MirrorHealthTracker()
@@ -48,6 +48,16 @@ class User(db.Model):
 
 class LiteratureArticle(db.Model):
     __tablename__ = 'literature_articles'
+    # GET /api/user/literature_list 的键集分页：每种排序方式对应一个 (user_id, 排序列, id) 复合索引，
+    # 翻页条件 (排序列, id) > (游标值, 游标id) 与 ORDER BY 都可以直接沿索引扫描
+    __table_args__ = (
+        db.Index('ix_literature_articles_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_literature_articles_user_updated', 'user_id', 'updated_at', 'id'),
+        db.Index('ix_literature_articles_user_year', 'user_id', 'year', 'id'),
+        db.Index('ix_literature_articles_user_title', 'user_id', 'title', 'id'),
+        db.Index('ix_literature_articles_user_status_created', 'user_id', 'status', 'created_at', 'id'),
+        db.Index('ix_literature_articles_user_doi', 'user_id', 'doi'),  # doi_prefix 过滤 (LIKE '前缀%')
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False,
                         index=True)  # 用户删除时，其文献也应删除
@@ -203,4 +213,189 @@ class UserActivityLog(db.Model):
             "timestamp_iso": self.timestamp.isoformat() + "Z" if self.timestamp else None,
             "related_article_db_id": self.related_article_db_id,
             "icon_class": icon_class
-        }
\ No newline at end of file
+        }
+
+class BatchTask(db.Model):
+    """
+    批量ZIP任务记录（取代 download_records.json）。
+    task_id 为基于文章内容生成的标识 (utils.generate_task_id)，同一批文章对应同一条记录。
+    状态更新均为单行 UPDATE；工作线程领取任务时用带状态条件的 UPDATE 做比较并交换，无需全局锁。
+    """
+    __tablename__ = 'batch_tasks'
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    job_id = db.Column(db.String(36), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True, index=True)
+
+    # SUBMITTED / PROCESSING / COMPLETED / STREAMABLE / EVICTED / FAILED / FAILED_ZIP_CREATION / FAILED_NO_DOWNLOADS
+    status = db.Column(db.String(32), nullable=False, index=True)
+    zip_filename = db.Column(db.String(255), nullable=True, index=True)
+    zip_size_bytes = db.Column(db.BigInteger, nullable=False, default=0, server_default=sa_text('0'))
+    # 最近一次下载ZIP的时间（生成时即初始化），ZIP保留策略按此做LRU淘汰
+    last_downloaded_at = db.Column(db.DateTime, nullable=True, index=True)
+    message = db.Column(db.Text, nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+
+    num_requested = db.Column(db.Integer, nullable=False, default=0, server_default=sa_text('0'))
+    num_success = db.Column(db.Integer, nullable=False, default=0, server_default=sa_text('0'))
+    articles_json = db.Column(db.Text, nullable=True)  # 任务的文章列表 (JSON字符串)，工作线程据此执行任务
+    failed_items_json = db.Column(db.Text, nullable=True)  # 失败条目列表 (JSON字符串)
+
+    # 后台执行器的领取信息
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default=sa_text('0'))
+    worker_id = db.Column(db.String(128), nullable=True)  # "主机名:进程ID:启动标识:线程序号"
+    processing_started_at = db.Column(db.DateTime, nullable=True)
+
+    # 时间戳
+    submitted_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc), index=True)
+    processed_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
+
+    # 任务ZIP中每篇文章的条目 (一对多)，供后续有重叠的批量复用
+    artifacts = db.relationship('BatchTaskArtifact', backref='batch_task', lazy='dynamic',
+                                cascade="all, delete-orphan")
+    # 提交过该批文章的所有用户 (一对多)。同一批文章共用一个 task_id，user_id 只记录首个提交者，
+    # 查询进度/状态时按此判断访问权限
+    submitters = db.relationship('BatchTaskSubmitter', backref='batch_task', lazy='dynamic',
+                                 cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f'<BatchTask {self.task_id} ({self.status})>'
+
+    def add_submitter(self, user_id):
+        """登记一个提交者（已登记则忽略）。未认证的提交 (user_id 为 None) 不登记。调用方负责 commit。"""
+        if user_id is None:
+            return
+        if self.user_id is None:
+            self.user_id = user_id
+        if self.id is not None and self.submitters.filter_by(user_id=user_id).first() is not None:
+            return
+        self.submitters.append(BatchTaskSubmitter(user_id=user_id))
+
+    def is_accessible_by(self, user_id):
+        """任务未记录任何提交者时对所有用户可见；否则仅首个提交者及后续提交过同一批文章的用户可见。"""
+        if self.user_id is None and self.submitters.first() is None:
+            return True
+        if user_id is None:
+            return False
+        return self.user_id == user_id or self.submitters.filter_by(user_id=user_id).first() is not None
+
+    @property
+    def articles(self):
+        try:
+            return json.loads(self.articles_json) if self.articles_json else []
+        except json.JSONDecodeError:
+            return []
+
+    @articles.setter
+    def articles(self, value):
+        self.articles_json = json.dumps(value, ensure_ascii=False) if value else None
+
+    @property
+    def failed_items(self):
+        try:
+            return json.loads(self.failed_items_json) if self.failed_items_json else []
+        except json.JSONDecodeError:
+            return []
+
+    @failed_items.setter
+    def failed_items(self, value):
+        self.failed_items_json = json.dumps(value, ensure_ascii=False) if value else None
+
+
+class BatchTaskSubmitter(db.Model):
+    """批量任务的提交者。相同文章集合的重复提交共享同一任务，每个提交者各占一行。"""
+    __tablename__ = 'batch_task_submitters'
+    __table_args__ = (
+        db.UniqueConstraint('batch_task_id', 'user_id', name='uq_batch_task_submitters_task_user'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    batch_task_id = db.Column(db.Integer, db.ForeignKey('batch_tasks.id', ondelete='CASCADE'), nullable=False,
+                              index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    submitted_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<BatchTaskSubmitter User {self.user_id} of BatchTask {self.batch_task_id}>'
+
+
+class BatchTaskArtifact(db.Model):
+    """
+    已完成任务ZIP中的单篇文章条目。一篇文章的每个存储 key (规范化的DOI / pdfLink，见 pdf_store.article_store_keys)
+    各对应一行，新批量中同一文章可直接从该ZIP条目复制，而无需重新下载。
+    """
+    __tablename__ = 'batch_task_artifacts'
+    id = db.Column(db.Integer, primary_key=True)
+    batch_task_id = db.Column(db.Integer, db.ForeignKey('batch_tasks.id', ondelete='CASCADE'), nullable=False,
+                              index=True)
+    article_key_hash = db.Column(db.String(40), nullable=False, index=True)  # pdf_store.key_digest(key)
+    zip_entry_name = db.Column(db.String(255), nullable=False)
+    size_bytes = db.Column(db.BigInteger, nullable=False, default=0, server_default=sa_text('0'))
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<BatchTaskArtifact {self.zip_entry_name} of BatchTask {self.batch_task_id}>'
+
+
+class PdfResolution(db.Model):
+    """
+    PDF链接解析结果缓存 (DOI/标题 -> pdfLink)，由 resolution_cache 读写。
+    pdf_link 为空表示上次解析未找到（负缓存）；命中与未命中分别按各自的 TTL 计算 expires_at。
+    """
+    __tablename__ = 'pdf_resolutions'
+    id = db.Column(db.Integer, primary_key=True)
+    query_key_hash = db.Column(db.String(40), unique=True, nullable=False, index=True)  # pdf_store.key_digest(query_key)
+    query_key = db.Column(db.Text, nullable=False)  # "doi:<规范化DOI>" 或 "title:<规范化标题>"
+    pdf_link = db.Column(db.Text, nullable=True)
+    source = db.Column(db.String(128), nullable=True)  # 给出结果的策略，如 "Sci-Hub:sci-hub.se" / "Unpaywall" / "arXiv"
+    resolved_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<PdfResolution {self.query_key} -> {self.pdf_link or "MISS"}>'
+
+
+class LibraryResolveJob(db.Model):
+    """
+    用户文献库的后台自动查找PDF链接任务 (见 library_resolver.py)。
+    按 literature_articles.id 升序分批处理 pdf_link 为空的文献，cursor_article_id 为已处理到的最大ID，
+    暂停或进程重启后从游标处继续。
+    """
+    __tablename__ = 'library_resolve_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+
+    # QUEUED / RUNNING / PAUSED / CANCELLED / COMPLETED / FAILED
+    status = db.Column(db.String(32), nullable=False, index=True)
+    cursor_article_id = db.Column(db.Integer, nullable=False, default=0, server_default=sa_text('0'))
+    total_candidates = db.Column(db.Integer, nullable=False, default=0, server_default=sa_text('0'))  # 创建时待查找的文献数
+    num_processed = db.Column(db.Integer, nullable=False, default=0, server_default=sa_text('0'))
+    num_found = db.Column(db.Integer, nullable=False, default=0, server_default=sa_text('0'))
+    error_message = db.Column(db.Text, nullable=True)
+
+    # 执行者与心跳：RUNNING 任务的心跳超过 LIBRARY_RESOLVE_LEASE_SECONDS 未更新时可被其他工作线程接管
+    worker_id = db.Column(db.String(128), nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<LibraryResolveJob {self.id} of User {self.user_id} ({self.status})>'
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total_candidates": self.total_candidates,
+            "num_processed": self.num_processed,
+            "num_found": self.num_found,
+            "cursor_article_id": self.cursor_article_id,
+            "error_message": self.error_message,
+            "created_at_iso": self.created_at.isoformat() + "Z" if self.created_at else None,
+            "updated_at_iso": self.updated_at.isoformat() + "Z" if self.updated_at else None,
+            "finished_at_iso": self.finished_at.isoformat() + "Z" if self.finished_at else None,
+        }
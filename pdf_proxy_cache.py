@@ -0,0 +1,193 @@
+# backend/pdf_proxy_cache.py
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+
+from flask import current_app
+
+from pdf_store import pdf_store, normalize_pdf_url, key_digest
+
+
+# === /api/proxy-pdf 的磁盘缓存 ===
+# PDF内容本身存放在 pdf_store 中 (key 为 "url:<规范化URL>"，与批量下载共用，同一文件只存一份，容量上限与LRU淘汰
+# 由 pdf_store 负责)；这里只为每个URL额外保存一份元数据 (PDF_STORE_DIR/proxy_meta/)：源站的 ETag / Last-Modified、
+# Content-Type 以及最近一次从源站确认的时间 fetched_at。
+#   - fetched_at 在 PDF_PROXY_CACHE_FRESH_SECONDS 内：直接从本地文件发送 (send_file，由 WSGI 服务器的 file_wrapper/sendfile 发送)
+#   - 超过该时长：带 If-None-Match / If-Modified-Since 向源站条件请求，304 则刷新 fetched_at 后仍从本地发送，
+#     200 则边转发边写入新内容；源站不可用时发送本地的旧副本
+#   - 未缓存：经 single_flight 下载 (同一URL的并发请求共用一次源站下载)，完成后由 remember() 登记元数据
+# 发给浏览器的 ETag 为内容的 SHA-256 (强校验值)，浏览器再次打开同一文献时可直接得到 304。
+
+ProxyCacheEntry = namedtuple(
+    'ProxyCacheEntry', ['blob_path', 'sha256', 'size', 'content_type', 'etag', 'last_modified', 'fetched_at'])
+
+
+class PdfProxyCache:
+    """
+    PDF代理缓存。用法与其他扩展一致：模块级实例化，在 create_app 中调用 init_app(app)（须在 pdf_store.init_app 之后）。
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.fresh_seconds = 24 * 3600
+        self.meta_dir = None
+        self._metrics = {"requests": 0, "hits": 0, "revalidated_hits": 0, "stale_hits": 0, "coalesced_hits": 0,
+                         "misses": 0, "browser_not_modified": 0, "bytes_from_cache": 0, "bytes_coalesced": 0,
+                         "bytes_from_upstream": 0}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('PDF_PROXY_CACHE_ENABLED', self.enabled))
+        self.fresh_seconds = int(app.config.get('PDF_PROXY_CACHE_FRESH_SECONDS', self.fresh_seconds))
+        self.meta_dir = None
+        if self.enabled and pdf_store.enabled:
+            meta_dir = os.path.join(pdf_store.root_dir, 'proxy_meta')
+            try:
+                os.makedirs(meta_dir, exist_ok=True)
+                self.meta_dir = meta_dir
+            except OSError as e:
+                app.logger.error(f"[PdfProxyCache] 创建元数据目录 '{meta_dir}' 失败，PDF代理缓存将被禁用: {e}", exc_info=True)
+        app.extensions['pdf_proxy_cache'] = self
+
+    @property
+    def active(self):
+        return bool(self.enabled and self.meta_dir and pdf_store.enabled)
+
+    # --- 元数据 ---
+    @staticmethod
+    def store_keys(pdf_url):
+        url = normalize_pdf_url(pdf_url)
+        return [f"url:{url}"] if url else []
+
+    def _meta_path(self, key):
+        key_hash = key_digest(key)
+        return os.path.join(self.meta_dir, key_hash[:2], f"{key_hash}.json")
+
+    def _read_meta(self, key):
+        try:
+            with open(self._meta_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key, meta):
+        meta_path = self._meta_path(key)
+        try:
+            os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+            fd, temp_meta_path = tempfile.mkstemp(dir=os.path.dirname(meta_path))
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(temp_meta_path, meta_path)
+        except OSError as e:
+            current_app.logger.warning(f"[PdfProxyCache] 写入元数据 '{meta_path}' 失败: {e}")
+
+    # --- 查询与更新 ---
+    def lookup(self, pdf_url):
+        """返回 ProxyCacheEntry；未缓存时返回 None。批量下载存入但尚无元数据的文件视为刚刚确认过。"""
+        keys = self.store_keys(pdf_url)
+        if not self.active or not keys:
+            return None
+        stored = pdf_store.lookup(keys)
+        if stored is None:
+            return None
+        blob_path, sha256_hex, size = stored
+        meta = self._read_meta(keys[0])
+        if meta is None or meta.get("sha256") != sha256_hex:
+            meta = {"sha256": sha256_hex, "content_type": "application/pdf", "etag": None,
+                    "last_modified": None, "fetched_at": time.time()}
+            self._write_meta(keys[0], meta)
+        return ProxyCacheEntry(blob_path, sha256_hex, size, meta.get("content_type") or "application/pdf",
+                               meta.get("etag"), meta.get("last_modified"), meta.get("fetched_at") or 0)
+
+    def is_fresh(self, entry):
+        return time.time() - entry.fetched_at < self.fresh_seconds
+
+    @staticmethod
+    def revalidation_headers(entry):
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def mark_revalidated(self, pdf_url, entry, upstream_response):
+        """源站返回 304：刷新 fetched_at (以及源站可能更新的校验值)，返回新的 entry。"""
+        entry = entry._replace(etag=upstream_response.headers.get('ETag') or entry.etag,
+                               last_modified=upstream_response.headers.get('Last-Modified') or entry.last_modified,
+                               fetched_at=time.time())
+        self._write_meta(self.store_keys(pdf_url)[0], {
+            "sha256": entry.sha256, "content_type": entry.content_type, "etag": entry.etag,
+            "last_modified": entry.last_modified, "fetched_at": entry.fetched_at})
+        return entry
+
+    def stream_and_store(self, pdf_url, upstream_response, chunks):
+        """生成器：转发源站响应的数据块，同时写入缓存；完整接收后登记元数据。"""
+        keys = self.store_keys(pdf_url)
+        upstream_headers = upstream_response.headers
+
+        def _counted(source_chunks):
+            for chunk in source_chunks:
+                self.record("bytes_from_upstream", len(chunk))
+                yield chunk
+
+        if not self.active or not keys:
+            yield from _counted(chunks)
+            return
+
+        content_length = upstream_headers.get('Content-Length')
+        # 经过内容编码 (gzip 等) 时 iter_content 返回解码后的数据，长度与 Content-Length 不同，不做长度校验
+        expected_size = int(content_length) if content_length and content_length.isdigit() and \
+            not upstream_headers.get('Content-Encoding') else None
+
+        yield from pdf_store.store_while_streaming(keys, _counted(chunks), expected_size,
+                                                   lambda stored: self.remember(pdf_url, stored, upstream_headers))
+
+    def remember(self, pdf_url, stored, upstream_headers):
+        """内容已提交到 pdf_store 后登记元数据 (源站的校验值与 Content-Type)。"""
+        keys = self.store_keys(pdf_url)
+        if not self.active or not keys:
+            return
+        _, sha256_hex, size = stored
+        self._write_meta(keys[0], {
+            "sha256": sha256_hex, "content_type": upstream_headers.get('Content-Type') or "application/pdf",
+            "etag": upstream_headers.get('ETag'), "last_modified": upstream_headers.get('Last-Modified'),
+            "fetched_at": time.time()})
+        current_app.logger.info(f"[PdfProxyCache] 已缓存 '{pdf_url}' ({size} 字节, sha256={sha256_hex[:12]})。")
+
+    @staticmethod
+    def last_modified_datetime(entry):
+        """send_file 使用的 Last-Modified：优先源站的值，否则为最近确认时间。"""
+        if entry.last_modified:
+            try:
+                return parsedate_to_datetime(entry.last_modified)
+            except (TypeError, ValueError):
+                pass
+        return entry.fetched_at or None
+
+    # --- 统计 ---
+    def record(self, name, delta=1):
+        with self._lock:
+            self._metrics[name] += delta
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        served_from_cache = metrics["hits"] + metrics["revalidated_hits"] + metrics["stale_hits"]
+        metrics["hit_ratio"] = round(served_from_cache / metrics["requests"], 4) if metrics["requests"] else None
+        # 节省的上游流量：本地发送与合并下载共享的字节数 (浏览器 304 时没有响应体，其节省的字节不计入)
+        metrics["bytes_saved"] = metrics["bytes_from_cache"] + metrics["bytes_coalesced"]
+        metrics["coalesced_ratio"] = round(metrics["coalesced_hits"] / metrics["requests"], 4) if metrics["requests"] else None
+        metrics["enabled"] = self.active
+        metrics["fresh_seconds"] = self.fresh_seconds
+        return metrics
+
+
+# 模块级实例，在 create_app 中 pdf_proxy_cache.init_app(app)
+pdf_proxy_cache = PdfProxyCache()
@@ -0,0 +1,325 @@
+# backend/pdf_store.py
+import os
+import re
+import hashlib
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse, urlunparse
+
+from flask import current_app
+from filelock import FileLock, Timeout
+
+
+# === 内容寻址的PDF存储 (跨批量任务、跨用户共享) ===
+# 目录结构 (PDF_STORE_DIR 下):
+#   blobs/<sha256前2位>/<sha256>.pdf   PDF内容本身，按 SHA-256 去重
+#   keys/<sha1(key)前2位>/<sha1(key)>  文本文件，内容为对应 blob 的 SHA-256
+#   incoming/                          下载中的临时文件，提交后原子重命名为 blob；
+#                                      按URL命名的 <sha1(url)>.part 为可断点续传的未完成下载
+# key 由规范化后的 DOI 或 pdfLink 生成 (见 article_store_keys)，同一篇文章的多个 key 指向同一个 blob。
+# blob 的 mtime 即"最近访问时间"：命中时 touch，超出容量上限时按 mtime 做 LRU 淘汰。
+
+_DOI_PREFIX_PATTERN = re.compile(r'^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)', re.IGNORECASE)
+
+
+def normalize_doi(doi):
+    if not doi:
+        return None
+    doi_str = _DOI_PREFIX_PATTERN.sub('', str(doi).strip()).strip().lower()
+    if not doi_str or doi_str in ('n/a', 'none', 'null'):
+        return None
+    return doi_str
+
+
+def normalize_pdf_url(pdf_url):
+    if not pdf_url:
+        return None
+    parsed = urlparse(str(pdf_url).strip())
+    if not parsed.scheme or not parsed.netloc:
+        return None
+    path = parsed.path.rstrip('/') or '/'
+    # 协议与主机名大小写不敏感；片段 (#page=2 等) 不影响内容
+    return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), path, parsed.params, parsed.query, ''))
+
+
+def article_store_keys(article_data):
+    """返回一篇文章在存储中的全部 key (DOI 优先，其次 pdfLink)。"""
+    keys = []
+    doi = normalize_doi(article_data.get('doi'))
+    if doi:
+        keys.append(f"doi:{doi}")
+    url = normalize_pdf_url(article_data.get('pdfLink'))
+    if url:
+        keys.append(f"url:{url}")
+    return keys
+
+
+def key_digest(key):
+    """key 的定长摘要，用作 keys/ 下的文件名以及数据库中的索引列。"""
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+class _HashingWriter:
+    """边写边计算 SHA-256，避免提交时再读一遍文件。"""
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self._sha256.update(data)
+        self.size += len(data)
+        return self._fileobj.write(data)
+
+    def hexdigest(self):
+        return self._sha256.hexdigest()
+
+
+class PdfStore:
+    """
+    内容寻址PDF存储。用法与 SQLAlchemy 扩展一致：模块级实例化，在 create_app 中调用 init_app(app)。
+    所有方法可在任意线程调用（只依赖文件系统原子操作和本进程内的锁）。
+    """
+
+    def __init__(self, app=None):
+        self.root_dir = None
+        self.max_bytes = 0
+        self._size_lock = threading.Lock()
+        self._total_bytes = None  # 惰性统计，首次需要时扫描一次
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.root_dir = app.config.get('PDF_STORE_DIR')
+        self.max_bytes = int(app.config.get('PDF_STORE_MAX_BYTES', 0) or 0)
+        if self.root_dir:
+            try:
+                for sub_dir in ('blobs', 'keys', 'incoming'):
+                    os.makedirs(os.path.join(self.root_dir, sub_dir), exist_ok=True)
+                self._cleanup_stale_incoming(app.config.get('PDF_STORE_INCOMING_MAX_AGE_SECONDS', 7 * 24 * 3600))
+            except OSError as e:
+                app.logger.error(f"[PdfStore] 创建PDF存储目录 '{self.root_dir}' 失败，PDF存储将被禁用: {e}", exc_info=True)
+                self.root_dir = None
+        app.extensions['pdf_store'] = self
+
+    @property
+    def enabled(self):
+        return bool(self.root_dir)
+
+    # --- 路径 ---
+    def _blob_path(self, sha256_hex):
+        return os.path.join(self.root_dir, 'blobs', sha256_hex[:2], f"{sha256_hex}.pdf")
+
+    def _key_path(self, key):
+        key_hash = key_digest(key)
+        return os.path.join(self.root_dir, 'keys', key_hash[:2], key_hash)
+
+    # --- 查询 ---
+    def lookup(self, keys):
+        """按 key 顺序查找，返回 (blob_path, sha256, size)；未命中返回 None。命中时刷新 LRU 时间。"""
+        if not self.enabled:
+            return None
+        for key in keys:
+            key_path = self._key_path(key)
+            try:
+                with open(key_path, 'r', encoding='utf-8') as f:
+                    sha256_hex = f.read().strip()
+            except OSError:
+                continue
+            blob_path = self._blob_path(sha256_hex)
+            try:
+                os.utime(blob_path, None)  # 作为 LRU 的"最近访问时间"
+                size = os.path.getsize(blob_path)
+            except OSError:
+                # blob 已被淘汰，清理悬空的 key
+                self._remove_quietly(key_path)
+                continue
+            return blob_path, sha256_hex, size
+        return None
+
+    def lookup_article(self, article_data):
+        return self.lookup(article_store_keys(article_data))
+
+    # --- 写入 ---
+    def store_from_download(self, keys, download_func):
+        """
+        调用 download_func(writer) 把内容写入 incoming 临时文件（边写边计算 SHA-256），
+        download_func 返回真值表示成功。成功后提交为 blob 并登记所有 key，返回 (blob_path, sha256, size)。
+        """
+        if not self.enabled:
+            return None
+        incoming_dir = os.path.join(self.root_dir, 'incoming')
+        fd, temp_path = tempfile.mkstemp(dir=incoming_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                writer = _HashingWriter(temp_file)
+                if not download_func(writer) or writer.size == 0:
+                    return None
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            return self._commit(temp_path, writer.hexdigest(), writer.size, keys)
+        finally:
+            self._remove_quietly(temp_path)
+
+    def store_while_streaming(self, keys, chunks, expected_size=None, on_commit=None):
+        """
+        生成器：逐块转发 chunks 的同时写入 incoming 临时文件。chunks 完整读完 (且与 expected_size 一致、
+        内容以 %PDF- 开头) 时提交为 blob 并调用 on_commit((blob_path, sha256, size))；
+        中途出错或调用方提前关闭生成器 (客户端断开) 时丢弃临时文件，不影响已转发的数据。
+        """
+        if not self.enabled:
+            yield from chunks
+            return
+        incoming_dir = os.path.join(self.root_dir, 'incoming')
+        fd, temp_path = tempfile.mkstemp(dir=incoming_dir, suffix='.part')
+        caching = True
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                writer = _HashingWriter(temp_file)
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if caching:
+                        if writer.size == 0 and not chunk.startswith(b'%PDF-'):
+                            caching = False  # 不是PDF (如源站返回的HTML错误页)，只转发不缓存
+                        else:
+                            writer.write(chunk)
+                    yield chunk
+                if not caching or writer.size == 0 or (expected_size is not None and writer.size != expected_size):
+                    return
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            stored = self._commit(temp_path, writer.hexdigest(), writer.size, keys)
+            if on_commit is not None:
+                on_commit(stored)
+        finally:
+            self._remove_quietly(temp_path)
+
+    def store_from_resumable_download(self, keys, pdf_url, download_func):
+        """
+        调用 download_func(part_path) 把 pdf_url 下载到 incoming 下按URL固定命名的 .part 文件，
+        download_func 返回真值表示下载完整。未完成的 .part 会保留在原处，下次同一URL的下载从断点继续。
+        同一URL的并发下载通过文件锁串行化，后到者直接复用先到者提交的结果。
+        """
+        if not self.enabled:
+            return None
+        url_hash = hashlib.sha1(pdf_url.encode('utf-8')).hexdigest()
+        part_path = os.path.join(self.root_dir, 'incoming', f"{url_hash}.part")
+        try:
+            with FileLock(part_path + ".lock", timeout=600):
+                cached = self.lookup(keys)  # 等锁期间可能已有其他线程/进程下载完成
+                if cached:
+                    return cached
+                if not download_func(part_path):
+                    return None
+                try:
+                    sha256_hex, size = self._hash_file(part_path)
+                    return self._commit(part_path, sha256_hex, size, keys)
+                finally:
+                    self._remove_quietly(part_path)
+        except Timeout:
+            current_app.logger.warning(f"[PdfStore] 等待 '{pdf_url}' 的下载锁超时，放弃本次下载。")
+            return None
+
+    @staticmethod
+    def _hash_file(path):
+        sha256 = hashlib.sha256()
+        size = 0
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+                size += len(chunk)
+        return sha256.hexdigest(), size
+
+    def _cleanup_stale_incoming(self, max_age_seconds):
+        """清理长期未被续传的 .part 及其元数据（进程崩溃遗留或源站已失效）。"""
+        incoming_dir = os.path.join(self.root_dir, 'incoming')
+        cutoff = time.time() - max_age_seconds
+        for entry in os.scandir(incoming_dir):
+            if entry.name.endswith('.lock'):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                continue
+
+    def _commit(self, temp_path, sha256_hex, size, keys):
+        blob_path = self._blob_path(sha256_hex)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        if os.path.exists(blob_path):
+            os.utime(blob_path, None)  # 内容已存在 (其他链接/用户下载过同一文件)，只需登记 key
+        else:
+            os.replace(temp_path, blob_path)
+            self._adjust_total(size)
+        for key in keys:
+            self._write_key(key, sha256_hex)
+        self.evict_if_needed()
+        return blob_path, sha256_hex, size
+
+    def _write_key(self, key, sha256_hex):
+        key_path = self._key_path(key)
+        os.makedirs(os.path.dirname(key_path), exist_ok=True)
+        fd, temp_key_path = tempfile.mkstemp(dir=os.path.dirname(key_path))
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(sha256_hex)
+        os.replace(temp_key_path, key_path)
+
+    # --- 容量管理 ---
+    def _adjust_total(self, delta):
+        with self._size_lock:
+            if self._total_bytes is not None:
+                self._total_bytes += delta
+
+    def _scan_blobs(self):
+        blobs = []
+        blobs_root = os.path.join(self.root_dir, 'blobs')
+        for dir_path, _, file_names in os.walk(blobs_root):
+            for file_name in file_names:
+                blob_path = os.path.join(dir_path, file_name)
+                try:
+                    stat_result = os.stat(blob_path)
+                except OSError:
+                    continue
+                blobs.append((stat_result.st_mtime, stat_result.st_size, blob_path))
+        return blobs
+
+    def total_bytes(self):
+        with self._size_lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._scan_blobs())
+            return self._total_bytes
+
+    def evict_if_needed(self):
+        """超过 PDF_STORE_MAX_BYTES 时按 LRU 淘汰，直到降到上限的 90%，避免每次写入都触发淘汰。"""
+        if not self.enabled or self.max_bytes <= 0 or self.total_bytes() <= self.max_bytes:
+            return 0
+        target_bytes = int(self.max_bytes * 0.9)
+        evicted_count = 0
+        with self._size_lock:
+            blobs = sorted(self._scan_blobs())  # 按 mtime 升序，最久未访问的在前
+            total = sum(size for _, size, _ in blobs)
+            for _, size, blob_path in blobs:
+                if total <= target_bytes:
+                    break
+                if self._remove_quietly(blob_path):
+                    total -= size
+                    evicted_count += 1
+            self._total_bytes = total
+        # 指向已淘汰 blob 的 key 在下次 lookup 时惰性清理
+        current_app.logger.info(f"[PdfStore] 已按LRU淘汰 {evicted_count} 个PDF，当前占用 {total} 字节。")
+        return evicted_count
+
+    @staticmethod
+    def _remove_quietly(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+
+# 模块级实例，在 create_app 中 pdf_store.init_app(app)
+pdf_store = PdfStore()
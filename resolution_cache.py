@@ -0,0 +1,169 @@
+# backend/resolution_cache.py
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+
+from models import db, PdfResolution
+from pdf_store import normalize_doi, key_digest
+
+
+# === PDF链接解析结果缓存 ===
+# 两级缓存：进程内 LRU (内存) 在前，pdf_resolutions 表在后（进程重启后仍有效，多进程共享）。
+# key 为规范化后的 DOI ("doi:...")，没有 DOI 时为规范化后的标题 ("title:...")。
+# 找到链接与未找到 (负缓存) 分别使用 PDF_RESOLUTION_CACHE_HIT_TTL_SECONDS / _MISS_TTL_SECONDS，
+# 负缓存的 TTL 较短，使暂时失败的镜像恢复后能较快重新解析。
+
+CachedResolution = namedtuple('CachedResolution', ['pdf_link', 'source'])  # pdf_link 为 None 表示负缓存
+
+_TITLE_SEPARATOR_PATTERN = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize_title(title):
+    if not title:
+        return None
+    # 全角/半角统一、忽略大小写和标点空白差异
+    title_str = unicodedata.normalize('NFKC', str(title)).lower()
+    title_str = _TITLE_SEPARATOR_PATTERN.sub(' ', title_str).strip()
+    return title_str or None
+
+
+def resolution_query_key(doi=None, title=None):
+    """DOI 能唯一确定文章，优先使用；否则使用标题。两者都无效时返回 None。"""
+    normalized_doi = normalize_doi(doi)
+    if normalized_doi:
+        return f"doi:{normalized_doi}"
+    normalized_title = normalize_title(title)
+    if normalized_title:
+        return f"title:{normalized_title}"
+    return None
+
+
+class ResolutionCache:
+    """
+    PDF链接解析缓存。用法与其他扩展一致：模块级实例化，在 create_app 中调用 init_app(app)。
+    get/put 需要在应用上下文中调用（数据库层使用 db.session）。
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.hit_ttl_seconds = 30 * 24 * 3600
+        self.miss_ttl_seconds = 6 * 3600
+        self.memory_max_entries = 10000
+        self._memory = OrderedDict()  # query_key -> (CachedResolution, 过期时间戳)
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "db_hits": 0, "negative_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('PDF_RESOLUTION_CACHE_ENABLED', self.enabled))
+        self.hit_ttl_seconds = int(app.config.get('PDF_RESOLUTION_CACHE_HIT_TTL_SECONDS', self.hit_ttl_seconds))
+        self.miss_ttl_seconds = int(app.config.get('PDF_RESOLUTION_CACHE_MISS_TTL_SECONDS', self.miss_ttl_seconds))
+        self.memory_max_entries = int(app.config.get('PDF_RESOLUTION_CACHE_MEMORY_ENTRIES', self.memory_max_entries))
+        app.extensions['resolution_cache'] = self
+
+    def _count(self, counter_name):
+        with self._lock:
+            self._counters[counter_name] += 1
+
+    # --- 内存层 ---
+    def _memory_get(self, query_key):
+        with self._lock:
+            entry = self._memory.get(query_key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._memory[query_key]
+                return None
+            self._memory.move_to_end(query_key)
+            return entry[0]
+
+    def _memory_put(self, query_key, resolution, expires_epoch):
+        if self.memory_max_entries <= 0:
+            return
+        with self._lock:
+            self._memory[query_key] = (resolution, expires_epoch)
+            self._memory.move_to_end(query_key)
+            while len(self._memory) > self.memory_max_entries:
+                self._memory.popitem(last=False)
+
+    # --- 对外接口 ---
+    def get(self, query_key):
+        """返回未过期的 CachedResolution（可能是负缓存）；没有缓存时返回 None。"""
+        if not self.enabled or not query_key:
+            return None
+        resolution = self._memory_get(query_key)
+        if resolution is not None:
+            self._count("memory_hits")
+            if resolution.pdf_link is None:
+                self._count("negative_hits")
+            return resolution
+
+        try:
+            row = PdfResolution.query.filter_by(query_key_hash=key_digest(query_key)).first()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            self._count("errors")
+            current_app.logger.error(f"[ResolutionCache] 查询解析缓存 '{query_key}' 失败: {e}", exc_info=True)
+            return None
+        expires_at = row.expires_at if row is not None else None
+        if expires_at is not None and expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)  # SQLite 读回的时间不带时区
+        if row is None or expires_at <= datetime.now(timezone.utc):
+            self._count("misses")
+            return None
+
+        resolution = CachedResolution(row.pdf_link, row.source)
+        self._memory_put(query_key, resolution, expires_at.timestamp())
+        self._count("db_hits")
+        if resolution.pdf_link is None:
+            self._count("negative_hits")
+        return resolution
+
+    def put(self, query_key, pdf_link, source=None):
+        """记录一次解析结果；pdf_link 为空时按负缓存 TTL 保存。"""
+        if not self.enabled or not query_key:
+            return
+        now = datetime.now(timezone.utc)
+        ttl_seconds = self.hit_ttl_seconds if pdf_link else self.miss_ttl_seconds
+        expires_at = now + timedelta(seconds=ttl_seconds)
+        resolution = CachedResolution(pdf_link or None, source if pdf_link else None)
+        self._memory_put(query_key, resolution, expires_at.timestamp())
+
+        values = {"pdf_link": resolution.pdf_link, "source": resolution.source,
+                  "resolved_at": now, "expires_at": expires_at}
+        query_key_hash = key_digest(query_key)
+        for _ in range(2):  # 并发插入同一 key 时 IntegrityError，回滚后按更新重试一次
+            try:
+                updated_rows = PdfResolution.query.filter_by(query_key_hash=query_key_hash).update(
+                    values, synchronize_session=False)
+                if not updated_rows:
+                    db.session.add(PdfResolution(query_key_hash=query_key_hash, query_key=query_key, **values))
+                db.session.commit()
+                self._count("stores")
+                return
+            except IntegrityError:
+                db.session.rollback()
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                self._count("errors")
+                current_app.logger.error(f"[ResolutionCache] 写入解析缓存 '{query_key}' 失败: {e}", exc_info=True)
+                return
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters["memory_entries"] = len(self._memory)
+        lookups = counters["memory_hits"] + counters["db_hits"] + counters["misses"]
+        counters["hit_rate"] = round((counters["memory_hits"] + counters["db_hits"]) / lookups, 4) if lookups else None
+        return counters
+
+
+# 模块级实例，在 create_app 中 resolution_cache.init_app(app)
+resolution_cache = ResolutionCache()
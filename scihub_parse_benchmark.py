@@ -0,0 +1,123 @@
+# backend/scihub_parse_benchmark.py
+"""
+对比 Sci-Hub 页面的两条解析路径：正则预扫描 (extract_scihub_candidates_prescan) 与 BeautifulSoup 完整解析
+(extract_scihub_candidates_soup)。
+
+用法:
+    python scihub_parse_benchmark.py [抓取的页面目录] [--iterations 200] [--max-bytes 262144]
+
+目录中的 *.html / *.htm 文件为保存下来的 Sci-Hub 页面 (浏览器"另存为"或 curl 输出即可)；
+不提供目录时使用内置的几种页面结构 (手工构造，包括容易让预扫描与完整解析结果不一致的结构)。
+页面按 --max-bytes 截断，与运行时 SCIHUB_PAGE_MAX_BYTES 的读取方式一致。
+输出每个页面两条路径的耗时中位数、加速比，以及两者选出的第一个候选链接是否一致；
+任一页面不一致时以退出码 1 结束，可直接用于 CI 检查。
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+from utils import extract_scihub_candidates_prescan, extract_scihub_candidates_soup
+
+_FILLER = "<p>" + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 40 + "</p>\n"
+
+SAMPLE_PAGES = {
+    "embed#pdf": (
+        "<html><head><title>Sci-Hub</title>" + "<script>var a = 1;</script>" * 20 + "</head><body>"
+        "<div id='menu'>" + "<a href='/about'>about</a>" * 30 + "</div>"
+        "<div id='article'><embed type='application/pdf' src='//zero.sci-hub.se/1234/abcd/paper.pdf#navpanes=0&view=FitH' id='pdf'></div>"
+        + _FILLER * 30 + "</body></html>"),
+    "iframe#viewer": (
+        "<html><body>" + _FILLER * 20 +
+        "<iframe id=\"viewer\" src=\"/downloads/2021-01-01/ab/paper.pdf\"></iframe>" + _FILLER * 20 + "</body></html>"),
+    "onclick button": (
+        "<html><body><div class=\"buttons\"><ul><li><a href=\"#\" "
+        "onclick=\"location.href='//moscow.sci-hub.ru/5678/efgh/paper.pdf?download=true'\">save</a></li></ul></div>"
+        + _FILLER * 40 + "</body></html>"),
+    "div#viewer embed": (
+        "<html><body>" + _FILLER * 10 + "<div id=\"viewer\"><embed src=\"/tree/ef/paper.pdf\"></div>"
+        + _FILLER * 10 + "</body></html>"),
+    # 以下结构中，只按标签属性判断 (不看父元素) 的预扫描会选错候选链接
+    "a#download before div#viewer iframe": (
+        "<html><body><a id=\"download\" href=\"/other.pdf\">download</a>" + _FILLER * 5 +
+        "<div id=\"viewer\"><iframe src=\"/real.pdf\"></iframe></div>" + _FILLER * 5 + "</body></html>"),
+    "stray onclick outside div.buttons": (
+        "<html><body><div class=\"sidebar\"><a href=\"#\" onclick=\"location.href='/ad.pdf'\">ad</a></div>"
+        + _FILLER * 5 + "<div class=\"buttons\"><ul><li><a href=\"#\" onclick=\"location.href='/real.pdf'\">save</a>"
+        "</li></ul></div>" + _FILLER * 5 + "</body></html>"),
+    "closed div#viewer, later iframe": (
+        "<html><body><div id=\"viewer\"><p>loading</p></div><iframe src=\"/ads/banner.pdf\"></iframe>"
+        "<a id=\"download\" href=\"/real.pdf\">download</a>" + _FILLER * 5 + "</body></html>"),
+    "markup inside script": (
+        "<html><head><script>var t = '<iframe id=\"viewer\" src=\"/fake.pdf\">';</script></head><body>"
+        "<!-- <embed id=\"pdf\" src=\"/commented.pdf\"> -->" + _FILLER * 5 +
+        "<embed id=\"pdf\" type=\"application/pdf\" src=\"/real.pdf\"></body></html>"),
+    "no pdf": "<html><body>" + _FILLER * 50 + "<p>article not found</p></body></html>",
+}
+
+
+def _load_pages(directory):
+    if not directory:
+        return {name: content.encode("utf-8") for name, content in SAMPLE_PAGES.items()}
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.htm*"))):
+        with open(path, "rb") as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+
+def _median_seconds(func, iterations):
+    timings = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started_at)
+    return statistics.median(timings)
+
+
+def _fast_path(page_content):
+    # 与 find_pdf_link_via_scihub 相同：预扫描没有候选时才完整解析
+    return extract_scihub_candidates_prescan(page_content.decode("utf-8", errors="replace")) or \
+        extract_scihub_candidates_soup(page_content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sci-Hub 页面解析基准测试")
+    parser.add_argument("directory", nargs="?", help="抓取的 Sci-Hub 页面目录 (*.html)")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--max-bytes", type=int, default=256 * 1024)
+    args = parser.parse_args()
+
+    pages = _load_pages(args.directory)
+    if not pages:
+        print(f"目录 '{args.directory}' 中没有 .html 文件。")
+        return 1
+
+    print(f"{'页面':<36}{'字节':>10}{'完整解析(ms)':>14}{'预扫描路径(ms)':>16}{'加速比':>8}  结果一致")
+    total_soup, total_fast = 0.0, 0.0
+    mismatched_pages = []
+    for name, content in pages.items():
+        page_content = content[:args.max_bytes]
+        soup_seconds = _median_seconds(lambda: extract_scihub_candidates_soup(page_content), args.iterations)
+        fast_seconds = _median_seconds(lambda: _fast_path(page_content), args.iterations)
+        total_soup += soup_seconds
+        total_fast += fast_seconds
+        soup_candidates = extract_scihub_candidates_soup(page_content)
+        fast_candidates = _fast_path(page_content)
+        same_first = (soup_candidates[0][1] if soup_candidates else None) == \
+                     (fast_candidates[0][1] if fast_candidates else None)
+        if not same_first:
+            mismatched_pages.append(name)
+        print(f"{name[:35]:<36}{len(page_content):>10}{soup_seconds * 1000:>14.3f}{fast_seconds * 1000:>16.3f}"
+              f"{soup_seconds / fast_seconds if fast_seconds else float('inf'):>8.1f}  {'是' if same_first else '否'}")
+    print(f"{'合计':<36}{'':>10}{total_soup * 1000:>14.3f}{total_fast * 1000:>16.3f}"
+          f"{total_soup / total_fast if total_fast else float('inf'):>8.1f}")
+    if mismatched_pages:
+        print(f"预扫描路径与完整解析选出的第一个候选链接不一致: {', '.join(mismatched_pages)}")
+    return 1 if mismatched_pages else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+# backend/single_flight.py
+import os
+import tempfile
+import threading
+
+from flask import current_app
+
+from pdf_store import pdf_store
+from utils import download_pdf_resumable
+
+
+# === 同一URL的并发下载合并 (single-flight) ===
+# 同一进程内对同一URL的并发请求 (多个浏览器打开同一篇文献的 /api/proxy-pdf、多个批量任务下载同一PDF)
+# 只向源站发起一次下载：第一个请求在后台线程中用 download_pdf_resumable 把PDF写入文件，所有请求 (包括第一个)
+# 都作为读者从这个正在增长的文件中读取，读到末尾时等待后台线程写入更多数据。
+#   - 启用 pdf_store 时写入的是 pdf_store 按URL命名的 .part 文件 (store_from_resumable_download)，完成后提交为 blob，
+#     跨进程的并发下载仍由其文件锁串行化；未启用时写入临时文件，最后一个读者结束后删除。
+#   - 下载在后台线程中进行，与任何一个请求的生命周期无关：第一个浏览器关闭页面不会中断其他读者，下载完成后仍会写入缓存。
+#   - 下载失败时读者收到 FlightFailed；尚未输出任何数据的调用方可以退回到各自原有的下载方式。
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class FlightFailed(Exception):
+    """合并下载失败 (源站错误、内容不是PDF、长时间没有新数据等)。"""
+
+
+class _Flight:
+    def __init__(self, pdf_url, keys):
+        self.pdf_url = pdf_url
+        self.keys = list(keys)  # 提交到 pdf_store 时登记的 key；后加入的请求可以追加自己的 key
+        self.cond = threading.Condition()
+        self.path = None  # 正在写入的文件
+        self.size = 0  # 已写入的字节数
+        self.total_size = None  # 源站给出的总大小 (未知时为 None)
+        self.headers = None  # 源站最近一次成功响应的响应头
+        self.generation = 0  # 下载从头重新开始 (已写入的数据被丢弃) 的次数
+        self.download_finished = False  # 下载已结束，path 可能正在被重命名为 blob
+        self.final_path = None  # 完整文件的路径 (blob 或临时文件)
+        self.final_size = None
+        self.result = None  # 提交到 pdf_store 的 (blob_path, sha256, size)
+        self.failed = False
+        self.readers = 0
+        self.temp_path = None  # 未启用 pdf_store 时的临时文件，下载结束且没有读者后删除
+        self.on_commit = []  # [(callable(stored, headers))]
+
+    def started(self):
+        return self.size > 0 or self.final_path is not None or self.failed
+
+
+class PdfFetchSingleFlight:
+    """
+    合并同一URL的并发PDF下载。用法与其他扩展一致：模块级实例化，在 create_app 中调用 init_app(app)（须在 pdf_store 之后）。
+    join() 返回一个 _Flight，随后用 read_chunks() 读取数据，或用 wait() 等待下载完成。
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.stall_timeout_seconds = 120
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._metrics = {"flights_started": 0, "joined_existing": 0, "flights_failed": 0, "bytes_fetched": 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('SINGLE_FLIGHT_ENABLED', self.enabled))
+        self.stall_timeout_seconds = float(app.config.get('SINGLE_FLIGHT_STALL_TIMEOUT_SECONDS', self.stall_timeout_seconds))
+        app.extensions['pdf_fetch_flights'] = self
+
+    # --- 发起或加入 ---
+    def join(self, pdf_url, keys=(), on_commit=None):
+        """返回 (flight, 是否新发起)。on_commit(stored, 源站响应头) 在内容提交到 pdf_store 后调用。"""
+        with self._lock:
+            flight = self._flights.get(pdf_url)
+            created = flight is None
+            if created:
+                flight = self._flights[pdf_url] = _Flight(pdf_url, keys)
+                self._metrics["flights_started"] += 1
+            else:
+                self._metrics["joined_existing"] += 1
+            with flight.cond:
+                for key in keys:
+                    if key not in flight.keys:
+                        flight.keys.append(key)
+                if on_commit is not None:
+                    flight.on_commit.append(on_commit)
+                flight.readers += 1  # 在全局锁内登记，保证临时文件在读者打开之前不会被删除
+        if created:
+            app = current_app._get_current_object()
+            threading.Thread(target=self._run, args=(app, flight), name="pdf-single-flight", daemon=True).start()
+        else:
+            current_app.logger.info(f"[SingleFlight] 合并到正在进行的下载: '{pdf_url}'")
+        return flight, created
+
+    def _run(self, app, flight):
+        with app.app_context():
+            log_prefix = "[SingleFlight]"
+
+            def _on_progress(written_size, total_size):
+                with flight.cond:
+                    if written_size < flight.size:
+                        flight.generation += 1  # 源站文件已变化，下载从头开始
+                    fetched_bytes = max(0, written_size - flight.size)
+                    flight.size, flight.total_size = written_size, total_size
+                    flight.cond.notify_all()
+                self._add_metric("bytes_fetched", fetched_bytes)  # 不在 flight.cond 内获取全局锁，避免与 join 的加锁顺序相反
+
+            def _on_headers(headers):
+                with flight.cond:
+                    flight.headers = headers.copy()
+
+            def _download(part_path):
+                with flight.cond:
+                    flight.path = part_path
+                    flight.size = os.path.getsize(part_path) if os.path.exists(part_path) else 0  # 续传前已有的数据
+                    flight.cond.notify_all()
+                downloaded_size = download_pdf_resumable(flight.pdf_url, part_path, _on_progress, _on_headers)
+                with flight.cond:
+                    flight.download_finished = True
+                    if downloaded_size:
+                        flight.size = downloaded_size
+                    flight.cond.notify_all()
+                return downloaded_size
+
+            stored = None
+            try:
+                if pdf_store.enabled and flight.keys:
+                    stored = pdf_store.store_from_resumable_download(flight.keys, flight.pdf_url, _download)
+                    final_path, final_size = (stored[0], stored[2]) if stored else (None, None)
+                else:
+                    fd, temp_path = tempfile.mkstemp(suffix='.part')
+                    os.close(fd)
+                    with flight.cond:
+                        flight.temp_path = temp_path
+                    final_size = _download(temp_path)
+                    final_path = temp_path if final_size else None
+            except Exception as e:
+                current_app.logger.error(f"{log_prefix} 下载 '{flight.pdf_url}' 时发生未知错误: {e}", exc_info=True)
+                final_path, final_size = None, None
+
+            with self._lock:
+                self._flights.pop(flight.pdf_url, None)  # 之后的请求直接命中 pdf_store 或发起新的下载
+                with flight.cond:
+                    flight.download_finished = True
+                    flight.final_path, flight.final_size, flight.result = final_path, final_size, stored
+                    flight.failed = final_path is None
+                    if flight.failed:
+                        self._metrics["flights_failed"] += 1
+                    flight.cond.notify_all()
+                    callbacks, headers = list(flight.on_commit), flight.headers or {}
+            if flight.failed:
+                current_app.logger.warning(f"{log_prefix} 合并下载 '{flight.pdf_url}' 失败。")
+            elif stored:
+                for callback in callbacks:
+                    try:
+                        callback(stored, headers)
+                    except Exception as e_callback:
+                        current_app.logger.warning(f"{log_prefix} 下载完成回调失败 ('{flight.pdf_url}'): {e_callback}")
+            self._release(flight, is_reader=False)
+
+    # --- 读取 ---
+    def wait_until_started(self, flight, timeout=None):
+        """等待下载产生第一批数据 (或直接完成)，返回 (总大小或None, 源站响应头)；失败或超时抛出 FlightFailed。"""
+        with flight.cond:
+            if not flight.cond.wait_for(flight.started, timeout or self.stall_timeout_seconds):
+                raise FlightFailed(f"等待 '{flight.pdf_url}' 开始下载超时。")
+            if flight.failed:
+                raise FlightFailed(f"下载 '{flight.pdf_url}' 失败。")
+            return (flight.final_size if flight.final_path else flight.total_size), (flight.headers or {}).copy()
+
+    def read_chunks(self, flight):
+        """
+        生成器：从头读取正在增长的文件直到下载完成。必须与 join() 一一对应 (结束时释放读者登记)，
+        下载失败、从头重新下载或长时间没有新数据时抛出 FlightFailed。
+        """
+        fileobj, position = None, 0
+        generation = flight.generation
+        try:
+            while True:
+                with flight.cond:
+                    while True:
+                        if flight.failed:
+                            raise FlightFailed(f"下载 '{flight.pdf_url}' 失败 (已读取 {position} 字节)。")
+                        if flight.generation != generation and position > 0:
+                            raise FlightFailed(f"'{flight.pdf_url}' 在源站已变化，下载已从头开始。")
+                        generation = flight.generation
+                        if fileobj is None:
+                            path = flight.final_path or (None if flight.download_finished else flight.path)
+                            if path:
+                                fileobj = open(path, 'rb')
+                        available = flight.final_size if flight.final_path else flight.size
+                        if fileobj is not None and available > position:
+                            break
+                        if flight.final_path and position >= flight.final_size:
+                            return
+                        if not flight.cond.wait(self.stall_timeout_seconds):
+                            raise FlightFailed(f"'{flight.pdf_url}' 超过 {self.stall_timeout_seconds:.0f} 秒没有新数据。")
+                fileobj.seek(position)
+                chunk = fileobj.read(min(READ_CHUNK_SIZE, available - position))
+                if not chunk:
+                    # 进度已报告但数据仍在写入方的缓冲区中，稍后重试
+                    with flight.cond:
+                        flight.cond.wait(0.05)
+                    continue
+                position += len(chunk)
+                yield chunk
+        finally:
+            if fileobj is not None:
+                fileobj.close()
+            self._release(flight)
+
+    def wait(self, flight, progress_callback=None):
+        """等待下载完成 (不读取数据)，返回提交到 pdf_store 的 (blob_path, sha256, size)；失败返回 None。必须与 join() 一一对应。"""
+        try:
+            reported_size = None
+            with flight.cond:
+                while not (flight.final_path or flight.failed):
+                    if progress_callback and flight.size != reported_size:
+                        reported_size = flight.size
+                        progress_callback(flight.size, flight.total_size)
+                    if not flight.cond.wait(self.stall_timeout_seconds) and flight.size == reported_size:
+                        current_app.logger.warning(f"[SingleFlight] 等待 '{flight.pdf_url}' 超时，没有新数据。")
+                        return None
+                return flight.result
+        finally:
+            self._release(flight)
+
+    def leave(self, flight):
+        """加入后没有调用 read_chunks() / wait() 的请求 (如 wait_until_started 失败) 用它释放读者登记。"""
+        self._release(flight)
+
+    @staticmethod
+    def _release(flight, is_reader=True):
+        """读者或后台线程结束。临时文件 (未启用 pdf_store 时) 在下载结束且没有读者后删除。"""
+        with flight.cond:
+            if is_reader:
+                flight.readers -= 1
+            path_to_remove = flight.temp_path if flight.readers == 0 and flight.download_finished else None
+            if path_to_remove:
+                flight.temp_path = None
+        if path_to_remove:
+            try:
+                os.remove(path_to_remove)
+            except OSError:
+                pass
+
+    # --- 统计 ---
+    def _add_metric(self, name, delta=1):
+        with self._lock:
+            self._metrics[name] += delta
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics["in_flight"] = len(self._flights)
+        return metrics
+
+
+# 模块级实例，在 create_app 中 pdf_fetch_flights.init_app(app)
+pdf_fetch_flights = PdfFetchSingleFlight()
@@ -0,0 +1,147 @@
+# backend/source_ranking.py
+import random
+import threading
+from collections import OrderedDict, deque
+
+
+# === 按 DOI 注册者前缀自适应排列PDF来源 ===
+# resolve_pdf_link 并行启动所有来源，但按优先级取结果：排在前面的来源未结束时，后面来源找到的链接也要等待。
+# 因此这里按 DOI 注册者前缀 (如 10.48550 为 arXiv，10.1016 为 Elsevier) 记录每类来源 (Sci-Hub / Unpaywall / arXiv)
+# 最近 SOURCE_RANKING_WINDOW 次的成败与成功耗时，把"期望耗时 = 成功耗时中位数 / 成功率"最小的来源排在最前
+# (顺序搜索问题的最优排列：按 代价/成功概率 升序)。
+#   - 样本数不足 SOURCE_RANKING_MIN_SAMPLES 的来源排在最前并保持默认顺序，以便尽快获得测量值；
+#   - 以 SOURCE_RANKING_EXPLORATION_RATE 的概率把随机一个非首位来源提到最前，避免统计因长期排在后面
+#     (结果总被更靠前的来源抢先而被取消) 而不再更新。
+# 统计只保存在进程内存中，与 mirror_health 一致；重启后从默认顺序重新学习。
+
+NO_DOI_PREFIX = "(no-doi)"
+
+
+def doi_registrant_prefix(doi):
+    """'https://doi.org/10.1016/j.cell.2020.01.001' -> '10.1016'；无法识别时返回 NO_DOI_PREFIX。"""
+    if not doi:
+        return NO_DOI_PREFIX
+    value = doi.strip().lower()
+    for marker in ("doi.org/", "doi:"):
+        position = value.find(marker)
+        if position != -1:
+            value = value[position + len(marker):]
+    prefix = value.split("/", 1)[0].strip()
+    return prefix if prefix.startswith("10.") else NO_DOI_PREFIX
+
+
+class _SourceStats:
+    def __init__(self, window_size):
+        self.outcomes = deque(maxlen=window_size)  # True 表示找到了链接
+        self.latencies = deque(maxlen=window_size)  # 找到链接时的耗时 (秒)
+
+    def success_rate(self):
+        # 拉普拉斯平滑，避免少量样本时成功率为 0 或 1
+        return (sum(1 for outcome in self.outcomes if outcome) + 1) / (len(self.outcomes) + 2)
+
+    def p50_latency(self):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[len(ordered) // 2]
+
+    def expected_cost(self, default_latency):
+        p50 = self.p50_latency()
+        return (p50 if p50 is not None else default_latency) / self.success_rate()
+
+
+class SourceRankingTracker:
+    """
+    来源排序统计。用法与其他扩展一致：模块级实例化，在 create_app 中调用 init_app(app)。
+    所有方法线程安全，可在解析线程池中直接调用。
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.window_size = 100
+        self.min_samples = 5
+        self.exploration_rate = 0.1
+        self.max_prefixes = 5000
+        self.default_latency = 30.0  # 没有成功样本的来源按截止时间估算耗时
+        self._prefixes = OrderedDict()  # prefix -> {来源名: _SourceStats}，按最近使用排列
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('SOURCE_RANKING_ENABLED', self.enabled))
+        self.window_size = int(app.config.get('SOURCE_RANKING_WINDOW', self.window_size))
+        self.min_samples = max(1, int(app.config.get('SOURCE_RANKING_MIN_SAMPLES', self.min_samples)))
+        self.exploration_rate = float(app.config.get('SOURCE_RANKING_EXPLORATION_RATE', self.exploration_rate))
+        self.max_prefixes = int(app.config.get('SOURCE_RANKING_MAX_PREFIXES', self.max_prefixes))
+        self.default_latency = float(app.config.get('PDF_RESOLVE_DEADLINE_SECONDS', self.default_latency))
+        app.extensions['source_ranking'] = self
+
+    def _stats_locked(self, prefix, source):
+        sources = self._prefixes.get(prefix)
+        if sources is None:
+            sources = self._prefixes[prefix] = {}
+            while len(self._prefixes) > self.max_prefixes:
+                self._prefixes.popitem(last=False)
+        else:
+            self._prefixes.move_to_end(prefix)
+        stats = sources.get(source)
+        if stats is None:
+            stats = sources[source] = _SourceStats(self.window_size)
+        return stats
+
+    def record_outcome(self, doi, source, found, latency_seconds):
+        """记录某类来源对一次查询的最终结果 (source 为来源类别，如 'Sci-Hub'，而不是具体镜像)。"""
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._stats_locked(doi_registrant_prefix(doi), source)
+            stats.outcomes.append(bool(found))
+            if found:
+                stats.latencies.append(latency_seconds)
+
+    def ordered_sources(self, doi, sources, explore=True):
+        """
+        返回 (排序后的来源列表, 是否为探索)。sources 为默认顺序；数据不足的来源排在最前且保持默认顺序，
+        其余按期望耗时升序。explore=False 时不做随机探索 (用于展示)。
+        """
+        sources = list(sources)
+        if not self.enabled or len(sources) < 2:
+            return sources, False
+        prefix = doi_registrant_prefix(doi)
+        with self._lock:
+            known = self._prefixes.get(prefix) or {}
+
+            def _sort_key(indexed_source):
+                index, source = indexed_source
+                stats = known.get(source)
+                if stats is None or len(stats.outcomes) < self.min_samples:
+                    return (0, 0.0, index)
+                return (1, stats.expected_cost(self.default_latency), index)
+            ordered = [source for _, source in sorted(enumerate(sources), key=_sort_key)]
+        if explore and random.random() < self.exploration_rate:
+            explored = ordered.pop(random.randrange(1, len(ordered)))
+            ordered.insert(0, explored)
+            return ordered, True
+        return ordered, False
+
+    def snapshot(self, prefix=None):
+        with self._lock:
+            items = [(prefix, self._prefixes[prefix])] if prefix in self._prefixes else \
+                ([] if prefix is not None else list(self._prefixes.items()))
+            result = {}
+            for item_prefix, sources in items:
+                result[item_prefix] = {}
+                for source, stats in sources.items():
+                    p50 = stats.p50_latency()
+                    result[item_prefix][source] = {
+                        "samples": len(stats.outcomes),
+                        "success_rate": round(stats.success_rate(), 4),
+                        "p50_latency_ms": round(p50 * 1000) if p50 is not None else None,
+                        "expected_cost_seconds": round(stats.expected_cost(self.default_latency), 3),
+                    }
+            return result
+
+
+# 模块级实例，在 create_app 中 source_ranking.init_app(app)
+source_ranking = SourceRankingTracker()
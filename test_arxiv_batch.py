@@ -0,0 +1,61 @@
+# backend/test_arxiv_batch.py
+import requests
+
+import utils
+from resolution_cache import resolution_cache, resolution_query_key
+
+
+def _feed(*entries):
+    body = "".join(
+        f'<entry><id>http://arxiv.org/abs/{arxiv_id}</id><title>{title}</title></entry>' for arxiv_id, title in entries)
+    return f'<feed xmlns="http://www.w3.org/2005/Atom">{body}</feed>'.encode("utf-8")
+
+
+def _fake_arxiv(monkeypatch, pages):
+    """pages 为依次返回的 Atom 响应体或要抛出的异常；返回记录每次请求参数的列表。"""
+    queries = []
+
+    def _get(service, url, params=None, **kwargs):
+        queries.append(params)
+        page = pages.pop(0)
+        if isinstance(page, Exception):
+            raise page
+        response = requests.Response()
+        response.status_code = 200
+        response._content = page
+        return response
+
+    monkeypatch.setattr(utils.http_client, "get", _get)
+    return queries
+
+
+def test_titles_are_batched_and_matched_back(app, monkeypatch):
+    app.config.update(ARXIV_BATCH_TITLES_PER_QUERY=10, ARXIV_BATCH_PAGE_SIZE=50)
+    queries = _fake_arxiv(monkeypatch, [_feed(
+        ("2101.00001v2", "Attention Is All You Need"),
+        ("2101.00002", "Graph Networks: A Survey"),  # 标点与大小写差异
+        ("2101.00003", "Unrelated Paper"))])
+    titles = ["Attention is all you need", "attention is all you need!", "Graph networks - a survey",
+              "A Paper arXiv Does Not Have"]
+
+    results, failed_titles = utils.find_pdfs_on_arxiv_by_titles(titles)
+
+    assert len(queries) == 1 and queries[0]["search_query"].count(" OR ") == 2  # 3 个不同的规范化标题
+    assert results == {
+        "Attention is all you need": "https://arxiv.org/pdf/2101.00001v2",
+        "attention is all you need!": "https://arxiv.org/pdf/2101.00001v2",
+        "Graph networks - a survey": "https://arxiv.org/pdf/2101.00002.pdf",
+        "A Paper arXiv Does Not Have": None,
+    }
+    assert failed_titles == set()
+
+
+def test_failed_chunk_is_reported_and_not_negatively_cached(app, monkeypatch):
+    app.config.update(ARXIV_BATCH_TITLES_PER_QUERY=1)
+    _fake_arxiv(monkeypatch, [_feed(), requests.exceptions.ConnectionError("reset")])
+
+    results = utils.find_pdf_links_by_titles(["Missing Paper", "Unlucky Paper"])
+
+    assert results == {"Missing Paper": None, "Unlucky Paper": None}
+    assert resolution_cache.get(resolution_query_key(None, "Missing Paper")) == (None, None)
+    assert resolution_cache.get(resolution_query_key(None, "Unlucky Paper")) is None
@@ -0,0 +1,291 @@
+# backend/test_batch_views.py
+import io
+import os
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import pytest
+from werkzeug.datastructures import Range
+from werkzeug.http import parse_range_header
+
+import batch_views
+from pdf_proxy_cache import ProxyCacheEntry
+from models import db, User, BatchTask
+
+ARTICLES = [{"doi": "10.1000/alpha", "title": "Alpha"}, {"doi": "10.1000/beta", "title": "Beta"}]
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    app.register_blueprint(batch_views.batch_bp)
+    monkeypatch.setattr(batch_views.batch_executor, "submit", lambda task_id: None)
+    for user_id in (1, 2, 3):
+        db.session.add(User(id=user_id, username=f"user{user_id}", email=f"user{user_id}@example.com",
+                            password_hash="x"))
+    db.session.commit()
+    return app.test_client()
+
+
+def _as_user(monkeypatch, user_id):
+    monkeypatch.setattr(batch_views, "get_current_user_from_token",
+                        lambda: {"user_id": user_id, "username": f"user{user_id}"})
+
+
+def _progress_status(client, task_id):
+    response = client.get(f"/api/batch_progress/{task_id}/events")
+    status_code = response.status_code
+    response.close()
+    return status_code
+
+
+def test_every_submitter_can_follow_shared_task_progress(client, monkeypatch):
+    _as_user(monkeypatch, 1)
+    first = client.post("/api/batch_process_and_zip", json={"articles": ARTICLES})
+    assert first.status_code == 202
+    task_id = first.get_json()["task_id"]
+
+    _as_user(monkeypatch, 2)
+    second = client.post("/api/batch_process_and_zip", json={"articles": ARTICLES})
+    assert second.get_json()["status"] == "already_processing_or_submitted"
+    assert second.get_json()["task_id"] == task_id
+
+    assert _progress_status(client, task_id) == 200
+    _as_user(monkeypatch, 1)
+    assert _progress_status(client, task_id) == 200
+    _as_user(monkeypatch, 3)
+    assert _progress_status(client, task_id) == 404
+
+
+def test_resubmission_keeps_original_owner(client, monkeypatch):
+    _as_user(monkeypatch, 1)
+    task_id = client.post("/api/batch_process_and_zip", json={"articles": ARTICLES}).get_json()["task_id"]
+    task = BatchTask.query.filter_by(task_id=task_id).first()
+    task.status = "EVICTED"  # 允许重新提交
+    db.session.commit()
+
+    _as_user(monkeypatch, 2)
+    assert client.post("/api/batch_process_and_zip", json={"articles": ARTICLES}).status_code == 202
+
+    task = BatchTask.query.filter_by(task_id=task_id).first()
+    assert task.user_id == 1
+    assert sorted(s.user_id for s in task.submitters) == [1, 2]
+
+
+def test_satisfiable_byte_ranges_clips_sorts_and_merges():
+    ranges = lambda header, size=1000: batch_views._satisfiable_byte_ranges(parse_range_header(header), size)
+    assert ranges("bytes=0-99") == [(0, 100)]
+    assert ranges("bytes=-100") == [(900, 1000)]
+    assert ranges("bytes=-5000") == [(0, 1000)]
+    assert ranges("bytes=900-") == [(900, 1000)]
+    assert ranges("bytes=950-2000") == [(950, 1000)]
+    assert ranges("bytes=0-99,500-599") == [(0, 100), (500, 600)]
+    assert ranges("bytes=0-99,100-199") == [(0, 200)]  # 相邻
+    assert ranges("bytes=2000-2999") == []
+    # werkzeug 拒绝乱序/重叠的区间头，这里直接构造 Range 覆盖排序与合并
+    unordered = Range("bytes", [(500, 600), (0, 150), (100, 200), (-50, None)])
+    assert batch_views._satisfiable_byte_ranges(unordered, 1000) == [(0, 200), (500, 600), (950, 1000)]
+
+
+def _cached_pdf(tmp_path, content):
+    blob_path = tmp_path / "blob.pdf"
+    blob_path.write_bytes(content)
+    return ProxyCacheEntry(blob_path=str(blob_path), sha256="abc123", size=len(content),
+                           content_type="application/pdf", etag=None, last_modified=None, fetched_at=time.time())
+
+
+def _send_cached(app, entry, range_header):
+    with app.test_request_context("/api/proxy-pdf", headers={"Range": range_header}):
+        response = batch_views._send_cached_proxy_pdf(entry, "paper.pdf", "HIT")
+        response.direct_passthrough = False
+        return response.status_code, response.headers, response.get_data()
+
+
+def test_merged_multi_range_request_gets_single_partial_response(app, tmp_path):
+    content = bytes(range(256)) * 4
+    entry = _cached_pdf(tmp_path, content)
+
+    status, headers, body = _send_cached(app, entry, "bytes=0-99,100-199")
+    assert status == 206
+    assert headers["Content-Range"] == f"bytes 0-199/{len(content)}"
+    assert headers["Content-Length"] == "200"
+    assert body == content[:200]
+
+    status, headers, body = _send_cached(app, entry, "bytes=10-19")
+    assert (status, headers["Content-Range"], body) == (206, f"bytes 10-19/{len(content)}", content[10:20])
+
+    status, headers, _ = _send_cached(app, entry, "bytes=0-9,500-509")
+    assert status == 206 and headers["Content-Type"].startswith("multipart/byteranges")
+
+    status, headers, _ = _send_cached(app, entry, "bytes=5000-")
+    assert (status, headers["Content-Range"]) == (416, f"bytes */{len(content)}")
+
+
+def test_zip_compression_follows_mid_file_sample(app):
+    compressible = b"%PDF-1.4\n" + b"BT /F1 12 Tf (plain text page) Tj ET\n" * 8000
+    already_compressed = os.urandom(256 * 1024)
+    # 只有中部可压缩 (如文件头尾是图片流)：取样位于中部
+    mixed = os.urandom(200 * 1024) + b"A" * (64 * 1024) + os.urandom(200 * 1024)
+
+    for payload, expected in ((compressible, zipfile.ZIP_DEFLATED), (already_compressed, zipfile.ZIP_STORED),
+                              (mixed, zipfile.ZIP_DEFLATED)):
+        fileobj = io.BytesIO(payload)
+        fileobj.seek(123)
+        assert batch_views._choose_zip_compression(fileobj, len(payload)) == expected
+        assert fileobj.tell() == 0  # 取样后回到开头，供写入ZIP
+
+    assert batch_views._choose_zip_compression(io.BytesIO(b""), 0) == zipfile.ZIP_STORED
+    app.config["BATCH_ZIP_COMPRESSION_SAMPLE_BYTES"] = 0  # 关闭取样
+    assert batch_views._choose_zip_compression(io.BytesIO(compressible), len(compressible)) == zipfile.ZIP_STORED
+
+
+def _fake_downloads(monkeypatch, delay=0.05, failing_urls=()):
+    """替换 download_pdf_to_fileobj，记录每个主机及全局的最大同时下载数。"""
+    lock = threading.Lock()
+    stats = {"active": 0, "max_active": 0, "active_per_host": defaultdict(int), "max_per_host": defaultdict(int),
+             "calls": []}
+
+    def _download(pdf_url, fileobj, progress_callback=None):
+        host = pdf_url.split("/")[2]
+        with lock:
+            stats["calls"].append(pdf_url)
+            stats["active"] += 1
+            stats["active_per_host"][host] += 1
+            stats["max_active"] = max(stats["max_active"], stats["active"])
+            stats["max_per_host"][host] = max(stats["max_per_host"][host], stats["active_per_host"][host])
+        time.sleep(delay)
+        with lock:
+            stats["active"] -= 1
+            stats["active_per_host"][host] -= 1
+        if pdf_url in failing_urls:
+            return None
+        body = f"%PDF-1.4 {pdf_url}".encode()
+        fileobj.write(body)
+        return len(body)
+
+    monkeypatch.setattr(batch_views, "download_pdf_to_fileobj", _download)
+    return stats
+
+
+def test_concurrent_downloads_respect_global_and_per_host_caps(app, monkeypatch):
+    app.config.update(BATCH_DOWNLOAD_MAX_CONCURRENCY=4, BATCH_DOWNLOAD_PER_HOST_CONCURRENCY=2)
+    failing_url = "https://b.example/3.pdf"
+    stats = _fake_downloads(monkeypatch, failing_urls={failing_url})
+    articles = [{"title": f"Paper {host}{index}", "pdfLink": f"https://{host}.example/{index}.pdf"}
+                for host in ("a", "b", "c") for index in range(4)]
+    articles.insert(1, {"title": "No link"})
+    written = {}
+    scheduler_thread = threading.current_thread()
+
+    def _on_downloaded(index, arcname, fileobj, size):
+        assert threading.current_thread() is scheduler_thread  # 回调在调度线程中执行，无需加锁
+        fileobj.seek(0)
+        written[index] = (arcname, fileobj.read(size))
+
+    success_count, failed = batch_views._download_articles_concurrently(articles, "[test]", _on_downloaded)
+
+    assert success_count == 11 and len(stats["calls"]) == 12
+    assert [item["reason"] for item in failed] == ["缺少PDF链接或标题", "下载或保存失败"]  # 按输入顺序
+    assert failed[1]["pdfLink_attempted"] == failing_url
+    assert stats["max_active"] <= 4 and max(stats["max_per_host"].values()) <= 2
+    assert stats["max_active"] > 2  # 不同主机的下载并行进行
+    assert written[0] == ("Paper_a0.pdf", b"%PDF-1.4 https://a.example/0.pdf")
+
+
+def test_streamed_zip_contains_downloads_and_failure_manifest(app, monkeypatch):
+    _fake_downloads(monkeypatch, delay=0, failing_urls={"https://b.example/2.pdf"})
+    articles = [{"title": "Same Title", "pdfLink": "https://a.example/1.pdf"},
+                {"title": "Same Title", "pdfLink": "https://b.example/2.pdf"},
+                {"title": "Same Title", "pdfLink": "https://c.example/3.pdf"},
+                {"title": "Missing link", "doi": "10.1000/x"}]
+    with app.test_request_context():
+        response = batch_views._stream_zip_response(articles, "文献包.zip", "[test]")
+        body = b"".join(response.response)
+
+    assert response.headers["Content-Type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(body)) as archive:
+        assert archive.testzip() is None
+        names = archive.namelist()
+        assert names[:2] == ["Same_Title.pdf", "Same_Title_3.pdf"]  # 文件名按输入顺序预先分配，失败的条目不写入
+        assert archive.read("Same_Title_3.pdf") == b"%PDF-1.4 https://c.example/3.pdf"
+        manifest = archive.read("_下载失败清单.txt").decode("utf-8")
+    assert "https://b.example/2.pdf" in manifest and "10.1000/x" in manifest
+
+
+def test_overlapping_batch_reuses_entries_from_completed_zip(app, monkeypatch, tmp_path):
+    app.config["ZIPPED_FILES_DIR"] = str(tmp_path)
+    old_articles = [{"title": "Shared", "doi": "10.1000/shared", "pdfLink": "https://a.example/shared.pdf"}]
+    with zipfile.ZipFile(tmp_path / "old.zip", "w") as archive:
+        archive.writestr("Shared.pdf", b"%PDF-1.4 shared")
+    db.session.add(BatchTask(task_id="old-task", status="COMPLETED", zip_filename="old.zip",
+                             processed_at=datetime.now(timezone.utc)))
+    db.session.commit()
+    batch_views._record_task_artifacts("old-task", old_articles, [(0, "Shared.pdf", 15)], "[test]")
+
+    stats = _fake_downloads(monkeypatch, delay=0)
+    new_articles = [{"title": "Shared again", "doi": "https://doi.org/10.1000/SHARED", "pdfLink": "https://mirror.example/x.pdf"},
+                    {"title": "New", "pdfLink": "https://a.example/new.pdf"}]
+    written = {}
+
+    def _on_downloaded(index, arcname, fileobj, size):
+        fileobj.seek(0)
+        written[arcname] = fileobj.read(size)
+
+    assert batch_views._download_articles_concurrently(new_articles, "[test]", _on_downloaded) == (2, [])
+    assert written["Shared_again.pdf"] == b"%PDF-1.4 shared"  # 按规范化DOI匹配，从旧ZIP复制
+    assert stats["calls"] == ["https://a.example/new.pdf"]
+
+    BatchTask.query.filter_by(task_id="old-task").update({"status": "EVICTED"})
+    db.session.commit()
+    assert batch_views._find_previous_zip_entry(["doi:10.1000/shared"]) is None  # 已清理的ZIP不再复用
+
+
+def _delete(client, task_id):
+    return client.post("/api/delete_batch_record", json={"task_id": task_id})
+
+
+def test_delete_is_limited_to_submitters_and_unlinks_shared_tasks(client, monkeypatch, app, tmp_path):
+    app.config["ZIPPED_FILES_DIR"] = str(tmp_path)
+    monkeypatch.setattr(batch_views, "log_user_activity", lambda *args, **kwargs: None)
+    _as_user(monkeypatch, 1)
+    task_id = client.post("/api/batch_process_and_zip", json={"articles": ARTICLES}).get_json()["task_id"]
+    _as_user(monkeypatch, 2)
+    client.post("/api/batch_process_and_zip", json={"articles": ARTICLES})
+    (tmp_path / "shared.zip").write_bytes(b"PK")
+    BatchTask.query.filter_by(task_id=task_id).update({"status": "COMPLETED", "zip_filename": "shared.zip"})
+    db.session.commit()
+
+    _as_user(monkeypatch, 3)
+    assert _delete(client, task_id).status_code == 404  # 非提交者
+
+    _as_user(monkeypatch, 1)
+    assert _delete(client, task_id).status_code == 200  # 首个提交者移除自己的记录
+    task = BatchTask.query.filter_by(task_id=task_id).first()
+    assert task.user_id == 2 and [s.user_id for s in task.submitters] == [2]
+    assert (tmp_path / "shared.zip").exists()
+    assert _progress_status(client, task_id) == 404
+
+    _as_user(monkeypatch, 2)
+    assert _delete(client, task_id).status_code == 200  # 最后一个提交者：删除任务与ZIP
+    assert BatchTask.query.filter_by(task_id=task_id).first() is None
+    assert not (tmp_path / "shared.zip").exists()
+
+
+def test_task_in_progress_cannot_be_deleted(client, monkeypatch):
+    _as_user(monkeypatch, 1)
+    task_id = client.post("/api/batch_process_and_zip", json={"articles": ARTICLES}).get_json()["task_id"]
+    for status in ("PROCESSING", "STREAMABLE"):
+        BatchTask.query.filter_by(task_id=task_id).update({"status": status})
+        db.session.commit()
+        assert _delete(client, task_id).status_code == 409
+    assert BatchTask.query.filter_by(task_id=task_id).first() is not None
+
+
+def test_proxy_cache_stats_require_login(client, monkeypatch):
+    monkeypatch.setattr(batch_views, "get_current_user_from_token", lambda: None)
+    assert client.get("/api/proxy-pdf/cache-stats").status_code == 401
+    _as_user(monkeypatch, 1)
+    body = client.get("/api/proxy-pdf/cache-stats").get_json()
+    assert body["success"] and "hit_ratio" in body["stats"]
@@ -0,0 +1,137 @@
+# backend/test_batch_worker.py
+import os
+import socket
+import time
+from collections import namedtuple
+from datetime import datetime, timezone, timedelta
+
+from flask import current_app
+
+import batch_views
+from batch_progress import batch_progress, TERMINAL_EVENT
+import batch_worker
+from models import db, BatchTask
+
+LeaseRow = namedtuple('LeaseRow', ['worker_id', 'processing_started_at'])
+
+
+def _expired(worker_id):
+    now = datetime.now(timezone.utc)
+    return batch_worker._lease_expired(LeaseRow(worker_id, now), now, lease_seconds=3600)
+
+
+def test_task_claimed_by_this_process_keeps_its_lease():
+    assert not _expired(f"{batch_worker.process_worker_id_prefix()}:0")
+
+
+def test_reused_pid_from_previous_boot_is_orphaned():
+    host, pid = socket.gethostname(), os.getpid()
+    assert _expired(f"{host}:{pid}:0123456789ab:0")  # 同一进程ID，另一次启动
+    assert _expired(f"{host}:{pid}:0")  # 不带启动标识的旧格式
+
+
+def test_other_hosts_and_live_local_processes_rely_on_lease():
+    assert not _expired(f"other-host:{os.getpid()}:0123456789ab:0")
+    assert not _expired(f"{socket.gethostname()}:{os.getppid()}:0123456789ab:0")
+
+
+def test_boot_id_changes_after_fork(monkeypatch):
+    boot_id = batch_worker.process_boot_id()
+    assert batch_worker.process_boot_id() == boot_id
+    monkeypatch.setattr(batch_worker.os, "getpid", lambda: -1)
+    assert batch_worker.process_boot_id() != boot_id
+
+
+def _submitted_task(task_id="content-id", **overrides):
+    task = BatchTask(task_id=task_id, status="SUBMITTED", articles=[{"doi": "10.1000/a"}])
+    for name, value in overrides.items():
+        setattr(task, name, value)
+    db.session.add(task)
+    db.session.commit()
+    return task
+
+
+def test_task_is_claimed_exactly_once(app):
+    _submitted_task()
+    worker = f"{batch_worker.process_worker_id_prefix()}:0"
+    assert batch_worker.claim_task_for_processing("content-id", worker) == [{"doi": "10.1000/a"}]
+    assert batch_worker.claim_task_for_processing("content-id", f"{batch_worker.process_worker_id_prefix()}:1") is None
+
+    task = BatchTask.query.filter_by(task_id="content-id").first()
+    assert (task.status, task.worker_id, task.attempts) == ("PROCESSING", worker, 1)
+    assert batch_worker.find_runnable_task_ids() == []
+
+
+def test_expired_lease_is_reclaimed_until_max_attempts(app):
+    app.config.update(BATCH_JOB_LEASE_SECONDS=60, BATCH_JOB_MAX_ATTEMPTS=2)
+    long_ago = datetime.now(timezone.utc) - timedelta(hours=2)
+    _submitted_task(status="PROCESSING", attempts=1, worker_id="other-host:1:0123456789ab:0",
+                    processing_started_at=long_ago)
+    assert batch_worker.find_runnable_task_ids() == ["content-id"]
+    assert batch_worker.claim_task_for_processing("content-id", "this-host:2:ba9876543210:0") is not None
+
+    BatchTask.query.filter_by(task_id="content-id").update({"processing_started_at": long_ago})
+    db.session.commit()
+    assert batch_worker.claim_task_for_processing("content-id", "this-host:2:ba9876543210:0") is None
+    assert BatchTask.query.filter_by(task_id="content-id").first().status == "FAILED"  # 超过最大重试次数
+
+    # 进度订阅者收到终态事件，SSE 连接随即结束
+    events, finished = batch_progress.wait_for_events("content-id", 0, timeout=0)
+    assert finished
+    event_type, data = events[-1][1:]
+    assert (event_type, data["status"], data["total_requested"]) == (TERMINAL_EVENT, "FAILED", 1)
+    assert "已放弃" in data["error_message"]
+
+
+def _claim_as(task_id, worker_id):
+    assert batch_worker.claim_task_for_processing(task_id, worker_id) is not None
+    return batch_worker.TaskLease(current_app._get_current_object(), task_id, worker_id)
+
+
+def test_running_task_renews_its_lease(app):
+    app.config["BATCH_JOB_LEASE_SECONDS"] = 3  # 每秒续租一次
+    _submitted_task()
+    worker = f"{batch_worker.process_worker_id_prefix()}:0"
+    with _claim_as("content-id", worker) as lease:
+        BatchTask.query.filter_by(task_id="content-id").update(
+            {"processing_started_at": datetime.now(timezone.utc) - timedelta(seconds=2)})
+        db.session.commit()
+        time.sleep(1.5)
+        db.session.expire_all()
+        started_at = batch_worker._as_utc(BatchTask.query.filter_by(task_id="content-id").first().processing_started_at)
+        assert datetime.now(timezone.utc) - started_at < timedelta(seconds=1.5)
+        assert lease.held
+
+
+def test_taken_over_execution_cannot_publish_its_result(app, monkeypatch, tmp_path):
+    app.config.update(ZIPPED_FILES_DIR=str(tmp_path), BATCH_JOB_LEASE_SECONDS=60)
+    _submitted_task(articles=[{"title": "Alpha", "pdfLink": "https://a.example/alpha.pdf"}])
+    stale_worker, new_worker = "other-host:1:0123456789ab:0", "other-host:2:ba9876543210:0"
+    stale_lease = _claim_as("content-id", stale_worker)
+
+    def _slow_download(pdf_url, fileobj, progress_callback=None):
+        # 下载期间旧执行的租约过期，被另一个工作线程接管
+        BatchTask.query.filter_by(task_id="content-id").update(
+            {"processing_started_at": datetime.now(timezone.utc) - timedelta(hours=2)})
+        db.session.commit()
+        assert batch_worker.find_runnable_task_ids() == ["content-id"]
+        assert batch_worker.claim_task_for_processing("content-id", new_worker) is not None
+        fileobj.write(b"%PDF-1.4 alpha")
+        return 14
+
+    monkeypatch.setattr(batch_views, "download_pdf_to_fileobj", _slow_download)
+    summaries = []
+    monkeypatch.setattr(batch_views, "_publish_task_summary", lambda task_id, status, *args, **kwargs: summaries.append(status))
+
+    result = batch_views._perform_batch_processing_for_blueprint(
+        [{"title": "Alpha", "pdfLink": "https://a.example/alpha.pdf"}], "content-id", stale_lease)
+
+    assert result["status"] == "ABANDONED" and not stale_lease.held
+    assert os.listdir(tmp_path) == []  # 旧执行的 .part 已删除，未发布ZIP
+    task = BatchTask.query.filter_by(task_id="content-id").first()
+    assert (task.status, task.worker_id, task.zip_filename) == ("PROCESSING", new_worker, None)
+    assert summaries == []
+    # 旧执行兜底写入失败状态同样被拒绝
+    assert not batch_views._temp_update_final_record_for_blueprint("content-id", "FAILED", worker_id=stale_worker)
+    assert batch_views._temp_update_final_record_for_blueprint("content-id", "FAILED", worker_id=new_worker)
+    assert summaries == ["FAILED"]
@@ -0,0 +1,26 @@
+# backend/test_deadline.py
+import pytest
+import requests
+
+from deadline import Deadline, DeadlineExceeded
+
+
+def test_timeout_is_capped_by_remaining_budget():
+    deadline = Deadline(2)
+    assert deadline.timeout(30) <= 2
+    assert deadline.timeout(0.5) == 0.5
+    assert 0 < deadline.timeout() <= 2
+    assert not deadline.expired()
+
+
+def test_expired_deadline_raises_a_requests_timeout():
+    deadline = Deadline(0)
+    assert deadline.expired() and deadline.remaining() == 0
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout(5)
+    assert issubclass(DeadlineExceeded, requests.exceptions.Timeout)  # 调用方现有的超时分支即可处理
+
+
+def test_negative_budget_is_treated_as_expired():
+    deadline = Deadline(-3)
+    assert deadline.budget_seconds == 0 and deadline.expired()
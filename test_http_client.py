@@ -0,0 +1,147 @@
+# backend/test_http_client.py
+import io
+import time
+
+import pytest
+import requests
+
+from deadline import Deadline, DeadlineExceeded
+from http_client import OutboundHttpClient, RateLimitExceeded, NO_RETRY, _TokenBucket, _retry_after_seconds
+
+URL = "https://api.example.org/v2/item"
+
+
+def _response(status_code, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(b"")
+    response.headers.update(headers or {})
+    return response
+
+
+def _client(monkeypatch, outcomes, retries=2, backoff_factor=0.01):
+    """outcomes 为依次返回的响应或抛出的异常；返回 (client, 记录每次尝试超时的列表)。"""
+    client = OutboundHttpClient()
+    client._service_settings = {"svc": {"retries": retries, "backoff_factor": backoff_factor}}
+    service = client._service("svc")
+    attempts = []
+    remaining = list(outcomes)
+
+    def _fake_request(method, url, **kwargs):
+        attempts.append(kwargs.get("timeout"))
+        outcome = remaining.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(service.session, "request", _fake_request)
+    return client, attempts
+
+
+def test_retries_status_codes_within_budget(monkeypatch):
+    client, attempts = _client(monkeypatch, [_response(503), _response(200)])
+    response = client.get("svc", URL, timeout=25, deadline=Deadline(5))
+    assert response.status_code == 200
+    assert len(attempts) == 2
+    assert all(timeout <= 5 for timeout in attempts)
+
+
+def test_does_not_sleep_past_the_deadline(monkeypatch):
+    client, attempts = _client(monkeypatch, [_response(503, {"Retry-After": "10"}), _response(200)])
+    started_at = time.monotonic()
+    response = client.get("svc", URL, timeout=25, deadline=Deadline(0.5))
+    assert response.status_code == 503  # 等待 Retry-After 会超出预算，直接返回最后的响应
+    assert len(attempts) == 1
+    assert time.monotonic() - started_at < 0.5
+
+
+def test_connection_errors_stop_retrying_when_budget_is_short(monkeypatch):
+    client, attempts = _client(monkeypatch, [requests.exceptions.ConnectionError("refused")] * 3, backoff_factor=1)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get("svc", URL, timeout=25, deadline=Deadline(0.5))
+    assert len(attempts) == 1
+
+
+def test_expired_deadline_sends_nothing(monkeypatch):
+    client, attempts = _client(monkeypatch, [_response(200)])
+    with pytest.raises(DeadlineExceeded):
+        client.get("svc", URL, deadline=Deadline(0))
+    assert attempts == []
+
+
+def test_token_bucket_allows_burst_then_spaces_requests():
+    bucket = _TokenBucket(rate_per_second=2, burst=2)
+    assert bucket.reserve() == 0.0 and bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.5, abs=0.05)
+    bucket.refund()
+    assert bucket.reserve() == pytest.approx(0.5, abs=0.05)
+
+
+def test_rate_limited_request_waits_or_is_rejected(monkeypatch):
+    client, attempts = _client(monkeypatch, [_response(200), _response(200)])
+    client._service("svc").settings.update(rate_per_second=1, burst=1)
+    client.max_wait_seconds = 0.5
+    assert client.get("svc", URL, deadline=Deadline(5)).status_code == 200
+    with pytest.raises(RateLimitExceeded):  # 下一个令牌要约 1 秒后才有，超过最长等待时间
+        client.get("svc", URL, deadline=Deadline(5))
+    assert len(attempts) == 1
+    assert client._service("svc").metrics["rate_limit_rejections"] == 1
+    # 其他主机有独立的令牌桶
+    assert client.get("svc", "https://other.example.org/x", deadline=Deadline(5)).status_code == 200
+
+
+def test_each_service_has_its_own_pool_and_retry_policy():
+    client = OutboundHttpClient()
+    client._service_settings = {"slow": {"retries": 0, "pool_maxsize": 2}, "fast": {"retries": 3, "pool_maxsize": 8}}
+    slow, fast = client._service("slow"), client._service("fast")
+    assert slow.session is not fast.session
+    assert slow.adapter.max_retries.total == 0 and fast.adapter.max_retries.total == 3
+    assert (slow.settings["pool_maxsize"], fast.settings["pool_maxsize"]) == (2, 8)
+    assert fast.settings["backoff_factor"] == 0.5  # 未配置的字段使用默认值
+    assert client._service("slow") is slow
+
+
+def test_retry_after_is_capped():
+    assert _retry_after_seconds(_response(429, {"Retry-After": "3600"}), 30) == 30
+    assert _retry_after_seconds(_response(429, {"Retry-After": "2"}), 30) == 2
+    assert _retry_after_seconds(_response(429)) is None
+
+
+def test_retry_after_cap_is_per_client(app):
+    app.config["HTTP_CLIENT_MAX_RETRY_AFTER_SECONDS"] = 5
+    configured = OutboundHttpClient(app)
+    default = OutboundHttpClient()
+    assert configured._service("svc").adapter.max_retries.max_retry_after_seconds == 5
+    assert default._service("svc").adapter.max_retries.max_retry_after_seconds == 30
+    # urllib3 每次重试生成的新 Retry 对象保留上限
+    assert configured._service("svc").adapter.max_retries.increment(method="GET", url=URL).max_retry_after_seconds == 5
+
+
+def test_budgeted_requests_share_the_pool_without_automatic_retries(monkeypatch):
+    client = OutboundHttpClient()
+    client._service_settings = {"svc": {"retries": 3}}
+    service = client._service("svc")
+    seen_retries = []
+
+    def _fake_send(request, **kwargs):
+        seen_retries.append(service.session.get_adapter(request.url).max_retries)
+        response = _response(200)
+        response.request, response.url = request, request.url
+        return response
+
+    monkeypatch.setattr(service.adapter, "send", _fake_send)
+    client.get("svc", URL, deadline=Deadline(5))
+    client.get("svc", URL)
+    assert seen_retries[0] is NO_RETRY
+    assert seen_retries[1].total == 3
+
+
+def test_outbound_stats_require_login(app, monkeypatch):
+    import main_views
+    app.register_blueprint(main_views.main_bp)
+    client = app.test_client()
+    monkeypatch.setattr(main_views, "get_current_user_from_token", lambda: None)
+    assert client.get("/api/outbound_http_stats").status_code == 401
+    monkeypatch.setattr(main_views, "get_current_user_from_token", lambda: {"user_id": 1, "username": "reader"})
+    response = client.get("/api/outbound_http_stats")
+    assert response.status_code == 200 and response.get_json()["success"]
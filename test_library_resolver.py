@@ -0,0 +1,84 @@
+# backend/test_library_resolver.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import library_resolver
+from library_resolver import LibraryAutoResolver, FOUND_STATUS, FAILED_STATUS
+from models import db, User, LiteratureArticle, LibraryResolveJob
+
+WORKER_ID = "test-host:1:library-0"
+
+
+def _setup_library(titles):
+    user = User(username="resolver", email="resolver@university.edu", password_hash="x")
+    db.session.add(user)
+    db.session.flush()
+    article_ids = {}
+    for title in titles:
+        article = LiteratureArticle(user_id=user.id, title=title, status='待处理')
+        db.session.add(article)
+        db.session.flush()
+        article_ids[title] = article.id
+    job = LibraryResolveJob(user_id=user.id, status="RUNNING", worker_id=WORKER_ID,
+                            heartbeat_at=datetime.now(timezone.utc), total_candidates=len(titles))
+    db.session.add(job)
+    db.session.commit()
+    return job.id, article_ids
+
+
+def _run(app, job_id):
+    resolver = LibraryAutoResolver(app)
+    resolver._resolve_pool = ThreadPoolExecutor(max_workers=2)
+    try:
+        resolver._run_job(job_id, WORKER_ID)
+    finally:
+        resolver._resolve_pool.shutdown(wait=True)
+
+
+def test_errored_lookups_are_left_unmarked_and_retried(app, monkeypatch):
+    job_id, article_ids = _setup_library(["found", "missing", "flaky", "down"])
+    calls = {"flaky": 0}
+
+    def _outcome(doi=None, title=None, deadline=None, background=False):
+        assert background  # 整库解析不占用交互式查询的线程池
+        if title == "found":
+            return "https://oa.example/found.pdf", True
+        if title == "flaky":
+            calls["flaky"] += 1
+            return (None, False) if calls["flaky"] == 1 else ("https://oa.example/flaky.pdf", True)
+        if title == "down":
+            return None, False  # 两轮都出错
+        return None, True
+
+    monkeypatch.setattr(library_resolver, "find_pdf_link_outcome", _outcome)
+    _run(app, job_id)
+
+    articles = {article.title: article for article in LiteratureArticle.query.all()}
+    assert articles["found"].status == FOUND_STATUS
+    assert articles["missing"].status == FAILED_STATUS
+    assert articles["flaky"].pdf_link == "https://oa.example/flaky.pdf"  # 重试轮找到
+    assert articles["down"].status == '待处理' and not articles["down"].pdf_link
+    job = db.session.get(LibraryResolveJob, job_id)
+    assert job.status == "COMPLETED"
+    assert (job.num_processed, job.num_found) == (3, 2)
+    assert job.cursor_article_id == article_ids["down"]
+
+
+def test_job_stops_when_heartbeat_shows_it_was_taken_over(app, monkeypatch):
+    job_id, _ = _setup_library(["slow"])
+    app.config["LIBRARY_RESOLVE_LEASE_SECONDS"] = 3  # 每秒刷新一次心跳
+
+    def _slow_outcome(doi=None, title=None, deadline=None, background=False):
+        with app.app_context():
+            LibraryResolveJob.query.filter_by(id=job_id).update({"worker_id": "other-host:1:library-0"})
+            db.session.commit()
+        time.sleep(1.5)
+        return "https://oa.example/slow.pdf", True
+
+    monkeypatch.setattr(library_resolver, "find_pdf_link_outcome", _slow_outcome)
+    _run(app, job_id)
+
+    article = LiteratureArticle.query.one()
+    assert not article.pdf_link  # 已被接管，本线程不再写回
+    assert db.session.get(LibraryResolveJob, job_id).num_processed == 0
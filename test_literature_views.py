@@ -0,0 +1,141 @@
+# backend/test_literature_views.py
+import json
+from datetime import datetime
+
+import pytest
+
+import literature_views
+from models import db, User, LiteratureArticle
+
+YEARS = [2020, None, 2018, 2020, None, 2021, 2018, 2019]
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    app.register_blueprint(literature_views.literature_bp)
+    monkeypatch.setattr(literature_views, "get_current_user_from_token", lambda: {"user_id": 1, "username": "reader"})
+    db.session.add(User(id=1, username="reader", email="reader@example.com", password_hash="x"))
+    db.session.add(User(id=2, username="other", email="other@example.com", password_hash="x"))
+    same_time = datetime(2024, 5, 1, 12, 0, 0)
+    for index, year in enumerate(YEARS):
+        db.session.add(LiteratureArticle(user_id=1, title=f"Paper {index}", year=year, created_at=same_time))
+    db.session.add(LiteratureArticle(user_id=2, title="Someone else's paper", year=2020))
+    db.session.commit()
+    return app.test_client()
+
+
+def _all_pages(client, **params):
+    items, cursor, pages = [], None, 0
+    while True:
+        query = dict(params, limit=3, **({"cursor": cursor} if cursor else {}))
+        body = client.get("/api/user/literature_list", query_string=query).get_json()
+        assert body["success"], body
+        items.extend(body["items"])
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return items, pages
+
+
+def _expected_ids(sort_column, descending):
+    articles = LiteratureArticle.query.filter_by(user_id=1).all()
+    with_value = sorted((a for a in articles if getattr(a, sort_column) is not None),
+                        key=lambda a: (getattr(a, sort_column), a.id), reverse=descending)
+    nulls = sorted((a for a in articles if getattr(a, sort_column) is None), key=lambda a: a.id, reverse=descending)
+    return [a.id for a in with_value + nulls]
+
+
+def test_cursor_round_trip_and_validation():
+    created_at = datetime(2024, 5, 1, 12, 0, 0)
+    cursor = literature_views._encode_literature_list_cursor("created_at", "desc", created_at, 42)
+    assert "=" not in cursor
+    assert literature_views._decode_literature_list_cursor(cursor, "created_at", "desc") == (created_at, 42)
+
+    null_cursor = literature_views._encode_literature_list_cursor("year", "asc", None, 7)
+    assert literature_views._decode_literature_list_cursor(null_cursor, "year", "asc") == (None, 7)
+
+    with pytest.raises(ValueError):
+        literature_views._decode_literature_list_cursor(cursor, "created_at", "asc")  # 排序方式不一致
+    with pytest.raises(ValueError):
+        literature_views._decode_literature_list_cursor("not-a-cursor", "created_at", "desc")
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_year_pages_cover_every_row_once_with_nulls_last(client, order):
+    items, pages = _all_pages(client, sort="year", order=order)
+    assert [item["id"] for item in items] == _expected_ids("year", order == "desc")
+    assert [item["year"] for item in items][-2:] == [None, None]
+    assert pages == 3
+
+
+def test_tied_timestamps_page_by_id(client):
+    items, _ = _all_pages(client, sort="created_at", order="desc")
+    assert [item["id"] for item in items] == _expected_ids("id", True)
+
+
+def test_invalid_cursor_is_rejected(client):
+    response = client.get("/api/user/literature_list", query_string={"cursor": "garbage", "limit": 3})
+    assert response.status_code == 400
+
+
+def test_streamed_list_is_valid_json_across_chunks(client, app):
+    app.config["LITERATURE_LIST_STREAM_CHUNK_BYTES"] = 64  # 每一两行就写出一块
+    response = client.get("/api/user/literature_list", query_string={"stream": "true", "sort": "year", "order": "asc"})
+    chunks = list(response.response)
+    assert len(chunks) > 2
+    rows = json.loads(b"".join(chunks))
+    assert [row["id"] for row in rows] == _expected_ids("year", False)
+
+
+def test_stream_cannot_be_combined_with_paging(client):
+    response = client.get("/api/user/literature_list", query_string={"stream": "1", "limit": 5})
+    assert response.status_code == 400
+
+
+def test_json_row_encoder_falls_back_for_values_orjson_rejects():
+    big_number = 2 ** 70
+    assert json.loads(literature_views._encode_json_row({"n": big_number, "t": "标题"})) == {"n": big_number, "t": "标题"}
+
+
+def test_bulk_find_streams_one_line_per_item_and_writes_back(client, monkeypatch):
+    doi_calls, title_batches = [], []
+
+    def _find(doi=None, title=None, background=False):
+        assert background  # 批量查找不占用交互式查询的线程池
+        doi_calls.append(doi)
+        return "https://example.org/alpha.pdf" if doi == "10.1000/alpha" else None
+
+    def _find_titles(titles):
+        title_batches.append(list(titles))
+        return {title: ("https://arxiv.org/pdf/1" if title == "Paper 2" else None) for title in titles}
+
+    monkeypatch.setattr(literature_views, "find_pdf_link", _find)
+    monkeypatch.setattr(literature_views, "find_pdf_links_by_titles", _find_titles)
+    items = [{"doi": "10.1000/alpha", "article_id": 1, "id": "row-a"},
+             {"doi": "10.1000/alpha", "article_id": 2},  # 相同DOI只解析一次
+             {"doi": "10.1000/beta", "article_id": 9},  # 其他用户的文献不会被写回
+             {"title": "Paper 2", "article_id": 3},
+             {"title": "Paper 4", "article_id": 5},
+             {"doi": "not-a-doi"}]
+    response = client.post("/api/find-pdf/bulk", json={"items": items, "write_back": True})
+
+    assert response.headers["Content-Type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    results = {line["index"]: line for line in lines if line["type"] == "result"}
+    assert sorted(results) == list(range(len(items)))
+    assert (results[0]["id"], results[0]["pdfLink"]) == ("row-a", "https://example.org/alpha.pdf")
+    assert results[1]["success"] and not results[2]["success"] and results[3]["success"]
+    assert results[5]["message"]
+    assert lines[-1] == {"type": "summary", "total": 6, "found": 3, "not_found": 2, "invalid": 1, "updated": 4}
+    assert sorted(doi_calls) == ["10.1000/alpha", "10.1000/beta"]
+    assert title_batches == [["Paper 2", "Paper 4"]]  # 只有标题的条目合并为一次 arXiv 查询
+
+    pdf_links = {article.id: article.pdf_link for article in LiteratureArticle.query.all()}
+    assert pdf_links[1] == pdf_links[2] == "https://example.org/alpha.pdf"
+    assert pdf_links[3] == "https://arxiv.org/pdf/1" and pdf_links[9] is None
+
+
+def test_bulk_find_rejects_empty_and_oversized_requests(client, app):
+    assert client.post("/api/find-pdf/bulk", json={"items": []}).status_code == 400
+    app.config["PDF_BULK_RESOLVE_MAX_ITEMS"] = 2
+    assert client.post("/api/find-pdf/bulk", json={"items": [{"doi": "10.1000/a"}] * 3}).status_code == 413
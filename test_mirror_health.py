@@ -0,0 +1,101 @@
+# backend/test_mirror_health.py
+from mirror_health import MirrorHealthTracker, CIRCUIT_CLOSED, CIRCUIT_OPEN, CIRCUIT_HALF_OPEN
+
+DOMAIN = "https://sci-hub.example"
+
+
+def _tripped_tracker(open_seconds=0):
+    tracker = MirrorHealthTracker()
+    tracker.open_seconds = open_seconds
+    for _ in range(tracker.failure_threshold):
+        assert tracker.allow_request(DOMAIN)
+        tracker.record_result(DOMAIN, 1.0, False)
+    return tracker
+
+
+def test_consecutive_failures_open_the_circuit():
+    tracker = MirrorHealthTracker()
+    tracker.record_result(DOMAIN, 1.0, False)
+    tracker.record_result(DOMAIN, 1.0, False)
+    tracker.record_result(DOMAIN, 0.3, True)  # 成功清零连续失败计数
+    assert not tracker.record_result(DOMAIN, 1.0, False)
+    assert not tracker.record_result(DOMAIN, 1.0, False)
+    assert tracker.record_result(DOMAIN, 1.0, False)  # 第 failure_threshold 次连续失败：CLOSED -> OPEN
+
+    state = tracker.snapshot()[DOMAIN]
+    assert state["circuit"] == CIRCUIT_OPEN
+    assert state["error_rate"] == round(5 / 6, 4)
+    assert 0 < state["open_remaining_seconds"] <= tracker.open_seconds
+    assert not tracker.allow_request(DOMAIN)
+
+
+def test_half_open_probe_success_closes_and_failure_reopens():
+    tracker = _tripped_tracker()
+    assert tracker.allow_request(DOMAIN)
+    assert tracker.record_result(DOMAIN, 0.4, True)
+    assert tracker.snapshot()[DOMAIN]["circuit"] == CIRCUIT_CLOSED
+
+    tracker = _tripped_tracker()
+    assert tracker.allow_request(DOMAIN)
+    tracker.open_seconds = 3600
+    assert tracker.record_result(DOMAIN, 1.0, False)  # 探测失败，一次即重新熔断
+    assert tracker.snapshot()[DOMAIN]["circuit"] == CIRCUIT_OPEN
+    assert not tracker.allow_request(DOMAIN)
+
+
+def test_domains_ordered_by_p50_with_open_circuits_last():
+    tracker = MirrorHealthTracker()
+    tracker.open_seconds = 3600
+    for latency in (0.9, 1.0, 1.1):
+        tracker.record_result("https://slow.example", latency, True)
+    for latency in (0.1, 0.2, 5.0):
+        tracker.record_result("https://fast.example", latency, True)
+    for _ in range(tracker.failure_threshold):
+        tracker.record_result("https://down.example", 1.0, False)
+
+    domains = ["https://down.example", "https://slow.example", "https://fast.example", "https://new.example"]
+    assert tracker.ordered_domains(domains) == [
+        "https://new.example", "https://fast.example", "https://slow.example", "https://down.example"]
+
+
+def test_release_probe_lets_next_request_probe_again():
+    tracker = _tripped_tracker()
+    assert tracker.allow_request(DOMAIN)  # 冷却结束，放行半开探测
+    assert tracker.snapshot()[DOMAIN]["circuit"] == CIRCUIT_HALF_OPEN
+    assert not tracker.allow_request(DOMAIN)  # 探测进行中，不放行其他请求
+
+    tracker.release_probe(DOMAIN)  # 探测因本地限速/预算用完而未得出结果
+
+    assert tracker.allow_request(DOMAIN)
+    tracker.record_result(DOMAIN, 0.2, True)
+    assert tracker.snapshot()[DOMAIN]["circuit"] == CIRCUIT_CLOSED
+
+
+def test_release_probe_is_noop_when_closed_or_open():
+    tracker = MirrorHealthTracker()
+    tracker.release_probe(DOMAIN)
+    assert tracker.allow_request(DOMAIN)
+
+    tracker = _tripped_tracker(open_seconds=3600)
+    tracker.release_probe(DOMAIN)
+    assert tracker.snapshot()[DOMAIN]["circuit"] == CIRCUIT_OPEN
+    assert not tracker.allow_request(DOMAIN)
+
+
+def test_scihub_lookup_releases_probe_when_rate_limited(monkeypatch):
+    from flask import Flask
+    import utils
+    from http_client import RateLimitExceeded
+
+    tracker = _tripped_tracker()
+    monkeypatch.setattr(utils, "mirror_health", tracker)
+
+    def _rate_limited(*args, **kwargs):
+        raise RateLimitExceeded("本地令牌桶已满")
+
+    monkeypatch.setattr(utils.http_client, "get", _rate_limited)
+    with Flask(__name__).app_context():
+        assert utils.find_pdf_link_via_scihub("10.1000/xyz", DOMAIN) is None
+
+    assert tracker.snapshot()[DOMAIN]["circuit"] == CIRCUIT_HALF_OPEN
+    assert tracker.allow_request(DOMAIN)  # 下一个请求仍可探测，镜像没有被永久停用
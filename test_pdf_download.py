@@ -0,0 +1,83 @@
+# backend/test_pdf_download.py
+import io
+import os
+
+import pytest
+import requests
+
+import utils
+
+PDF_URL = "https://publisher.example/paper.pdf"
+CONTENT = b"%PDF-1.5\n" + bytes(range(256)) * 8
+
+
+def _response(status_code, body, headers):
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(body)
+    response.headers.update(headers)
+    response.url = PDF_URL
+    return response
+
+
+@pytest.fixture
+def fake_server(app, monkeypatch):
+    """依次返回给定的响应，并记录每次请求的请求头。"""
+    requests_seen, responses = [], []
+
+    def _get(service, url, **kwargs):
+        requests_seen.append(dict(kwargs.get("headers") or {}))
+        return responses.pop(0)
+
+    monkeypatch.setattr(utils.http_client, "get", _get)
+    monkeypatch.setattr(utils.time, "sleep", lambda seconds: None)
+    return requests_seen, responses
+
+
+def _full_headers(**extra):
+    headers = {"Content-Type": "application/pdf", "Content-Length": str(len(CONTENT)),
+               "Accept-Ranges": "bytes", "ETag": '"v1"'}
+    headers.update(extra)
+    return headers
+
+
+def test_interrupted_download_resumes_from_partial_bytes(app, tmp_path, fake_server):
+    requests_seen, responses = fake_server
+    part_path = str(tmp_path / "paper.part")
+    responses.append(_response(200, CONTENT[:700], _full_headers()))  # 连接提前结束
+    responses.append(_response(206, CONTENT[700:], {
+        "Content-Type": "application/pdf", "Content-Range": f"bytes 700-{len(CONTENT) - 1}/{len(CONTENT)}"}))
+
+    assert utils.download_pdf_resumable(PDF_URL, part_path) == len(CONTENT)
+
+    assert requests_seen[1]["Range"] == "bytes=700-" and requests_seen[1]["If-Range"] == '"v1"'
+    with open(part_path, "rb") as f:
+        assert f.read() == CONTENT
+    assert not os.path.exists(part_path + utils.PDF_PART_META_SUFFIX)
+
+
+def test_partial_file_survives_failed_call_and_restarts_when_changed(app, tmp_path, fake_server):
+    requests_seen, responses = fake_server
+    app.config["PDF_DOWNLOAD_RESUME_ATTEMPTS"] = 1
+    part_path = str(tmp_path / "paper.part")
+    responses.append(_response(200, CONTENT[:500], _full_headers()))
+    assert utils.download_pdf_resumable(PDF_URL, part_path) is None
+    assert os.path.getsize(part_path) == 500  # 可续传，保留 .part 供下次调用
+
+    changed = b"%PDF-1.6\n" + bytes(reversed(range(256))) * 8
+    responses.append(_response(200, changed, _full_headers(ETag='"v2"')))  # If-Range 不匹配：源站返回完整新文件
+    assert utils.download_pdf_resumable(PDF_URL, part_path) == len(changed)
+    assert requests_seen[1]["Range"] == "bytes=500-"
+    with open(part_path, "rb") as f:
+        assert f.read() == changed
+
+
+def test_non_resumable_failure_discards_partial_file(app, tmp_path, fake_server):
+    _, responses = fake_server
+    app.config["PDF_DOWNLOAD_RESUME_ATTEMPTS"] = 1
+    part_path = str(tmp_path / "paper.part")
+    headers = _full_headers()
+    del headers["Accept-Ranges"]
+    responses.append(_response(200, CONTENT[:500], headers))
+    assert utils.download_pdf_resumable(PDF_URL, part_path) is None
+    assert not os.path.exists(part_path)
@@ -0,0 +1,65 @@
+# backend/test_pdf_proxy_cache.py
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+
+import pdf_proxy_cache as proxy_cache_module
+from pdf_proxy_cache import PdfProxyCache
+from pdf_store import PdfStore
+
+PDF_URL = "https://mirror.example/paper.pdf"
+PDF_BYTES = b"%PDF-1.7\n" + b"1" * 2048
+
+
+@pytest.fixture
+def cache(app, tmp_path, monkeypatch):
+    app.config.update(PDF_STORE_DIR=str(tmp_path / "pdf_store"), PDF_STORE_MAX_BYTES=0, PDF_PROXY_CACHE_FRESH_SECONDS=60)
+    monkeypatch.setattr(proxy_cache_module, "pdf_store", PdfStore(app))
+    return PdfProxyCache(app)
+
+
+def _upstream(headers):
+    return SimpleNamespace(headers=headers)
+
+
+def test_streamed_response_is_cached_with_upstream_validators(cache):
+    upstream = _upstream({"Content-Type": "application/pdf", "Content-Length": str(len(PDF_BYTES)),
+                          "ETag": '"v1"', "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"})
+    chunks = [PDF_BYTES[:1000], PDF_BYTES[1000:]]
+    assert cache.lookup(PDF_URL) is None
+
+    assert b"".join(cache.stream_and_store(PDF_URL, upstream, iter(chunks))) == PDF_BYTES
+
+    entry = cache.lookup("HTTPS://Mirror.example/paper.pdf#page=3")  # 规范化后为同一URL
+    assert entry.sha256 == hashlib.sha256(PDF_BYTES).hexdigest() and entry.size == len(PDF_BYTES)
+    assert (entry.etag, entry.last_modified) == ('"v1"', "Wed, 01 Jan 2025 00:00:00 GMT")
+    assert cache.is_fresh(entry)
+    assert cache.revalidation_headers(entry) == {"If-None-Match": '"v1"',
+                                                 "If-Modified-Since": "Wed, 01 Jan 2025 00:00:00 GMT"}
+    assert cache.stats()["bytes_from_upstream"] == len(PDF_BYTES)
+
+
+def test_truncated_upstream_body_is_not_cached(cache):
+    upstream = _upstream({"Content-Length": str(len(PDF_BYTES) + 10)})
+    assert b"".join(cache.stream_and_store(PDF_URL, upstream, iter([PDF_BYTES]))) == PDF_BYTES  # 照常转发给浏览器
+    assert cache.lookup(PDF_URL) is None
+
+
+def test_stale_entry_is_refreshed_by_upstream_not_modified(cache):
+    upstream = _upstream({"ETag": '"v1"'})
+    b"".join(cache.stream_and_store(PDF_URL, upstream, iter([PDF_BYTES])))
+    stale = cache.lookup(PDF_URL)._replace(fetched_at=0)
+    assert not cache.is_fresh(stale)
+
+    refreshed = cache.mark_revalidated(PDF_URL, stale, _upstream({"ETag": '"v2"'}))
+
+    assert cache.is_fresh(refreshed) and refreshed.etag == '"v2"'
+    assert cache.lookup(PDF_URL).etag == '"v2"'  # 元数据已落盘
+
+
+def test_inactive_without_pdf_store(app):
+    cache = PdfProxyCache(app)  # 测试环境未初始化模块级 pdf_store
+    assert not cache.active
+    assert cache.lookup(PDF_URL) is None
+    assert cache.stats()["enabled"] is False
@@ -0,0 +1,119 @@
+# backend/test_pdf_resolution.py
+import threading
+import time
+
+import utils
+from deadline import Deadline
+from resolution_cache import resolution_cache, resolution_query_key
+
+DOI = "10.1000/resolution-test"
+TITLE = "A Study Of Conclusive Lookups"
+
+
+def _patch_sources(monkeypatch, scihub=None, unpaywall=None, arxiv=None):
+    """每个参数为 None (确定没有PDF)、链接字符串，或要抛出的异常；scihub 可按镜像给出 dict。"""
+    def _answer(outcome):
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def _scihub(doi, domain, cancel_event=None, deadline=None, raise_on_error=False):
+        return _answer(scihub.get(domain) if isinstance(scihub, dict) else scihub)
+
+    monkeypatch.setattr(utils, "find_pdf_link_via_scihub", _scihub)
+    monkeypatch.setattr(utils, "find_pdf_on_unpaywall_by_doi", lambda doi, deadline=None, raise_on_error=False: _answer(unpaywall))
+    monkeypatch.setattr(utils, "find_pdf_on_arxiv_by_title", lambda title, deadline=None, raise_on_error=False: _answer(arxiv))
+
+
+def test_all_sources_answering_is_conclusive_and_negatively_cached(app, monkeypatch):
+    _patch_sources(monkeypatch)
+    pdf_url, source_name, conclusive = utils.resolve_pdf_link(DOI, TITLE, deadline=Deadline(5))
+    assert (pdf_url, source_name, conclusive) == (None, None, True)
+
+    assert utils.find_pdf_link(DOI, TITLE, deadline=Deadline(5)) is None
+    cached = resolution_cache.get(resolution_query_key(DOI, TITLE))
+    assert cached is not None and cached.pdf_link is None
+
+
+def test_source_error_is_not_negatively_cached(app, monkeypatch):
+    _patch_sources(monkeypatch, unpaywall=utils.SourceLookupError("connect timeout"),
+                   arxiv=utils.SourceLookupError("rate limited"))
+    assert utils.resolve_pdf_link(DOI, TITLE, deadline=Deadline(5))[2] is False
+
+    assert utils.find_pdf_link(DOI, TITLE, deadline=Deadline(5)) is None
+    assert resolution_cache.get(resolution_query_key(DOI, TITLE)) is None
+
+
+def test_one_mirror_answering_is_enough_for_sci_hub(app, monkeypatch):
+    _patch_sources(monkeypatch, scihub={"https://sci-hub.one": utils.SourceLookupError("502"),
+                                        "https://sci-hub.two": None})
+    assert utils.resolve_pdf_link(DOI, TITLE, deadline=Deadline(5))[2] is True
+
+    _patch_sources(monkeypatch, scihub=utils.SourceLookupError("all mirrors down"))
+    assert utils.resolve_pdf_link(DOI, TITLE, deadline=Deadline(5))[2] is False
+
+
+def test_found_link_is_cached_even_when_other_sources_failed(app, monkeypatch):
+    _patch_sources(monkeypatch, scihub=utils.SourceLookupError("timeout"), unpaywall="https://oa.example/paper.pdf",
+                   arxiv=utils.SourceLookupError("timeout"))
+    assert utils.find_pdf_link(DOI, TITLE, deadline=Deadline(5)) == "https://oa.example/paper.pdf"
+    assert resolution_cache.get(resolution_query_key(DOI, TITLE)).pdf_link == "https://oa.example/paper.pdf"
+
+
+def test_background_lookups_use_their_own_pool(app, monkeypatch):
+    _patch_sources(monkeypatch, unpaywall="https://oa.example/paper.pdf")
+    threads = []
+    real_unpaywall = utils.find_pdf_on_unpaywall_by_doi
+
+    def _recording_unpaywall(doi, deadline=None, raise_on_error=False):
+        threads.append(threading.current_thread().name)
+        return real_unpaywall(doi, deadline=deadline, raise_on_error=raise_on_error)
+
+    monkeypatch.setattr(utils, "find_pdf_on_unpaywall_by_doi", _recording_unpaywall)
+    utils.resolve_pdf_link(DOI, deadline=Deadline(5))
+    utils.resolve_pdf_link(DOI, deadline=Deadline(5), background=True)
+
+    assert threads[0].startswith("pdf-resolver_")
+    assert threads[1].startswith("pdf-resolver-bg_")
+    assert utils._get_pdf_resolver_pool() is not utils._get_pdf_resolver_pool(background=True)
+
+
+def _patch_timed_sources(monkeypatch, scihub, unpaywall, arxiv):
+    """每个来源为 (耗时秒数, 结果)；固定默认来源顺序 Sci-Hub > Unpaywall > arXiv。"""
+    monkeypatch.setattr(utils.source_ranking, "enabled", False)
+
+    def _timed(outcome):
+        time.sleep(outcome[0])
+        return outcome[1]
+
+    monkeypatch.setattr(utils, "find_pdf_link_via_scihub",
+                        lambda doi, domain, cancel_event=None, deadline=None, raise_on_error=False: _timed(scihub))
+    monkeypatch.setattr(utils, "find_pdf_on_unpaywall_by_doi",
+                        lambda doi, deadline=None, raise_on_error=False: _timed(unpaywall))
+    monkeypatch.setattr(utils, "find_pdf_on_arxiv_by_title",
+                        lambda title, deadline=None, raise_on_error=False: _timed(arxiv))
+
+
+def test_higher_priority_result_wins_over_faster_lower_priority(app, monkeypatch):
+    _patch_timed_sources(monkeypatch, scihub=(0.3, "https://sci-hub.one/paper.pdf"),
+                         unpaywall=(0.0, "https://oa.example/paper.pdf"), arxiv=(0.0, None))
+    pdf_url, source_name, _ = utils.resolve_pdf_link(DOI, TITLE, deadline=Deadline(5))
+    assert pdf_url == "https://sci-hub.one/paper.pdf" and source_name.startswith("Sci-Hub:")
+
+
+def test_lower_priority_result_used_once_higher_priorities_miss(app, monkeypatch):
+    _patch_timed_sources(monkeypatch, scihub=(0.05, None), unpaywall=(0.0, "https://oa.example/paper.pdf"),
+                         arxiv=(2.0, "https://arxiv.org/pdf/2101.00001"))
+    started_at = time.monotonic()
+    assert utils.resolve_pdf_link(DOI, TITLE, deadline=Deadline(5))[:2] == ("https://oa.example/paper.pdf", "Unpaywall")
+    assert time.monotonic() - started_at < 1.0  # 不等待优先级更低的 arXiv
+
+
+def test_deadline_returns_best_finished_result(app, monkeypatch):
+    _patch_timed_sources(monkeypatch, scihub=(2.0, "https://sci-hub.one/paper.pdf"),
+                         unpaywall=(0.0, "https://oa.example/paper.pdf"), arxiv=(0.0, None))
+    started_at = time.monotonic()
+    pdf_url, _, conclusive = utils.resolve_pdf_link(DOI, TITLE, deadline=Deadline(0.3))
+    assert pdf_url == "https://oa.example/paper.pdf"
+    assert conclusive is False  # Sci-Hub 尚未结束
+    assert time.monotonic() - started_at < 1.0
@@ -0,0 +1,77 @@
+# backend/test_pdf_store.py
+import hashlib
+import os
+
+import pytest
+
+from pdf_store import PdfStore, article_store_keys
+
+PDF_BYTES = b"%PDF-1.7\n" + b"0" * 1000
+
+
+@pytest.fixture
+def store(app, tmp_path):
+    app.config.update(PDF_STORE_DIR=str(tmp_path / "pdf_store"), PDF_STORE_MAX_BYTES=0)
+    return PdfStore(app)
+
+
+def _writer_of(content):
+    def _download(writer):
+        writer.write(content)
+        return True
+    return _download
+
+
+def test_article_keys_are_normalized():
+    article = {"doi": "https://doi.org/10.1000/ABC", "pdfLink": "HTTPS://Example.org/paper.pdf#page=2"}
+    assert article_store_keys(article) == ["doi:10.1000/abc", "url:https://example.org/paper.pdf"]
+    assert article_store_keys({"doi": "N/A", "pdfLink": "not a url"}) == []
+
+
+def test_same_content_is_stored_once_under_every_key(store):
+    first = store.store_from_download(["doi:10.1000/a"], _writer_of(PDF_BYTES))
+    second = store.store_from_download(["url:https://mirror.example/a.pdf"], _writer_of(PDF_BYTES))
+
+    assert first == second
+    blob_path, sha256_hex, size = first
+    assert sha256_hex == hashlib.sha256(PDF_BYTES).hexdigest() and size == len(PDF_BYTES)
+    assert store.lookup(["doi:10.1000/missing", "url:https://mirror.example/a.pdf"]) == first
+    assert store.total_bytes() == len(PDF_BYTES)
+    assert os.listdir(os.path.join(store.root_dir, "incoming")) == []
+
+
+def test_failed_or_empty_download_is_discarded(store):
+    assert store.store_from_download(["doi:10.1000/a"], lambda writer: False) is None
+    assert store.store_from_download(["doi:10.1000/a"], _writer_of(b"")) is None
+    assert store.lookup(["doi:10.1000/a"]) is None
+    assert os.listdir(os.path.join(store.root_dir, "incoming")) == []
+
+
+def test_streaming_store_only_commits_complete_pdfs(store):
+    committed = []
+    chunks = [PDF_BYTES[:100], PDF_BYTES[100:]]
+    assert b"".join(store.store_while_streaming(["doi:10.1000/a"], iter(chunks), len(PDF_BYTES),
+                                                committed.append)) == PDF_BYTES
+    assert committed and store.lookup(["doi:10.1000/a"]) == committed[0]
+
+    html_page = [b"<html>rate limited</html>"]
+    assert list(store.store_while_streaming(["doi:10.1000/b"], iter(html_page))) == html_page
+    truncated = store.store_while_streaming(["doi:10.1000/c"], iter(chunks), len(PDF_BYTES) + 1)
+    assert b"".join(truncated) == PDF_BYTES
+    assert store.lookup(["doi:10.1000/b"]) is None and store.lookup(["doi:10.1000/c"]) is None
+
+
+def test_lru_eviction_drops_least_recently_used_blob(store):
+    store.max_bytes = int(len(PDF_BYTES) * 2.5)
+    contents = [PDF_BYTES + bytes([index]) for index in range(3)]
+    stored = [store.store_from_download([f"doi:10.1000/{index}"], _writer_of(content))
+              for index, content in enumerate(contents[:2])]
+    os.utime(stored[0][0], (1, 1))
+    os.utime(stored[1][0], (2, 2))
+    store.lookup(["doi:10.1000/0"])  # 命中刷新访问时间，1 号变为最久未访问
+
+    store.store_from_download(["doi:10.1000/2"], _writer_of(contents[2]))
+
+    assert store.lookup(["doi:10.1000/1"]) is None
+    assert store.lookup(["doi:10.1000/0"]) is not None and store.lookup(["doi:10.1000/2"]) is not None
+    assert store.total_bytes() <= store.max_bytes
@@ -0,0 +1,61 @@
+# backend/test_resolution_cache.py
+from datetime import datetime, timezone, timedelta
+
+import resolution_cache as resolution_cache_module
+from models import db, PdfResolution
+from pdf_store import key_digest
+from resolution_cache import resolution_cache, resolution_query_key
+
+HIT_KEY = resolution_query_key(doi="10.1000/Cached-Hit")
+MISS_KEY = resolution_query_key(title="A Paper Nobody Hosts")
+
+
+def _row(query_key):
+    return PdfResolution.query.filter_by(query_key_hash=key_digest(query_key)).first()
+
+
+def test_query_keys_are_normalized():
+    assert resolution_query_key(doi="https://doi.org/10.1000/ABC") == resolution_query_key(doi="10.1000/abc")
+    assert resolution_query_key(title="Deep  Learning: A Review!") == "title:deep learning a review"
+    assert resolution_query_key(doi="10.1000/abc", title="ignored") == "doi:10.1000/abc"
+    assert resolution_query_key() is None
+
+
+def test_hits_and_misses_use_their_own_ttls(app):
+    resolution_cache.put(HIT_KEY, "https://oa.example/hit.pdf", "Unpaywall")
+    resolution_cache.put(MISS_KEY, None, "Unpaywall")
+
+    hit_row, miss_row = _row(HIT_KEY), _row(MISS_KEY)
+    assert hit_row.expires_at - hit_row.resolved_at == timedelta(seconds=resolution_cache.hit_ttl_seconds)
+    assert miss_row.expires_at - miss_row.resolved_at == timedelta(seconds=resolution_cache.miss_ttl_seconds)
+    assert miss_row.source is None  # 负缓存不记录来源
+
+    assert resolution_cache.get(HIT_KEY) == ("https://oa.example/hit.pdf", "Unpaywall")
+    assert resolution_cache.get(MISS_KEY) == (None, None)
+
+
+def test_expired_memory_entry_is_dropped(app, monkeypatch):
+    resolution_cache.put(MISS_KEY, None)
+    later = resolution_cache_module.time.time() + resolution_cache.miss_ttl_seconds + 1
+    monkeypatch.setattr(resolution_cache_module.time, "time", lambda: later)
+    assert resolution_cache._memory_get(MISS_KEY) is None
+    assert MISS_KEY not in resolution_cache._memory
+
+
+def test_database_layer_survives_restart_until_expiry(app):
+    resolution_cache.put(HIT_KEY, "https://oa.example/hit.pdf", "Sci-Hub:sci-hub.one")
+    resolution_cache._memory.clear()  # 模拟进程重启
+    assert resolution_cache.get(HIT_KEY).pdf_link == "https://oa.example/hit.pdf"
+    assert HIT_KEY in resolution_cache._memory  # 数据库命中后回填内存层
+
+    _row(HIT_KEY).expires_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db.session.commit()
+    resolution_cache._memory.clear()
+    assert resolution_cache.get(HIT_KEY) is None
+
+
+def test_memory_layer_is_bounded_lru(app, monkeypatch):
+    monkeypatch.setattr(resolution_cache, "memory_max_entries", 2)
+    for index in range(3):
+        resolution_cache.put(f"doi:10.1000/{index}", f"https://oa.example/{index}.pdf")
+    assert list(resolution_cache._memory) == ["doi:10.1000/1", "doi:10.1000/2"]
@@ -0,0 +1,41 @@
+# backend/test_scihub_parse.py
+import pytest
+
+from scihub_parse_benchmark import SAMPLE_PAGES
+from utils import extract_scihub_candidates_prescan, extract_scihub_candidates_soup
+
+EXTRA_PAGES = {
+    "download-buttons nested": (
+        "<div class='download-buttons wide'><section><a href='/x/paper.PDF'>upper</a>"
+        "<a href='/x/paper.pdf?dl=1'>save</a></section></div>"),
+    "download-buttons link outside div": "<div class='download-buttons'></div><a href='/outside.pdf'>x</a>",
+    "buttons link not a direct child": (
+        "<div class='buttons'><ul><li><span><a onclick=\"location.href='/nested.pdf'\">x</a></span></li></ul></div>"),
+    "uppercase tags and attributes": "<DIV ID='viewer'><IFRAME SRC='/upper.pdf'></IFRAME></DIV>",
+    "duplicate attributes": "<embed id='pdf' src='/first.pdf' src='/second.pdf'>",
+    "unclosed list items": (
+        "<div class=buttons><ul><li>one<li><a onclick=\"location.href='/unclosed.pdf'\">x</a></ul></div>"),
+    "stray end tags": "</div></li><div id='viewer'></span><embed src='/ok.pdf'></div>",
+    "embed is a void element": "<div id='viewer'><embed src='/a.pdf'><iframe src='/b.pdf'></iframe></div>",
+    "origin button": "<button onclick=\"location.href=location.origin+'/dl/paper.pdf'\">save</button><a id=download href='/x.pdf'>",
+    "entity in attribute": "<iframe id='viewer' src='/view?file=a.pdf&amp;page=1'></iframe>",
+    "attribute containing >": "<a id='download' title='a > b' href='/gt.pdf'>x</a>",
+}
+PAGES = {**SAMPLE_PAGES, **EXTRA_PAGES}
+
+
+@pytest.mark.parametrize("name", sorted(PAGES))
+def test_prescan_matches_full_parse(name):
+    page = PAGES[name]
+    assert extract_scihub_candidates_prescan(page) == extract_scihub_candidates_soup(page.encode("utf-8"))
+
+
+def test_viewer_iframe_outranks_download_link():
+    page = SAMPLE_PAGES["a#download before div#viewer iframe"]
+    assert extract_scihub_candidates_prescan(page)[0] == ("div#viewer iframe", "/real.pdf")
+
+
+def test_benchmark_reports_no_mismatches(monkeypatch):
+    import scihub_parse_benchmark
+    monkeypatch.setattr("sys.argv", ["scihub_parse_benchmark.py", "--iterations", "1"])
+    assert scihub_parse_benchmark.main() == 0
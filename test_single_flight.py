@@ -0,0 +1,70 @@
+# backend/test_single_flight.py
+import threading
+
+import pytest
+
+import single_flight
+from single_flight import PdfFetchSingleFlight, FlightFailed
+
+PDF_URL = "https://publisher.example/shared.pdf"
+CONTENT = b"%PDF-1.4\n" + b"x" * (3 * single_flight.READ_CHUNK_SIZE)
+
+
+@pytest.fixture
+def flights(app, monkeypatch):
+    """pdf_store 未启用：合并下载写入临时文件。下载在 release 之前停在前半段，便于让多个读者加入。"""
+    release = threading.Event()
+    downloads = []
+
+    def _download(pdf_url, part_path, progress_callback=None, headers_callback=None):
+        downloads.append(pdf_url)
+        if headers_callback:
+            headers_callback({"Content-Type": "application/pdf"})
+        half = len(CONTENT) // 2
+        with open(part_path, "wb") as f:
+            f.write(CONTENT[:half])
+            f.flush()
+            progress_callback(half, len(CONTENT))
+            release.wait(5)
+            f.write(CONTENT[half:])
+        progress_callback(len(CONTENT), len(CONTENT))
+        return len(CONTENT)
+
+    monkeypatch.setattr(single_flight, "download_pdf_resumable", _download)
+    return PdfFetchSingleFlight(app), release, downloads
+
+
+def test_concurrent_readers_share_one_download(app, flights):
+    tracker, release, downloads = flights
+    first, created_first = tracker.join(PDF_URL)
+    second, created_second = tracker.join(PDF_URL)
+    assert (created_first, created_second) == (True, False) and first is second
+
+    assert tracker.wait_until_started(first) == (len(CONTENT), {"Content-Type": "application/pdf"})
+    bodies = [[], []]
+
+    def _read(index):
+        with app.app_context():
+            bodies[index].extend(tracker.read_chunks(first))
+
+    readers = [threading.Thread(target=_read, args=(index,)) for index in range(2)]
+    for reader in readers:
+        reader.start()
+    release.set()
+    for reader in readers:
+        reader.join(5)
+
+    assert [b"".join(body) for body in bodies] == [CONTENT, CONTENT]
+    assert downloads == [PDF_URL]
+    assert tracker.stats()["joined_existing"] == 1 and tracker.stats()["in_flight"] == 0
+    assert first.temp_path is None  # 最后一个读者结束后删除临时文件
+
+
+def test_failed_download_raises_for_waiting_readers(app, monkeypatch):
+    monkeypatch.setattr(single_flight, "download_pdf_resumable", lambda *args, **kwargs: None)
+    tracker = PdfFetchSingleFlight(app)
+    flight, _ = tracker.join(PDF_URL)
+    with pytest.raises(FlightFailed):
+        tracker.wait_until_started(flight, timeout=5)
+    tracker.leave(flight)
+    assert tracker.stats()["flights_failed"] == 1
@@ -0,0 +1,57 @@
+# backend/test_source_ranking.py
+import source_ranking as source_ranking_module
+from source_ranking import SourceRankingTracker, doi_registrant_prefix, NO_DOI_PREFIX
+
+DEFAULT_ORDER = ["Sci-Hub", "Unpaywall", "arXiv"]
+ARXIV_DOI = "10.48550/arXiv.2101.00001"
+
+
+def _tracker():
+    tracker = SourceRankingTracker()
+    tracker.exploration_rate = 0.0
+    tracker.min_samples = 3
+    return tracker
+
+
+def test_registrant_prefix():
+    assert doi_registrant_prefix("https://doi.org/10.1016/j.cell.2020.01.001") == "10.1016"
+    assert doi_registrant_prefix("doi: 10.48550/arXiv.2101.00001") == "10.48550"
+    assert doi_registrant_prefix("not-a-doi") == NO_DOI_PREFIX
+    assert doi_registrant_prefix(None) == NO_DOI_PREFIX
+
+
+def test_fast_reliable_source_moves_first_for_its_prefix_only():
+    tracker = _tracker()
+    for _ in range(5):
+        tracker.record_outcome(ARXIV_DOI, "arXiv", True, 0.4)
+        tracker.record_outcome(ARXIV_DOI, "Unpaywall", True, 1.5)
+        tracker.record_outcome(ARXIV_DOI, "Sci-Hub", False, 0)
+
+    assert tracker.ordered_sources(ARXIV_DOI, DEFAULT_ORDER) == (["arXiv", "Unpaywall", "Sci-Hub"], False)
+    assert tracker.ordered_sources("10.1016/j.cell.2020.01.001", DEFAULT_ORDER) == (DEFAULT_ORDER, False)
+
+
+def test_sources_without_enough_samples_stay_in_front():
+    tracker = _tracker()
+    for _ in range(5):
+        tracker.record_outcome(ARXIV_DOI, "arXiv", True, 0.4)
+        tracker.record_outcome(ARXIV_DOI, "Sci-Hub", True, 2.0)
+    tracker.record_outcome(ARXIV_DOI, "Unpaywall", False, 0)
+
+    assert tracker.ordered_sources(ARXIV_DOI, DEFAULT_ORDER)[0] == ["Unpaywall", "arXiv", "Sci-Hub"]
+
+
+def test_exploration_promotes_a_non_leading_source(monkeypatch):
+    tracker = _tracker()
+    tracker.exploration_rate = 1.0
+    monkeypatch.setattr(source_ranking_module.random, "randrange", lambda start, stop: stop - 1)
+    assert tracker.ordered_sources(ARXIV_DOI, DEFAULT_ORDER) == (["arXiv", "Sci-Hub", "Unpaywall"], True)
+    assert tracker.ordered_sources(ARXIV_DOI, DEFAULT_ORDER, explore=False) == (DEFAULT_ORDER, False)
+
+
+def test_prefix_table_is_bounded():
+    tracker = _tracker()
+    tracker.max_prefixes = 2
+    for registrant in ("10.1000", "10.2000", "10.3000"):
+        tracker.record_outcome(f"{registrant}/x", "Unpaywall", True, 1.0)
+    assert sorted(tracker.snapshot()) == ["10.2000", "10.3000"]
@@ -0,0 +1,71 @@
+# backend/test_zip_retention.py
+import os
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+from models import db, User, BatchTask
+from zip_retention import sweep_zipped_files
+
+
+@pytest.fixture
+def zipped_dir(app, tmp_path):
+    app.config.update(ZIPPED_FILES_DIR=str(tmp_path), ZIP_RETENTION_MAX_BYTES=0,
+                      ZIP_RETENTION_PER_USER_MAX_BYTES=0, ZIP_RETENTION_MAX_AGE_SECONDS=0)
+    for user_id in (1, 2):
+        db.session.add(User(id=user_id, username=f"user{user_id}", email=f"user{user_id}@example.com",
+                            password_hash="x"))
+    db.session.commit()
+    return tmp_path
+
+
+def _completed_zip(zipped_dir, name, size, days_since_download, user_id=None):
+    (zipped_dir / f"{name}.zip").write_bytes(b"z" * size)
+    db.session.add(BatchTask(task_id=name, user_id=user_id, status="COMPLETED", zip_filename=f"{name}.zip",
+                             zip_size_bytes=size,
+                             last_downloaded_at=datetime.now(timezone.utc) - timedelta(days=days_since_download)))
+    db.session.commit()
+
+
+def _statuses():
+    return {task.task_id: task.status for task in BatchTask.query.all()}
+
+
+def test_old_zips_are_evicted_by_age(app, zipped_dir):
+    app.config["ZIP_RETENTION_MAX_AGE_SECONDS"] = 7 * 24 * 3600
+    _completed_zip(zipped_dir, "stale", 100, days_since_download=30)
+    _completed_zip(zipped_dir, "fresh", 100, days_since_download=1)
+
+    assert sweep_zipped_files() == 1
+    assert _statuses() == {"stale": "EVICTED", "fresh": "COMPLETED"}
+    assert not (zipped_dir / "stale.zip").exists() and (zipped_dir / "fresh.zip").exists()
+
+
+def test_per_user_and_total_caps_evict_least_recently_used(app, zipped_dir):
+    app.config.update(ZIP_RETENTION_PER_USER_MAX_BYTES=250, ZIP_RETENTION_MAX_BYTES=350)
+    _completed_zip(zipped_dir, "u1-old", 100, days_since_download=5, user_id=1)
+    _completed_zip(zipped_dir, "u1-mid", 100, days_since_download=3, user_id=1)
+    _completed_zip(zipped_dir, "u1-new", 100, days_since_download=1, user_id=1)
+    _completed_zip(zipped_dir, "anon-old", 100, days_since_download=4)
+    _completed_zip(zipped_dir, "u2-new", 100, days_since_download=2, user_id=2)
+
+    assert sweep_zipped_files() == 2
+    # 用户1 超出 250 字节：淘汰其最旧的一个；此后总量 400 > 350：淘汰剩余中最旧的 (匿名任务)
+    assert _statuses() == {"u1-old": "EVICTED", "u1-mid": "COMPLETED", "u1-new": "COMPLETED",
+                           "anon-old": "EVICTED", "u2-new": "COMPLETED"}
+
+
+def test_missing_files_and_orphans_are_reconciled(app, zipped_dir):
+    app.config["BATCH_JOB_LEASE_SECONDS"] = 60
+    _completed_zip(zipped_dir, "gone", 100, days_since_download=1)
+    os.remove(zipped_dir / "gone.zip")
+    orphan = zipped_dir / "orphan.zip.part"
+    orphan.write_bytes(b"partial")
+    os.utime(orphan, (1, 1))
+    recent = zipped_dir / "building.zip.part"
+    recent.write_bytes(b"partial")
+
+    sweep_zipped_files()
+
+    assert _statuses() == {"gone": "EVICTED"}
+    assert not orphan.exists() and recent.exists()
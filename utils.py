@@ -1,6 +1,7 @@
 # backend/utils.py
 import os
 import re
+import html
 import math
 import json # 虽然 response.json() 不需要，但如果其他地方手动解析JSON则可能需要
 import jwt
@@ -8,17 +9,23 @@ from datetime import datetime, timezone, timedelta
 from flask import request, current_app, make_response, jsonify # jsonify 可能在这里用不到，但在蓝图中会用
 import requests
 from bs4 import BeautifulSoup
+from bs4.element import Tag
 import xml.etree.ElementTree as ET
 from urllib.parse import urljoin, quote_plus, urlparse
 import hashlib # <--- generate_task_id 需要
-import json    # <--- load/save_download_records 需要
+import time
+import threading
+import difflib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import json    # <--- load_download_records 需要
 from models import db, UserActivityLog # 确保路径正确
+from resolution_cache import resolution_cache, resolution_query_key, normalize_title
+from mirror_health import mirror_health
+from source_ranking import source_ranking, doi_registrant_prefix
+from http_client import http_client, RateLimitExceeded
+from deadline import Deadline, DeadlineExceeded
 
-# --- 将 REQUEST_SESSION 移到 utils.py ---
-REQUEST_SESSION = requests.Session()
-REQUEST_SESSION.headers.update({
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.0.0 Safari/537.36 LitFinderBot/1.1"
-})
+# --- 出站请求统一经由 http_client.py (按上游服务划分连接池、重试与限速) ---
 
 
 # 注意：现在 BACKEND_COLUMN_MAPPING 将从 current_app.config 中获取
@@ -185,47 +192,206 @@ def format_bytes(size_bytes: int) -> str:
     return f"{s} {size_name[i]}"
 
 
-def find_pdf_link(doi=None, title=None):
-    pdf_url = None  # 初始化为 None
-    log_prefix = "[FindPdfLinkUtil]"
-    current_app.logger.info(f"{log_prefix} Initiating PDF link search. DOI: '{doi}', Title: '{title}'")
+# === 并行 (hedged) PDF链接解析 ===
+# 所有策略 (各 Sci-Hub 镜像 -> Unpaywall -> arXiv) 同时发起，但仍按原有优先级取结果：
+# 只要优先级更高的策略都已结束（且未找到），就立即采用当前最高优先级的结果并取消其余策略；
+# 整体受 PDF_RESOLVE_DEADLINE_SECONDS 限制，到期时返回已完成策略中优先级最高的结果。
+# 各来源的查询函数以 raise_on_error=True 调用：确定没有PDF时返回 None，出错 (超时、连接错误、本地限速、5xx 等) 时
+# 抛出 SourceLookupError。只有每类来源都给出了确定结果时，"未找到" 才写入负缓存。
+# 交互式查询 (/api/find-pdf) 与批量/后台解析 (/api/find-pdf/bulk、library_resolver) 使用各自独立的线程池，
+# 大批量解析占满其线程池时，单篇查询不需要排在其后。
+_PDF_RESOLVER_POOL = None
+_PDF_BACKGROUND_RESOLVER_POOL = None
+_PDF_RESOLVER_POOL_LOCK = threading.Lock()
 
-    sci_hub_domains_list = current_app.config.get('SCI_HUB_DOMAINS', [])
 
-    if doi:
-        current_app.logger.info(
-            f"{log_prefix} Attempting Sci-Hub search for DOI: '{doi}'. Domains: {sci_hub_domains_list}")
-        for domain in sci_hub_domains_list:
-            pdf_url = find_pdf_link_via_scihub(doi, domain)  # find_pdf_link_via_scihub 会返回URL或None
-            if pdf_url:
-                current_app.logger.info(f"{log_prefix} PDF link found via Sci-Hub domain '{domain}'.")
-                break
+class SourceLookupError(Exception):
+    """来源查询出错，结果不能说明该来源没有这篇文献的PDF。"""
+
+
+def _is_definitive_http_miss(http_err):
+    """404/410 说明来源确定没有该条目；其余 HTTP 错误 (429、5xx 等) 视为查询出错。"""
+    return http_err.response is not None and http_err.response.status_code in (404, 410)
 
-    if not pdf_url and doi:
-        current_app.logger.info(f"{log_prefix} Sci-Hub unsuccessful. Attempting Unpaywall for DOI: '{doi}'.")
-        pdf_url = find_pdf_on_unpaywall_by_doi(doi)  # find_pdf_on_unpaywall_by_doi 会返回URL或None
-        if pdf_url:
-            current_app.logger.info(f"{log_prefix} PDF link found via Unpaywall.")
 
-    if not pdf_url and title:
-        current_app.logger.info(f"{log_prefix} Previous methods unsuccessful. Attempting arXiv for Title: '{title}'.")
-        pdf_url = find_pdf_on_arxiv_by_title(title)  # find_pdf_on_arxiv_by_title 会返回URL或None
-        if pdf_url:
-            current_app.logger.info(f"{log_prefix} PDF link found via arXiv.")
+def _get_pdf_resolver_pool(background=False):
+    # 进程内共享的线程池，避免每次请求创建线程；首次使用时按配置创建
+    global _PDF_RESOLVER_POOL, _PDF_BACKGROUND_RESOLVER_POOL
+    with _PDF_RESOLVER_POOL_LOCK:
+        if background:
+            if _PDF_BACKGROUND_RESOLVER_POOL is None:
+                max_workers = max(1, int(current_app.config.get('PDF_RESOLVE_BACKGROUND_MAX_WORKERS', 8)))
+                _PDF_BACKGROUND_RESOLVER_POOL = ThreadPoolExecutor(max_workers=max_workers,
+                                                                   thread_name_prefix="pdf-resolver-bg")
+            return _PDF_BACKGROUND_RESOLVER_POOL
+        if _PDF_RESOLVER_POOL is None:
+            max_workers = max(1, int(current_app.config.get('PDF_RESOLVE_MAX_WORKERS', 16)))
+            _PDF_RESOLVER_POOL = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pdf-resolver")
+        return _PDF_RESOLVER_POOL
+
+
+def _strategy_source(strategy_name):
+    """策略名对应的来源类别：'Sci-Hub:sci-hub.se' -> 'Sci-Hub'。"""
+    return strategy_name.split(":", 1)[0]
+
+
+def _pdf_link_strategies(doi, title, cancel_event, deadline):
+    """
+    按优先级返回 [(策略名, 可调用对象)]。默认顺序为 Sci-Hub、Unpaywall、arXiv，
+    来源类别之间的顺序由 source_ranking 按该 DOI 前缀的历史结果调整。
+    """
+    groups = {}
+    if doi:
+        # 按镜像健康状况排序：响应快的在前，熔断中的在后（其策略会立即以未找到结束）
+        groups["Sci-Hub"] = [
+            (f"Sci-Hub:{domain}", lambda domain=domain: find_pdf_link_via_scihub(doi, domain, cancel_event, deadline, raise_on_error=True))
+            for domain in mirror_health.ordered_domains(current_app.config.get('SCI_HUB_DOMAINS', []))]
+        groups["Unpaywall"] = [("Unpaywall", lambda: find_pdf_on_unpaywall_by_doi(doi, deadline, raise_on_error=True))]
+    if title:
+        groups["arXiv"] = [("arXiv", lambda: find_pdf_on_arxiv_by_title(title, deadline, raise_on_error=True))]
+    groups = {source: group for source, group in groups.items() if group}
+
+    ordered_sources, explored = source_ranking.ordered_sources(doi, groups.keys())
+    if ordered_sources != list(groups.keys()):
+        current_app.logger.debug(
+            f"[FindPdfLinkUtil] Source order for prefix '{doi_registrant_prefix(doi)}': "
+            f"{' > '.join(ordered_sources)}{' (exploring)' if explored else ''}")
+    return [strategy for source in ordered_sources for strategy in groups[source]]
+
+
+def find_pdf_link(doi=None, title=None, deadline=None, background=False):
+    """
+    查找PDF链接，先查解析缓存 (resolution_cache)，未缓存时才并行查询各来源并写回缓存（包括确定未找到的结果）。
+    deadline: 可选的 Deadline，默认为 PDF_RESOLVE_DEADLINE_SECONDS；到期时返回已完成来源中最好的结果。
+    background: 批量/后台解析传 True，使用独立的后台线程池 (PDF_RESOLVE_BACKGROUND_MAX_WORKERS)。
+    """
+    return find_pdf_link_outcome(doi=doi, title=title, deadline=deadline, background=background)[0]
+
+
+def find_pdf_link_outcome(doi=None, title=None, deadline=None, background=False):
+    """与 find_pdf_link 相同，但返回 (pdf_url, 结果是否确定)。缓存中的结果 (包括负缓存) 都是确定的。"""
+    log_prefix = "[FindPdfLinkUtil]"
+    query_key = resolution_query_key(doi, title)
+    cached = resolution_cache.get(query_key)
+    if cached is not None:
+        current_app.logger.debug(
+            f"{log_prefix} Resolution cache hit for '{query_key}': {cached.pdf_link or 'MISS'} (source: {cached.source})")
+        return cached.pdf_link, True
+
+    pdf_url, source_name, conclusive = resolve_pdf_link(doi=doi, title=title, deadline=deadline, background=background)
+    if pdf_url or conclusive:  # 因截止时间未查完或来源出错的"未找到"不写入负缓存
+        resolution_cache.put(query_key, pdf_url, source_name)
+    return pdf_url, bool(pdf_url) or conclusive
+
+
+def resolve_pdf_link(doi=None, title=None, deadline=None, background=False):
+    """
+    不经缓存地并行查询所有来源，返回 (pdf_url, 来源名, 结果是否确定)；未找到时 pdf_url 和来源名为 None。
+    结果确定：所有策略都已结束，且每类来源至少有一个策略给出了确定的答复 (Sci-Hub 的各镜像内容相同，一个即可)。
+    deadline 同时限定等待时间和各来源每个出站请求的超时。
+    """
+    log_prefix = "[FindPdfLinkUtil]"
+    current_app.logger.info(f"{log_prefix} Initiating PDF link search. DOI: '{doi}', Title: '{title}'")
 
+    if deadline is None:
+        deadline = Deadline(current_app.config.get('PDF_RESOLVE_DEADLINE_SECONDS', 30))
+    cancel_event = threading.Event()
+    strategies = _pdf_link_strategies(doi, title, cancel_event, deadline)
+    if not strategies:
+        current_app.logger.info(f"{log_prefix} No DOI or title provided, nothing to search.")
+        return None, None, True
+
+    app = current_app._get_current_object()  # 线程池中需要显式推入应用上下文
+
+    def _run_strategy(strategy_func):
+        with app.app_context():
+            return strategy_func()
+
+    pool = _get_pdf_resolver_pool(background=background)
+    started_at = time.monotonic()
+    futures = [pool.submit(_run_strategy, strategy_func) for _, strategy_func in strategies]
+    results = [None] * len(futures)
+    finished = [False] * len(futures)
+    errored = [False] * len(futures)
+
+    # 每类来源的结果只记录一次：其任一策略找到链接，或其所有策略都已结束仍未找到
+    source_pending = {}
+    for strategy_name, _ in strategies:
+        source = _strategy_source(strategy_name)
+        source_pending[source] = source_pending.get(source, 0) + 1
+
+    def _record_source_result(index):
+        source = _strategy_source(strategies[index][0])
+        if source not in source_pending:
+            return
+        source_pending[source] -= 1
+        if results[index] or source_pending[source] == 0:
+            del source_pending[source]
+            source_ranking.record_outcome(doi, source, bool(results[index]), time.monotonic() - started_at)
+
+    pdf_url, source_name = None, None
+    try:
+        pending = set(futures)
+        while pending:
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                current_app.logger.warning(
+                    f"{log_prefix} Deadline of {deadline.budget_seconds:.1f}s reached with {len(pending)} strategies still running.")
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures.index(future)
+                finished[index] = True
+                try:
+                    results[index] = future.result()
+                except SourceLookupError as e:
+                    errored[index] = True
+                    current_app.logger.info(f"{log_prefix} Strategy '{strategies[index][0]}' gave no definitive answer: {e}")
+                except Exception as e:
+                    errored[index] = True
+                    current_app.logger.error(f"{log_prefix} Strategy '{strategies[index][0]}' raised: {e}", exc_info=True)
+                _record_source_result(index)
+            # 从最高优先级开始：遇到仍在运行的策略就继续等待，遇到第一个有结果的策略即可返回
+            for index in range(len(futures)):
+                if not finished[index]:
+                    break
+                if results[index]:
+                    pdf_url, source_name = results[index], strategies[index][0]
+                    break
+            if pdf_url:
+                break
+        if not pdf_url:
+            # 到达截止时间：采用已完成策略中优先级最高的结果
+            for index in range(len(futures)):
+                if finished[index] and results[index]:
+                    pdf_url, source_name = results[index], strategies[index][0]
+                    break
+    finally:
+        # 取消尚未开始的策略，并通知正在运行的策略尽早退出；已发出的请求受各自的超时限制
+        cancel_event.set()
+        for future in futures:
+            future.cancel()
+
+    elapsed = time.monotonic() - started_at
     if pdf_url:
         current_app.logger.info(
-            f"{log_prefix} Search complete. PDF link found: {pdf_url} (DOI: '{doi}', Title: '{title}')")
+            f"{log_prefix} Search complete in {elapsed:.1f}s. PDF link found via {source_name}: {pdf_url} (DOI: '{doi}', Title: '{title}')")
     else:
         current_app.logger.info(
-            f"{log_prefix} Search complete. No PDF link found after exhausting all strategies (DOI: '{doi}', Title: '{title}')")
-
-    return pdf_url
+            f"{log_prefix} Search complete in {elapsed:.1f}s. No PDF link found after exhausting all strategies (DOI: '{doi}', Title: '{title}')")
+    answered_sources = {_strategy_source(strategies[index][0])
+                        for index in range(len(futures)) if finished[index] and not errored[index]}
+    conclusive = all(finished) and answered_sources == {_strategy_source(name) for name, _ in strategies}
+    if not pdf_url and not conclusive:
+        current_app.logger.info(f"{log_prefix} Result is not conclusive (timeouts or source errors), it will not be negatively cached.")
+    return pdf_url, source_name, conclusive
 # --- 其他您希望移到 utils.py 的通用辅助函数可以放在这里 ---
 
 
-def find_pdf_on_unpaywall_by_doi(doi):
+def find_pdf_on_unpaywall_by_doi(doi, deadline=None, raise_on_error=False):
+    # raise_on_error: 查询出错时抛出 SourceLookupError，而不是与"确定没有PDF"一样返回 None
     pdf_url_found = None
+    lookup_error = None
     log_prefix = "[UnpaywallSearchUtil]"
 
     # 使用 current_app.config 获取配置
@@ -248,7 +414,7 @@ def find_pdf_on_unpaywall_by_doi(doi):
     api_url = f"https://api.unpaywall.org/v2/{quote_plus(doi)}?email={my_email_for_apis}"
 
     try:
-        response = REQUEST_SESSION.get(api_url, timeout=25)
+        response = http_client.get("unpaywall", api_url, timeout=25, deadline=deadline)
         response.raise_for_status()
         data = response.json()
         best_oa_location = data.get('best_oa_location')
@@ -267,83 +433,257 @@ def find_pdf_on_unpaywall_by_doi(doi):
     # ... (异常捕获块中的 app.logger 全部改为 current_app.logger) ...
     except requests.exceptions.HTTPError as http_err:
         current_app.logger.warning(
-            f"{log_prefix} 访问 Unpaywall API 时发生 HTTP 错误 (DOI: '{doi}'). URL: {api_url}. 状态码: {http_err.response.status_code if http_err.response else 'N/A'}. 错误: {http_err}")
-    except requests.exceptions.Timeout:
+            f"{log_prefix} 访问 Unpaywall API 时发生 HTTP 错误 (DOI: '{doi}'). URL: {api_url}. 状态码: {http_err.response.status_code if http_err.response is not None else 'N/A'}. 错误: {http_err}")
+        if not _is_definitive_http_miss(http_err):
+            lookup_error = http_err
+    except requests.exceptions.Timeout as timeout_err:
         current_app.logger.warning(f"{log_prefix} 访问 Unpaywall API 超时 (DOI: '{doi}'). URL: {api_url}")
+        lookup_error = timeout_err
     except requests.exceptions.ConnectionError as conn_err:
         current_app.logger.warning(
             f"{log_prefix} 访问 Unpaywall API 时发生连接错误 (DOI: '{doi}'). URL: {api_url}. 错误: {conn_err}")
+        lookup_error = conn_err
     except requests.exceptions.RequestException as req_err:
         current_app.logger.warning(
             f"{log_prefix} 访问 Unpaywall API 时发生请求错误 (DOI: '{doi}'). URL: {api_url}. 错误: {req_err}")
+        lookup_error = req_err
     except json.JSONDecodeError as json_err:
         current_app.logger.error(
             f"{log_prefix} 解析来自 Unpaywall 的 JSON 响应失败 (DOI: '{doi}'). URL: {api_url}. 错误: {json_err}")
+        lookup_error = json_err
     except Exception as e:
         current_app.logger.error(
             f"{log_prefix} 处理 Unpaywall API (DOI: '{doi}') 时发生未知错误. URL: {api_url}. 错误: {e}", exc_info=True)
+        lookup_error = e
 
+    if lookup_error is not None and raise_on_error:
+        raise SourceLookupError(f"Unpaywall 查询出错 (DOI: '{doi}'): {lookup_error}")
     return pdf_url_found
 
 
-def find_pdf_link_via_scihub(doi, domain):
+def _record_mirror_result(domain, latency_seconds, success):
+    if mirror_health.record_result(domain, latency_seconds, success):
+        current_app.logger.warning(
+            f"[SciHubSearchUtil] Circuit for Sci-Hub domain '{domain}' is now {mirror_health.snapshot()[domain]['circuit']}.")
+
+
+# === Sci-Hub 页面解析 ===
+# 页面只读取前 SCIHUB_PAGE_MAX_BYTES 字节（PDF嵌入元素位于页面前部），先用预编译正则做轻量预扫描，
+# 只有预扫描一个候选链接都没找到时才回退到 BeautifulSoup 完整解析。预扫描为 SCIHUB_SELECTORS 中的每个选择器
+# 提供一个判断函数，并按 html.parser 的方式维护祖先元素栈 (跳过注释与 script/style 内容，空元素不入栈，结束标签
+# 弹出到最近的同名元素)，因而依赖父元素结构的选择器也能判断，两条路径按同一优先级返回相同的候选链接。
+# 两条路径共用同一套属性 -> 链接的提取规则 (_scihub_candidate_from_attrs)。对比见 scihub_parse_benchmark.py。
+SCIHUB_SELECTORS = [
+    '#pdf', 'iframe#viewer', 'embed#viewer',
+    'div#viewer iframe', 'div#viewer embed',
+    'div.buttons > ul > li > a[onclick*=".pdf"]',
+    'div.download-buttons a[href*=".pdf"]',
+    'a#download',
+    'button[onclick*="location.href=location.origin"]'
+]
+_SCIHUB_TOKEN_PATTERN = re.compile(
+    r'<!--.*?-->|<(script|style)\b(?:[^>"\']|"[^"]*"|\'[^\']*\')*>.*?</\1\s*>'
+    r'|<(/?)([a-zA-Z][^\s/>]*)((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>',
+    re.IGNORECASE | re.DOTALL)
+_HTML_ATTR_PATTERN = re.compile(r'([^\s"\'=<>/]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+)))?')
+_SCIHUB_ONCLICK_PDF_PATTERN = re.compile(r"location\.href=['\"]([^'\"]+\.pdf[^'\"]*)['\"]")
+# 与 BeautifulSoup (html.parser) 相同的空元素：没有结束标签，不会成为其他元素的父元素
+_HTML_VOID_ELEMENTS = frozenset({
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr', 'image', 'img', 'input',
+    'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid', 'param', 'source', 'spacer', 'track', 'wbr'})
+
+
+def _has_class(attrs, class_name):
+    return class_name in attrs.get('class', '').split()
+
+
+def _has_ancestor(ancestors, tag, predicate):
+    return any(ancestor_tag == tag and predicate(ancestor_attrs) for ancestor_tag, ancestor_attrs in ancestors)
+
+
+def _is_buttons_list_link(tag, attrs, ancestors):
+    # div.buttons > ul > li > a[onclick*=".pdf"]：要求直接父元素链为 li、ul、div.buttons
+    if tag != 'a' or '.pdf' not in attrs.get('onclick', '') or len(ancestors) < 3:
+        return False
+    (div_tag, div_attrs), (ul_tag, _), (li_tag, _) = ancestors[-3:]
+    return (div_tag, ul_tag, li_tag) == ('div', 'ul', 'li') and _has_class(div_attrs, 'buttons')
+
+
+# 预扫描规则：选择器 -> 判断函数 (标签名, 属性, 祖先元素列表[(标签名, 属性)])，覆盖 SCIHUB_SELECTORS 中的每一项
+_SCIHUB_PRESCAN_PREDICATES = {
+    '#pdf': lambda tag, attrs, ancestors: attrs.get('id') == 'pdf',
+    'iframe#viewer': lambda tag, attrs, ancestors: tag == 'iframe' and attrs.get('id') == 'viewer',
+    'embed#viewer': lambda tag, attrs, ancestors: tag == 'embed' and attrs.get('id') == 'viewer',
+    'div#viewer iframe': lambda tag, attrs, ancestors: tag == 'iframe' and _has_ancestor(
+        ancestors, 'div', lambda ancestor_attrs: ancestor_attrs.get('id') == 'viewer'),
+    'div#viewer embed': lambda tag, attrs, ancestors: tag == 'embed' and _has_ancestor(
+        ancestors, 'div', lambda ancestor_attrs: ancestor_attrs.get('id') == 'viewer'),
+    'div.buttons > ul > li > a[onclick*=".pdf"]': _is_buttons_list_link,
+    'div.download-buttons a[href*=".pdf"]': lambda tag, attrs, ancestors: tag == 'a' and '.pdf' in attrs.get(
+        'href', '') and _has_ancestor(ancestors, 'div', lambda ancestor_attrs: _has_class(ancestor_attrs, 'download-buttons')),
+    'a#download': lambda tag, attrs, ancestors: tag == 'a' and attrs.get('id') == 'download',
+    'button[onclick*="location.href=location.origin"]': lambda tag, attrs, ancestors: tag == 'button' and
+        'location.href=location.origin' in attrs.get('onclick', ''),
+}
+assert list(_SCIHUB_PRESCAN_PREDICATES) == SCIHUB_SELECTORS, "预扫描规则必须与 SCIHUB_SELECTORS 一一对应且顺序相同"
+
+
+def _scihub_candidate_from_attrs(attrs):
+    """按原有规则从元素属性中取候选链接：src 优先，其次可疑的 href，最后 onclick 中的 .pdf 跳转。"""
+    if attrs.get('src'):
+        return attrs['src']
+    href = attrs.get('href')
+    if href and ('.pdf' in href.lower() or 'sci-hub' in href.lower() or 'doi.org' in href.lower()):
+        return href
+    if 'onclick' in attrs:
+        match = _SCIHUB_ONCLICK_PDF_PATTERN.search(attrs['onclick'])
+        if match:
+            return match.group(1)
+    return None
+
+
+def _parse_html_attrs(raw_attrs):
+    attrs = {}
+    for attr_match in _HTML_ATTR_PATTERN.finditer(raw_attrs):
+        value = next((group for group in attr_match.group(2, 3, 4) if group is not None), '')
+        attrs[attr_match.group(1).lower()] = html.unescape(value)  # 与 html.parser 一致，重复属性取最后一个
+    return attrs
+
+
+def extract_scihub_candidates_prescan(html_text):
+    """正则预扫描，返回 [(选择器, 候选链接)]，每个选择器取文档中第一个匹配元素（与 select_one 一致）。"""
+    matched = {}
+    ancestors = []  # [(标签名, 属性)]，当前元素的祖先，按文档嵌套顺序
+    for token in _SCIHUB_TOKEN_PATTERN.finditer(html_text):
+        tag = token.group(3)
+        if tag is None:
+            continue  # 注释或 script/style
+        tag = tag.lower()
+        if token.group(2):  # 结束标签：弹出到最近的同名元素，没有则忽略
+            for depth in range(len(ancestors) - 1, -1, -1):
+                if ancestors[depth][0] == tag:
+                    del ancestors[depth:]
+                    break
+            continue
+        attrs = _parse_html_attrs(token.group(4))
+        for selector, predicate in _SCIHUB_PRESCAN_PREDICATES.items():
+            if selector not in matched and predicate(tag, attrs, ancestors):
+                matched[selector] = attrs
+        if len(matched) == len(SCIHUB_SELECTORS):
+            break
+        if tag not in _HTML_VOID_ELEMENTS and not token.group(4).rstrip().endswith('/'):
+            ancestors.append((tag, attrs))
+    candidates = []
+    for selector in SCIHUB_SELECTORS:
+        potential_url = _scihub_candidate_from_attrs(matched[selector]) if selector in matched else None
+        if potential_url:
+            candidates.append((selector, potential_url))
+    return candidates
+
+
+def extract_scihub_candidates_soup(html_content):
+    """BeautifulSoup 完整解析，返回 [(选择器, 候选链接)]。"""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    candidates = []
+    for selector in SCIHUB_SELECTORS:
+        element = soup.select_one(selector)
+        if isinstance(element, Tag):
+            attrs = {name: ' '.join(value) if isinstance(value, list) else value for name, value in element.attrs.items()}
+            potential_url = _scihub_candidate_from_attrs(attrs)
+            if potential_url:
+                candidates.append((selector, potential_url))
+    return candidates
+
+
+def _read_capped_body(response, max_bytes, deadline=None):
+    """流式读取响应体，最多 max_bytes 字节；时间预算用完时抛出 DeadlineExceeded。"""
+    chunks = []
+    received = 0
+    for chunk in response.iter_content(chunk_size=16 * 1024):
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceeded(f"读取 '{response.url}' 的响应体时时间预算已用完。")
+        if not chunk:
+            continue
+        chunks.append(chunk)
+        received += len(chunk)
+        if received >= max_bytes:
+            break
+    return b''.join(chunks)[:max_bytes]
+
+
+def find_pdf_link_via_scihub(doi, domain, cancel_event=None, deadline=None, raise_on_error=False):
+    # cancel_event: 可选，并行解析时其他策略已得到结果则被置位，此时跳过剩余的 HEAD 校验
+    # deadline: 可选，页面请求与每个 HEAD 校验的超时都不超过剩余的时间预算
+    # raise_on_error: 查询出错 (包括镜像熔断中被跳过) 时抛出 SourceLookupError，而不是与"确定没有PDF"一样返回 None
     pdf_url_found = None
+    lookup_error = None
     sci_hub_url = f"{domain.rstrip('/')}/{doi}"
     log_prefix = "[SciHubSearchUtil]"  # 使用统一的前缀
+    if not mirror_health.allow_request(domain):
+        current_app.logger.info(f"{log_prefix} Skipping Sci-Hub domain '{domain}': circuit open after repeated failures.")
+        if raise_on_error:
+            raise SourceLookupError(f"Sci-Hub 镜像 '{domain}' 熔断中，已跳过。")
+        return None
     current_app.logger.info(f"{log_prefix} Attempting Sci-Hub domain '{domain}' for DOI '{doi}'. URL: {sci_hub_url}")
 
+    mirror_result_recorded = False  # 未记录结果就退出时须释放半开探测名额 (见 finally)
     try:
-        response = REQUEST_SESSION.get(sci_hub_url, timeout=30, allow_redirects=True)
-        response.raise_for_status()
-        content_type_header = response.headers.get("Content-Type", "").lower()
-        if "application/pdf" in content_type_header:
-            current_app.logger.info(
-                f"{log_prefix} Success! Direct PDF response from Sci-Hub URL: {response.url}. Content-Type: {content_type_header}")
-            return response.url
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-        selectors = [
-            '#pdf', 'iframe#viewer', 'embed#viewer',
-            'div#viewer iframe', 'div#viewer embed',
-            'div.buttons > ul > li > a[onclick*=".pdf"]',
-            'div.download-buttons a[href*=".pdf"]',
-            'a#download',
-            'button[onclick*="location.href=location.origin"]'
-        ]
-
-        for selector in selectors:
-            element = soup.select_one(selector)
-            if element:
-                potential_url = None
-                if element.get('src'):
-                    potential_url = element.get('src')
-                elif element.get('href') and ('.pdf' in element.get('href').lower() or 'sci-hub' in element.get(
-                        'href').lower() or 'doi.org' in element.get('href').lower()):
-                    potential_url = element.get('href')
-                elif 'onclick' in element.attrs:
-                    match = re.search(r"location\.href=['\"]([^'\"]+\.pdf[^'\"]*)['\"]", element['onclick'])
-                    if match: potential_url = match.group(1)
-
-                if potential_url:
-                    if potential_url.startswith('//'): potential_url = "https:" + potential_url
-                    if not potential_url.startswith('http'): potential_url = urljoin(response.url, potential_url)
-                    current_app.logger.debug(
-                        f"{log_prefix} Potential PDF URL extracted: {potential_url} using selector: '{selector}'")
-                    try:
-                        head_response = REQUEST_SESSION.head(potential_url, timeout=15, allow_redirects=True)
-                        head_content_type = head_response.headers.get("Content-Type", "").lower()
-                        if head_response.ok and (
-                                "application/pdf" in head_content_type or ".pdf" in potential_url.lower()):
-                            current_app.logger.info(
-                                f"{log_prefix} Verified PDF link via HEAD request for {potential_url}. Content-Type: '{head_content_type}'.")
-                            return potential_url
-                        else:
-                            current_app.logger.warning(
-                                f"{log_prefix} Link {potential_url} from selector '{selector}' does not seem to be a PDF or request failed. HEAD Status: {head_response.status_code}, Content-Type: '{head_content_type}'.")
-                    except requests.exceptions.RequestException as head_err:
-                        current_app.logger.warning(
-                            f"{log_prefix} HEAD request error for {potential_url}: {head_err}. Proceeding cautiously if URL contains '.pdf'.")
-                        if ".pdf" in potential_url.lower(): return potential_url
+        request_started_at = time.monotonic()
+        try:
+            response = http_client.get("scihub", sci_hub_url, timeout=30, allow_redirects=True, stream=True,
+                                       deadline=deadline)
+        except (RateLimitExceeded, DeadlineExceeded):
+            raise  # 本地限速或预算用完，不代表镜像故障
+        except requests.exceptions.RequestException:
+            _record_mirror_result(domain, time.monotonic() - request_started_at, False)
+            mirror_result_recorded = True
+            raise
+        with response:
+            # 4xx 说明镜像本身可用（如该DOI不存在），只有 5xx 计为镜像故障
+            _record_mirror_result(domain, time.monotonic() - request_started_at, response.status_code < 500)
+            mirror_result_recorded = True
+            response.raise_for_status()
+            content_type_header = response.headers.get("Content-Type", "").lower()
+            if "application/pdf" in content_type_header:
+                # 直接返回了PDF：无需读取响应体
+                current_app.logger.info(
+                    f"{log_prefix} Success! Direct PDF response from Sci-Hub URL: {response.url}. Content-Type: {content_type_header}")
+                return response.url
+            max_page_bytes = int(current_app.config.get('SCIHUB_PAGE_MAX_BYTES', 256 * 1024))
+            page_content = _read_capped_body(response, max_page_bytes, deadline)
+            page_url = response.url
+            page_encoding = response.encoding or 'utf-8'
+
+        candidates = extract_scihub_candidates_prescan(page_content.decode(page_encoding, errors='replace'))
+        if not candidates:
+            current_app.logger.debug(f"{log_prefix} Prescan found no candidates on '{domain}', falling back to full HTML parsing.")
+            candidates = extract_scihub_candidates_soup(page_content)
+
+        for selector, potential_url in candidates:
+            if cancel_event is not None and cancel_event.is_set():
+                current_app.logger.debug(f"{log_prefix} Search on '{domain}' cancelled, another strategy already answered.")
+                return None
+            if potential_url.startswith('//'): potential_url = "https:" + potential_url
+            if not potential_url.startswith('http'): potential_url = urljoin(page_url, potential_url)
+            current_app.logger.debug(
+                f"{log_prefix} Potential PDF URL extracted: {potential_url} using selector: '{selector}'")
+            try:
+                head_response = http_client.head("scihub", potential_url, timeout=15, allow_redirects=True,
+                                                 deadline=deadline)
+                head_content_type = head_response.headers.get("Content-Type", "").lower()
+                if head_response.ok and (
+                        "application/pdf" in head_content_type or ".pdf" in potential_url.lower()):
+                    current_app.logger.info(
+                        f"{log_prefix} Verified PDF link via HEAD request for {potential_url}. Content-Type: '{head_content_type}'.")
+                    return potential_url
+                else:
+                    current_app.logger.warning(
+                        f"{log_prefix} Link {potential_url} from selector '{selector}' does not seem to be a PDF or request failed. HEAD Status: {head_response.status_code}, Content-Type: '{head_content_type}'.")
+            except requests.exceptions.RequestException as head_err:
+                current_app.logger.warning(
+                    f"{log_prefix} HEAD request error for {potential_url}: {head_err}. Proceeding cautiously if URL contains '.pdf'.")
+                if ".pdf" in potential_url.lower(): return potential_url
+                lookup_error = head_err  # 该候选链接未能校验，"未找到" 不是确定结果
 
         current_app.logger.info(
             f"{log_prefix} No PDF link found through HTML parsing on Sci-Hub domain '{domain}' for DOI '{doi}'.")
@@ -351,16 +691,61 @@ def find_pdf_link_via_scihub(doi, domain):
     except requests.exceptions.RequestException as req_err:
         current_app.logger.warning(
             f"{log_prefix} Request error for Sci-Hub '{domain}', DOI '{doi}', URL '{sci_hub_url}': {req_err}")
+        if not (isinstance(req_err, requests.exceptions.HTTPError) and _is_definitive_http_miss(req_err)):
+            lookup_error = req_err
     except Exception as e:
         current_app.logger.error(
             f"{log_prefix} Unexpected error parsing Sci-Hub response from '{domain}' for DOI '{doi}'. URL: {sci_hub_url}. Error: {e}",
             exc_info=True)
+        lookup_error = e
+    finally:
+        if not mirror_result_recorded:
+            mirror_health.release_probe(domain)
 
+    if lookup_error is not None and raise_on_error:
+        raise SourceLookupError(f"Sci-Hub '{domain}' 查询出错 (DOI: '{doi}'): {lookup_error}")
     return None
 
 
-def find_pdf_on_arxiv_by_title(title):
+_ARXIV_ATOM_NS = '{http://www.w3.org/2005/Atom}'
+_ARXIV_API_URL = 'http://export.arxiv.org/api/query'
+
+
+def _arxiv_entry_pdf_link(entry):
+    """从 arXiv Atom 条目中取PDF链接：优先 title="pdf" 的 link，否则由摘要页链接构造。"""
+    log_prefix = "[ArXivSearchUtil]"
+    atom_ns = _ARXIV_ATOM_NS
+    for link_tag in entry.findall(f'{atom_ns}link[@title="pdf"]'):
+        if link_tag.get('href'):
+            pdf_url_found = link_tag.get('href')
+            current_app.logger.info(f"{log_prefix} 找到直接的 arXiv PDF 链接 (link title='pdf'): {pdf_url_found}")
+            return pdf_url_found
+    abs_link_text = None
+    id_tag = entry.find(f'{atom_ns}id')
+    if id_tag is not None and id_tag.text and '/abs/' in id_tag.text:
+        abs_link_text = id_tag.text.strip()
+    if not abs_link_text:
+        return None
+    current_app.logger.debug(f"{log_prefix} 找到 arXiv 摘要页链接: {abs_link_text}")
+    parsed_url = urlparse(abs_link_text)
+    path_components = parsed_url.path.strip('/').split('/')
+    arxiv_id_part = None
+    if 'abs' in path_components and len(path_components) > path_components.index('abs') + 1:
+        arxiv_id_part = "/".join(path_components[path_components.index('abs')+1:])
+    if not arxiv_id_part:
+        current_app.logger.warning(f"{log_prefix} 无法从摘要页链接 '{abs_link_text}' 中解析出有效的 arXiv ID。")
+        return None
+    constructed_pdf_link = f"https://arxiv.org/pdf/{arxiv_id_part}"
+    if not re.search(r'v\d+$', arxiv_id_part) and not constructed_pdf_link.endswith('.pdf'):
+        constructed_pdf_link += ".pdf"
+    current_app.logger.info(f"{log_prefix} 根据摘要页链接构造的 arXiv PDF 链接为: {constructed_pdf_link}")
+    return constructed_pdf_link
+
+
+def find_pdf_on_arxiv_by_title(title, deadline=None, raise_on_error=False):
+    # raise_on_error: 查询出错时抛出 SourceLookupError，而不是与"确定没有PDF"一样返回 None
     pdf_url_found = None
+    lookup_error = None
     log_prefix = "[ArXivSearchUtil]"
 
     if not title or not title.strip():
@@ -374,63 +759,147 @@ def find_pdf_on_arxiv_by_title(title):
         encoded_title = quote_plus(cleaned_title)
         api_url = f'http://export.arxiv.org/api/query?search_query=ti:"{encoded_title}"&start=0&max_results=1'
         current_app.logger.debug(f"{log_prefix} 查询API URL: {api_url}") # <--- 修改点
-        response = REQUEST_SESSION.get(api_url, timeout=20)
+        response = http_client.get("arxiv", api_url, timeout=20, deadline=deadline)
         response.raise_for_status()
         root = ET.fromstring(response.content)
-        atom_ns = '{http://www.w3.org/2005/Atom}'
-        entries = root.findall(f'{atom_ns}entry')
+        entries = root.findall(f'{_ARXIV_ATOM_NS}entry')
         if not entries:
             current_app.logger.info(f"{log_prefix} 对于标题 '{cleaned_title}'，arXiv API响应中未找到任何条目。") # <--- 修改点
             return None
-        # ... (后续的XML解析逻辑和日志也应将 app.logger 改为 current_app.logger) ...
-        # ... (为了简洁，此处省略，请确保您在实际代码中替换所有 app.logger)
         entry = entries[0]
-        for link_tag in entry.findall(f'{atom_ns}link[@title="pdf"]'):
-            if link_tag.get('href'):
-                pdf_url_found = link_tag.get('href')
-                current_app.logger.info(f"{log_prefix} 找到直接的 arXiv PDF 链接 (link title='pdf'): {pdf_url_found}")
-                return pdf_url_found
-        abs_link_text = None # ... (获取abs_link_text的逻辑) ...
-        id_tag = entry.find(f'{atom_ns}id')
-        if id_tag is not None and id_tag.text and '/abs/' in id_tag.text:
-            abs_link_text = id_tag.text.strip()
-        # ... (构造PDF链接的逻辑) ...
-        if abs_link_text:
-            current_app.logger.debug(f"{log_prefix} 找到 arXiv 摘要页链接: {abs_link_text}")
-            parsed_url = urlparse(abs_link_text)
-            path_components = parsed_url.path.strip('/').split('/')
-            arxiv_id_part = None
-            if 'abs' in path_components and len(path_components) > path_components.index('abs') + 1:
-                arxiv_id_part = "/".join(path_components[path_components.index('abs')+1:])
-            if arxiv_id_part:
-                constructed_pdf_link = f"https://arxiv.org/pdf/{arxiv_id_part}"
-                if not re.search(r'v\d+$', arxiv_id_part) and not constructed_pdf_link.endswith('.pdf'):
-                    constructed_pdf_link += ".pdf"
-                current_app.logger.info(f"{log_prefix} 根据摘要页链接构造的 arXiv PDF 链接为: {constructed_pdf_link}")
-                return constructed_pdf_link # 返回构造的链接
-            else:
-                current_app.logger.warning(f"{log_prefix} 无法从摘要页链接 '{abs_link_text}' 中解析出有效的 arXiv ID。")
-        else:
-             current_app.logger.info(f"{log_prefix} 在标题为 '{cleaned_title}' 的 arXiv 条目中未找到合适的摘要页链接。")
+        pdf_url_found = _arxiv_entry_pdf_link(entry)
+        if pdf_url_found:
+            return pdf_url_found
+        current_app.logger.info(f"{log_prefix} 在标题为 '{cleaned_title}' 的 arXiv 条目中未找到合适的摘要页链接。")
 
 
     # ... (异常捕获块中的 app.logger 全部改为 current_app.logger) ...
     except requests.exceptions.HTTPError as http_err:
-        current_app.logger.warning(f"{log_prefix} 访问 arXiv API 时发生 HTTP 错误 (标题: '{cleaned_title}'). URL: {api_url if 'api_url' in locals() else 'N/A'}. 状态码: {http_err.response.status_code if http_err.response else 'N/A'}. 错误: {http_err}")
-    except requests.exceptions.Timeout:
+        current_app.logger.warning(f"{log_prefix} 访问 arXiv API 时发生 HTTP 错误 (标题: '{cleaned_title}'). URL: {api_url if 'api_url' in locals() else 'N/A'}. 状态码: {http_err.response.status_code if http_err.response is not None else 'N/A'}. 错误: {http_err}")
+        lookup_error = http_err
+    except requests.exceptions.Timeout as timeout_err:
         current_app.logger.warning(f"{log_prefix} 访问 arXiv API 超时 (标题: '{cleaned_title}'). URL: {api_url if 'api_url' in locals() else 'N/A'}")
+        lookup_error = timeout_err
     # ... (其他异常类型)
     except ET.ParseError as xml_err:
         current_app.logger.error(f"{log_prefix} 解析来自 arXiv API 的 XML 响应失败 (标题: '{cleaned_title}'). URL: {api_url if 'api_url' in locals() else 'N/A'}. 错误: {xml_err}")
         if 'response' in locals() and response.content:
              current_app.logger.debug(f"{log_prefix} arXiv 响应内容 (前200字符): {response.content[:200]}")
+        lookup_error = xml_err
     except Exception as e:
         current_app.logger.error(f"{log_prefix} 处理 arXiv API (标题: '{cleaned_title}') 时发生未知错误. URL: {api_url if 'api_url' in locals() else 'N/A'}. 错误: {e}", exc_info=True)
+        lookup_error = e
 
     if not pdf_url_found:
         current_app.logger.info(f"{log_prefix} 尝试所有策略后，未能为标题 '{cleaned_title}' 找到 arXiv PDF 链接。")
+    if lookup_error is not None and raise_on_error:
+        raise SourceLookupError(f"arXiv 查询出错 (标题: '{cleaned_title}'): {lookup_error}")
     return pdf_url_found
 
+
+# === arXiv 批量标题查询 ===
+# 把多个标题合并为一个查询 (ti:"..." OR ti:"...")，按页读取结果，一次解析 Atom 响应，
+# 再按规范化标题的相似度把条目匹配回输入标题。arXiv 要求的请求间隔由 http_client 中 arxiv 服务的令牌桶保证。
+
+
+def _best_title_match(entry_title, pending_titles, threshold):
+    """返回与 entry_title 最相似且不低于阈值的待匹配标题 (规范化后)，没有则返回 None。"""
+    best_title, best_ratio = None, threshold
+    for pending_title in pending_titles:
+        if pending_title == entry_title:
+            return pending_title
+        # 长度差距过大时不可能达到阈值，跳过较昂贵的相似度计算
+        if min(len(pending_title), len(entry_title)) * 2 < threshold * (len(pending_title) + len(entry_title)):
+            continue
+        ratio = difflib.SequenceMatcher(None, pending_title, entry_title).ratio()
+        if ratio >= best_ratio:
+            best_title, best_ratio = pending_title, ratio
+    return best_title
+
+
+def find_pdfs_on_arxiv_by_titles(titles):
+    """
+    批量查找 arXiv PDF 链接，返回 ({原始标题: pdf_url 或 None}, 查询出错而结果不确定的原始标题集合)。
+    每 ARXIV_BATCH_TITLES_PER_QUERY 个标题合并为一个查询，每个查询最多读取 ARXIV_BATCH_MAX_PAGES 页。
+    """
+    log_prefix = "[ArXivBatchSearchUtil]"
+    config = current_app.config
+    titles_per_query = max(1, int(config.get('ARXIV_BATCH_TITLES_PER_QUERY', 10)))
+    page_size = max(1, int(config.get('ARXIV_BATCH_PAGE_SIZE', 50)))
+    max_pages = max(1, int(config.get('ARXIV_BATCH_MAX_PAGES', 3)))
+    threshold = float(config.get('ARXIV_TITLE_MATCH_THRESHOLD', 0.9))
+
+    results = {}
+    failed_titles = set()
+    originals_by_normalized = {}  # 规范化标题 -> [原始标题, ...]
+    for title in titles:
+        results[title] = None
+        normalized = normalize_title(title)
+        if normalized:
+            originals_by_normalized.setdefault(normalized, []).append(title)
+
+    normalized_titles = list(originals_by_normalized)
+    request_count = 0
+    for chunk_start in range(0, len(normalized_titles), titles_per_query):
+        pending = set(normalized_titles[chunk_start:chunk_start + titles_per_query])
+        # 规范化标题已去掉标点和引号，可直接放入短语查询
+        search_query = " OR ".join(f'ti:"{normalized}"' for normalized in sorted(pending))
+        for page in range(max_pages):
+            if not pending:
+                break
+            params = {'search_query': search_query, 'start': page * page_size, 'max_results': page_size}
+            try:
+                response = http_client.get("arxiv", _ARXIV_API_URL, params=params, timeout=30)
+                request_count += 1
+                response.raise_for_status()
+                entries = ET.fromstring(response.content).findall(f'{_ARXIV_ATOM_NS}entry')
+            except (requests.exceptions.RequestException, ET.ParseError) as e:
+                current_app.logger.warning(f"{log_prefix} arXiv 批量查询失败 (第 {page + 1} 页，{len(pending)} 个标题待匹配): {e}")
+                for normalized in pending:
+                    failed_titles.update(originals_by_normalized[normalized])
+                break
+            for entry in entries:
+                title_tag = entry.find(f'{_ARXIV_ATOM_NS}title')
+                entry_title = normalize_title(title_tag.text) if title_tag is not None else None
+                matched = _best_title_match(entry_title, pending, threshold) if entry_title else None
+                if not matched:
+                    continue
+                pdf_url = _arxiv_entry_pdf_link(entry)
+                if pdf_url:
+                    pending.discard(matched)
+                    for original_title in originals_by_normalized[matched]:
+                        results[original_title] = pdf_url
+            if len(entries) < page_size:
+                break  # 已是最后一页
+
+    found_count = sum(1 for pdf_url in results.values() if pdf_url)
+    current_app.logger.info(
+        f"{log_prefix} 批量查询 {len(normalized_titles)} 个标题，共 {request_count} 次请求，匹配到 {found_count} 个PDF链接。")
+    return results, failed_titles
+
+
+def find_pdf_links_by_titles(titles):
+    """
+    仅凭标题查找PDF链接的批量版本（无DOI时唯一的来源是 arXiv）：先查解析缓存，未缓存的标题合并为批量 arXiv 查询，
+    结果写回缓存（查询出错的标题不写入负缓存）。返回 {原始标题: pdf_url 或 None}。
+    """
+    results = {}
+    uncached_titles = []
+    for title in titles:
+        cached = resolution_cache.get(resolution_query_key(None, title))
+        if cached is not None:
+            results[title] = cached.pdf_link
+        else:
+            uncached_titles.append(title)
+    if uncached_titles:
+        arxiv_results, failed_titles = find_pdfs_on_arxiv_by_titles(uncached_titles)
+        for title, pdf_url in arxiv_results.items():
+            results[title] = pdf_url
+            if pdf_url or title not in failed_titles:
+                resolution_cache.put(resolution_query_key(None, title), pdf_url, "arXiv" if pdf_url else None)
+    return results
+
+
 def generate_task_id(articles_data_list):
     # 这个函数不直接依赖 app 或 current_app 上下文，可以直接使用
     if not articles_data_list:
@@ -451,6 +920,7 @@ def generate_task_id(articles_data_list):
     # print(f"[Util/GenerateTaskID] Generated Task ID: {task_id} for {len(articles_data_list)} articles from source string: '{task_id_source_string[:100]}...'") # 临时用print
     return task_id
 
+# 旧版 download_records.json 只读不写：任务记录已迁移到 batch_tasks 表，仅供 migrate_download_records_to_db 导入
 def load_download_records():
     log_prefix = "[Util/LoadRecords]"
     download_records_file_path = current_app.config.get('DOWNLOAD_RECORDS_FILE')
@@ -487,74 +957,93 @@ def load_download_records():
     current_app.logger.warning(f"{log_prefix} 无法加载任何下载记录。将返回空记录。")
     return {} # 所有尝试失败后，返回空字典
 
-def save_download_records(records):
-    log_prefix = "[Util/SaveRecords]"
-    download_records_file_path = current_app.config.get('DOWNLOAD_RECORDS_FILE')
-    if not download_records_file_path:
-        current_app.logger.error(f"{log_prefix} DOWNLOAD_RECORDS_FILE 未在应用配置中定义！无法保存记录。")
-        return False
+def _parse_record_timestamp(timestamp_str):
+    # download_records.json 中的时间为本地时间 "%Y-%m-%d %H:%M:%S"，转换为 UTC 存入数据库
+    if not timestamp_str:
+        return None
+    try:
+        return datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S").astimezone(timezone.utc)
+    except (TypeError, ValueError):
+        return None
 
-    # 定义临时文件名和备份文件名
-    temp_file_path = download_records_file_path + ".tmp"
-    backup_file_path = download_records_file_path + ".bak"
 
-    try:
-        # 1. 将数据写入临时文件
-        with open(temp_file_path, 'w', encoding='utf-8') as f:
-            json.dump(records, f, ensure_ascii=False, indent=4)
-        current_app.logger.debug(f"{log_prefix} 记录已成功写入临时文件 '{temp_file_path}'。")
+def migrate_download_records_to_db():
+    """
+    一次性把 download_records.json 中的任务记录导入 batch_tasks 表。
+    已存在的 task_id 会被跳过，因此可以重复执行；导入完成后原文件重命名为 .migrated，避免再次导入。
+    返回 (导入条数, 跳过条数)。
+    """
+    from models import BatchTask, User  # 仅迁移时需要
 
-        # 2. 如果主文件存在，将其备份
-        if os.path.exists(download_records_file_path):
-            try:
-                # shutil.copy2(download_records_file_path, backup_file_path) # 复制并保留元数据
-                os.replace(download_records_file_path, backup_file_path) # 或者直接重命名为备份，如果旧备份不重要
-                current_app.logger.info(f"{log_prefix} 原记录文件已备份至 '{backup_file_path}'。")
-            except Exception as e_backup:
-                current_app.logger.error(f"{log_prefix} 备份原记录文件 '{download_records_file_path}' 失败: {e_backup}", exc_info=True)
-                # 备份失败是一个警告，但我们仍会尝试用新文件替换主文件
-
-        # 3. 原子地将临时文件重命名为主文件
-        # os.replace() 在多数情况下是原子性的，如果目标文件已存在，则覆盖它。
-        os.replace(temp_file_path, download_records_file_path)
-        current_app.logger.info(f"{log_prefix} 下载记录已成功保存到 '{download_records_file_path}' (通过替换临时文件)。")
-        return True # 表示保存成功
-
-    except (IOError, TypeError, Exception) as e: # TypeError for json.dump if records is not serializable
-        current_app.logger.error(f"{log_prefix} 保存下载记录到 '{download_records_file_path}' (通过临时文件 '{temp_file_path}') 时发生错误: {e}", exc_info=True)
-        # 如果发生错误，尝试删除可能已创建的临时文件
-        if os.path.exists(temp_file_path):
+    log_prefix = "[Util/MigrateRecords]"
+    download_records_file_path = current_app.config.get('DOWNLOAD_RECORDS_FILE')
+    if not download_records_file_path or not (os.path.exists(download_records_file_path) or
+                                              os.path.exists(download_records_file_path + ".bak")):
+        current_app.logger.info(f"{log_prefix} 没有需要迁移的下载记录文件。")
+        return 0, 0
+
+    records = load_download_records()
+    existing_task_ids = {row.task_id for row in BatchTask.query.with_entities(BatchTask.task_id).all()}
+    existing_user_ids = {row.id for row in User.query.with_entities(User.id).all()}
+    imported_count, skipped_count = 0, 0
+    for task_id, record in records.items():
+        if task_id in existing_task_ids or not isinstance(record, dict):
+            skipped_count += 1
+            continue
+        # 早期记录没有 status 字段，只有成功生成的ZIP才会被写入
+        status = record.get('status') or ("COMPLETED" if record.get('zip_filename') else "FAILED")
+        submitted_at = _parse_record_timestamp(record.get('timestamp_submitted') or record.get('timestamp'))
+        processed_at = _parse_record_timestamp(record.get('timestamp_processed') or record.get('timestamp'))
+        user_id = record.get('user_id')
+        task = BatchTask(
+            task_id=task_id,
+            job_id=record.get('job_id'),
+            user_id=user_id if user_id in existing_user_ids else None,
+            status=status,
+            zip_filename=record.get('zip_filename'),
+            message=record.get('message'),
+            error_message=record.get('error_message'),
+            num_requested=record.get('num_requested') or record.get('num_articles_requested') or 0,
+            num_success=record.get('num_success') or record.get('num_articles_success') or 0,
+            attempts=record.get('attempts') or 0,
+            worker_id=record.get('worker_id'),
+            # 迁移时正在处理中的任务不保留开始时间，租约视为已过期，由扫描线程重新执行
+            processing_started_at=None,
+            submitted_at=submitted_at or datetime.now(timezone.utc),
+            processed_at=processed_at if status not in ("SUBMITTED", "PROCESSING", "STREAMABLE") else None,
+        )
+        task.articles = record.get('articles')
+        task.failed_items = record.get('failed_items')
+        if status == "COMPLETED" and task.zip_filename:
+            task.last_downloaded_at = task.processed_at  # 供 zip_retention 的LRU淘汰使用
             try:
-                os.remove(temp_file_path)
-                current_app.logger.info(f"{log_prefix} 已删除错误的临时文件 '{temp_file_path}'。")
-            except OSError as e_rm_tmp:
-                current_app.logger.error(f"{log_prefix} 删除错误的临时文件 '{temp_file_path}' 失败: {e_rm_tmp}", exc_info=True)
-        return False # 表示保存失败
+                task.zip_size_bytes = os.path.getsize(os.path.join(current_app.config.get('ZIPPED_FILES_DIR'), task.zip_filename))
+            except (OSError, TypeError):
+                task.zip_size_bytes = 0
+        db.session.add(task)
+        existing_task_ids.add(task_id)
+        imported_count += 1
+    db.session.commit()
 
-def download_pdf_to_server(pdf_url, desired_title, target_directory):
+    if os.path.exists(download_records_file_path):
+        os.replace(download_records_file_path, download_records_file_path + ".migrated")
+    current_app.logger.info(f"{log_prefix} 已导入 {imported_count} 条任务记录，跳过 {skipped_count} 条。")
+    return imported_count, skipped_count
+
+
+def download_pdf_to_fileobj(pdf_url, fileobj, progress_callback=None):
+    """
+    流式下载PDF并写入任意可写文件对象（磁盘文件、SpooledTemporaryFile、ZIP条目等）。
+    校验逻辑基于响应头和首个数据块完成，不需要回读已写入的数据。
+    progress_callback(已下载字节数, 总字节数或None) 在每个数据块写入后调用。
+    成功时返回写入的字节数，失败时返回 None（调用方负责清理已写入的部分数据）。
+    """
     log_prefix = "[PdfDownloader]"
-    file_path = None  # 初始化 file_path
-
-    if not pdf_url or not desired_title:
-        current_app.logger.error(f"{log_prefix} PDF URL ('{pdf_url}') 或文献标题 ('{desired_title}') 为空。下载中止。")
-        return None
-
-    if not os.path.exists(target_directory):
-        try:
-            os.makedirs(target_directory)
-            current_app.logger.info(f"{log_prefix} 为PDF下载创建了目录 '{target_directory}'。")
-        except OSError as e:
-            current_app.logger.error(f"{log_prefix} 无法创建目标目录 '{target_directory}': {e}", exc_info=True)
-            return None
-
-    filename = sanitize_filename(desired_title)  # sanitize_filename 应确保生成有效的文件名
-    file_path = os.path.join(target_directory, filename)
-
     try:
-        current_app.logger.info(f"{log_prefix} 开始下载: '{pdf_url}' -> '{file_path}'")
+        current_app.logger.info(f"{log_prefix} 开始下载: '{pdf_url}'")
 
         # 使用 with语句确保response对象被正确关闭
-        with REQUEST_SESSION.get(pdf_url, stream=True, timeout=90, allow_redirects=True) as response:  # 增加超时时间
+        with http_client.get("pdf", pdf_url, stream=True, timeout=90, allow_redirects=True) as response:  # 增加超时时间
             response.raise_for_status()  # 提早检查HTTP错误
 
             content_type = response.headers.get('Content-Type', '').lower()
@@ -563,44 +1052,41 @@ def download_pdf_to_server(pdf_url, desired_title, target_directory):
                 current_app.logger.warning(
                     f"{log_prefix} URL '{pdf_url}' 的 Content-Type 是 '{content_type}'，可能不是PDF。谨慎下载。")
 
-            downloaded_size = 0
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192 * 4):  # 略微增大块大小
-                    if chunk:  # 过滤掉 keep-alive 的新块
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
-
-            current_app.logger.info(f"{log_prefix} 文件下载成功。大小: {downloaded_size} 字节。已保存至: '{file_path}'")
-
-            # 下载后验证
-            if downloaded_size == 0:
-                current_app.logger.warning(f"{log_prefix} 下载的文件 '{file_path}' 为空 (0字节)。正在删除。")
-                # os.remove(file_path) # 将在 finally 或异常处理中统一清理
-                raise ValueError("Downloaded file is empty.")  # 抛出异常以便统一处理
-
             # 检查是否下载到了HTML页面 (基于服务器报告的Content-Type)
             if 'html' in content_type and 'application/pdf' not in content_type:
                 current_app.logger.warning(
-                    f"{log_prefix} 下载的文件 '{file_path}' 被服务器识别为HTML (Content-Type: '{content_type}')。这可能不是预期的PDF。正在删除。")
+                    f"{log_prefix} URL '{pdf_url}' 被服务器识别为HTML (Content-Type: '{content_type}')。这可能不是预期的PDF。")
                 raise ValueError("Downloaded file identified as HTML by server.")
 
-            # 对于通用二进制流，检查PDF魔术字节
-            if 'application/octet-stream' in content_type:
-                with open(file_path, 'rb') as f_check:
-                    magic_bytes = f_check.read(5)  # 读取前5个字节
-                    if magic_bytes != b'%PDF-':  # PDF文件通常以 '%PDF-' 开头
+            content_length = response.headers.get('Content-Length')
+            total_size = int(content_length) if content_length and content_length.isdigit() and \
+                not response.headers.get('Content-Encoding') else None
+            downloaded_size = 0
+            for chunk in response.iter_content(chunk_size=8192 * 4):  # 略微增大块大小
+                if not chunk:  # 过滤掉 keep-alive 的新块
+                    continue
+                # 对于通用二进制流，用首个数据块检查PDF魔术字节 (PDF文件通常以 '%PDF-' 开头)
+                if downloaded_size == 0 and 'application/octet-stream' in content_type:
+                    if not chunk.startswith(b'%PDF-'):
                         current_app.logger.warning(
-                            f"{log_prefix} 下载的文件 '{file_path}' (Content-Type: octet-stream) 开头不是PDF魔术字节 (%PDF-)。可能是错误的文件。正在删除。")
+                            f"{log_prefix} URL '{pdf_url}' (Content-Type: octet-stream) 开头不是PDF魔术字节 (%PDF-)。可能是错误的文件。")
                         raise ValueError("Downloaded octet-stream file is not a PDF.")
-                    else:
-                        current_app.logger.info(f"{log_prefix} 文件 '{file_path}' (octet-stream) 通过魔术字节验证为PDF。")
+                    current_app.logger.info(f"{log_prefix} URL '{pdf_url}' (octet-stream) 通过魔术字节验证为PDF。")
+                fileobj.write(chunk)
+                downloaded_size += len(chunk)
+                if progress_callback:
+                    progress_callback(downloaded_size, total_size)
 
-            # 所有检查通过，返回文件路径
-            return file_path
+            # 下载后验证
+            if downloaded_size == 0:
+                current_app.logger.warning(f"{log_prefix} 从 '{pdf_url}' 下载的内容为空 (0字节)。")
+                raise ValueError("Downloaded file is empty.")  # 抛出异常以便统一处理
+
+            current_app.logger.info(f"{log_prefix} 文件下载成功。大小: {downloaded_size} 字节。来源: '{pdf_url}'")
+            return downloaded_size
 
     except ValueError as ve:  # 捕获我们自己抛出的验证错误
         current_app.logger.error(f"{log_prefix} 下载后文件验证失败 for '{pdf_url}': {ve}")
-        # 文件清理将在 finally 块或更高层异常处理中进行
     except requests.exceptions.HTTPError as http_err:
         current_app.logger.error(
             f"{log_prefix} 下载 '{pdf_url}' 时发生HTTP错误: {http_err.response.status_code if http_err.response else 'N/A'} - {http_err}",
@@ -611,21 +1097,200 @@ def download_pdf_to_server(pdf_url, desired_title, target_directory):
         current_app.logger.error(f"{log_prefix} 下载 '{pdf_url}' 时发生连接错误: {conn_err}", exc_info=False)
     except requests.exceptions.RequestException as req_err:  # 更通用的网络请求相关错误
         current_app.logger.error(f"{log_prefix} 下载 '{pdf_url}' 时发生网络错误: {req_err}", exc_info=False)
-    except IOError as io_err:  # 文件写入错误
-        current_app.logger.error(f"{log_prefix} 写入文件 '{file_path if file_path else '路径未定义'}' 时发生IO错误: {io_err}",
-                         exc_info=True)
+    except IOError as io_err:  # 写入目标文件对象时的错误
+        current_app.logger.error(f"{log_prefix} 写入 '{pdf_url}' 的下载内容时发生IO错误: {io_err}", exc_info=True)
     except Exception as e:  # 其他所有意外错误
-        current_app.logger.error(
-            f"{log_prefix} 下载 '{pdf_url}' 到 '{file_path if file_path else '路径未定义'}' 过程中发生未知错误: {e}",
-            exc_info=True)
+        current_app.logger.error(f"{log_prefix} 下载 '{pdf_url}' 过程中发生未知错误: {e}", exc_info=True)
+
+    return None  # 确保在所有失败路径上都返回None
+
+
+# === 断点续传下载 ===
+# 未完成的下载保存为 <目标>.part，旁边的 <目标>.part.meta 记录源URL与服务器给出的 ETag / Last-Modified。
+# 只有服务器声明 Accept-Ranges: bytes 且提供了校验器时才写 meta；重试时带 Range + If-Range 续传，
+# 文件在服务器端发生变化时服务器会返回完整的 200 响应，此时从头覆盖下载。
+PDF_PART_META_SUFFIX = ".meta"
 
-    # 统一的错误后清理逻辑：如果发生任何上述异常且文件已创建（或部分创建）
-    if file_path and os.path.exists(file_path):
+
+class _IncompleteDownloadError(Exception):
+    """连接中断或服务器返回的数据不完整，可在下次尝试中续传。"""
+
+
+def _load_part_meta(part_path):
+    try:
+        with open(part_path + PDF_PART_META_SUFFIX, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_part_meta(part_path, meta):
+    meta_path = part_path + PDF_PART_META_SUFFIX
+    with open(meta_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(meta_path + ".tmp", meta_path)
+
+
+def discard_partial_download(part_path, keep_data=False):
+    """删除 .part 的元数据（keep_data=False 时连同数据文件一起删除）。"""
+    paths = [part_path + PDF_PART_META_SUFFIX] if keep_data else [part_path, part_path + PDF_PART_META_SUFFIX]
+    for path in paths:
         try:
-            current_app.logger.warning(f"{log_prefix} 因发生错误，正在删除可能不完整或错误的文件: '{file_path}'")
-            os.remove(file_path)
-        except OSError as e_rm:
-            current_app.logger.error(f"{log_prefix} 在错误处理中删除文件 '{file_path}' 失败: {e_rm}", exc_info=True)
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _parse_content_range(content_range):
+    """解析 'bytes 100-199/1000' 或 'bytes */1000'，返回 (起点或None, 总长度或None)。"""
+    match = re.match(r'^\s*bytes\s+(?:(\d+)-\d+|\*)/(\d+|\*)\s*$', content_range or '', re.IGNORECASE)
+    if not match:
+        return None, None
+    start = int(match.group(1)) if match.group(1) is not None else None
+    total = int(match.group(2)) if match.group(2) != '*' else None
+    return start, total
+
+
+def _download_pdf_range_once(pdf_url, part_path, log_prefix, progress_callback=None, headers_callback=None):
+    existing_size = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    meta = _load_part_meta(part_path) if existing_size else None
+    validator = None
+    if meta and meta.get('url') == pdf_url:
+        etag = meta.get('etag')
+        # If-Range 只接受强 ETag，弱 ETag (W/"...") 时改用 Last-Modified
+        validator = etag if etag and not etag.startswith('W/') else meta.get('last_modified')
+
+    # identity 编码保证字节偏移与 Content-Length / Content-Range 一致
+    headers = {'Accept-Encoding': 'identity'}
+    resuming = bool(existing_size and validator)
+    if resuming:
+        headers['Range'] = f"bytes={existing_size}-"
+        headers['If-Range'] = validator
+
+    with http_client.get("pdf", pdf_url, stream=True, timeout=90, allow_redirects=True, headers=headers) as response:
+        if resuming and response.status_code == 416:
+            # 请求起点已在文件末尾：服务器报告的总长度与本地一致，说明上次其实已经下载完整
+            _, total_size = _parse_content_range(response.headers.get('Content-Range'))
+            if total_size == existing_size:
+                current_app.logger.info(f"{log_prefix} '{pdf_url}' 的 .part 文件已完整 ({existing_size} 字节)。")
+                return existing_size
+            discard_partial_download(part_path)
+            raise _IncompleteDownloadError("服务器拒绝了续传范围 (416)，将从头下载。")
+        response.raise_for_status()
+        if headers_callback:
+            headers_callback(response.headers)
+
+        if resuming and response.status_code == 206:
+            range_start, total_size = _parse_content_range(response.headers.get('Content-Range'))
+            if range_start != existing_size:
+                discard_partial_download(part_path)
+                raise _IncompleteDownloadError(
+                    f"Content-Range 起点 ({range_start}) 与本地已下载字节数 ({existing_size}) 不一致，将从头下载。")
+            current_app.logger.info(f"{log_prefix} 从第 {existing_size} 字节处续传 '{pdf_url}' (总大小: {total_size or '未知'})。")
+            write_mode = 'ab'
+            written_size = existing_size
+            content_type = ''
+        else:
+            # 200：首次下载，或服务器忽略了 Range / If-Range 校验失败（文件已变化），从头下载
+            if existing_size:
+                current_app.logger.info(f"{log_prefix} '{pdf_url}' 无法续传（服务器不支持Range或文件已变化），从头下载。")
+            content_type = response.headers.get('Content-Type', '').lower()
+            if 'application/pdf' not in content_type and 'application/octet-stream' not in content_type:
+                current_app.logger.warning(
+                    f"{log_prefix} URL '{pdf_url}' 的 Content-Type 是 '{content_type}'，可能不是PDF。谨慎下载。")
+            if 'html' in content_type and 'application/pdf' not in content_type:
+                current_app.logger.warning(
+                    f"{log_prefix} URL '{pdf_url}' 被服务器识别为HTML (Content-Type: '{content_type}')。这可能不是预期的PDF。")
+                raise ValueError("Downloaded file identified as HTML by server.")
 
-    return None  # 确保在所有失败路径上都返回None
+            content_length = response.headers.get('Content-Length')
+            total_size = int(content_length) if content_length and content_length.isdigit() and \
+                not response.headers.get('Content-Encoding') else None
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if 'bytes' in response.headers.get('Accept-Ranges', '').lower() and (etag or last_modified):
+                _save_part_meta(part_path, {"url": pdf_url, "etag": etag, "last_modified": last_modified,
+                                            "total_size": total_size})
+            else:
+                discard_partial_download(part_path, keep_data=True)  # 不可续传，失败时不保留 .part
+            write_mode = 'wb'
+            written_size = 0
+
+        with open(part_path, write_mode) as f:
+            for chunk in response.iter_content(chunk_size=8192 * 4):
+                if not chunk:  # 过滤掉 keep-alive 的新块
+                    continue
+                if written_size == 0 and 'application/octet-stream' in content_type:
+                    if not chunk.startswith(b'%PDF-'):
+                        current_app.logger.warning(
+                            f"{log_prefix} URL '{pdf_url}' (Content-Type: octet-stream) 开头不是PDF魔术字节 (%PDF-)。可能是错误的文件。")
+                        raise ValueError("Downloaded octet-stream file is not a PDF.")
+                f.write(chunk)
+                written_size += len(chunk)
+                if progress_callback:
+                    progress_callback(written_size, total_size)
+            f.flush()
+            os.fsync(f.fileno())
+
+    if written_size == 0:
+        current_app.logger.warning(f"{log_prefix} 从 '{pdf_url}' 下载的内容为空 (0字节)。")
+        raise ValueError("Downloaded file is empty.")
+    if total_size is not None and written_size != total_size:
+        raise _IncompleteDownloadError(f"连接提前结束：已接收 {written_size}/{total_size} 字节。")
+    return written_size
+
+
+def download_pdf_resumable(pdf_url, part_path, progress_callback=None, headers_callback=None):
+    """
+    断点续传地把PDF下载到 part_path，连接中断时在 PDF_DOWNLOAD_RESUME_ATTEMPTS 次尝试内从断点继续。
+    成功时返回文件总字节数（数据留在 part_path，由调用方重命名或提交），失败返回 None。
+    失败时，可续传的 .part 及其元数据会被保留，下次对同一 part_path 调用时从断点继续；不可续传的则被删除。
+    progress_callback(已下载字节数, 总字节数或None) 的字节数包含续传前已下载的部分。
+    headers_callback(响应头) 在每次尝试收到源站的成功响应时调用。
+    """
+    log_prefix = "[PdfDownloader]"
+    max_attempts = max(1, int(current_app.config.get('PDF_DOWNLOAD_RESUME_ATTEMPTS', 3)))
+    current_app.logger.info(f"{log_prefix} 开始下载: '{pdf_url}'")
+    for attempt in range(1, max_attempts + 1):
+        try:
+            downloaded_size = _download_pdf_range_once(pdf_url, part_path, log_prefix, progress_callback,
+                                                       headers_callback)
+            discard_partial_download(part_path, keep_data=True)  # 已完整，元数据不再需要
+            current_app.logger.info(f"{log_prefix} 文件下载成功。大小: {downloaded_size} 字节。来源: '{pdf_url}'")
+            return downloaded_size
+        except (_IncompleteDownloadError, requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            resumable = _load_part_meta(part_path) is not None
+            partial_size = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            current_app.logger.warning(
+                f"{log_prefix} 第 {attempt}/{max_attempts} 次下载 '{pdf_url}' 中断 (已下载 {partial_size} 字节，"
+                f"{'可续传' if resumable else '不可续传'}): {e}")
+            if attempt < max_attempts:
+                time.sleep(min(2 ** attempt, 10))
+            continue
+        except ValueError as ve:  # 内容校验失败，.part 中的数据没有保留价值
+            current_app.logger.error(f"{log_prefix} 下载后文件验证失败 for '{pdf_url}': {ve}")
+            discard_partial_download(part_path)
+            return None
+        except requests.exceptions.HTTPError as http_err:
+            current_app.logger.error(
+                f"{log_prefix} 下载 '{pdf_url}' 时发生HTTP错误: {http_err.response.status_code if http_err.response is not None else 'N/A'} - {http_err}",
+                exc_info=False)
+            break
+        except requests.exceptions.RequestException as req_err:
+            current_app.logger.error(f"{log_prefix} 下载 '{pdf_url}' 时发生网络错误: {req_err}", exc_info=False)
+            break
+        except IOError as io_err:
+            current_app.logger.error(f"{log_prefix} 写入 '{part_path}' 时发生IO错误: {io_err}", exc_info=True)
+            discard_partial_download(part_path)
+            return None
+        except Exception as e:
+            current_app.logger.error(f"{log_prefix} 下载 '{pdf_url}' 过程中发生未知错误: {e}", exc_info=True)
+            discard_partial_download(part_path)
+            return None
 
+    if _load_part_meta(part_path) is None:
+        discard_partial_download(part_path)
+    else:
+        current_app.logger.info(f"{log_prefix} 保留未完成的下载 '{part_path}'，下次重试时将从断点续传。")
+    return None
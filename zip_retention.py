@@ -0,0 +1,195 @@
+# backend/zip_retention.py
+import os
+import threading
+from datetime import datetime, timezone, timedelta
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, BatchTask
+
+
+# === ZIPPED_FILES_DIR 保留策略 ===
+# 后台线程定期清理已生成的ZIP包，规则依次为：
+#   1. 最近访问（最近一次下载，或生成时间）早于 ZIP_RETENTION_MAX_AGE_SECONDS 的ZIP
+#   2. 单个用户的ZIP总大小超过 ZIP_RETENTION_PER_USER_MAX_BYTES 时，按最近访问时间从旧到新淘汰
+#   3. 全部ZIP总大小超过 ZIP_RETENTION_MAX_BYTES 时，同样按LRU淘汰
+# 被淘汰的任务记录状态改为 EVICTED（先更新记录再删文件）；重新提交同一批文章时会自动重新构建。
+# 目录中没有任何任务记录引用的ZIP（以及遗留的 .part 构建文件）也会被清理。
+class ZipRetentionManager:
+    """
+    ZIP保留策略管理器。用法与 BatchJobExecutor 一致：模块级实例化，在 create_app 中调用 init_app(app)，再 start()。
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['zip_retention'] = self
+
+    def start(self):
+        if self.app is None:
+            raise RuntimeError("ZipRetentionManager 尚未通过 init_app 关联到 Flask 应用。")
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._sweep_loop, name="zip-retention-sweeper", daemon=True)
+        self._thread.start()
+        self.app.logger.info("[ZipRetention] ZIP保留策略后台清理线程已启动。")
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def _sweep_loop(self):
+        interval = max(10, int(self.app.config.get('ZIP_RETENTION_SWEEP_INTERVAL_SECONDS', 600)))
+        while not self._stop_event.wait(interval):
+            try:
+                with self.app.app_context():
+                    sweep_zipped_files()
+            except Exception as e:
+                self.app.logger.error(f"[ZipRetention] 清理ZIP时发生错误: {e}", exc_info=True)
+
+
+def _last_access(task):
+    last_access = task.last_downloaded_at or task.processed_at or task.submitted_at
+    if last_access is not None and last_access.tzinfo is None:
+        last_access = last_access.replace(tzinfo=timezone.utc)  # SQLite 读回的时间不带时区
+    return last_access or datetime.min.replace(tzinfo=timezone.utc)
+
+
+def evict_task_zip(task_id, zip_filename, reason):
+    """
+    淘汰单个任务的ZIP：仅当记录仍为 COMPLETED 且指向同一文件时才改为 EVICTED（多进程同时清理时只有一个成功），
+    更新成功后再删除文件。返回是否由本次调用完成淘汰。
+    """
+    log_prefix = "[ZipRetention]"
+    zipped_files_dir = current_app.config.get('ZIPPED_FILES_DIR')
+    now = datetime.now(timezone.utc)
+    try:
+        evicted_rows = BatchTask.query.filter(
+            BatchTask.task_id == task_id, BatchTask.status == "COMPLETED", BatchTask.zip_filename == zip_filename
+        ).update({
+            "status": "EVICTED", "zip_size_bytes": 0, "updated_at": now,
+            "message": f"ZIP包已按保留策略清理 ({reason})，重新提交即可重新生成。"
+        }, synchronize_session=False)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"{log_prefix} 标记任务 '{task_id}' 为 EVICTED 失败: {e}", exc_info=True)
+        return False
+    if evicted_rows != 1:
+        return False
+
+    zip_path = os.path.join(zipped_files_dir, zip_filename)
+    try:
+        os.remove(zip_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        current_app.logger.error(f"{log_prefix} 删除ZIP文件 '{zip_path}' 失败: {e}", exc_info=True)
+    current_app.logger.info(f"{log_prefix} 已清理任务 '{task_id}' 的ZIP '{zip_filename}' ({reason})。")
+    return True
+
+
+def sweep_zipped_files():
+    """执行一次清理，返回被淘汰的ZIP数量。"""
+    log_prefix = "[ZipRetention]"
+    config = current_app.config
+    zipped_files_dir = config.get('ZIPPED_FILES_DIR')
+    if not zipped_files_dir or not os.path.isdir(zipped_files_dir):
+        return 0
+    max_total_bytes = int(config.get('ZIP_RETENTION_MAX_BYTES', 0) or 0)
+    max_user_bytes = int(config.get('ZIP_RETENTION_PER_USER_MAX_BYTES', 0) or 0)
+    max_age_seconds = int(config.get('ZIP_RETENTION_MAX_AGE_SECONDS', 0) or 0)
+    now = datetime.now(timezone.utc)
+
+    tasks = BatchTask.query.with_entities(
+        BatchTask.task_id, BatchTask.user_id, BatchTask.status, BatchTask.zip_filename, BatchTask.zip_size_bytes,
+        BatchTask.last_downloaded_at, BatchTask.processed_at, BatchTask.submitted_at
+    ).filter(BatchTask.zip_filename.isnot(None)).all()
+    referenced_filenames = {task.zip_filename for task in tasks}
+
+    # 以磁盘为准：记录为 COMPLETED 但文件已不存在的任务直接标记为 EVICTED，保持记录与磁盘一致
+    live_zips = []  # (最近访问时间, 大小, task)
+    evicted_count = 0
+    for task in tasks:
+        if task.status != "COMPLETED":
+            continue
+        try:
+            size = os.path.getsize(os.path.join(zipped_files_dir, task.zip_filename))
+        except OSError:
+            evict_task_zip(task.task_id, task.zip_filename, "文件已不存在")
+            continue
+        live_zips.append((_last_access(task), size, task))
+    live_zips.sort(key=lambda item: item[0])  # 最久未访问的在前
+
+    evicted_task_ids = set()
+
+    def _evict(item, reason):
+        nonlocal evicted_count
+        if evict_task_zip(item[2].task_id, item[2].zip_filename, reason):
+            evicted_count += 1
+        evicted_task_ids.add(item[2].task_id)  # 淘汰失败（记录已变化）时也不再计入占用
+
+    # 1. 最长保留时间
+    if max_age_seconds > 0:
+        cutoff = now - timedelta(seconds=max_age_seconds)
+        for item in live_zips:
+            if item[0] < cutoff:
+                _evict(item, "超过最长保留时间")
+
+    # 2. 单用户容量上限（匿名提交的任务只计入总容量）
+    if max_user_bytes > 0:
+        user_usage = {}
+        for item in live_zips:
+            if item[2].user_id is not None and item[2].task_id not in evicted_task_ids:
+                user_usage[item[2].user_id] = user_usage.get(item[2].user_id, 0) + item[1]
+        for item in live_zips:
+            user_id = item[2].user_id
+            if user_id is None or item[2].task_id in evicted_task_ids or user_usage[user_id] <= max_user_bytes:
+                continue
+            _evict(item, "超过单用户ZIP容量上限")
+            user_usage[user_id] -= item[1]
+
+    # 3. 总容量上限
+    if max_total_bytes > 0:
+        total_bytes = sum(item[1] for item in live_zips if item[2].task_id not in evicted_task_ids)
+        for item in live_zips:
+            if total_bytes <= max_total_bytes:
+                break
+            if item[2].task_id in evicted_task_ids:
+                continue
+            _evict(item, "超过ZIP总容量上限")
+            total_bytes -= item[1]
+
+    _remove_orphan_files(zipped_files_dir, referenced_filenames, now)
+    if evicted_count:
+        current_app.logger.info(f"{log_prefix} 本轮共清理 {evicted_count} 个ZIP包。")
+    return evicted_count
+
+
+def _remove_orphan_files(zipped_files_dir, referenced_filenames, now):
+    """清理没有任务记录引用的ZIP，以及超过任务租约仍未完成的 .part 构建文件。"""
+    orphan_grace_seconds = int(current_app.config.get('BATCH_JOB_LEASE_SECONDS', 3600))
+    cutoff_epoch = now.timestamp() - orphan_grace_seconds
+    for entry in os.scandir(zipped_files_dir):
+        if not entry.is_file() or entry.name in referenced_filenames:
+            continue
+        try:
+            if entry.stat().st_mtime >= cutoff_epoch:
+                continue  # 刚生成或仍在构建中
+            os.remove(entry.path)
+            current_app.logger.info(f"[ZipRetention] 已清理无任务记录引用的文件 '{entry.name}'。")
+        except OSError:
+            continue
+
+
+# 模块级实例，在 create_app 中 zip_retention.init_app(app)
+zip_retention = ZipRetentionManager()